@@ -18,6 +18,9 @@ def create_app(config_name='default'):
     db.init_app(app)
     migrate.init_app(app, db)
     
+    from app.utils.cache_dashboard import cache_dashboard
+    cache_dashboard.init_app(app)
+    
     # Configura a localização brasileira
     try:
         locale.setlocale(locale.LC_ALL, 'pt_BR.UTF-8')
@@ -15,6 +15,19 @@ class Config:
     MARGEM_LUCRO_PADRAO = 30  # Margem padrão de 30%
     RATEIO_CUSTOS_METODO = 'proporcional'  # Método de rateio de custos indiretos
     
+    # Importação de NF-e em lote
+    NFE_LOTE_TAMANHO = 50  # Notas gravadas por transação
+    NFE_LOTE_PROCESSOS = None  # Processos para leitura dos XMLs (None = número de CPUs)
+    
+    # Previsão de demanda em lote
+    PREVISAO_DIAS_HISTORICO = 90  # Dias de histórico usados pela previsão de todos os itens
+    
+    # Cache do dashboard: 'lru' (memória, um worker), 'sqlite' (compartilhado entre workers) ou None
+    DASHBOARD_CACHE = os.environ.get('DASHBOARD_CACHE', 'lru')
+    DASHBOARD_CACHE_ITENS = 256  # Máximo de resultados no backend 'lru'
+    DASHBOARD_CACHE_CAMINHO = os.environ.get('DASHBOARD_CACHE_CAMINHO')  # Padrão: instance/cache_dashboard.sqlite
+    DASHBOARD_WIDGETS_THREADS = 6  # Threads usadas para calcular os widgets em paralelo
+    
     # Configurações de token (se expandir para API)
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or SECRET_KEY
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
@@ -29,6 +42,7 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    DASHBOARD_CACHE = None
 
 class ProductionConfig(Config):
     """Configuração de produção"""
@@ -38,6 +52,9 @@ class ProductionConfig(Config):
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL')
     if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith('postgres://'):
         SQLALCHEMY_DATABASE_URI = SQLALCHEMY_DATABASE_URI.replace('postgres://', 'postgresql://', 1)
+    # Sem cache por padrão: o 'lru' só é invalidado no worker que fez a alteração e
+    # instâncias serverless não compartilham o arquivo do 'sqlite' (defina DASHBOARD_CACHE)
+    DASHBOARD_CACHE = os.environ.get('DASHBOARD_CACHE')
 
 # Dicionário com as configurações disponíveis
 config = {
@@ -1,6 +1,6 @@
 from app.extensions import db
 from sqlalchemy.sql import func
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, literal_column
 from datetime import datetime, date
 from decimal import Decimal
 
@@ -131,25 +131,9 @@ class MetaDesperdicio(db.Model):
     
     @property
     def valor_atual(self):
-        """Calcula o valor atual de desperdício"""
-        from sqlalchemy import func
-        
-        query = db.session.query(func.sum(RegistroDesperdicio.quantidade))
-        query = query.filter(RegistroDesperdicio.data_registro >= self.data_inicio)
-        
-        if date.today() < self.data_fim:
-            end_date = date.today()
-        else:
-            end_date = self.data_fim
-            
-        query = query.filter(RegistroDesperdicio.data_registro <= end_date)
-        
-        if self.categoria_id:
-            query = query.filter(RegistroDesperdicio.categoria_id == self.categoria_id)
-        if self.produto_id:
-            query = query.filter(RegistroDesperdicio.produto_id == self.produto_id)
-        
-        return query.scalar() or 0
+        """Valor atual de desperdício (lido do cache de avaliar_metas quando disponível)"""
+        from app.utils.metas_desperdicio import valor_atual_meta
+        return valor_atual_meta(self)
     
     @property
     def status(self):
@@ -199,3 +183,53 @@ class MetaDesperdicio(db.Model):
             'status': self.status,
             'progresso': self.progresso
         }
+
+
+class DesperdicioDiario(db.Model):
+    """Agregado diário de desperdício por categoria e item, mantido a partir do RegistroDesperdicio
+    
+    Cada linha resume um dia de uma categoria para um produto ou prato. Os
+    indicadores de desperdício leem este agregado (uma linha por dia/categoria/item)
+    em vez de percorrer os registros.
+    """
+    __tablename__ = 'desperdicio_diario'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.Date, nullable=False, index=True)
+    categoria_id = db.Column(db.Integer, db.ForeignKey('categoria_desperdicio.id'), nullable=False)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produto.id'))
+    prato_id = db.Column(db.Integer, db.ForeignKey('pratos.id'))
+    
+    quantidade = db.Column(db.Float, nullable=False, default=0)
+    valor = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    total_registros = db.Column(db.Integer, nullable=False, default=0)  # Registros agregados
+    unidade = db.Column(db.String(10))  # Unidade dos registros do item
+    
+    # Relações
+    categoria = db.relationship('CategoriaDesperdicio')
+    produto = db.relationship('Produto')
+    prato = db.relationship('Prato')
+    
+    __table_args__ = (
+        # COALESCE: produto_id/prato_id nulos também identificam uma única linha
+        db.Index('uq_desperdicio_diario_item', data, categoria_id,
+                 func.coalesce(produto_id, literal_column('0')), func.coalesce(prato_id, literal_column('0')),
+                 unique=True),
+    )
+    
+    def __repr__(self):
+        return f'<DesperdicioDiario {self.data} categoria={self.categoria_id}: {self.total_registros} registros>'
+    
+    def to_dict(self):
+        """Converte o objeto para dicionário"""
+        return {
+            'id': self.id,
+            'data': self.data.isoformat(),
+            'categoria_id': self.categoria_id,
+            'produto_id': self.produto_id,
+            'prato_id': self.prato_id,
+            'quantidade': self.quantidade,
+            'valor': float(self.valor),
+            'total_registros': self.total_registros,
+            'unidade': self.unidade
+        }
@@ -40,25 +40,33 @@ class EstoqueMovimentacao(db.Model):
     @classmethod
     def registrar_entrada(cls, produto_id, quantidade, referencia=None, ref_id=None, valor_unitario=None, observacao=None):
         """Método de classe para registrar uma entrada de estoque"""
-        from app.models.modelo_produto import Produto
+        from app.models.modelo_produto import Produto, ProdutoPrecoHistorico
+        from app.utils.estoque_atomico import repor_estoque
         
+        agora = datetime.now()
         movimento = cls(
             produto_id=produto_id,
             quantidade=quantidade,
             tipo='entrada',
-            data_movimentacao=datetime.now(),
+            data_movimentacao=agora,
             referencia=referencia,
             ref_id=ref_id,
             valor_unitario=valor_unitario,
             observacao=observacao
         )
         
-        # Atualiza o estoque atual do produto
-        produto = Produto.query.get(produto_id)
-        if produto:
-            produto.estoque_atual += float(quantidade)
-            if valor_unitario is not None:
-                produto.preco_unitario = valor_unitario
+        # Atualiza o estoque atual do produto (UPDATE atômico no banco)
+        repor_estoque(produto_id, quantidade)
+        if valor_unitario is not None:
+            db.session.get(Produto, produto_id).preco_unitario = valor_unitario
+            db.session.add(ProdutoPrecoHistorico(
+                produto_id=produto_id,
+                vigente_desde=agora,
+                preco_medio=valor_unitario,
+                ultimo_preco_compra=valor_unitario,
+                origem='entrada',
+                referencia=referencia
+            ))
         
         db.session.add(movimento)
         db.session.commit()
@@ -68,13 +76,11 @@ class EstoqueMovimentacao(db.Model):
     def registrar_saida(cls, produto_id, quantidade, referencia=None, ref_id=None, observacao=None):
         """Método de classe para registrar uma saída de estoque"""
         from app.models.modelo_produto import Produto
+        from app.utils.estoque_atomico import baixar_estoque
         
-        produto = Produto.query.get(produto_id)
-        if not produto:
-            raise ValueError(f'Produto com ID {produto_id} não encontrado')
-        
-        if produto.estoque_atual < float(quantidade):
-            raise ValueError(f'Estoque insuficiente para {produto.nome}. Atual: {produto.estoque_atual}, Solicitado: {quantidade}')
+        # A verificação de saldo e a baixa são um único UPDATE condicional no banco
+        baixar_estoque(produto_id, quantidade)
+        produto = db.session.get(Produto, produto_id)
         
         movimento = cls(
             produto_id=produto_id,
@@ -87,9 +93,6 @@ class EstoqueMovimentacao(db.Model):
             observacao=observacao
         )
         
-        # Atualiza o estoque atual do produto
-        produto.estoque_atual -= float(quantidade)
-        
         db.session.add(movimento)
         db.session.commit()
         return movimento
@@ -115,3 +118,48 @@ class EstoqueMovimentacao(db.Model):
             'valor_total': float(self.valor_total) if self.valor_total else None,
             'produto': self.produto.to_dict() if self.produto else None
         }
+
+
+class EstoqueSnapshot(db.Model):
+    """Posição de estoque de um produto em um instante (fechamento diário ou mensal)
+
+    Guarda a quantidade e o valor resultantes de todas as movimentações anteriores
+    a `posicao_em`, para que consultas de estoque em uma data passada partam do
+    snapshot mais próximo em vez de repassar todo o histórico.
+    """
+    __tablename__ = 'estoque_snapshot'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produto.id', ondelete='CASCADE'), nullable=False)
+    posicao_em = db.Column(db.DateTime, nullable=False)  # Movimentações anteriores a este instante
+    quantidade = db.Column(db.Float, nullable=False, default=0)
+    preco_unitario = db.Column(db.Numeric(10, 4), nullable=False, default=0)  # Preço médio vigente no instante
+    valor = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    periodicidade = db.Column(db.String(10), nullable=False, default='diario')  # 'diario' ou 'mensal'
+    data_geracao = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    
+    # Relações
+    produto = db.relationship('Produto')
+    
+    # Restrições
+    __table_args__ = (
+        db.UniqueConstraint('produto_id', 'posicao_em', name='uq_estoque_snapshot_produto_posicao'),
+        db.Index('ix_estoque_snapshot_posicao', 'posicao_em'),
+        CheckConstraint("periodicidade in ('diario', 'mensal')", name='check_periodicidade_snapshot'),
+    )
+    
+    def __repr__(self):
+        return f'<EstoqueSnapshot produto={self.produto_id} {self.quantidade} em {self.posicao_em}>'
+    
+    def to_dict(self):
+        """Converte o objeto para dicionário"""
+        return {
+            'id': self.id,
+            'produto_id': self.produto_id,
+            'posicao_em': self.posicao_em.isoformat(),
+            'quantidade': self.quantidade,
+            'preco_unitario': float(self.preco_unitario),
+            'valor': float(self.valor),
+            'periodicidade': self.periodicidade,
+            'data_geracao': self.data_geracao.isoformat()
+        }
@@ -2,6 +2,79 @@ from app.extensions import db
 from sqlalchemy.sql import func
 from sqlalchemy import CheckConstraint
 from datetime import datetime
+import gzip
+import hashlib
+
+try:
+    import zstandard
+except ImportError:  # Dependência opcional: sem ela os XMLs são comprimidos com gzip
+    zstandard = None
+
+
+class NFXmlBlob(db.Model):
+    """Armazena o XML original das notas, comprimido e endereçado pelo hash da chave de acesso
+    
+    Fica fora da tabela nf_nota para que listagens e paginação de notas nunca
+    tragam o conteúdo do XML; ele só é lido quando o documento é aberto.
+    """
+    __tablename__ = 'nf_xml_blob'
+    
+    hash = db.Column(db.String(64), primary_key=True)  # sha256 da chave de acesso
+    algoritmo = db.Column(db.String(10), nullable=False)  # 'zstd' ou 'gzip'
+    tamanho_original = db.Column(db.Integer, nullable=False)  # Bytes do XML sem compressão
+    tamanho_comprimido = db.Column(db.Integer, nullable=False)
+    conteudo = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    data_criacao = db.Column(db.DateTime, default=func.now())
+    
+    def __repr__(self):
+        return f'<NFXmlBlob {self.hash[:12]} ({self.algoritmo}, {self.tamanho_comprimido} bytes)>'
+    
+    @staticmethod
+    def calcular_hash(chave_acesso):
+        """Calcula a chave do blob a partir da chave de acesso da nota"""
+        return hashlib.sha256(chave_acesso.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def comprimir(xml_content):
+        """Comprime o XML, retornando (algoritmo, tamanho_original, bytes comprimidos)"""
+        dados = xml_content.encode('utf-8') if isinstance(xml_content, str) else xml_content
+        if zstandard is not None:
+            return 'zstd', len(dados), zstandard.ZstdCompressor(level=10).compress(dados)
+        return 'gzip', len(dados), gzip.compress(dados, compresslevel=9)
+    
+    @classmethod
+    def montar(cls, chave_acesso, xml_content):
+        """Retorna o dicionário de colunas do blob (útil para inserções em massa)"""
+        algoritmo, tamanho, comprimido = cls.comprimir(xml_content)
+        return {
+            'hash': cls.calcular_hash(chave_acesso),
+            'algoritmo': algoritmo,
+            'tamanho_original': tamanho,
+            'tamanho_comprimido': len(comprimido),
+            'conteudo': comprimido
+        }
+    
+    @classmethod
+    def salvar(cls, chave_acesso, xml_content):
+        """Grava o XML da nota (reaproveitando o blob se a nota já foi armazenada)"""
+        hash_chave = cls.calcular_hash(chave_acesso)
+        with db.session.no_autoflush:
+            blob = db.session.get(cls, hash_chave)
+        if blob is None:
+            blob = cls(**cls.montar(chave_acesso, xml_content))
+            db.session.add(blob)
+        return blob
+    
+    def get_xml(self):
+        """Retorna o XML descomprimido como texto"""
+        if self.algoritmo == 'zstd':
+            if zstandard is None:
+                raise RuntimeError('O pacote zstandard é necessário para ler este XML')
+            dados = zstandard.ZstdDecompressor().decompress(self.conteudo)
+        else:
+            dados = gzip.decompress(self.conteudo)
+        return dados.decode('utf-8')
+
 
 class NFNota(db.Model):
     """Modelo para representar as Notas Fiscais Eletrônicas"""
@@ -20,10 +93,11 @@ class NFNota(db.Model):
     valor_desconto = db.Column(db.Numeric(10, 2), default=0)
     valor_impostos = db.Column(db.Numeric(10, 2), default=0)
     fornecedor_id = db.Column(db.Integer, db.ForeignKey('fornecedor.id'), nullable=False)
-    xml_data = db.Column(db.Text)  # Armazena o XML original para referência
+    xml_hash = db.Column(db.String(64), db.ForeignKey('nf_xml_blob.hash'), index=True)  # XML original (NFXmlBlob)
     
     # Relações
     fornecedor = db.relationship('Fornecedor', back_populates='notas_fiscais')
+    xml_blob = db.relationship('NFXmlBlob')
     itens = db.relationship('NFItem', back_populates='nota', cascade='all, delete-orphan')
     
     # Restrições
@@ -39,6 +113,22 @@ class NFNota(db.Model):
     def __repr__(self):
         return f'<NFNota {self.numero}/{self.serie} - {self.fornecedor.razao_social if self.fornecedor else "N/A"}>'
     
+    @property
+    def xml_data(self):
+        """XML original da nota (lido do armazenamento comprimido apenas sob demanda)"""
+        if self.xml_blob is None:
+            return None
+        return self.xml_blob.get_xml()
+    
+    @xml_data.setter
+    def xml_data(self, xml_content):
+        if not xml_content:
+            self.xml_blob = None
+            return
+        if not self.chave_acesso:
+            raise ValueError('A chave de acesso deve ser definida antes do XML')
+        self.xml_blob = NFXmlBlob.salvar(self.chave_acesso, xml_content)
+    
     def get_data_formatada(self):
         """Retorna a data de emissão formatada"""
         return self.data_emissao.strftime('%d/%m/%Y')
@@ -51,35 +141,54 @@ class NFNota(db.Model):
     def atualizar_estoque(self):
         """Atualiza o estoque com base nos itens da nota fiscal"""
         from app.models.modelo_estoque import EstoqueMovimentacao
+        from app.models.modelo_produto import ProdutoPrecoHistorico
         from app.utils.calculos import calcular_preco_medio_ponderado
+        from app.utils.estoque_atomico import aplicar_movimentos, bloquear_produtos
+        
+        # Trava os produtos da nota: o preço médio parte do estoque e preço gravados
+        atuais = bloquear_produtos(item.produto_id for item in self.itens)
         
+        agora = datetime.now()
         for item in self.itens:
+            atual = atuais.get(item.produto_id) or {
+                'estoque': float(item.produto.estoque_atual or 0), 'preco': float(item.produto.preco_unitario or 0)
+            }
+            
             # Calcular novo preço médio ponderado
             novo_preco = calcular_preco_medio_ponderado(
-                estoque_atual=float(item.produto.estoque_atual),
-                preco_atual=float(item.produto.preco_unitario or 0),
+                estoque_atual=atual['estoque'],
+                preco_atual=atual['preco'],
                 quantidade_nova=float(item.quantidade),
                 preco_novo=float(item.valor_unitario)
             )
+            atual['estoque'] += float(item.quantidade)
+            atual['preco'] = novo_preco
             
-            # Atualiza o preço unitário do produto
+            # Atualiza o preço unitário do produto, preservando o anterior no histórico
             item.produto.preco_unitario = novo_preco
+            db.session.add(ProdutoPrecoHistorico(
+                produto_id=item.produto_id,
+                vigente_desde=agora,
+                preco_medio=novo_preco,
+                ultimo_preco_compra=item.valor_unitario,
+                origem='nfe',
+                referencia=f'NF {self.numero}/{self.serie}'
+            ))
             
             # Cria um movimento de estoque para cada item
             movimento = EstoqueMovimentacao(
                 produto_id=item.produto_id,
                 quantidade=item.quantidade,
                 tipo='entrada',
-                data_movimentacao=datetime.now(),
+                data_movimentacao=agora,
                 referencia=f'NF {self.numero}/{self.serie}',
                 ref_id=item.id,
                 valor_unitario=item.valor_unitario
             )
             db.session.add(movimento)
-            
-            # Atualiza o estoque atual
-            item.produto.estoque_atual += float(item.quantidade)
-            
+        
+        # Atualiza o estoque atual (UPDATE atômico no banco)
+        aplicar_movimentos((item.produto_id, item.quantidade) for item in self.itens)
         db.session.commit()
 
 
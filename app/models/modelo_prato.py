@@ -1,6 +1,7 @@
 from app.extensions import db
 from sqlalchemy.sql import func
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, case, event, inspect, or_, select, update
+from sqlalchemy.orm import Session
 from decimal import Decimal
 from datetime import datetime
 
@@ -23,6 +24,10 @@ class Prato(db.Model):
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
     data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Custos persistidos, recalculados apenas quando insumos ou preços dos produtos mudam
+    custo_direto_cache = db.Column(db.Numeric(12, 4), index=True)  # Custo dos insumos para o rendimento completo
+    custo_porcao_cache = db.Column(db.Numeric(12, 4), index=True)  # Custo total por porção (direto + indireto)
+    
     # Relações
     insumos = db.relationship('PratoInsumo', back_populates='prato', cascade='all, delete-orphan')
     registros_desperdicio = db.relationship('RegistroDesperdicio', back_populates='prato')
@@ -41,6 +46,12 @@ class Prato(db.Model):
     @property
     def custo_direto_total(self):
         """Custo total dos insumos para o rendimento completo"""
+        if self.custo_direto_cache is not None:
+            return float(self.custo_direto_cache)
+        return self.calcular_custo_direto()
+    
+    def calcular_custo_direto(self):
+        """Calcula o custo dos insumos percorrendo a receita (ignora o cache)"""
         return sum(insumo.custo_total for insumo in self.insumos)
     
     @property
@@ -53,7 +64,7 @@ class Prato(db.Model):
     @property
     def custo_total_por_porcao(self):
         """Custo total por porção (direto + indireto)"""
-        return self.custo_direto_por_porcao + float(self.custo_indireto)
+        return self.custo_direto_por_porcao + float(self.custo_indireto or 0)
     
     def calcular_preco_sugerido(self):
         """Calcula o preço sugerido com base nos custos e margem"""
@@ -146,3 +157,126 @@ class PratoInsumo(db.Model):
             'custo_por_porcao': float(self.custo_por_porcao),
             'produto': self.produto.to_dict() if self.produto else None
         }
+
+
+def recalcular_custos_pratos(prato_ids=None, produto_ids=None, connection=None):
+    """Recalcula os custos persistidos dos pratos em um único UPDATE
+    
+    Args:
+        prato_ids: Pratos a recalcular
+        produto_ids: Produtos cujo preço mudou (recalcula os pratos que os utilizam)
+        connection: Conexão a usar (padrão: a da sessão atual)
+        
+    Sem nenhum filtro, recalcula todos os pratos.
+    """
+    from app.models.modelo_produto import Produto
+    
+    pratos = Prato.__table__
+    insumos = PratoInsumo.__table__
+    produtos = Produto.__table__
+    
+    custo_direto = select(
+        func.coalesce(func.sum(insumos.c.quantidade * produtos.c.preco_unitario), 0)
+    ).select_from(
+        insumos.join(produtos, insumos.c.produto_id == produtos.c.id)
+    ).where(
+        insumos.c.prato_id == pratos.c.id
+    ).scalar_subquery()
+    
+    custo_porcao = case(
+        (pratos.c.porcoes_rendimento > 0, custo_direto / pratos.c.porcoes_rendimento),
+        else_=0
+    ) + func.coalesce(pratos.c.custo_indireto, 0)
+    
+    stmt = update(pratos).values(
+        custo_direto_cache=custo_direto,
+        custo_porcao_cache=custo_porcao
+    )
+    
+    filtros = []
+    if prato_ids:
+        filtros.append(pratos.c.id.in_(list(prato_ids)))
+    if produto_ids:
+        filtros.append(pratos.c.id.in_(
+            select(insumos.c.prato_id).where(insumos.c.produto_id.in_(list(produto_ids)))
+        ))
+    if filtros:
+        stmt = stmt.where(or_(*filtros))
+    elif prato_ids is not None or produto_ids is not None:
+        return  # Filtros vazios: nada a recalcular
+    
+    if connection is None:
+        connection = db.session.connection()
+    connection.execute(stmt)
+
+
+# Invalidação do cache de custos dirigida pelas dependências
+CAMPOS_PRATO_CUSTO = ('porcoes_rendimento', 'custo_indireto')
+CAMPOS_INSUMO_CUSTO = ('prato_id', 'produto_id', 'quantidade')
+
+
+def _valores_historico(obj, campo):
+    """Retorna os valores antigo e novo de um atributo alterado"""
+    historico = inspect(obj).attrs[campo].history
+    return [v for v in (historico.deleted or ()) + (historico.added or ()) if v is not None]
+
+
+@event.listens_for(Session, 'before_flush')
+def _coletar_dependencias_custo(session, flush_context, instances):
+    """Identifica pratos e produtos cujas alterações afetam o custo dos pratos"""
+    from app.models.modelo_produto import Produto
+    
+    pendentes = session.info.setdefault('custos_pratos_pendentes', {'pratos': set(), 'produtos': set(), 'objetos': []})
+    
+    for obj in session.new:
+        if isinstance(obj, (Prato, PratoInsumo)):
+            pendentes['objetos'].append(obj)
+    
+    for obj in session.deleted:
+        if isinstance(obj, PratoInsumo) and obj.prato_id:
+            pendentes['pratos'].add(obj.prato_id)
+    
+    for obj in session.dirty:
+        if isinstance(obj, Produto):
+            if inspect(obj).attrs.preco_unitario.history.has_changes():
+                pendentes['produtos'].add(obj.id)
+        elif isinstance(obj, PratoInsumo):
+            if any(inspect(obj).attrs[c].history.has_changes() for c in CAMPOS_INSUMO_CUSTO):
+                pendentes['pratos'].update(_valores_historico(obj, 'prato_id') or [obj.prato_id])
+                pendentes['objetos'].append(obj)
+        elif isinstance(obj, Prato):
+            if any(inspect(obj).attrs[c].history.has_changes() for c in CAMPOS_PRATO_CUSTO):
+                pendentes['pratos'].add(obj.id)
+
+
+@event.listens_for(Session, 'after_flush')
+def _recalcular_custos_pendentes(session, flush_context):
+    """Recalcula, na mesma transação, o custo dos pratos afetados pelo flush"""
+    pendentes = session.info.pop('custos_pratos_pendentes', None)
+    if not pendentes:
+        return
+    
+    prato_ids = set(pendentes['pratos'])
+    for obj in pendentes['objetos']:
+        prato_ids.add(obj.id if isinstance(obj, Prato) else obj.prato_id)
+    prato_ids.discard(None)
+    produto_ids = {p for p in pendentes['produtos'] if p is not None}
+    
+    if not prato_ids and not produto_ids:
+        return
+    
+    recalcular_custos_pratos(prato_ids, produto_ids, connection=session.connection())
+    session.info['custos_pratos_expirar'] = (prato_ids, bool(produto_ids))
+
+
+@event.listens_for(Session, 'after_flush_postexec')
+def _expirar_custos_recalculados(session, flush_context):
+    """Expira o cache dos pratos carregados para que o novo custo seja relido"""
+    expirar = session.info.pop('custos_pratos_expirar', None)
+    if not expirar:
+        return
+    
+    prato_ids, todos = expirar
+    for obj in list(session.identity_map.values()):
+        if isinstance(obj, Prato) and (todos or obj.id in prato_ids):
+            session.expire(obj, ['custo_direto_cache', 'custo_porcao_cache'])
@@ -1,5 +1,6 @@
 from app.extensions import db
-from sqlalchemy import func
+from sqlalchemy import event, func, literal_column
+from sqlalchemy.orm import Session
 from datetime import datetime, date, timedelta
 import json
 
@@ -16,6 +17,7 @@ class HistoricoVendas(db.Model):
     quantidade = db.Column(db.Integer, nullable=False, default=0)
     valor_unitario = db.Column(db.Numeric(10, 2), nullable=False, default=0)
     valor_total = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    custo_unitario_snapshot = db.Column(db.Numeric(12, 4))  # Custo por porção do prato no momento da venda
     
     # Metadados para análise
     periodo_dia = db.Column(db.String(20))  # manhã, tarde, noite
@@ -66,6 +68,11 @@ class HistoricoVendas(db.Model):
         )
         
         db.session.add(venda)
+        
+        # Mantém o agregado diário usado pelo dashboard na mesma transação
+        from app.utils.agregados_vendas import acumular_vendas_diarias
+        acumular_vendas_diarias([venda])
+        
         db.session.commit()
         
         return venda
@@ -85,6 +92,7 @@ class HistoricoVendas(db.Model):
             'quantidade': self.quantidade,
             'valor_unitario': float(self.valor_unitario),
             'valor_total': float(self.valor_total),
+            'custo_unitario_snapshot': float(self.custo_unitario_snapshot) if self.custo_unitario_snapshot is not None else None,
             'periodo_dia': self.periodo_dia,
             'dia_semana': self.dia_semana,
             'semana_mes': self.semana_mes,
@@ -98,6 +106,47 @@ class HistoricoVendas(db.Model):
         }
 
 
+class VendaDiariaAgregada(db.Model):
+    """Agregado diário de vendas por prato, mantido a partir do HistoricoVendas
+    
+    Cada linha resume um dia de um prato (itens de cardápio são resolvidos para o
+    prato correspondente). O custo é um retrato do custo por porção no momento em
+    que as vendas foram registradas.
+    """
+    __tablename__ = 'vendas_diarias_agregadas'
+    id = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.Date, nullable=False, index=True)
+    prato_id = db.Column(db.Integer, db.ForeignKey('pratos.id'))  # None para vendas sem prato associado
+    
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    custo = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    total_registros = db.Column(db.Integer, nullable=False, default=0)  # Linhas do histórico agregadas
+    
+    # Relacionamentos
+    prato = db.relationship('Prato')
+    
+    __table_args__ = (
+        # COALESCE: vendas sem prato também têm uma única linha por dia
+        db.Index('uq_venda_diaria_data_prato', data, func.coalesce(prato_id, literal_column('0')), unique=True),
+    )
+    
+    def __repr__(self):
+        return f"<VendaDiariaAgregada {self.data} prato={self.prato_id}: {self.quantidade} unidades>"
+    
+    def to_dict(self):
+        """Converte o objeto para dicionário"""
+        return {
+            'id': self.id,
+            'data': self.data.isoformat(),
+            'prato_id': self.prato_id,
+            'quantidade': self.quantidade,
+            'receita': float(self.receita),
+            'custo': float(self.custo),
+            'total_registros': self.total_registros
+        }
+
+
 class PrevisaoDemanda(db.Model):
     __tablename__ = 'previsao_demanda'
     id = db.Column(db.Integer, primary_key=True)
@@ -163,6 +212,55 @@ class PrevisaoDemanda(db.Model):
         }
 
 
+class ResultadoBacktest(db.Model):
+    """Precisão de um método de previsão para um item, medida por backtest com origem móvel
+    
+    Guarda apenas a execução mais recente de cada item e método. O método marcado
+    como melhor é usado pela previsão automática.
+    """
+    __tablename__ = 'resultado_backtest'
+    id = db.Column(db.Integer, primary_key=True)
+    data_execucao = db.Column(db.DateTime, default=func.now(), nullable=False)
+    
+    # Item avaliado - pode ser prato ou item de cardápio
+    cardapio_item_id = db.Column(db.Integer, db.ForeignKey('cardapio_item.id'), index=True)
+    prato_id = db.Column(db.Integer, db.ForeignKey('pratos.id'), index=True)
+    
+    metodo = db.Column(db.String(50), nullable=False)
+    horizonte = db.Column(db.Integer, nullable=False)  # Dias previstos a partir de cada origem
+    origens = db.Column(db.Integer, nullable=False)  # Quantidade de origens avaliadas
+    
+    # Métricas de erro
+    mape = db.Column(db.Float)  # Erro percentual absoluto médio (dias com venda)
+    wape = db.Column(db.Float)  # Erro absoluto total / vendas totais
+    vies = db.Column(db.Float)  # (previsto - real) / real, no total
+    melhor = db.Column(db.Boolean, default=False, nullable=False, index=True)  # Menor WAPE do item
+    
+    # Relacionamentos
+    cardapio_item = db.relationship('CardapioItem')
+    prato = db.relationship('Prato')
+    
+    def __repr__(self):
+        item = f"cardapio_item={self.cardapio_item_id}" if self.cardapio_item_id else f"prato={self.prato_id}"
+        return f"<ResultadoBacktest {item} {self.metodo}: WAPE {self.wape}>"
+    
+    def to_dict(self):
+        """Converte o objeto para dicionário"""
+        return {
+            'id': self.id,
+            'data_execucao': self.data_execucao.isoformat() if self.data_execucao else None,
+            'cardapio_item_id': self.cardapio_item_id,
+            'prato_id': self.prato_id,
+            'metodo': self.metodo,
+            'horizonte': self.horizonte,
+            'origens': self.origens,
+            'mape': self.mape,
+            'wape': self.wape,
+            'vies': self.vies,
+            'melhor': self.melhor
+        }
+
+
 class FatorSazonalidade(db.Model):
     __tablename__ = 'fator_sazonalidade'
     id = db.Column(db.Integer, primary_key=True)
@@ -218,3 +316,16 @@ class FatorSazonalidade(db.Model):
             'cardapio_item': self.cardapio_item.to_dict() if self.cardapio_item else None,
             'prato': self.prato.to_dict() if self.prato else None
         }
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_custo_vendas(session, flush_context, instances):
+    """Grava o custo por porção vigente nas vendas novas que ainda não o têm"""
+    vendas = [obj for obj in session.new
+              if isinstance(obj, HistoricoVendas) and obj.custo_unitario_snapshot is None]
+    if not vendas:
+        return
+    
+    from app.utils.agregados_vendas import registrar_custo_vendas
+    with session.no_autoflush:
+        registrar_custo_vendas(vendas)
@@ -1,7 +1,11 @@
 from app.extensions import db
 from sqlalchemy.sql import func
-from sqlalchemy import CheckConstraint
+from sqlalchemy import CheckConstraint, event, inspect
+from sqlalchemy.orm import Session
+from datetime import datetime, time, timedelta
 from decimal import Decimal
+import numpy as np
+import pandas as pd
 
 class Produto(db.Model):
     """Modelo para representar produtos/insumos do estoque"""
@@ -28,6 +32,8 @@ class Produto(db.Model):
     itens_nf = db.relationship('NFItem', back_populates='produto', lazy='dynamic')
     prato_insumos = db.relationship('PratoInsumo', back_populates='produto', lazy='dynamic')
     registros_desperdicio = db.relationship('RegistroDesperdicio', back_populates='produto', lazy='dynamic')
+    historico_precos = db.relationship('ProdutoPrecoHistorico', back_populates='produto', lazy='dynamic',
+                                       order_by='ProdutoPrecoHistorico.vigente_desde')
     metas_desperdicio = db.relationship('MetaDesperdicio', back_populates='produto', foreign_keys='MetaDesperdicio.produto_id')
     
     # Restrições
@@ -49,13 +55,19 @@ class Produto(db.Model):
         return self.estoque_atual < self.estoque_minimo
     
     def atualizar_estoque(self, quantidade, tipo):
-        """Atualiza o estoque com base na quantidade e tipo (entrada/saída)"""
+        """Atualiza o estoque com base na quantidade e tipo (entrada/saída)
+        
+        O ajuste é feito no banco com um UPDATE atômico (ver
+        app.utils.estoque_atomico), seguro com vários workers.
+        """
+        from app.utils.estoque_atomico import baixar_estoque, repor_estoque
+        
+        if self.id is None:
+            db.session.flush()
         if tipo.lower() == 'entrada':
-            self.estoque_atual += float(quantidade)
+            return repor_estoque(self.id, quantidade)
         elif tipo.lower() == 'saída':
-            if self.estoque_atual < float(quantidade):
-                raise ValueError(f'Estoque insuficiente para {self.nome}')
-            self.estoque_atual -= float(quantidade)
+            return baixar_estoque(self.id, quantidade)
         
         return self.estoque_atual
     
@@ -75,3 +87,133 @@ class Produto(db.Model):
             'fornecedor_id': self.fornecedor_id,
             'ativo': self.ativo
         }
+
+
+class ProdutoPrecoHistorico(db.Model):
+    """Histórico (somente inclusão) dos preços de um produto
+
+    Cada linha registra o preço médio ponderado que passou a valer a partir de
+    `vigente_desde` e, quando a mudança veio de uma compra, o preço dessa compra.
+    """
+    __tablename__ = 'produto_preco_historico'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    produto_id = db.Column(db.Integer, db.ForeignKey('produto.id', ondelete='CASCADE'), nullable=False)
+    vigente_desde = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    preco_medio = db.Column(db.Numeric(10, 4), nullable=False)  # Preço médio ponderado (Produto.preco_unitario)
+    ultimo_preco_compra = db.Column(db.Numeric(10, 4))  # Preço da compra que gerou a mudança
+    origem = db.Column(db.String(20), nullable=False, default='manual')  # cadastro, manual, entrada, nfe
+    referencia = db.Column(db.String(100))  # Ex: "NF 1234/1"
+    
+    # Relações
+    produto = db.relationship('Produto', back_populates='historico_precos')
+    
+    # Consultas "preço em D" usam o índice (produto, data)
+    __table_args__ = (
+        db.Index('ix_produto_preco_historico_produto_data', 'produto_id', 'vigente_desde'),
+        CheckConstraint('preco_medio >= 0', name='check_preco_historico_positivo'),
+    )
+    
+    def __repr__(self):
+        return f'<ProdutoPrecoHistorico produto={self.produto_id} {self.preco_medio} desde {self.vigente_desde}>'
+    
+    @staticmethod
+    def _limite(data):
+        """Datas valem até o fim do dia; datetimes são usados como estão"""
+        if isinstance(data, datetime):
+            return data
+        return datetime.combine(data + timedelta(days=1), time.min)
+    
+    @classmethod
+    def preco_em(cls, produto_id, data, campo='preco_medio'):
+        """Preço vigente de um produto em uma data (None se não houver histórico até lá)"""
+        coluna = getattr(cls, campo)
+        return db.session.query(coluna).filter(
+            cls.produto_id == produto_id,
+            cls.vigente_desde < cls._limite(data)
+        ).order_by(cls.vigente_desde.desc(), cls.id.desc()).limit(1).scalar()
+    
+    @classmethod
+    def precos_em(cls, pares, campo='preco_medio'):
+        """Resolve o preço vigente de vários (produto, data) com uma única consulta
+        
+        Args:
+            pares: Iterável de (produto_id, data)
+            campo: 'preco_medio' ou 'ultimo_preco_compra'
+            
+        Returns:
+            Dict: Preço (float) por (produto_id, data); pares sem histórico até a
+                data ficam de fora
+        """
+        pares = list(dict.fromkeys((int(p), d) for p, d in pares))
+        if not pares:
+            return {}
+        
+        coluna = getattr(cls, campo)
+        limites = [cls._limite(d) for _, d in pares]
+        historico = pd.DataFrame(
+            db.session.query(cls.produto_id, cls.vigente_desde, coluna).filter(
+                cls.produto_id.in_({p for p, _ in pares}),
+                cls.vigente_desde < max(limites),
+                coluna.isnot(None)
+            ).order_by(cls.vigente_desde, cls.id).all(),
+            columns=['produto_id', 'vigente_desde', 'preco']
+        )
+        if historico.empty:
+            return {}
+        
+        # Ajuste "o último registro antes do limite" para todos os pares de uma vez
+        consulta = pd.DataFrame({
+            'posicao': np.arange(len(pares)),
+            'produto_id': [p for p, _ in pares],
+            'limite': pd.to_datetime(limites).astype('datetime64[ns]') - pd.Timedelta(microseconds=1),
+        }).sort_values('limite')
+        historico['vigente_desde'] = pd.to_datetime(historico['vigente_desde']).astype('datetime64[ns]')
+        resultado = pd.merge_asof(
+            consulta, historico, left_on='limite', right_on='vigente_desde', by='produto_id',
+            direction='backward', allow_exact_matches=True
+        ).dropna(subset=['preco'])
+        
+        return {pares[posicao]: float(preco) for posicao, preco in zip(resultado['posicao'], resultado['preco'])}
+    
+    def to_dict(self):
+        """Converte o objeto para dicionário"""
+        return {
+            'id': self.id,
+            'produto_id': self.produto_id,
+            'vigente_desde': self.vigente_desde.isoformat(),
+            'preco_medio': float(self.preco_medio),
+            'ultimo_preco_compra': float(self.ultimo_preco_compra) if self.ultimo_preco_compra is not None else None,
+            'origem': self.origem,
+            'referencia': self.referencia
+        }
+
+
+@event.listens_for(Session, 'before_flush')
+def _registrar_historico_precos(session, flush_context, instances):
+    """Registra no histórico toda mudança de preço feita pelo ORM
+    
+    Caminhos que já registram a mudança (com o preço de compra) adicionam a
+    própria linha na sessão; os demais (cadastro, edição manual) recebem uma
+    linha aqui.
+    """
+    produtos_registrados = set()
+    ids_registrados = set()
+    for obj in session.new:
+        if isinstance(obj, ProdutoPrecoHistorico):
+            if obj.produto is not None:
+                produtos_registrados.add(id(obj.produto))
+            ids_registrados.add(obj.produto_id)
+    ids_registrados.discard(None)
+    
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Produto) or id(obj) in produtos_registrados or obj.id in ids_registrados:
+            continue
+        novo = obj in session.new
+        if not novo and not inspect(obj).attrs.preco_unitario.history.has_changes():
+            continue
+        session.add(ProdutoPrecoHistorico(
+            produto=obj,
+            preco_medio=obj.preco_unitario or 0,
+            origem='cadastro' if novo else 'manual'
+        ))
@@ -4,8 +4,9 @@ from app.models.modelo_cardapio import Cardapio, CardapioSecao, CardapioItem
 from app.models.modelo_prato import Prato
 from app.routes.cardapios import bp
 from datetime import datetime, date
-import pandas as pd
-import io
+from sqlalchemy import case, func
+from sqlalchemy.orm import joinedload
+from app.utils.exportacao import percorrer, resposta_csv
 
 @bp.route('/')
 @bp.route('/index')
@@ -342,58 +343,50 @@ def remover_item(id):
 @bp.route('/exportar/<int:id>')
 def exportar(id):
     """Exporta o cardápio para um arquivo CSV"""
-    from flask import Response
-    
     cardapio = Cardapio.query.get_or_404(id)
-    
-    # Dados do cardápio
-    dados_cardapio = {
-        'Nome': cardapio.nome,
-        'Descrição': cardapio.descricao or '',
-        'Tipo': cardapio.tipo or '',
-        'Temporada': cardapio.temporada or '',
-        'Data de Início': cardapio.data_inicio.strftime('%d/%m/%Y'),
-        'Data de Fim': cardapio.data_fim.strftime('%d/%m/%Y') if cardapio.data_fim else 'Não definido',
-        'Status': 'Ativo' if cardapio.ativo else 'Inativo',
-        'Total de Pratos': cardapio.total_pratos,
-        'Ticket Médio Estimado': f'R$ {cardapio.ticket_medio_estimado:.2f}'
-    }
-    
-    df_cardapio = pd.DataFrame([dados_cardapio])
-    
-    # Lista de itens do cardápio
-    itens_data = []
-    
-    for secao in sorted(cardapio.secoes, key=lambda s: s.ordem):
-        for item in sorted(secao.itens, key=lambda i: i.ordem):
-            itens_data.append({
-                'Seção': secao.nome,
-                'Ordem Seção': secao.ordem,
-                'Prato': item.prato.nome,
-                'Ordem Item': item.ordem,
-                'Preço': float(item.get_preco_venda) if item.get_preco_venda else None,
-                'Custo Total': item.prato.custo_total_por_porcao,
-                'Margem (%)': float(item.prato.margem),
-                'Destaque': 'Sim' if item.destaque else 'Não',
-                'Disponível': 'Sim' if item.disponivel else 'Não',
-                'Observação': item.observacao or ''
-            })
-    
-    df_itens = pd.DataFrame(itens_data)
-    
-    # Exportar para CSV
-    output = io.StringIO()
-    output.write("DADOS DO CARDÁPIO\n")
-    df_cardapio.T.to_csv(output, header=False)
-    output.write("\nITENS DO CARDÁPIO\n")
-    df_itens.to_csv(output, index=False)
-    
-    # Retornar como download
-    return Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-disposition":
-                 f"attachment; filename=cardapio_{cardapio.nome.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.csv"}
+
+    # Itens do cardápio em lotes, na ordem das seções, com prato e seção na mesma consulta
+    itens = CardapioItem.query.join(CardapioItem.secao).filter(
+        CardapioSecao.cardapio_id == cardapio.id
+    ).options(
+        joinedload(CardapioItem.secao),
+        joinedload(CardapioItem.prato)
+    ).order_by(CardapioSecao.ordem, CardapioSecao.id, CardapioItem.ordem, CardapioItem.id)
+
+    def linhas():
+        # Dados do cardápio, um campo por linha
+        yield ['DADOS DO CARDÁPIO']
+        yield ['Nome', cardapio.nome]
+        yield ['Descrição', cardapio.descricao or '']
+        yield ['Tipo', cardapio.tipo or '']
+        yield ['Temporada', cardapio.temporada or '']
+        yield ['Data de Início', cardapio.data_inicio.strftime('%d/%m/%Y')]
+        yield ['Data de Fim', cardapio.data_fim.strftime('%d/%m/%Y') if cardapio.data_fim else 'Não definido']
+        yield ['Status', 'Ativo' if cardapio.ativo else 'Inativo']
+        yield ['Total de Pratos', cardapio.total_pratos]
+        yield ['Ticket Médio Estimado', f'R$ {cardapio.ticket_medio_estimado:.2f}']
+
+        # Lista de itens do cardápio
+        yield []
+        yield ['ITENS DO CARDÁPIO']
+        yield ['Seção', 'Ordem Seção', 'Prato', 'Ordem Item', 'Preço', 'Custo Total', 'Margem (%)',
+               'Destaque', 'Disponível', 'Observação']
+        for item in percorrer(itens):
+            yield [
+                item.secao.nome,
+                item.secao.ordem,
+                item.prato.nome,
+                item.ordem,
+                float(item.get_preco_venda) if item.get_preco_venda else None,
+                item.prato.custo_total_por_porcao,
+                float(item.prato.margem),
+                'Sim' if item.destaque else 'Não',
+                'Sim' if item.disponivel else 'Não',
+                item.observacao or ''
+            ]
+
+    return resposta_csv(
+        linhas(), f"cardapio_{cardapio.nome.replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}"
     )
 
 @bp.route('/imprimir/<int:id>')
@@ -415,13 +408,12 @@ def imprimir(id):
 def sugestao():
     """Sugere um cardápio com base em rentabilidade"""
     # Obter pratos ativos ordenados por margem de lucro
-    pratos_alta_margem = Prato.query.filter_by(ativo=True).all()
-    
-    # Ordenar por margem de lucro (em valor, não percentual)
-    pratos_alta_margem.sort(
-        key=lambda p: (float(p.preco_venda or 0) - p.custo_total_por_porcao) if p.preco_venda else 0, 
-        reverse=True
+    # Ordenar por margem de lucro (em valor, não percentual) usando o custo persistido
+    margem_valor = case(
+        (Prato.preco_venda > 0, Prato.preco_venda - func.coalesce(Prato.custo_porcao_cache, 0)),
+        else_=0
     )
+    pratos_alta_margem = Prato.query.filter_by(ativo=True).order_by(margem_valor.desc()).all()
     
     # Agrupar por categoria
     pratos_por_categoria = {}
@@ -1,13 +1,16 @@
 from flask import render_template, redirect, url_for, request, jsonify, current_app, Response
 from app.extensions import db
 from sqlalchemy import func, desc, extract, and_, or_, case, cast, Float
-from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_prato import Prato
 from app.models.modelo_produto import Produto
 from app.models.modelo_cardapio import Cardapio, CardapioItem, CardapioSecao
-from app.models.modelo_previsao import HistoricoVendas
-from app.models.modelo_desperdicio import RegistroDesperdicio
+from app.models.modelo_previsao import HistoricoVendas, VendaDiariaAgregada
 from app.models.modelo_custo import CustoIndireto
 from app.routes.dashboard import bp
+from app.utils.agregados_vendas import obter_totais_por_dia
+from app.utils.cache_dashboard import cache_dashboard
+from app.utils.relatorio_desperdicio import totais_por_categoria
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, date, timedelta
 import pandas as pd
 import numpy as np
@@ -15,36 +18,24 @@ import json
 import calendar
 import io
 
+# Custo das vendas: soma do custo por porção registrado em cada venda
+CUSTO_VENDAS = func.coalesce(func.sum(HistoricoVendas.quantidade * HistoricoVendas.custo_unitario_snapshot), 0)
+
+
 # Funções auxiliares para cálculos de lucratividade
+@cache_dashboard.em_cache
 def calcular_metricas_principais(data_inicio, data_fim):
-    """Calcula as métricas principais de lucratividade para o período - OTIMIZADO"""
-    from sqlalchemy.orm import joinedload
-    
-    # Obter vendas no período com eager loading
-    vendas = HistoricoVendas.query.options(
-        joinedload(HistoricoVendas.cardapio_item).joinedload(CardapioItem.prato),
-        joinedload(HistoricoVendas.prato)
+    """Calcula as métricas principais de lucratividade para o período - usa o agregado diário"""
+    # Receita e custo direto já consolidados por dia/prato
+    receita_total, custo_total = db.session.query(
+        func.coalesce(func.sum(VendaDiariaAgregada.receita), 0),
+        func.coalesce(func.sum(VendaDiariaAgregada.custo), 0)
     ).filter(
-        HistoricoVendas.data >= data_inicio,
-        HistoricoVendas.data <= data_fim
-    ).all()
-    
-    # Calcular receita total
-    receita_total = sum(float(v.valor_total or 0) for v in vendas)
-    
-    # Calcular custos totais
-    custo_total = 0
-    for venda in vendas:
-        # Custo do item vendido
-        if venda.cardapio_item:
-            # Já carregado via eager load
-            item = venda.cardapio_item
-            if item.prato:
-                custo_total += float(item.prato.custo_total_por_porcao or 0) * venda.quantidade
-        elif venda.prato:
-            # Já carregado via eager load
-            prato = venda.prato
-            custo_total += float(prato.custo_total_por_porcao or 0) * venda.quantidade
+        VendaDiariaAgregada.data >= data_inicio,
+        VendaDiariaAgregada.data <= data_fim
+    ).one()
+    receita_total = float(receita_total)
+    custo_total = float(custo_total)
     
     # Adicionar custos indiretos do período (Query única, ok)
     custos_indiretos = CustoIndireto.query.filter(
@@ -61,9 +52,9 @@ def calcular_metricas_principais(data_inicio, data_fim):
     return receita_total, custo_total, lucro_total, margem_media
 
 
+@cache_dashboard.em_cache
 def obter_dados_diarios(data_inicio, data_fim):
-    """Obtém dados diários de receitas e custos para gráfico - OTIMIZADO"""
-    from sqlalchemy.orm import joinedload
+    """Obtém dados diários de receitas e custos para gráfico - usa o agregado diário"""
 
     # Criar dicionários para armazenar os valores por dia
     receitas_por_dia = {}
@@ -79,35 +70,12 @@ def obter_dados_diarios(data_inicio, data_fim):
         lucros_por_dia[data_str] = 0
         data_atual += timedelta(days=1)
     
-    # Obter vendas no período com eager loading
-    vendas = HistoricoVendas.query.options(
-        joinedload(HistoricoVendas.cardapio_item).joinedload(CardapioItem.prato),
-        joinedload(HistoricoVendas.prato)
-    ).filter(
-        HistoricoVendas.data >= data_inicio,
-        HistoricoVendas.data <= data_fim
-    ).all()
-    
-    # Calcular receitas e custos diretos por dia
-    for venda in vendas:
-        data_str = venda.data.strftime('%Y-%m-%d')
-        if data_str not in receitas_por_dia:
-            continue # Data fora do range (improvável dado o filter)
-            
-        # Adicionar receita
-        receitas_por_dia[data_str] += float(venda.valor_total or 0)
-        
-        # Calcular custo direto
-        custo_item = 0
-        if venda.cardapio_item:
-            item = venda.cardapio_item
-            if item.prato:
-                custo_item = float(item.prato.custo_total_por_porcao or 0) * venda.quantidade
-        elif venda.prato:
-            prato = venda.prato
-            custo_item = float(prato.custo_total_por_porcao or 0) * venda.quantidade
-        
-        custos_por_dia[data_str] += custo_item
+    # Receitas e custos diretos por dia a partir do agregado diário
+    for data_venda, (receita, custo, _) in obter_totais_por_dia(data_inicio, data_fim).items():
+        data_str = data_venda.strftime('%Y-%m-%d')
+        if data_str in receitas_por_dia:
+            receitas_por_dia[data_str] += receita
+            custos_por_dia[data_str] += custo
     
     # Adicionar custos indiretos por dia
     custos_indiretos = CustoIndireto.query.filter(
@@ -145,14 +113,16 @@ def obter_dados_diarios(data_inicio, data_fim):
     }
 
 
+@cache_dashboard.em_cache
 def obter_top_pratos(data_inicio, data_fim, limite=5):
     """Obtém os pratos mais lucrativos no período"""
-    # Consultar vendas de pratos no período
+    # Consultar vendas de pratos no período (custo registrado em cada venda)
     vendas_pratos = db.session.query(
         Prato.id,
         Prato.nome,
         func.sum(HistoricoVendas.quantidade).label('quantidade_vendida'),
-        func.sum(HistoricoVendas.valor_total).label('receita_total')
+        func.sum(HistoricoVendas.valor_total).label('receita_total'),
+        CUSTO_VENDAS.label('custo_total')
     ).join(
         HistoricoVendas,
         HistoricoVendas.prato_id == Prato.id
@@ -168,26 +138,25 @@ def obter_top_pratos(data_inicio, data_fim, limite=5):
     # Preparar dados com cálculo de lucro
     top_pratos = []
     for p in vendas_pratos:
-        prato = Prato.query.get(p.id)
-        if prato:
-            custo_unitario = float(prato.custo_total_por_porcao or 0)
-            custo_total = custo_unitario * p.quantidade_vendida
-            lucro = float(p.receita_total or 0) - custo_total
-            margem = (lucro / float(p.receita_total)) * 100 if float(p.receita_total) > 0 else 0
-            
-            top_pratos.append({
-                'id': p.id,
-                'nome': p.nome,
-                'quantidade_vendida': p.quantidade_vendida,
-                'receita_total': float(p.receita_total or 0),
-                'custo_total': custo_total,
-                'lucro': lucro,
-                'margem': margem
-            })
+        receita_total = float(p.receita_total or 0)
+        custo_total = float(p.custo_total or 0)
+        lucro = receita_total - custo_total
+        margem = (lucro / receita_total) * 100 if receita_total > 0 else 0
+        
+        top_pratos.append({
+            'id': p.id,
+            'nome': p.nome,
+            'quantidade_vendida': p.quantidade_vendida,
+            'receita_total': receita_total,
+            'custo_total': custo_total,
+            'lucro': lucro,
+            'margem': margem
+        })
     
     return top_pratos
 
 
+@cache_dashboard.em_cache
 def obter_distribuicao_categorias(data_inicio, data_fim):
     """Obtém a distribuição de vendas por categoria"""
     # Consultar vendas de itens de cardápio agrupadas por seção
@@ -230,6 +199,7 @@ def obter_distribuicao_categorias(data_inicio, data_fim):
     }
 
 
+@cache_dashboard.em_cache
 def obter_tendencia_lucratividade(meses=6):
     """Obtém a tendência de lucratividade dos últimos meses de forma otimizada"""
     hoje = date.today()
@@ -244,16 +214,7 @@ def obter_tendencia_lucratividade(meses=6):
             ano_atual -= 1
     inicio_periodo = date(ano_atual, mes_atual, 1)
 
-    # 1. Carregar TODOS os pratos com insumos para calcular custo em memória (evita N+1 e erro de SQL property)
-    from sqlalchemy.orm import joinedload
-    todos_pratos = Prato.query.options(
-        joinedload(Prato.insumos).joinedload(PratoInsumo.produto)
-    ).all()
-    
-    # Mapa de custos: prato_id -> custo_unitario
-    custo_prato_map = {p.id: float(p.custo_total_por_porcao or 0) for p in todos_pratos}
-    
-    # 2. Consultar vendas agregadas por Mês e por Item/Prato
+    # 1. Consultar vendas agregadas por mês (custo registrado em cada venda)
     # Detectar dialeto para função de data correta
     is_postgres = False
     try:
@@ -270,49 +231,22 @@ def obter_tendencia_lucratividade(meses=6):
     else:
         func_mes_ano = func.strftime('%Y-%m', HistoricoVendas.data)
 
-    # Agrupamos por mês E por item para podermos aplicar o custo correto em Python
-    vendas_detalhadas = db.session.query(
+    vendas_mensais = db.session.query(
         func_mes_ano.label('mes_ano'),
-        HistoricoVendas.cardapio_item_id,
-        HistoricoVendas.prato_id,
-        CardapioItem.prato_id.label('item_prato_id'),
-        func.sum(HistoricoVendas.quantidade).label('qtd_total'),
-        func.sum(HistoricoVendas.valor_total).label('receita_total')
-    ).outerjoin(
-        CardapioItem, HistoricoVendas.cardapio_item_id == CardapioItem.id
+        func.sum(HistoricoVendas.valor_total).label('receita_total'),
+        CUSTO_VENDAS.label('custo_total')
     ).filter(
         HistoricoVendas.data >= inicio_periodo
     ).group_by(
-        func_mes_ano,
-        HistoricoVendas.cardapio_item_id,
-        HistoricoVendas.prato_id,
-        CardapioItem.prato_id
+        func_mes_ano
     ).all()
     
-    # 3. Processar agregação mensal em Python
-    dados_mensais = {} # 'YYYY-MM': {'receita': 0, 'custo': 0}
-    
-    for v in vendas_detalhadas:
-        mes_ano = v.mes_ano
-        if mes_ano not in dados_mensais:
-            dados_mensais[mes_ano] = {'receita': 0.0, 'custo': 0.0}
-            
-        # Receita
-        dados_mensais[mes_ano]['receita'] += float(v.receita_total or 0)
-        
-        # Custo
-        prato_id = None
-        if v.item_prato_id: # Veio via CardapioItem
-            prato_id = v.item_prato_id
-        elif v.prato_id: # Veio direto via Prato
-            prato_id = v.prato_id
-            
-        if prato_id and prato_id in custo_prato_map:
-            custo_unit = custo_prato_map[prato_id]
-            custo_total = custo_unit * float(v.qtd_total or 0)
-            dados_mensais[mes_ano]['custo'] += custo_total
-
-    # 4. Adicionar Custos Indiretos Mensais
+    dados_mensais = {
+        v.mes_ano: {'receita': float(v.receita_total or 0), 'custo': float(v.custo_total or 0)}
+        for v in vendas_mensais
+    }
+
+    # 2. Adicionar Custos Indiretos Mensais
     if is_postgres:
         func_mes_ano_custo = func.to_char(CustoIndireto.data_referencia, 'YYYY-MM')
     else:
@@ -332,7 +266,7 @@ def obter_tendencia_lucratividade(meses=6):
         if mes_ano in dados_mensais:
             dados_mensais[mes_ano]['custo'] += float(c.total or 0)
 
-    # 5. Formatar para retorno (Lista ordenada por mês)
+    # 3. Formatar para retorno (Lista ordenada por mês)
     lista_final = []
     # Reconstruir a lista de meses para garantir ordem cronológica
     mes_iter = mes_atual
@@ -372,30 +306,18 @@ def obter_tendencia_lucratividade(meses=6):
     }
 
 
+@cache_dashboard.em_cache
 def obter_indicadores_desperdicio(data_inicio, data_fim):
-    """Obtém indicadores de desperdício para o período"""
-    # Consultar registros de desperdício no período
-    desperdicios = RegistroDesperdicio.query.filter(
-        RegistroDesperdicio.data_registro >= data_inicio,
-        RegistroDesperdicio.data_registro <= data_fim
-    ).all()
+    """Obtém indicadores de desperdício para o período - usa o agregado diário"""
+    por_categoria = totais_por_categoria(data_inicio, data_fim)
     
     # Calcular valor total do desperdício
-    valor_total = sum(float(d.valor_estimado or 0) for d in desperdicios)
+    valor_total = sum(c['valor'] for c in por_categoria.values())
+    total_registros = sum(c['registros'] for c in por_categoria.values())
     
     # Contar registros por categoria
-    contagem_por_categoria = {}
-    valor_por_categoria = {}
-    
-    for desp in desperdicios:
-        if desp.categoria:
-            categoria = desp.categoria.nome
-            if categoria not in contagem_por_categoria:
-                contagem_por_categoria[categoria] = 0
-                valor_por_categoria[categoria] = 0
-            
-            contagem_por_categoria[categoria] += 1
-            valor_por_categoria[categoria] += float(desp.valor_estimado or 0)
+    contagem_por_categoria = {c['nome']: c['registros'] for c in por_categoria.values()}
+    valor_por_categoria = {c['nome']: c['valor'] for c in por_categoria.values()}
     
     # Obter receita total do período (para calcular percentual de desperdício)
     receita_total, _, _, _ = calcular_metricas_principais(data_inicio, data_fim)
@@ -404,78 +326,225 @@ def obter_indicadores_desperdicio(data_inicio, data_fim):
     percentual_desperdicio = (valor_total / receita_total * 100) if receita_total > 0 else 0
     
     return {
-        'total_registros': len(desperdicios),
+        'total_registros': total_registros,
         'valor_total': valor_total,
         'percentual_receita': percentual_desperdicio,
         'categorias': contagem_por_categoria,
         'valores_por_categoria': valor_por_categoria
     }
 
+def calcular_lucratividade_categorias(data_inicio, data_fim):
+    """Receita, custo, lucro e margem por seção de cardápio e por categoria de prato
+
+    Usa duas consultas agrupadas (vendas por seção e por categoria), com o custo
+    registrado em cada venda - o número de consultas não depende do tamanho do
+    cardápio.
+
+    Returns:
+        Dict: Dados indexados por 'Seção: <nome>' / 'Categoria: <nome>'
+    """
+    # Vendas de itens de cardápio agrupadas por seção
+    vendas_secoes = db.session.query(
+        CardapioSecao.nome,
+        func.sum(HistoricoVendas.quantidade),
+        func.sum(HistoricoVendas.valor_total),
+        CUSTO_VENDAS
+    ).join(
+        CardapioItem,
+        CardapioItem.secao_id == CardapioSecao.id
+    ).join(
+        HistoricoVendas,
+        HistoricoVendas.cardapio_item_id == CardapioItem.id
+    ).filter(
+        HistoricoVendas.data >= data_inicio,
+        HistoricoVendas.data <= data_fim
+    ).group_by(
+        CardapioSecao.id, CardapioSecao.nome
+    ).all()
+
+    # Vendas diretas de pratos agrupadas por categoria
+    vendas_categorias = db.session.query(
+        Prato.categoria,
+        func.sum(HistoricoVendas.quantidade),
+        func.sum(HistoricoVendas.valor_total),
+        CUSTO_VENDAS
+    ).join(
+        HistoricoVendas,
+        HistoricoVendas.prato_id == Prato.id
+    ).filter(
+        HistoricoVendas.data >= data_inicio,
+        HistoricoVendas.data <= data_fim,
+        Prato.categoria != None
+    ).group_by(
+        Prato.categoria
+    ).all()
+
+    categorias_dados = {}
+    linhas = [('Seção', nome, quantidade, receita, custo)
+              for nome, quantidade, receita, custo in vendas_secoes]
+    linhas += [('Categoria', categoria or 'Sem Categoria', quantidade, receita, custo)
+               for categoria, quantidade, receita, custo in vendas_categorias]
+
+    for tipo, nome, quantidade, receita, custo in linhas:
+        dados = categorias_dados.setdefault(f'{tipo}: {nome}', {
+            'tipo': tipo,
+            'nome': nome,
+            'quantidade': 0,
+            'receita': 0,
+            'custo': 0,
+            'lucro': 0
+        })
+        receita = float(receita or 0)
+        custo = float(custo or 0)
+        dados['quantidade'] += quantidade or 0
+        dados['receita'] += receita
+        dados['custo'] += custo
+        dados['lucro'] += receita - custo
+
+    for dados in categorias_dados.values():
+        dados['margem'] = (dados['lucro'] / dados['receita'] * 100) if dados['receita'] > 0 else 0
+
+    return categorias_dados
+
+
+def obter_periodo_dashboard(args):
+    """Resolve o período do dashboard a partir dos parâmetros da requisição
+
+    Returns:
+        Tuple: (periodo, data_inicio, data_fim, titulo)
+    """
+    periodo = args.get('periodo', 'mensal')
+    hoje = date.today()
+    inicio_mes = date(hoje.year, hoje.month, 1)
+    fim_mes = date(hoje.year, hoje.month, calendar.monthrange(hoje.year, hoje.month)[1])
+    
+    if periodo == 'mensal':
+        inicio_periodo, fim_periodo = inicio_mes, fim_mes
+        titulo_periodo = f"Mês de {inicio_periodo.strftime('%B/%Y')}"
+    elif periodo == 'trimestral':
+        trimestre = (hoje.month - 1) // 3
+        inicio_periodo = date(hoje.year, trimestre * 3 + 1, 1)
+        fim_periodo = date(hoje.year, (trimestre + 1) * 3, calendar.monthrange(hoje.year, (trimestre + 1) * 3)[1])
+        titulo_periodo = f"{trimestre + 1}º Trimestre de {hoje.year}"
+    elif periodo == 'anual':
+        inicio_periodo = date(hoje.year, 1, 1)
+        fim_periodo = date(hoje.year, 12, 31)
+        titulo_periodo = f"Ano de {hoje.year}"
+    else:  # personalizado
+        try:
+            inicio_periodo = datetime.strptime(args.get('data_inicio', ''), '%Y-%m-%d').date()
+            fim_periodo = datetime.strptime(args.get('data_fim', ''), '%Y-%m-%d').date()
+        except ValueError:
+            inicio_periodo, fim_periodo = inicio_mes, fim_mes
+        titulo_periodo = f"Período de {inicio_periodo} a {fim_periodo}"
+    
+    return periodo, inicio_periodo, fim_periodo, titulo_periodo
+
+
+# Widgets do dashboard: cada um é calculado de forma independente (endpoint próprio)
+def _widget_metricas(data_inicio, data_fim):
+    receita_total, custo_total, lucro_total, margem_media = calcular_metricas_principais(data_inicio, data_fim)
+    return {
+        'receita_total': receita_total,
+        'custo_total': custo_total,
+        'lucro_total': lucro_total,
+        'margem_media': margem_media
+    }
+
+
+def _widget_desperdicio(data_inicio, data_fim):
+    indicadores = obter_indicadores_desperdicio(data_inicio, data_fim)
+    _, custo_total, _, _ = calcular_metricas_principais(data_inicio, data_fim)
+    # Impacto do desperdício em relação ao custo total
+    impacto = (indicadores['valor_total'] / custo_total * 100) if custo_total > 0 else 0
+    return dict(indicadores, impacto_custo=impacto)
+
+
+WIDGETS = {
+    'metricas': _widget_metricas,
+    'dados_diarios': obter_dados_diarios,
+    'top_pratos': obter_top_pratos,
+    'distribuicao_categorias': obter_distribuicao_categorias,
+    'tendencia': lambda data_inicio, data_fim: obter_tendencia_lucratividade(),
+    'desperdicio': _widget_desperdicio,
+}
+
+
+def _executar_widget(app, nome, data_inicio, data_fim):
+    """Calcula um widget em um contexto de aplicação próprio (sessão do banco própria)"""
+    with app.app_context():
+        return WIDGETS[nome](data_inicio, data_fim)
+
+
+def calcular_widgets(nomes, data_inicio, data_fim, max_workers=None):
+    """Calcula vários widgets em paralelo, em um pool de threads
+
+    Cada thread abre o seu próprio contexto de aplicação e, portanto, a sua própria
+    sessão do banco; o tempo total fica próximo ao do widget mais lento.
+
+    Args:
+        nomes: Widgets a calcular (chaves de WIDGETS)
+        data_inicio: Início do período
+        data_fim: Fim do período
+        max_workers: Threads do pool (padrão: DASHBOARD_WIDGETS_THREADS; 1 calcula em sequência)
+
+    Returns:
+        Dict: Resultado de cada widget, indexado pelo nome
+    """
+    nomes = list(nomes)
+    for nome in nomes:
+        if nome not in WIDGETS:
+            raise ValueError(f'Widget desconhecido: {nome}')
+    
+    max_workers = max_workers or current_app.config.get('DASHBOARD_WIDGETS_THREADS') or len(nomes)
+    if max_workers == 1 or len(nomes) < 2:
+        return {nome: WIDGETS[nome](data_inicio, data_fim) for nome in nomes}
+    
+    app = current_app._get_current_object()
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futuros = {nome: executor.submit(_executar_widget, app, nome, data_inicio, data_fim) for nome in nomes}
+        return {nome: futuro.result() for nome, futuro in futuros.items()}
+
+
 @bp.route('/')
 @bp.route('/index')
 def index():
-    """Página principal do dashboard de lucratividade"""
+    """Página principal do dashboard de lucratividade
+    
+    A página é exibida de imediato; cada widget é carregado depois pelo seu endpoint.
+    """
+    periodo, inicio_periodo, fim_periodo, titulo_periodo = obter_periodo_dashboard(request.args)
+    return render_template('dashboard/index.html',
+                           titulo_periodo=titulo_periodo,
+                           periodo=periodo,
+                           inicio_periodo=inicio_periodo,
+                           fim_periodo=fim_periodo)
+
+
+@bp.route('/widgets')
+def widgets():
+    """Todos os widgets (ou os informados em ?nome=) calculados em paralelo"""
+    _, inicio_periodo, fim_periodo, _ = obter_periodo_dashboard(request.args)
+    nomes = request.args.getlist('nome') or list(WIDGETS)
     try:
-        # Obter período selecionado
-        periodo = request.args.get('periodo', 'mensal')
-        hoje = date.today()
-        
-        if periodo == 'mensal':
-            inicio_periodo = date(hoje.year, hoje.month, 1)
-            fim_periodo = date(hoje.year, hoje.month, calendar.monthrange(hoje.year, hoje.month)[1])
-            titulo_periodo = f"Mês de {inicio_periodo.strftime('%B/%Y')}"
-        elif periodo == 'trimestral':
-            trimestre = (hoje.month - 1) // 3
-            inicio_periodo = date(hoje.year, trimestre * 3 + 1, 1)
-            fim_periodo = date(hoje.year, (trimestre + 1) * 3, calendar.monthrange(hoje.year, (trimestre + 1) * 3)[1])
-            titulo_periodo = f"{trimestre + 1}º Trimestre de {hoje.year}"
-        elif periodo == 'anual':
-            inicio_periodo = date(hoje.year, 1, 1)
-            fim_periodo = date(hoje.year, 12, 31)
-            titulo_periodo = f"Ano de {hoje.year}"
-        else:  # personalizado
-            inicio_periodo = request.args.get('data_inicio', date(hoje.year, hoje.month, 1))
-            fim_periodo = request.args.get('data_fim', date(hoje.year, hoje.month, calendar.monthrange(hoje.year, hoje.month)[1]))
-            titulo_periodo = f"Período de {inicio_periodo} a {fim_periodo}"
-        
-        # Calcular métricas principais
-        receita_total, custo_total, lucro_total, margem_media = calcular_metricas_principais(inicio_periodo, fim_periodo)
-        
-        # Obter dados para gráficos
-        dados_diarios = obter_dados_diarios(inicio_periodo, fim_periodo)
-        top_pratos = obter_top_pratos(inicio_periodo, fim_periodo)
-        distribuicao_categorias = obter_distribuicao_categorias(inicio_periodo, fim_periodo)
-        tendencia_lucratividade = obter_tendencia_lucratividade()
-        
-        # Calcular valor do desperdício
-        desperdicios = RegistroDesperdicio.query.filter(
-            RegistroDesperdicio.data_registro >= inicio_periodo,
-            RegistroDesperdicio.data_registro <= fim_periodo
-        ).all()
-        valor_desperdicio = sum(float(d.valor_estimado or 0) for d in desperdicios)
-        
-        # Calcular impacto do desperdício em relação ao custo total
-        impacto_desperdicio = (valor_desperdicio / custo_total * 100) if custo_total > 0 else 0
-        
-        return render_template('dashboard/index.html',
-                            titulo_periodo=titulo_periodo,
-                            periodo=periodo,
-                            inicio_periodo=inicio_periodo,
-                            fim_periodo=fim_periodo,
-                            receita_total=receita_total,
-                            custo_total=custo_total,
-                            lucro_total=lucro_total,
-                            margem_media=margem_media,
-                            dados_diarios=dados_diarios,
-                            top_pratos=top_pratos,
-                            distribuicao_categorias=distribuicao_categorias,
-                            tendencia_lucratividade=tendencia_lucratividade,
-                            valor_desperdicio=valor_desperdicio,
-                            impacto_desperdicio=impacto_desperdicio)
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return f"Erro processando Dashboard: {str(e)} <br><pre>{traceback.format_exc()}</pre>", 500
+        return jsonify(calcular_widgets(nomes, inicio_periodo, fim_periodo))
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 404
+
+
+@bp.route('/widgets/<nome>')
+def widget(nome):
+    """Dados de um widget do dashboard"""
+    if nome not in WIDGETS:
+        return jsonify({'erro': f'Widget desconhecido: {nome}'}), 404
+    _, inicio_periodo, fim_periodo, _ = obter_periodo_dashboard(request.args)
+    return jsonify(WIDGETS[nome](inicio_periodo, fim_periodo))
+
+
+@bp.route('/cache/estatisticas')
+def estatisticas_cache():
+    """Acertos e falhas do cache do dashboard neste processo"""
+    return jsonify(cache_dashboard.estatisticas())
 
 
 @bp.route('/relatorio/pratos')
@@ -498,9 +567,9 @@ def relatorio_pratos():
         Prato.id,
         Prato.nome,
         Prato.categoria,
-        Prato.custo_total_por_porcao, # Assumindo que isso pode ser obtido ou deve ser pré-carregado
         func.sum(HistoricoVendas.quantidade).label('quantidade_vendida'),
-        func.sum(HistoricoVendas.valor_total).label('receita_total')
+        func.sum(HistoricoVendas.valor_total).label('receita_total'),
+        CUSTO_VENDAS.label('custo_direto_total')
     ).join(
         HistoricoVendas,
         HistoricoVendas.prato_id == Prato.id
@@ -532,54 +601,34 @@ def relatorio_pratos():
     # Preparar dados detalhados
     pratos_detalhes = []
     
-    # Eager loading para evitar N+1 no acesso a prato.custo_total_por_porcao
-    # Se custo_total_por_porcao for uma property que faz queries, precisamos otimizar ela ou aceitar que ela é lenta.
-    # Assumindo que o loop itera sobre resultados da query acima, 'p' é um Row, não um objeto Prato completo com relacionamentos carregados.
-    # Mas precisamos do custo. Vamos carregar os objetos Prato necessários em batch se necessário, ou confiar que a property é rapida.
-    # PROBLEMA: custo_total_por_porcao acessa insumos. Se iterarmos 100 pratos, faremos 100 queries de insumos.
-    # SOLUÇÃO: Carregar pratos com insumos e produtos.
-    
-    prato_ids = [p.id for p in vendas_pratos]
-    if prato_ids:
-        from sqlalchemy.orm import joinedload
-        # Carregar pratos com seus insumos e produtos dos insumos em UMA query
-        objetos_pratos = {prato.id: prato for prato in Prato.query.options(
-            joinedload(Prato.insumos).joinedload(PratoInsumo.produto)
-        ).filter(Prato.id.in_(prato_ids)).all()}
-    else:
-        objetos_pratos = {}
-
     for p in vendas_pratos:
-        prato_obj = objetos_pratos.get(p.id)
+        # Custos diretos registrados nas vendas
+        custo_direto_total = float(p.custo_direto_total or 0)
+        custo_unitario = custo_direto_total / p.quantidade_vendida if p.quantidade_vendida else 0
+        
+        # Rateio de custos indiretos
+        proporcao_receita = float(p.receita_total) / receita_total_periodo if receita_total_periodo > 0 else 0
+        custo_indireto_estimado = float(total_indiretos) * proporcao_receita
+        
+        # Cálculos finais
+        custo_total = custo_direto_total + custo_indireto_estimado
+        lucro = float(p.receita_total) - custo_total
+        margem = (lucro / float(p.receita_total)) * 100 if float(p.receita_total) > 0 else 0
         
-        if prato_obj:
-            # Custos diretos (agora rápido devido ao eager loading)
-            custo_unitario = float(prato_obj.custo_total_por_porcao or 0)
-            custo_direto_total = custo_unitario * p.quantidade_vendida
-            
-            # Rateio de custos indiretos
-            proporcao_receita = float(p.receita_total) / receita_total_periodo if receita_total_periodo > 0 else 0
-            custo_indireto_estimado = float(total_indiretos) * proporcao_receita
-            
-            # Cálculos finais
-            custo_total = custo_direto_total + custo_indireto_estimado
-            lucro = float(p.receita_total) - custo_total
-            margem = (lucro / float(p.receita_total)) * 100 if float(p.receita_total) > 0 else 0
-            
-            pratos_detalhes.append({
-                'id': p.id,
-                'nome': p.nome,
-                'categoria': p.categoria,
-                'quantidade_vendida': p.quantidade_vendida,
-                'receita_total': float(p.receita_total),
-                'custo_direto_total': custo_direto_total,
-                'custo_indireto_estimado': custo_indireto_estimado,
-                'custo_total': custo_total,
-                'lucro': lucro,
-                'margem': margem,
-                'custo_unitario': custo_unitario,
-                'preco_venda': float(p.receita_total) / p.quantidade_vendida if p.quantidade_vendida > 0 else 0
-            })
+        pratos_detalhes.append({
+            'id': p.id,
+            'nome': p.nome,
+            'categoria': p.categoria,
+            'quantidade_vendida': p.quantidade_vendida,
+            'receita_total': float(p.receita_total),
+            'custo_direto_total': custo_direto_total,
+            'custo_indireto_estimado': custo_indireto_estimado,
+            'custo_total': custo_total,
+            'lucro': lucro,
+            'margem': margem,
+            'custo_unitario': custo_unitario,
+            'preco_venda': float(p.receita_total) / p.quantidade_vendida if p.quantidade_vendida > 0 else 0
+        })
     
     # Ordenar por margem de lucro (do maior para o menor)
     pratos_detalhes.sort(key=lambda x: x['margem'], reverse=True)
@@ -641,114 +690,7 @@ def relatorio_categorias():
         inicio_periodo = hoje - timedelta(days=30)
         fim_periodo = hoje
     
-    # Consultar vendas por seção de cardápio
-    vendas_secoes = db.session.query(
-        CardapioSecao.id,
-        CardapioSecao.nome,
-        func.sum(HistoricoVendas.quantidade).label('quantidade_vendida'),
-        func.sum(HistoricoVendas.valor_total).label('receita_total')
-    ).join(
-        CardapioItem,
-        CardapioItem.secao_id == CardapioSecao.id
-    ).join(
-        HistoricoVendas,
-        HistoricoVendas.cardapio_item_id == CardapioItem.id
-    ).filter(
-        HistoricoVendas.data >= inicio_periodo,
-        HistoricoVendas.data <= fim_periodo
-    ).group_by(
-        CardapioSecao.id
-    ).all()
-    
-    # Consultar vendas por categoria de prato
-    vendas_categorias_prato = db.session.query(
-        Prato.categoria,
-        func.sum(HistoricoVendas.quantidade).label('quantidade_vendida'),
-        func.sum(HistoricoVendas.valor_total).label('receita_total')
-    ).join(
-        HistoricoVendas,
-        HistoricoVendas.prato_id == Prato.id
-    ).filter(
-        HistoricoVendas.data >= inicio_periodo,
-        HistoricoVendas.data <= fim_periodo,
-        Prato.categoria != None
-    ).group_by(
-        Prato.categoria
-    ).all()
-    
-    # Combinar dados (seções de cardápio e categorias de pratos)
-    categorias_dados = {}
-    
-    # Processar seções de cardápio
-    for secao in vendas_secoes:
-        # Obter itens da seção para calcular custos
-        itens = CardapioItem.query.filter_by(secao_id=secao.id).all()
-        custo_total = 0
-        
-        for item in itens:
-            # Obter vendas específicas deste item no período
-            vendas_item = HistoricoVendas.query.filter(
-                HistoricoVendas.cardapio_item_id == item.id,
-                HistoricoVendas.data >= inicio_periodo,
-                HistoricoVendas.data <= fim_periodo
-            ).all()
-            
-            # Calcular custo
-            if item.prato:
-                for venda in vendas_item:
-                    custo_total += float(item.prato.custo_total_por_porcao or 0) * venda.quantidade
-        
-        # Adicionar aos dados por categoria
-        categorias_dados[f'Seção: {secao.nome}'] = {
-            'tipo': 'Seção',
-            'nome': secao.nome,
-            'quantidade': secao.quantidade_vendida,
-            'receita': float(secao.receita_total),
-            'custo': custo_total,
-            'lucro': float(secao.receita_total) - custo_total
-        }
-    
-    # Processar categorias de pratos
-    for cat in vendas_categorias_prato:
-        categoria = cat.categoria or 'Sem Categoria'
-        nome_categoria = f'Categoria: {categoria}'
-        
-        # Obter pratos desta categoria
-        pratos = Prato.query.filter_by(categoria=categoria).all()
-        custo_total = 0
-        
-        for prato in pratos:
-            # Obter vendas específicas deste prato no período
-            vendas_prato = HistoricoVendas.query.filter(
-                HistoricoVendas.prato_id == prato.id,
-                HistoricoVendas.data >= inicio_periodo,
-                HistoricoVendas.data <= fim_periodo
-            ).all()
-            
-            # Calcular custo
-            if prato:
-                for venda in vendas_prato:
-                    custo_total += float(prato.custo_total_por_porcao or 0) * venda.quantidade
-        
-        # Adicionar aos dados por categoria
-        if nome_categoria not in categorias_dados:
-            categorias_dados[nome_categoria] = {
-                'tipo': 'Categoria',
-                'nome': categoria,
-                'quantidade': 0,
-                'receita': 0,
-                'custo': 0,
-                'lucro': 0
-            }
-        
-        categorias_dados[nome_categoria]['quantidade'] += cat.quantidade_vendida
-        categorias_dados[nome_categoria]['receita'] += float(cat.receita_total)
-        categorias_dados[nome_categoria]['custo'] += custo_total
-        categorias_dados[nome_categoria]['lucro'] += float(cat.receita_total) - custo_total
-    
-    # Calcular margens
-    for nome, dados in categorias_dados.items():
-        dados['margem'] = (dados['lucro'] / dados['receita'] * 100) if dados['receita'] > 0 else 0
+    categorias_dados = calcular_lucratividade_categorias(inicio_periodo, fim_periodo)
     
     # Converter para lista e ordenar por margem de lucro
     categorias_lista = []
@@ -1,12 +1,16 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, current_app, Response
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from app.extensions import db
+from sqlalchemy.orm import joinedload
 from app.models.modelo_desperdicio import CategoriaDesperdicio, RegistroDesperdicio, MetaDesperdicio
 from app.models.modelo_produto import Produto
 from app.models.modelo_prato import Prato
 from app.routes.desperdicio import bp
+from app.utils.metas_desperdicio import avaliar_metas
+from app.utils.agregados_desperdicio import acumular_desperdicio_diario, filtrar_periodo
+from app.utils.relatorio_desperdicio import resumo_desperdicio, totais_por_categoria, totais_por_tipo
+from app.utils.exportacao import percorrer, periodo_solicitado, resposta_csv
+from app.utils.exportacao_analitica import FORMATOS, resposta_colunar
 from datetime import datetime, date, timedelta
-import pandas as pd
-import io
 import json
 
 @bp.route('/')
@@ -17,43 +21,20 @@ def index():
     hoje = date.today()
     inicio_mes = date(hoje.year, hoje.month, 1)
     
-    # Registros do mês atual
-    registros_mes = RegistroDesperdicio.query.filter(
-        RegistroDesperdicio.data_registro >= inicio_mes
-    ).all()
-    
-    # Calcular valores gerais
-    total_registros = len(registros_mes)
-    total_valor = sum(float(r.valor_estimado or 0) for r in registros_mes)
-    
-    # Agrupar por categoria
-    por_categoria = {}
-    for registro in registros_mes:
-        categoria = registro.categoria.nome
-        if categoria not in por_categoria:
-            por_categoria[categoria] = {
-                'quantidade': 0,
-                'valor': 0,
-                'cor': registro.categoria.cor or '#CCCCCC'
-            }
-        por_categoria[categoria]['quantidade'] += 1
-        por_categoria[categoria]['valor'] += float(registro.valor_estimado or 0)
+    # Totais do mês atual a partir do agregado diário
+    por_categoria = {
+        dados['nome']: {'quantidade': dados['registros'], 'valor': dados['valor'], 'cor': dados['cor']}
+        for dados in totais_por_categoria(inicio_mes, None).values()
+    }
+    total_registros = sum(c['quantidade'] for c in por_categoria.values())
+    total_valor = sum(c['valor'] for c in por_categoria.values())
     
     # Agrupar por tipo de item
-    por_tipo = {
-        'Produtos': {'quantidade': 0, 'valor': 0},
-        'Pratos': {'quantidade': 0, 'valor': 0}
-    }
-    for registro in registros_mes:
-        if registro.produto_id:
-            por_tipo['Produtos']['quantidade'] += 1
-            por_tipo['Produtos']['valor'] += float(registro.valor_estimado or 0)
-        elif registro.prato_id:
-            por_tipo['Pratos']['quantidade'] += 1
-            por_tipo['Pratos']['valor'] += float(registro.valor_estimado or 0)
+    por_tipo = totais_por_tipo(inicio_mes, None)
     
     # Metas ativas
     metas_ativas = MetaDesperdicio.query.filter_by(ativo=True).all()
+    avaliar_metas(metas_ativas)
     
     # Dados para gráficos (JSON)
     dados_categorias = []
@@ -227,7 +208,7 @@ def criar_registro():
         registro = RegistroDesperdicio(
             categoria_id=categoria_id,
             quantidade=quantidade,
-            unidade_medida=unidade_medida,
+            unidade=unidade_medida,
             valor_estimado=valor_estimado,
             motivo=motivo,
             responsavel=responsavel,
@@ -243,6 +224,8 @@ def criar_registro():
             registro.prato_id = item_id
         
         db.session.add(registro)
+        # Mantém o agregado diário usado pelos indicadores na mesma transação
+        acumular_desperdicio_diario([registro])
         db.session.commit()
         
         flash('Registro de desperdício criado com sucesso!', 'success')
@@ -270,9 +253,16 @@ def visualizar_registro(id):
 def listar_metas():
     """Lista todas as metas de redução de desperdício"""
     metas = MetaDesperdicio.query.all()
+    avaliar_metas(metas)
     return render_template('desperdicio/metas.html', metas=metas)
 
 
+@bp.route('/api/metas', methods=['GET'])
+def api_metas():
+    """Valor atual, progresso e status das metas ativas"""
+    return jsonify(avaliar_metas())
+
+
 @bp.route('/meta/criar', methods=['GET', 'POST'])
 def criar_meta():
     """Cria uma nova meta de redução de desperdício"""
@@ -462,146 +452,34 @@ def relatorios():
             data_fim = date(ano, 12, 31)
             titulo_periodo = str(ano)
         
-        # Query base filtrada por data com Eager Loading
-        from sqlalchemy.orm import joinedload
-        query = RegistroDesperdicio.query.options(
-            joinedload(RegistroDesperdicio.categoria),
-            joinedload(RegistroDesperdicio.produto),
-            joinedload(RegistroDesperdicio.prato)
-        ).filter(
-            RegistroDesperdicio.data_registro >= data_inicio,
-            RegistroDesperdicio.data_registro <= data_fim
-        )
-        
         if categoria_id:
-            query = query.filter_by(categoria_id=categoria_id)
             cat_obj = CategoriaDesperdicio.query.get(categoria_id)
             if cat_obj:
                 titulo_periodo += f' - Categoria: {cat_obj.nome}'
         
-        registros = query.all()
-        
-        # Calcular totais
-        total_registros = len(registros)
-        total_valor = sum(float(r.valor_estimado or 0) for r in registros)
-        total_quantidade = sum(float(r.quantidade or 0) for r in registros)
-        
-        # Cálculos para gráficos e tabelas
-        # 1. Por Categoria (Pizza)
-        cat_stats = {}
-        for r in registros:
-            if not r.categoria: continue
-            nome = r.categoria.nome
-            if nome not in cat_stats:
-                cat_stats[nome] = {'valor': 0, 'qtd': 0, 'cor': r.categoria.cor or '#CCCCCC', 'nome': nome}
-            cat_stats[nome]['valor'] += float(r.valor_estimado or 0)
-            cat_stats[nome]['qtd'] += 1
-        
-        estatisticas_categorias = []
-        for nome, dados in cat_stats.items():
-            dados['percentual'] = (dados['valor'] / total_valor * 100) if total_valor > 0 else 0
-            dados['tendencia'] = 0 # Placeholder
-            estatisticas_categorias.append(dados)
-        estatisticas_categorias.sort(key=lambda x: x['valor'], reverse=True)
-        
-        dados_categorias = {
-            'labels': [c['nome'] for c in estatisticas_categorias],
-            'valores': [c['valor'] for c in estatisticas_categorias],
-            'cores': [c['cor'] for c in estatisticas_categorias]
-        }
-    
-        # 2. Evolução (Linha) - Agrupar por dia
-        dates_map = {}
-        current = data_inicio
-        while current <= data_fim:
-            dates_map[current.strftime('%Y-%m-%d')] = 0
-            current += timedelta(days=1)
-            
-        for r in registros:
-            dkey = r.data_registro.strftime('%Y-%m-%d')
-            if dkey in dates_map:
-                dates_map[dkey] += float(r.valor_estimado or 0)
-                
-        sorted_dates = sorted(dates_map.keys())
-        dados_evolucao = {
-            'datas': [datetime.strptime(d, '%Y-%m-%d').strftime('%d/%m') for d in sorted_dates],
-            'valores': [dates_map[d] for d in sorted_dates]
-        }
-        
-        # 3. Dias da Semana (Barra)
-        dias_semana_map = {0: 'Dom', 1: 'Seg', 2: 'Ter', 3: 'Qua', 4: 'Qui', 5: 'Sex', 6: 'Sáb'}
-        # Nota: Python weekday() 0=Monday. JS 0=Sunday usually? 
-        # Validar: Python 0=Segunda, 6=Domingo. Ajustar map.
-        dias_semana_lbl = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
-        dias_valores = [0] * 7
-        
-        for r in registros:
-            wd = r.data_registro.weekday() # 0-6
-            dias_valores[wd] += float(r.valor_estimado or 0)
-            
-        dados_dias_semana = {
-            'labels': dias_semana_lbl,
-            'valores': dias_valores
-        }
-    
-        # 4. Top Itens
-        itens_stats = {}
-        for r in registros:
-            key = None
-            nome = "Desconhecido"
-            unidade = r.unidade_medida
-            if r.produto: 
-                key = f"prod_{r.produto_id}"
-                nome = r.produto.nome
-            elif r.prato:
-                key = f"prato_{r.prato_id}"
-                nome = r.prato.nome
-            else:
-                continue
-                
-            if key not in itens_stats:
-                itens_stats[key] = {'nome': nome, 'valor': 0, 'quantidade': 0, 'unidade': unidade}
-            
-            itens_stats[key]['valor'] += float(r.valor_estimado or 0)
-            itens_stats[key]['quantidade'] += float(r.quantidade or 0)
-    
-        top_itens = list(itens_stats.values())
-        top_itens.sort(key=lambda x: x['valor'], reverse=True)
-        top_itens = top_itens[:10]
-        for item in top_itens:
-            item['percentual'] = (item['valor'] / total_valor * 100) if total_valor > 0 else 0
-            # Template espera item.prato.nome? Não, vamos passar dict
-            # Hack para template: ele acessa item.prato.nome. Vamos simular estrutura se precisar
-            # O template usa {{ item.prato.nome }} ??
-            # Vamos checar o template na próxima verificação se falhar, mas vou criar um objeto fake wrapper se precisar.
-            # Template line 219: {{ item.prato.nome }}. ISSO É UM PROBLEMA.
-            # Vou passar um objeto Mock ou dict com acesso via ponto se precisar, 
-            # mas Jinja acessa dict via ponto também? Sim.
-            # Então item.prato.nome precisa funcionar.
-            # Vou criar item['prato'] = {'nome': nome} dentro do dict.
-            item['prato'] = {'nome': item['nome']}
-            
+        # Estatísticas agregadas no banco; os registros vêm paginados à parte
+        resumo = resumo_desperdicio(data_inicio, data_fim, categoria_id)
+        pagina = request.args.get('pagina', 1, type=int)
+        registros = filtrar_periodo(RegistroDesperdicio.query.options(
+            joinedload(RegistroDesperdicio.categoria),
+            joinedload(RegistroDesperdicio.produto),
+            joinedload(RegistroDesperdicio.prato)
+        ), RegistroDesperdicio, data_inicio, data_fim, categoria_id).order_by(
+            RegistroDesperdicio.data_registro.desc()
+        ).paginate(page=pagina, per_page=20, error_out=False)
+        
         # Calcular tendência (placeholder ou simples comparação com período anterior)
         tendencia = 0
         media_diaria = 0
-        if total_registros > 0:
+        if resumo['total_registros'] > 0:
             dias = (data_fim - data_inicio).days + 1
-            media_diaria = total_valor / dias
+            media_diaria = resumo['total_valor'] / dias
     
         return render_template('desperdicio/relatorios.html',
                             registros=registros,
-                            total_registros=total_registros,
-                            total_valor=total_valor,
-                            total_quantidade=total_quantidade,
                             media_diaria=media_diaria,
                             tendencia=tendencia,
-                            # Dados complexos
-                            estatisticas_categorias=estatisticas_categorias,
-                            top_itens=top_itens,
-                            # JSONs para gráficos
-                            dados_evolucao=dados_evolucao,
-                            dados_categorias=dados_categorias,
-                            dados_dias_semana=dados_dias_semana,
+                            **resumo,
                             # Outros
                             titulo_periodo=titulo_periodo,
                             periodo=periodo,
@@ -610,7 +488,9 @@ def relatorios():
                             categoria_id=categoria_id,
                             todas_categorias=CategoriaDesperdicio.query.all(),
                             data_inicio=data_inicio.strftime('%d/%m/%Y'),
-                            data_fim=data_fim.strftime('%d/%m/%Y'))
+                            data_fim=data_fim.strftime('%d/%m/%Y'),
+                            periodo_inicio=data_inicio.isoformat(),
+                            periodo_fim=data_fim.isoformat())
     except Exception as e:
         import traceback
         traceback.print_exc()
@@ -647,50 +527,57 @@ def exportar_registros():
     elif tipo_item == 'prato':
         query = query.filter(RegistroDesperdicio.prato_id != None)
     
-    # Executar a query
-    registros = query.all()
-    
-    # Preparar dados para exportação
-    dados = []
-    for registro in registros:
-        item = ''
-        tipo = ''
-        if registro.produto_id:
-            item = registro.produto.nome if registro.produto else ''
-            tipo = 'Produto'
-        elif registro.prato_id:
-            item = registro.prato.nome if registro.prato else ''
-            tipo = 'Prato'
-        
-        dados.append({
-            'ID': registro.id,
-            'Data': registro.data_registro.strftime('%d/%m/%Y %H:%M'),
-            'Categoria': registro.categoria.nome if registro.categoria else '',
-            'Tipo': tipo,
-            'Item': item,
-            'Quantidade': registro.quantidade,
-            'Unidade': registro.unidade_medida,
-            'Valor Estimado': float(registro.valor_estimado or 0),
-            'Motivo': registro.motivo or '',
-            'Responsável': registro.responsavel or '',
-            'Local': registro.local or ''
-        })
-    
-    # Criar DataFrame e exportar para CSV
-    df = pd.DataFrame(dados)
-    
-    # Criar um buffer de memória para o CSV
-    output = io.StringIO()
-    df.to_csv(output, index=False, sep=';', encoding='utf-8')
-    csv_data = output.getvalue()
-    
-    # Criar resposta para download
+    # Percorrer a consulta em lotes, com os relacionamentos na mesma consulta
+    query = query.options(
+        joinedload(RegistroDesperdicio.categoria),
+        joinedload(RegistroDesperdicio.produto),
+        joinedload(RegistroDesperdicio.prato)
+    ).order_by(RegistroDesperdicio.data_registro, RegistroDesperdicio.id)
+
+    def linhas():
+        yield ['ID', 'Data', 'Categoria', 'Tipo', 'Item', 'Quantidade', 'Unidade',
+               'Valor Estimado', 'Motivo', 'Responsável', 'Local']
+        for registro in percorrer(query):
+            item = ''
+            tipo = ''
+            if registro.produto_id:
+                item = registro.produto.nome if registro.produto else ''
+                tipo = 'Produto'
+            elif registro.prato_id:
+                item = registro.prato.nome if registro.prato else ''
+                tipo = 'Prato'
+
+            yield [
+                registro.id,
+                registro.data_registro.strftime('%d/%m/%Y %H:%M'),
+                registro.categoria.nome if registro.categoria else '',
+                tipo,
+                item,
+                registro.quantidade,
+                registro.unidade,
+                float(registro.valor_estimado or 0),
+                registro.motivo or '',
+                registro.responsavel or '',
+                registro.local or ''
+            ]
+
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    return resposta_csv(linhas(), f'desperdicios_{timestamp}', separador=';')
+
+
+@bp.route('/exportar/registros/<formato>')
+def exportar_registros_colunar(formato):
+    """Exporta registros de desperdício em Parquet ou Arrow, com os campos derivados"""
+    if formato not in FORMATOS:
+        return jsonify({'erro': f'Formato desconhecido: {formato}. Use parquet ou arrow'}), 404
+
+    try:
+        data_inicio, data_fim = periodo_solicitado()
+    except ValueError:
+        return jsonify({'erro': 'Informe as datas no formato AAAA-MM-DD'}), 400
+
     timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    return Response(
-        csv_data,
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment;filename=desperdicios_{timestamp}.csv'}
-    )
+    return resposta_colunar('desperdicio', formato, data_inicio, data_fim, f'desperdicios_{timestamp}')
 
 
 @bp.route('/registrar', methods=['GET', 'POST'])
@@ -755,6 +642,8 @@ def registrar_desperdicio():
             registro.data_registro = datetime.strptime(data_registro, '%Y-%m-%d')
         
         db.session.add(registro)
+        # Mantém o agregado diário usado pelos indicadores na mesma transação
+        acumular_desperdicio_diario([registro])
         db.session.commit()
         
         flash('Registro de desperdício criado com sucesso!', 'success')
@@ -1,12 +1,13 @@
 from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from app.extensions import db
+from sqlalchemy.orm import joinedload
 from app.models.modelo_estoque import EstoqueMovimentacao
 from app.models.modelo_produto import Produto
 from app.models.modelo_fornecedor import Fornecedor
 from app.routes.estoque import bp
+from app.utils.estoque_snapshot import estoque_em, verificar_estoque
+from app.utils.exportacao import percorrer, resposta_csv
 from datetime import datetime, timedelta
-import pandas as pd
-import io
 
 @bp.route('/')
 @bp.route('/index')
@@ -168,43 +169,32 @@ def relatorio():
 
 @bp.route('/exportar_relatorio')
 def exportar_relatorio():
-    """Exporta relatu00f3rio de estoque para CSV"""
-    from flask import Response
-    
-    # Obter todos os produtos
-    produtos = Produto.query.order_by(Produto.categoria, Produto.nome).all()
-    
-    # Criar DataFrame
-    data = [
-        {
-            'ID': p.id,
-            'Cu00f3digo': p.codigo,
-            'Nome': p.nome,
-            'Categoria': p.categoria,
-            'Unidade': p.unidade,
-            'Estoque Atual': p.estoque_atual,
-            'Estoque Mu00ednimo': p.estoque_minimo,
-            'Preu00e7o Unitu00e1rio': float(p.preco_unitario),
-            'Valor em Estoque': p.calcular_valor_em_estoque(),
-            'Fornecedor': p.fornecedor.razao_social if p.fornecedor else 'N/A',
-            'Status': 'Em Falta' if p.esta_em_falta() else 'Normal'
-        } for p in produtos
-    ]
-    
-    df = pd.DataFrame(data)
-    
-    # Gerar CSV
-    output = io.StringIO()
-    df.to_csv(output, index=False)
-    
-    # Retornar como download
-    return Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-disposition":
-                 f"attachment; filename=relatorio_estoque_{datetime.now().strftime('%Y%m%d')}.csv"}
+    """Exporta relatório de estoque para CSV"""
+    # Produtos em lotes, com o fornecedor na mesma consulta
+    query = Produto.query.options(joinedload(Produto.fornecedor)).order_by(
+        Produto.categoria, Produto.nome, Produto.id
     )
 
+    def linhas():
+        yield ['ID', 'Código', 'Nome', 'Categoria', 'Unidade', 'Estoque Atual', 'Estoque Mínimo',
+               'Preço Unitário', 'Valor em Estoque', 'Fornecedor', 'Status']
+        for p in percorrer(query):
+            yield [
+                p.id,
+                p.codigo,
+                p.nome,
+                p.categoria,
+                p.unidade,
+                p.estoque_atual,
+                p.estoque_minimo,
+                float(p.preco_unitario),
+                p.calcular_valor_em_estoque(),
+                p.fornecedor.razao_social if p.fornecedor else 'N/A',
+                'Em Falta' if p.esta_em_falta() else 'Normal'
+            ]
+
+    return resposta_csv(linhas(), f"relatorio_estoque_{datetime.now().strftime('%Y%m%d')}")
+
 # API Endpoints
 @bp.route('/api/movimentacoes/<int:produto_id>')
 def api_movimentacoes(produto_id):
@@ -230,6 +220,27 @@ def api_movimentacoes(produto_id):
         } for m in movimentacoes
     ])
 
+@bp.route('/api/posicao')
+def api_posicao():
+    """API para consultar quantidade e valor do estoque em uma data passada (JSON)"""
+    try:
+        data = datetime.strptime(request.args.get('data', ''), '%Y-%m-%d').date()
+    except ValueError:
+        return jsonify({'erro': 'Informe a data no formato AAAA-MM-DD'}), 400
+    produto_ids = request.args.getlist('produto_id', type=int) or None
+    
+    posicoes = estoque_em(data, produto_ids)
+    return jsonify({
+        'data': data.isoformat(),
+        'valor_total': round(sum(p['valor'] for p in posicoes.values()), 2),
+        'produtos': [{'produto_id': produto_id, **p} for produto_id, p in sorted(posicoes.items())]
+    })
+
+@bp.route('/api/verificar')
+def api_verificar():
+    """API para comparar o estoque atual com o recalculado das movimentações (JSON)"""
+    return jsonify(verificar_estoque())
+
 @bp.route('/api/em_falta')
 def api_em_falta():
     """API para listar produtos com estoque abaixo do mu00ednimo (JSON)"""
@@ -1,61 +1,13 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app, Response, abort
 from app.extensions import db
 from app.models.modelo_nfe import NFNota, NFItem
 from app.models.modelo_fornecedor import Fornecedor
 from app.models.modelo_produto import Produto
 from app.routes.nfe import bp
-import xmltodict
+from app.utils.nfe_lote import importar_lote as importar_lote_nfe, ler_zip
+from app.utils.nfe_parser import extrair_dados_nfe
+import zipfile
 from datetime import datetime
-from pydantic import BaseModel, Field, validator
-from typing import List, Optional
-import re
-
-# Modelos Pydantic para validação do XML da NF-e
-class NFeItemModel(BaseModel):
-    num_item: int = Field(..., alias='nItem')
-    codigo: str = Field(..., alias='cProd')
-    descricao: str = Field(..., alias='xProd')
-    ncm: Optional[str] = Field(None, alias='NCM')
-    cfop: Optional[str] = Field(None, alias='CFOP')
-    unidade: str = Field(..., alias='uCom')
-    quantidade: float = Field(..., alias='qCom')
-    valor_unitario: float = Field(..., alias='vUnCom')
-    valor_total: float = Field(..., alias='vProd')
-    icms_valor: Optional[float] = None
-    icms_aliquota: Optional[float] = None
-    ipi_valor: Optional[float] = None
-    ipi_aliquota: Optional[float] = None
-    
-    class Config:
-        extra = 'ignore'  # Ignora campos não mapeados
-
-class NFeFornecedorModel(BaseModel):
-    cnpj: str
-    razao_social: str = Field(..., alias='xNome')
-    inscricao_estadual: Optional[str] = Field(None, alias='IE')
-    endereco: Optional[str] = None
-    cidade: Optional[str] = None
-    estado: Optional[str] = None
-    
-    class Config:
-        extra = 'ignore'  # Ignora campos não mapeados
-
-class NFeModel(BaseModel):
-    chave_acesso: str
-    numero: str = Field(..., alias='nNF')
-    serie: str = Field(..., alias='serie')
-    data_emissao: datetime
-    valor_produtos: float = Field(..., alias='vProd')
-    valor_total: float = Field(..., alias='vNF')
-    valor_frete: Optional[float] = Field(0, alias='vFrete')
-    valor_seguro: Optional[float] = Field(0, alias='vSeg')
-    valor_desconto: Optional[float] = Field(0, alias='vDesc')
-    valor_impostos: Optional[float] = Field(0, alias='vImp')
-    fornecedor: NFeFornecedorModel
-    itens: List[NFeItemModel]
-    
-    class Config:
-        extra = 'ignore'  # Ignora campos não mapeados
 
 @bp.route('/')
 @bp.route('/index')
@@ -140,12 +92,58 @@ def importar():
     
     return render_template('nfe/importar.html')
 
+@bp.route('/importar_lote', methods=['GET', 'POST'])
+def importar_lote():
+    """Importa várias notas fiscais de uma vez (vários XMLs e/ou arquivos ZIP)"""
+    if request.method == 'POST':
+        arquivos = []
+        for arquivo in request.files.getlist('arquivos'):
+            nome = arquivo.filename or ''
+            if nome.lower().endswith('.zip'):
+                try:
+                    arquivos.extend(ler_zip(arquivo.read(), nome))
+                except zipfile.BadZipFile:
+                    flash(f'Arquivo ZIP inválido: {nome}', 'danger')
+            elif nome.lower().endswith('.xml'):
+                arquivos.append((nome, arquivo.read()))
+        
+        if not arquivos:
+            flash('Nenhum arquivo XML encontrado!', 'danger')
+            return render_template('nfe/importar_lote.html')
+        
+        resultado = importar_lote_nfe(
+            arquivos,
+            tamanho_lote=current_app.config.get('NFE_LOTE_TAMANHO', 50),
+            processos=current_app.config.get('NFE_LOTE_PROCESSOS')
+        )
+        
+        categoria = 'success' if not resultado['erros'] else 'warning'
+        flash(f"{resultado['importadas']} notas importadas, {resultado['duplicadas']} já existentes "
+              f"e {resultado['erros']} com erro.", categoria)
+        return render_template('nfe/importar_lote.html', resultado=resultado)
+    
+    return render_template('nfe/importar_lote.html')
+
 @bp.route('/visualizar/<int:id>')
 def visualizar(id):
     """Visualiza detalhes de uma nota fiscal"""
     nota = NFNota.query.get_or_404(id)
     return render_template('nfe/visualizar.html', nota=nota)
 
+@bp.route('/xml/<int:id>')
+def baixar_xml(id):
+    """Baixa o XML original da nota (único ponto que lê o conteúdo armazenado)"""
+    nota = NFNota.query.get_or_404(id)
+    xml_content = nota.xml_data
+    if xml_content is None:
+        abort(404)
+    
+    return Response(
+        xml_content,
+        mimetype='application/xml',
+        headers={"Content-disposition": f"attachment; filename={nota.chave_acesso}-procnfe.xml"}
+    )
+
 @bp.route('/item/<int:id>')
 def visualizar_item(id):
     """Visualiza detalhes de um item da nota fiscal"""
@@ -153,191 +151,8 @@ def visualizar_item(id):
     return render_template('nfe/item.html', item=item)
 
 def processar_xml_nfe(xml_content):
-    """Processa o XML da NF-e e retorna um modelo validado"""
-    try:
-        # Converter XML para dicionário
-        # process_namespaces=True remove namespaces dos nomes das tags para facilitar acesso,
-        # MAS apenas se fornecermos o mapa de namespaces para remover (None)
-        ns_map = {'http://www.portalfiscal.inf.br/nfe': None}
-        xml_dict = xmltodict.parse(xml_content, process_namespaces=True, namespaces=ns_map)
-        
-        # Função auxiliar para busca recursiva
-        def buscar_chave(dados, chave):
-            if isinstance(dados, dict):
-                for k, v in dados.items():
-                    if k == chave:
-                        return v
-                    if isinstance(v, (dict, list)):
-                        res = buscar_chave(v, chave)
-                        if res: return res
-            elif isinstance(dados, list):
-                for item in dados:
-                    res = buscar_chave(item, chave)
-                    if res: return res
-            return None
-
-        # Tentar encontrar infNFe recursivamente
-        inf_nfe = buscar_chave(xml_dict, 'infNFe')
-        
-        if not inf_nfe:
-             # Tentar encontrar com maiúsculas/minúsculas diferentes ou namespaces residuais
-             # Mas assumindo que xmltodict com process_namespaces=True resolve a maioria
-             # Vamos tentar iterar manualmente o primeiro nível para casos extremos
-             for key in xml_dict:
-                 if 'infNFe' in str(key):
-                     # Se a chave contem infNFe (ex: ns:infNFe)
-                    if isinstance(xml_dict[key], dict):
-                        inf_nfe = xml_dict[key]
-                        break
-        
-        if not inf_nfe:
-            # Dump parcial para debug no log se falhar
-            print(f"DEBUG XML KEYS: {list(xml_dict.keys())}")
-            raise ValueError("Estrutura da NF-e inválida: Tag 'infNFe' não encontrada.")
-            
-        # inf_nfe encontrado diretamente
-        
-        # Extrair chave de acesso
-        chave_acesso = None
-        if 'nfeProc' in xml_dict and 'protNFe' in xml_dict['nfeProc']:
-            prot = xml_dict['nfeProc']['protNFe']['infProt']
-            chave_acesso = prot.get('chNFe')
-        else:
-            # Tentar extrair do attributo Id da infNFe
-            chave_id = inf_nfe.get('@Id', '')
-            if chave_id.startswith('NFe'):
-                chave_acesso = chave_id[3:]
-                
-        if not chave_acesso:
-            # Fallback final
-            chave_acesso = "DESCONHECID_" + datetime.now().strftime('%Y%m%d%H%M%S')
-        
-        # Informações da Nota
-        ide = inf_nfe['ide']
-        numero = ide['nNF']
-        serie = ide['serie']
-        data_str = ide.get('dhEmi', ide.get('dEmi'))
-        if 'T' in data_str:
-            data_emissao = datetime.strptime(data_str.split('T')[0], '%Y-%m-%d')
-        else:
-            data_emissao = datetime.strptime(data_str, '%Y-%m-%d')
-        
-        # Informações do Fornecedor (Emitente)
-        emit = inf_nfe['emit']
-        cnpj = emit.get('CNPJ', emit.get('CPF', ''))
-        razao_social = emit['xNome']
-        inscricao_estadual = emit.get('IE')
-        
-        # Endereço do Fornecedor
-        endereco = None
-        cidade = None
-        estado = None
-        if 'enderEmit' in emit:
-            end = emit['enderEmit']
-            logradouro = end.get('xLgr', '')
-            numero_end = end.get('nro', '')
-            bairro = end.get('xBairro', '')
-            endereco = f"{logradouro}, {numero_end} - {bairro}"
-            cidade = end.get('xMun')
-            estado = end.get('UF')
-        
-        # Valores Totais
-        total = inf_nfe['total']['ICMSTot']
-        valor_produtos = float(total['vProd'])
-        valor_total = float(total['vNF'])
-        valor_frete = float(total.get('vFrete', 0))
-        valor_seguro = float(total.get('vSeg', 0))
-        valor_desconto = float(total.get('vDesc', 0))
-        valor_impostos = float(total.get('vIPI', 0)) + float(total.get('vICMS', 0))
-        
-        # Itens da Nota
-        itens_list = []
-        det = inf_nfe['det']
-        
-        # Se tiver apenas um item, xmltodict retorna dict, não lista
-        if isinstance(det, dict):
-            det = [det]
-        
-        for item in det:
-            num_item = int(item['@nItem'])
-            prod = item['prod']
-            
-            # Extrair informações fiscais (ICMS, IPI)
-            icms_valor = 0.0
-            icms_aliquota = 0.0
-            ipi_valor = 0.0
-            ipi_aliquota = 0.0
-            
-            if 'imposto' in item:
-                imposto = item['imposto']
-                if 'ICMS' in imposto:
-                    # ICMS pode estar em várias tags (ICMS00, ICMS20, etc.)
-                    for key, val in imposto['ICMS'].items():
-                        if key.startswith('ICMS') and isinstance(val, dict):
-                            icms_valor = float(val.get('vICMS', 0))
-                            icms_aliquota = float(val.get('pICMS', 0))
-                            break
-                
-                if 'IPI' in imposto:
-                     for key, val in imposto['IPI'].items():
-                        if key.startswith('IPITrib') and isinstance(val, dict):
-                            ipi_valor = float(val.get('vIPI', 0))
-                            ipi_aliquota = float(val.get('pIPI', 0))
-                            break
-            
-            item_dict = {
-                'nItem': num_item,
-                'cProd': prod['cProd'],
-                'xProd': prod['xProd'],
-                'NCM': prod.get('NCM'),
-                'CFOP': prod.get('CFOP'),
-                'uCom': prod['uCom'],
-                'qCom': float(prod['qCom']),
-                'vUnCom': float(prod['vUnCom']),
-                'vProd': float(prod['vProd']),
-                'icms_valor': icms_valor,
-                'icms_aliquota': icms_aliquota,
-                'ipi_valor': ipi_valor,
-                'ipi_aliquota': ipi_aliquota
-            }
-            
-            itens_list.append(item_dict)
-        
-        # Criar modelo de fornecedor
-        fornecedor_model = NFeFornecedorModel(
-            cnpj=cnpj,
-            xNome=razao_social,
-            IE=inscricao_estadual,
-            endereco=endereco,
-            cidade=cidade,
-            estado=estado
-        )
-        
-        # Criar modelo de itens
-        itens_model = [NFeItemModel(**item) for item in itens_list]
-        
-        # Criar modelo completo da NF-e
-        nfe_model = NFeModel(
-            chave_acesso=chave_acesso,
-            nNF=numero,
-            serie=serie,
-            data_emissao=data_emissao,
-            vProd=valor_produtos,
-            vNF=valor_total,
-            vFrete=valor_frete,
-            vSeg=valor_seguro,
-            vDesc=valor_desconto,
-            vImp=valor_impostos,
-            fornecedor=fornecedor_model,
-            itens=itens_model
-        )
-        
-        return nfe_model
-        
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        raise ValueError(f"Erro ao processar XML: {str(e)}")
+    """Processa o XML da NF-e e retorna um modelo validado (NFeData)"""
+    return extrair_dados_nfe(xml_content)
 
 def importar_nfe(nfe_data, xml_content):
     """Importa os dados da NF-e para o banco de dados"""
@@ -4,10 +4,11 @@ from app.models.modelo_prato import Prato, PratoInsumo
 from app.models.modelo_produto import Produto
 from app.models.modelo_custo import CustoIndireto
 from app.routes.pratos import bp
+from app.utils.producao import calcular_porcoes_produziveis
 from datetime import datetime, date
-import pandas as pd
-import io
 from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from app.utils.exportacao import percorrer, resposta_csv
 
 @bp.route('/')
 @bp.route('/index')
@@ -19,11 +20,8 @@ def index():
     categoria = request.args.get('categoria')
     ordenar_por = request.args.get('ordenar_por', 'nome')
     
-    # Construir query base
-    from sqlalchemy.orm import joinedload
-    query = Prato.query.options(
-        joinedload(Prato.insumos).joinedload(PratoInsumo.produto)
-    )
+    # Construir query base (o custo é uma coluna persistida, sem carregar as receitas)
+    query = Prato.query
     
     # Aplicar filtros
     if categoria:
@@ -31,35 +29,17 @@ def index():
     
     # Aplicar ordenação
     if ordenar_por == 'custo':
-        # Aqui estamos ordenando pelos pratos mais caros primeiro
-        # Não é possível fazer isso diretamente via SQL pois é uma propriedade calculada
-        # Seria necessário usar raw SQL ou obter todos e ordenar na memória
-        pratos = query.all()
-        pratos.sort(key=lambda p: p.custo_total_por_porcao, reverse=True)
-        
-        # Paginacao manual
-        per_page = 20
-        total = len(pratos)
-        start = (page - 1) * per_page
-        end = start + per_page
-        pratos_page = pratos[start:end]
-        
-        # Simular um objeto de paginação
-        from collections import namedtuple
-        Pagination = namedtuple('Pagination', ['items', 'page', 'per_page', 'total', 'pages'])
-        pages = (total + per_page - 1) // per_page  # Arredonda para cima
-        paginacao = Pagination(pratos_page, page, per_page, total, pages)
-        
-    else:  # ordenar por nome ou outro campo direto
-        if ordenar_por == 'nome':
-            query = query.order_by(Prato.nome)
-        elif ordenar_por == 'categoria':
-            query = query.order_by(Prato.categoria, Prato.nome)
-        elif ordenar_por == 'preco':
-            query = query.order_by(Prato.preco_venda.desc())
-        
-        # Paginacao via SQLAlchemy
-        paginacao = query.paginate(page=page, per_page=20, error_out=False)
+        # Pratos mais caros primeiro, usando o custo por porção persistido
+        query = query.order_by(Prato.custo_porcao_cache.desc(), Prato.nome)
+    elif ordenar_por == 'nome':
+        query = query.order_by(Prato.nome)
+    elif ordenar_por == 'categoria':
+        query = query.order_by(Prato.categoria, Prato.nome)
+    elif ordenar_por == 'preco':
+        query = query.order_by(Prato.preco_venda.desc())
+    
+    # Paginacao via SQLAlchemy
+    paginacao = query.paginate(page=page, per_page=20, error_out=False)
     
     # Obter lista de categorias para filtro
     # Usa query separada limpa (sem joins desnecessários) para categorias
@@ -352,73 +332,55 @@ def ficha_tecnica(id):
 @bp.route('/exportar_ficha/<int:id>')
 def exportar_ficha(id):
     """Exporta a ficha técnica para CSV"""
-    from flask import Response
-    
     prato = Prato.query.get_or_404(id)
-    
-    # Ordenar insumos por ordem
-    insumos = sorted(prato.insumos, key=lambda i: i.ordem)
-    
-    # Criar DataFrame de insumos
-    data_insumos = [
-        {
-            'Ordem': i.ordem,
-            'Produto': i.produto.nome,
-            'Quantidade': i.quantidade,
-            'Unidade': i.produto.unidade_medida,
-            'Custo Unitário': float(i.produto.preco_unitario),
-            'Custo Total': i.custo_total,
-            'Custo por Porção': i.custo_por_porcao,
-            'Obrigatório': 'Sim' if i.obrigatorio else 'Não',
-            'Observação': i.observacao or ''
-        } for i in insumos
-    ]
-    
-    df_insumos = pd.DataFrame(data_insumos)
-    
-    # Criar DataFrame com informações do prato
-    data_prato = [
-        {
-            'Nome': prato.nome,
-            'Categoria': prato.categoria or '',
-            'Rendimento': f"{prato.rendimento} {prato.unidade_rendimento}",
-            'Tempo de Preparo': f"{prato.tempo_preparo} min" if prato.tempo_preparo else '',
-            'Custo Direto Total': prato.custo_direto_total,
-            'Custo Direto por Porção': prato.custo_direto_por_porcao,
-            'Custo Indireto por Porção': float(prato.custo_indireto),
-            'Custo Total por Porção': prato.custo_total_por_porcao,
-            'Margem (%)': float(prato.margem),
-            'Preço Sugerido': prato.calcular_preco_sugerido(),
-            'Preço de Venda': float(prato.preco_venda) if prato.preco_venda else 0,
-            'Descrição': prato.descricao or ''
-        }
-    ]
-    
-    df_prato = pd.DataFrame(data_prato)
-    
-    # Exportar para CSV
-    output = io.StringIO()
-    output.write("FICHA TÉCNICA DE PREPARO\n")
-    df_prato.T.to_csv(output, header=False)
-    output.write("\nINSUMOS\n")
-    df_insumos.to_csv(output, index=False)
-    
-    # Retornar como download
-    return Response(
-        output.getvalue(),
-        mimetype="text/csv",
-        headers={"Content-disposition":
-                 f"attachment; filename=ficha_tecnica_{prato.nome}_{datetime.now().strftime('%Y%m%d')}.csv"}
-    )
+
+    # Insumos em lotes, na ordem da ficha, com o produto na mesma consulta
+    insumos = PratoInsumo.query.filter_by(prato_id=prato.id).options(
+        joinedload(PratoInsumo.produto)
+    ).order_by(PratoInsumo.ordem, PratoInsumo.id)
+
+    def linhas():
+        # Informações do prato, um campo por linha
+        yield ['FICHA TÉCNICA DE PREPARO']
+        yield ['Nome', prato.nome]
+        yield ['Categoria', prato.categoria or '']
+        yield ['Rendimento', f"{prato.rendimento} {prato.unidade_rendimento}"]
+        yield ['Tempo de Preparo', f"{prato.tempo_preparo} min" if prato.tempo_preparo else '']
+        yield ['Custo Direto Total', prato.custo_direto_total]
+        yield ['Custo Direto por Porção', prato.custo_direto_por_porcao]
+        yield ['Custo Indireto por Porção', float(prato.custo_indireto)]
+        yield ['Custo Total por Porção', prato.custo_total_por_porcao]
+        yield ['Margem (%)', float(prato.margem)]
+        yield ['Preço Sugerido', prato.calcular_preco_sugerido()]
+        yield ['Preço de Venda', float(prato.preco_venda) if prato.preco_venda else 0]
+        yield ['Descrição', prato.descricao or '']
+
+        yield []
+        yield ['INSUMOS']
+        yield ['Ordem', 'Produto', 'Quantidade', 'Unidade', 'Custo Unitário', 'Custo Total',
+               'Custo por Porção', 'Obrigatório', 'Observação']
+        for i in percorrer(insumos):
+            yield [
+                i.ordem,
+                i.produto.nome,
+                i.quantidade,
+                i.produto.unidade,
+                float(i.produto.preco_unitario),
+                i.custo_total,
+                i.custo_por_porcao,
+                'Sim' if i.obrigatorio else 'Não',
+                i.observacao or ''
+            ]
+
+    return resposta_csv(linhas(), f"ficha_tecnica_{prato.nome}_{datetime.now().strftime('%Y%m%d')}")
 
 @bp.route('/relatorio_custos')
 def relatorio_custos():
     """Relatório de custos de todos os pratos"""
-    # Obter todos os pratos
-    pratos = Prato.query.filter_by(ativo=True).all()
-    
-    # Ordenar por custo total (do mais caro para o mais barato)
-    pratos.sort(key=lambda p: p.custo_total_por_porcao, reverse=True)
+    # Obter todos os pratos ordenados por custo total (do mais caro para o mais barato)
+    pratos = Prato.query.filter_by(ativo=True).order_by(
+        Prato.custo_porcao_cache.desc(), Prato.nome
+    ).all()
     
     # Calcular estatísticas
     custo_total = sum(p.custo_total_por_porcao for p in pratos)
@@ -519,11 +481,20 @@ def verificar_estoque():
     if not ingredientes or not quantidades:
         return jsonify([])
     
+    # Todos os produtos em uma única consulta
+    ids = []
+    for ingrediente_id in ingredientes:
+        try:
+            ids.append(int(ingrediente_id))
+        except (ValueError, TypeError):
+            continue
+    produtos = {p.id: p for p in Produto.query.filter(Produto.id.in_(ids))} if ids else {}
+    
     resultado = []
     for i, ingrediente_id in enumerate(ingredientes):
         try:
             quantidade = float(quantidades[i])
-            produto = Produto.query.get(ingrediente_id)
+            produto = produtos.get(int(ingrediente_id))
             
             if produto:
                 estoque_atual = produto.estoque_atual or 0
@@ -541,3 +512,9 @@ def verificar_estoque():
             continue
     
     return jsonify(resultado)
+
+@bp.route('/api/porcoes_produziveis', methods=['GET'])
+def porcoes_produziveis():
+    """Porções que o estoque atual permite produzir de cada prato, com o insumo gargalo"""
+    somente_ativos = request.args.get('todos') not in ('1', 'true')
+    return jsonify(calcular_porcoes_produziveis(somente_ativos=somente_ativos))
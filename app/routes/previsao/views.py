@@ -1,16 +1,21 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, current_app, Response
+from flask import render_template, redirect, url_for, flash, request, jsonify, current_app
 from app.extensions import db
-from sqlalchemy import func, and_, or_
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
 from app.models.modelo_previsao import HistoricoVendas, PrevisaoDemanda, FatorSazonalidade
 from app.models.modelo_cardapio import CardapioItem, Cardapio, CardapioSecao
 from app.models.modelo_prato import Prato
 from app.routes.previsao import bp
+from app.utils.previsao_demanda import METODOS, gerar_previsoes_todos, prever_holt_winters
+from app.utils.sazonalidade import IndiceSazonalidade, carregar_eventos
+from app.utils.backtest_previsao import METODO_PADRAO, melhor_metodo
+from app.utils.importacao_vendas import importar_historico_csv
+from app.utils.planejamento_compras import planejar_compras
+from app.utils.exportacao import percorrer, periodo_solicitado, resposta_csv
+from app.utils.exportacao_analitica import FORMATOS, resposta_colunar
 from datetime import datetime, date, timedelta
-import pandas as pd
 import numpy as np
-import io
 import json
-import csv
 
 # Funções de algoritmos de previsão
 def calcular_media_movel(dados, janela=7):
@@ -18,13 +23,8 @@ def calcular_media_movel(dados, janela=7):
     if len(dados) < janela:
         return dados, 0.5  # baixa confiabilidade se poucos dados
     
-    # Calcular médias móveis
-    medias = []
-    for i in range(len(dados) - janela + 1):
-        medias.append(sum(dados[i:i+janela]) / janela)
-    
-    # Projetar para dias futuros (usamos a última média calculada)
-    ultima_media = medias[-1] if medias else sum(dados) / len(dados)
+    # Projetar para dias futuros (usamos a última média móvel)
+    ultima_media = float(np.mean(dados[-janela:]))
     previsao = dados + [ultima_media] * janela
     
     # Calcular confiabilidade (usando desvio padrão como indicador)
@@ -69,6 +69,11 @@ def calcular_regressao_linear(dados, dias_projecao=7):
     
     return list(dados) + list(valores_futuros), confiabilidade
 
+def calcular_holt_winters(dados, dias_projecao=7):
+    """Calcula previsão por suavização exponencial tripla (Holt-Winters semanal)"""
+    previsao, confiabilidade = prever_holt_winters(np.array(dados, dtype=float)[:, None], dias_projecao)
+    return list(dados) + previsao[:, 0].tolist(), float(confiabilidade[0])
+
 
 # Rotas do blueprint
 @bp.route('/')
@@ -255,66 +260,23 @@ def importar_historico():
             flash('Por favor, envie um arquivo CSV válido!', 'danger')
             return redirect(url_for('previsao.importar_historico'))
         
-        # Processar o arquivo
+        # Processar o arquivo (validação em blocos, uma única transação)
         try:
-            # Ler o CSV
-            stream = io.StringIO(arquivo.stream.read().decode('utf-8'))
-            csv_reader = csv.DictReader(stream, delimiter=';')
-            
-            # Contadores para feedback
-            total_importados = 0
-            total_ignorados = 0
-            
-            for row in csv_reader:
-                try:
-                    # Extrair dados
-                    data = row.get('data')
-                    tipo_item = row.get('tipo_item')
-                    item_id = int(row.get('item_id', 0))
-                    quantidade = int(row.get('quantidade', 0))
-                    valor_unitario = float(row.get('valor_unitario', 0).replace(',', '.'))
-                    periodo_dia = row.get('periodo_dia')
-                    clima = row.get('clima')
-                    temperatura = float(row.get('temperatura', 0).replace(',', '.')) if row.get('temperatura') else None
-                    evento_especial = row.get('evento_especial')
-                    
-                    # Validar dados mínimos
-                    if not data or not tipo_item or not item_id or not quantidade or not valor_unitario:
-                        total_ignorados += 1
-                        continue
-                    
-                    # Verificar se o item existe
-                    if tipo_item == 'cardapio_item' and not CardapioItem.query.get(item_id):
-                        total_ignorados += 1
-                        continue
-                    elif tipo_item == 'prato' and not Prato.query.get(item_id):
-                        total_ignorados += 1
-                        continue
-                    
-                    # Registrar a venda
-                    HistoricoVendas.registrar_venda(
-                        data=data,
-                        item_id=item_id,
-                        tipo_item=tipo_item,
-                        quantidade=quantidade,
-                        valor_unitario=valor_unitario,
-                        periodo_dia=periodo_dia,
-                        evento_especial=evento_especial,
-                        clima=clima,
-                        temperatura=temperatura
-                    )
-                    
-                    total_importados += 1
-                except Exception as e:
-                    total_ignorados += 1
-                    current_app.logger.error(f'Erro ao importar linha: {str(e)}')
-            
-            flash(f'{total_importados} registros importados com sucesso! {total_ignorados} registros ignorados.', 'success')
-            return redirect(url_for('previsao.listar_historico'))
-            
+            resultado = importar_historico_csv(arquivo.stream)
         except Exception as e:
             flash(f'Erro ao processar o arquivo: {str(e)}', 'danger')
             return redirect(url_for('previsao.importar_historico'))
+        
+        for rejeicao in resultado['rejeicoes']:
+            current_app.logger.warning(f"Linha {rejeicao['linha']} ignorada ({rejeicao['motivo']}): {rejeicao['dados']}")
+        
+        flash(f"{resultado['importadas']} registros importados com sucesso! "
+              f"{resultado['rejeitadas']} registros ignorados "
+              f"({resultado['linhas_por_segundo']:.0f} linhas/s).", 'success')
+        if resultado['rejeicoes']:
+            exemplos = '; '.join(f"linha {r['linha']}: {r['motivo']}" for r in resultado['rejeicoes'][:5])
+            flash(f'Linhas ignoradas: {exemplos}', 'warning')
+        return redirect(url_for('previsao.listar_historico'))
     
     return render_template('previsao/importar_historico.html')
 
@@ -349,56 +311,62 @@ def exportar_historico():
         if item_id:
             query = query.filter(HistoricoVendas.prato_id == item_id)
     
-    # Executar a query
-    registros = query.order_by(HistoricoVendas.data).all()
-    
-    # Preparar dados para exportação
-    dados = []
-    for registro in registros:
-        item_nome = registro.cardapio_item.prato.nome if registro.cardapio_item else ''
-        tipo_item = ''
-        item_id = 0
-        
-        if registro.cardapio_item_id:
-            item_nome = registro.cardapio_item.prato.nome if registro.cardapio_item else ''
-            tipo_item = 'cardapio_item'
-            item_id = registro.cardapio_item_id
-        elif registro.prato_id:
-            item_nome = registro.prato.nome if registro.prato else ''
-            tipo_item = 'prato'
-            item_id = registro.prato_id
-        
-        dados.append({
-            'ID': registro.id,
-            'Data': registro.data.strftime('%Y-%m-%d'),
-            'Tipo Item': tipo_item,
-            'Item ID': item_id,
-            'Item Nome': item_nome,
-            'Quantidade': registro.quantidade,
-            'Valor Unitário': float(registro.valor_unitario),
-            'Valor Total': float(registro.valor_total),
-            'Período do Dia': registro.periodo_dia or '',
-            'Dia da Semana': registro.dia_semana,
-            'Clima': registro.clima or '',
-            'Temperatura': registro.temperatura or '',
-            'Evento Especial': registro.evento_especial or ''
-        })
-    
-    # Criar DataFrame e exportar para CSV
-    df = pd.DataFrame(dados)
-    
-    # Criar um buffer de memória para o CSV
-    output = io.StringIO()
-    df.to_csv(output, index=False, sep=';', encoding='utf-8')
-    csv_data = output.getvalue()
-    
-    # Criar resposta para download
+    # Percorrer a consulta em lotes, com os nomes dos itens na mesma consulta
+    query = query.options(
+        joinedload(HistoricoVendas.cardapio_item).joinedload(CardapioItem.prato),
+        joinedload(HistoricoVendas.prato)
+    ).order_by(HistoricoVendas.data, HistoricoVendas.id)
+
+    def linhas():
+        yield ['ID', 'Data', 'Tipo Item', 'Item ID', 'Item Nome', 'Quantidade', 'Valor Unitário',
+               'Valor Total', 'Período do Dia', 'Dia da Semana', 'Clima', 'Temperatura', 'Evento Especial']
+        for registro in percorrer(query):
+            item_nome = ''
+            tipo = ''
+            id_item = 0
+
+            if registro.cardapio_item_id:
+                item_nome = registro.cardapio_item.prato.nome if registro.cardapio_item else ''
+                tipo = 'cardapio_item'
+                id_item = registro.cardapio_item_id
+            elif registro.prato_id:
+                item_nome = registro.prato.nome if registro.prato else ''
+                tipo = 'prato'
+                id_item = registro.prato_id
+
+            yield [
+                registro.id,
+                registro.data.strftime('%Y-%m-%d'),
+                tipo,
+                id_item,
+                item_nome,
+                registro.quantidade,
+                float(registro.valor_unitario),
+                float(registro.valor_total),
+                registro.periodo_dia or '',
+                registro.dia_semana,
+                registro.clima or '',
+                registro.temperatura or '',
+                registro.evento_especial or ''
+            ]
+
+    timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
+    return resposta_csv(linhas(), f'historico_vendas_{timestamp}', separador=';')
+
+
+@bp.route('/historico/exportar/<formato>')
+def exportar_historico_colunar(formato):
+    """Exporta o histórico de vendas em Parquet ou Arrow, com os campos derivados"""
+    if formato not in FORMATOS:
+        return jsonify({'erro': f'Formato desconhecido: {formato}. Use parquet ou arrow'}), 404
+
+    try:
+        data_inicio, data_fim = periodo_solicitado()
+    except ValueError:
+        return jsonify({'erro': 'Informe as datas no formato AAAA-MM-DD'}), 400
+
     timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
-    return Response(
-        csv_data,
-        mimetype='text/csv',
-        headers={'Content-Disposition': f'attachment;filename=historico_vendas_{timestamp}.csv'}
-    )
+    return resposta_colunar('vendas', formato, data_inicio, data_fim, f'historico_vendas_{timestamp}')
 
 
 @bp.route('/previsoes')
@@ -441,7 +409,7 @@ def listar_previsoes():
     metodos_disponiveis = [
         {'id': 'media_movel', 'nome': 'Média Móvel'},
         {'id': 'regressao_linear', 'nome': 'Regressão Linear'},
-        {'id': 'sazonalidade', 'nome': 'Modelo com Sazonalidade'}
+        {'id': 'sazonalidade', 'nome': 'Modelo com Sazonalidade (Holt-Winters)'}
     ]
     
     return render_template('previsao/previsoes.html',
@@ -480,6 +448,11 @@ def gerar_previsao():
             flash('Prato não encontrado!', 'danger')
             return redirect(url_for('previsao.gerar_previsao'))
         
+        # Seleção automática: método com menor erro no último backtest do item
+        selecao_automatica = metodo == 'automatico'
+        if selecao_automatica:
+            metodo = melhor_metodo(tipo_item, item_id) or METODO_PADRAO
+        
         # Converter datas
         try:
             data_inicio_dt = datetime.strptime(data_inicio, '%Y-%m-%d').date()
@@ -495,6 +468,10 @@ def gerar_previsao():
         # Obter histórico de vendas para gerar previsão
         hoje = date.today()
         data_passado_inicio = hoje - (data_fim_dt - data_inicio_dt) - timedelta(days=dias_projecao)
+        if metodo == 'sazonalidade':
+            # O Holt-Winters precisa de várias semanas para estimar o ciclo semanal
+            data_passado_inicio = min(data_passado_inicio,
+                                      hoje - timedelta(days=current_app.config['PREVISAO_DIAS_HISTORICO']))
         data_passado_fim = hoje - timedelta(days=1)  # até ontem
         
         # Construir query do histórico
@@ -535,47 +512,16 @@ def gerar_previsao():
             datas.append(datetime.fromisoformat(data_str).date())
             valores.append(dados_por_data[data_str])
         
-        # Aplicar fatores de sazonalidade se solicitado
+        # O modelo sazonal trabalha com a série diária completa (dias sem venda = 0)
+        if metodo == 'sazonalidade':
+            datas = [datas[0] + timedelta(days=i) for i in range((data_passado_fim - datas[0]).days + 1)]
+            valores = [dados_por_data.get(d.isoformat(), 0) for d in datas]
+        
+        # Normalizar o histórico removendo o efeito sazonal (índice pré-compilado do item)
         if usar_sazonalidade:
-            # Obter fatores de sazonalidade aplicaveis ao item
-            if tipo_item == 'cardapio_item':
-                fatores = FatorSazonalidade.query.filter(
-                    or_(
-                        FatorSazonalidade.cardapio_item_id == item_id,
-                        and_(
-                            FatorSazonalidade.cardapio_item_id == None,
-                            FatorSazonalidade.prato_id == None
-                        )
-                    )
-                ).all()
-            else:  # prato
-                fatores = FatorSazonalidade.query.filter(
-                    or_(
-                        FatorSazonalidade.prato_id == item_id,
-                        and_(
-                            FatorSazonalidade.cardapio_item_id == None,
-                            FatorSazonalidade.prato_id == None
-                        )
-                    )
-                ).all()
-            
-            # Aplicar fatores
-            for i, data in enumerate(datas):
-                # Verificar cada fator
-                for fator in fatores:
-                    aplica_fator = False
-                    
-                    # Verificar mes
-                    if fator.mes and fator.mes == data.month:
-                        aplica_fator = True
-                    
-                    # Verificar dia da semana
-                    if fator.dia_semana is not None and fator.dia_semana == data.weekday():
-                        aplica_fator = True
-                    
-                    # Se algum criterio satisfeito, aplicar fator
-                    if aplica_fator:
-                        valores[i] = valores[i] / fator.fator  # Normalizar removendo o efeito sazonal
+            indice = IndiceSazonalidade.compilar([(tipo_item, item_id)])
+            eventos = carregar_eventos(datas[0], datas[-1])
+            valores = indice.dessazonalizar(np.array(valores, dtype=float)[:, None], datas, eventos)[:, 0].tolist()
         
         # Executar algoritmo de previsão
         valores_previstos = {}
@@ -585,9 +531,8 @@ def gerar_previsao():
             previsao, confiabilidade = calcular_media_movel(valores, janela=min(7, len(valores)))
         elif metodo == 'regressao_linear':
             previsao, confiabilidade = calcular_regressao_linear(valores, dias_projecao=(data_fim_dt - data_inicio_dt).days + 1)
-        else:  # sazonalidade ou outro método futuro
-            # Implementar outros métodos conforme necessário
-            previsao, confiabilidade = calcular_regressao_linear(valores, dias_projecao=(data_fim_dt - data_inicio_dt).days + 1)
+        else:  # sazonalidade
+            previsao, confiabilidade = calcular_holt_winters(valores, dias_projecao=(data_fim_dt - data_inicio_dt).days + 1)
         
         # Criar dicionário de previsões por data
         # Primeiro, criar lista de datas para o período de previsão
@@ -597,29 +542,16 @@ def gerar_previsao():
             datas_previsao.append(data_atual)
             data_atual += timedelta(days=1)
         
-        # Mapear valores previstos para as datas
-        for i, data in enumerate(datas_previsao):
-            if i < len(previsao):
-                valor = previsao[len(valores) + i]  # pegar os valores da previsão (após dados históricos)
-                
-                # Aplicar fatores de sazonalidade de volta se foram usados
-                if usar_sazonalidade:
-                    for fator in fatores:
-                        aplica_fator = False
-                        
-                        # Verificar mes
-                        if fator.mes and fator.mes == data.month:
-                            aplica_fator = True
-                        
-                        # Verificar dia da semana
-                        if fator.dia_semana is not None and fator.dia_semana == data.weekday():
-                            aplica_fator = True
-                        
-                        # Se algum criterio satisfeito, aplicar fator
-                        if aplica_fator:
-                            valor = valor * fator.fator  # Reaplica o efeito sazonal
-                
-                valores_previstos[data.isoformat()] = round(max(0, valor))  # arredondar e garantir não negativo
+        # Mapear valores previstos para as datas (pegar os valores após os dados históricos)
+        previstos = np.array(previsao[len(valores):len(valores) + len(datas_previsao)], dtype=float)
+        datas_previsao = datas_previsao[:len(previstos)]
+        
+        # Reaplicar o efeito sazonal se foi removido
+        if usar_sazonalidade:
+            previstos = indice.aplicar(previstos[:, None], datas_previsao)[:, 0]
+        
+        for data, valor in zip(datas_previsao, previstos):
+            valores_previstos[data.isoformat()] = round(max(0, valor))  # arredondar e garantir não negativo
         
         # Criar registro de previsão
         previsao_obj = PrevisaoDemanda(
@@ -628,7 +560,8 @@ def gerar_previsao():
             metodo=metodo,
             parametros=json.dumps({
                 'dias_projecao': dias_projecao,
-                'usar_sazonalidade': usar_sazonalidade
+                'usar_sazonalidade': usar_sazonalidade,
+                'selecao_automatica': selecao_automatica
             }),
             confiabilidade=confiabilidade
         )
@@ -666,6 +599,49 @@ def gerar_previsao():
                           data_fim=data_fim_padrao)
 
 
+@bp.route('/previsao/gerar_todas', methods=['POST'])
+def gerar_previsoes_lote():
+    """Gera previsões de todos os itens com histórico em um único processamento"""
+    metodos = request.form.getlist('metodos') or list(METODOS)
+    hoje = date.today()
+    try:
+        data_inicio = datetime.strptime(request.form.get('data_inicio', ''), '%Y-%m-%d').date()
+        data_fim = datetime.strptime(request.form.get('data_fim', ''), '%Y-%m-%d').date()
+    except ValueError:
+        data_inicio, data_fim = hoje, hoje + timedelta(days=7)
+    
+    try:
+        resultado = gerar_previsoes_todos(
+            data_inicio, data_fim,
+            metodos=metodos,
+            usar_sazonalidade='usar_sazonalidade' in request.form,
+            dias_historico=request.form.get('dias_historico', type=int) or current_app.config['PREVISAO_DIAS_HISTORICO']
+        )
+    except ValueError as e:
+        flash(str(e), 'danger')
+        return redirect(url_for('previsao.listar_previsoes'))
+    
+    flash(f"{resultado['previsoes']} previsões geradas para {resultado['itens']} itens "
+          f"em {resultado['tempo_total']:.2f}s ({resultado['ignorados']} itens sem histórico suficiente).",
+          'success')
+    return redirect(url_for('previsao.listar_previsoes'))
+
+
+@bp.route('/api/compras')
+def api_planejamento_compras():
+    """Lista de compras sugerida por fornecedor para atender a demanda prevista (JSON)"""
+    hoje = date.today()
+    try:
+        data_inicio = datetime.strptime(request.args.get('inicio', hoje.isoformat()), '%Y-%m-%d').date()
+        data_fim = datetime.strptime(request.args.get('fim', (data_inicio + timedelta(days=6)).isoformat()),
+                                     '%Y-%m-%d').date()
+        return jsonify(planejar_compras(
+            data_inicio, data_fim, considerar_estoque_minimo=request.args.get('sem_minimo') not in ('1', 'true')
+        ))
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+
+
 @bp.route('/previsao/visualizar/<int:id>')
 def visualizar_previsao(id):
     """Visualiza detalhes de uma previsão de demanda"""
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+"""Reconstrói ou verifica o agregado diário de desperdício
+
+Uso:
+    python -m app.scripts.agregados_desperdicio --rebuild [--inicio AAAA-MM-DD] [--fim AAAA-MM-DD]
+    python -m app.scripts.agregados_desperdicio --check [--inicio AAAA-MM-DD] [--fim AAAA-MM-DD]
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from app import create_app
+from app.utils.agregados_desperdicio import reconstruir_desperdicio_diario, verificar_desperdicio_diario
+
+
+def _data(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Agregado diário de desperdício (desperdicio_diario)')
+    acao = parser.add_mutually_exclusive_group(required=True)
+    acao.add_argument('--rebuild', action='store_true', help='Reconstrói o agregado a partir dos registros')
+    acao.add_argument('--check', action='store_true', help='Compara o agregado com os registros brutos')
+    parser.add_argument('--inicio', type=_data, help='Data inicial (AAAA-MM-DD)')
+    parser.add_argument('--fim', type=_data, help='Data final (AAAA-MM-DD)')
+    args = parser.parse_args(argv)
+
+    app = create_app('development')
+    with app.app_context():
+        if args.rebuild:
+            linhas = reconstruir_desperdicio_diario(args.inicio, args.fim)
+            print(f"Agregado de desperdício reconstruído: {linhas} linhas geradas.")
+            return 0
+
+        divergencias = verificar_desperdicio_diario(args.inicio, args.fim)
+        if not divergencias:
+            print("Agregado de desperdício consistente com os registros.")
+            return 0
+
+        print(f"Foram encontradas {len(divergencias)} divergências:")
+        for d in divergencias:
+            print(f"  {d['data']} categoria={d['categoria_id']} produto={d['produto_id']} prato={d['prato_id']}: "
+                  f"esperado {d['esperado']} / agregado {d['agregado']}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+"""Reconstrói ou verifica o agregado diário de vendas usado pelo dashboard
+
+Uso:
+    python -m app.scripts.agregados_vendas --rebuild [--inicio AAAA-MM-DD] [--fim AAAA-MM-DD]
+    python -m app.scripts.agregados_vendas --check [--inicio AAAA-MM-DD] [--fim AAAA-MM-DD]
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from app import create_app
+from app.utils.agregados_vendas import reconstruir_vendas_diarias, verificar_vendas_diarias
+
+
+def _data(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Agregado diário de vendas (vendas_diarias_agregadas)')
+    acao = parser.add_mutually_exclusive_group(required=True)
+    acao.add_argument('--rebuild', action='store_true', help='Reconstrói o agregado a partir do histórico')
+    acao.add_argument('--check', action='store_true', help='Compara o agregado com o histórico bruto')
+    parser.add_argument('--inicio', type=_data, help='Data inicial (AAAA-MM-DD)')
+    parser.add_argument('--fim', type=_data, help='Data final (AAAA-MM-DD)')
+    args = parser.parse_args(argv)
+
+    app = create_app('development')
+    with app.app_context():
+        if args.rebuild:
+            linhas = reconstruir_vendas_diarias(args.inicio, args.fim)
+            print(f"Agregado diário reconstruído: {linhas} linhas geradas.")
+            return 0
+
+        divergencias = verificar_vendas_diarias(args.inicio, args.fim)
+        if not divergencias:
+            print("Agregado diário consistente com o histórico de vendas.")
+            return 0
+
+        print(f"Foram encontradas {len(divergencias)} divergências:")
+        for d in divergencias:
+            print(f"  {d['data']} prato={d['prato_id']}: esperado {d['esperado']} / agregado {d['agregado']}")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+"""Backtest dos métodos de previsão de demanda (origem móvel) para todos os itens
+
+Grava as métricas por item em resultado_backtest; o método de menor WAPE passa
+a ser usado quando a previsão é gerada com o método 'automatico'.
+
+Uso:
+    python -m app.scripts.backtest_previsao [--historico 180] [--horizonte 7] [--origens 4] [--processos N]
+"""
+import argparse
+import sys
+
+from app import create_app
+from app.utils.backtest_previsao import executar_backtest
+from app.utils.previsao_demanda import METODOS
+
+
+def _percentual(valor):
+    return f"{valor * 100:.1f}%" if valor is not None else '-'
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Backtest dos métodos de previsão de demanda')
+    parser.add_argument('--historico', type=int, default=180, help='Dias de histórico reproduzidos')
+    parser.add_argument('--horizonte', type=int, default=7, help='Dias previstos a partir de cada origem')
+    parser.add_argument('--origens', type=int, default=4, help='Quantidade de origens avaliadas')
+    parser.add_argument('--metodo', action='append', choices=METODOS, dest='metodos',
+                        help='Método a avaliar (pode repetir; padrão: todos; os demais mantêm o último resultado)')
+    parser.add_argument('--processos', type=int, help='Processos em paralelo (padrão: número de CPUs)')
+    args = parser.parse_args(argv)
+
+    app = create_app('development')
+    with app.app_context():
+        resultado = executar_backtest(
+            dias_historico=args.historico,
+            horizonte=args.horizonte,
+            origens=args.origens,
+            metodos=args.metodos or METODOS,
+            processos=args.processos
+        )
+
+        print(f"{resultado['itens']} itens avaliados ({resultado['ignorados']} sem histórico suficiente) "
+              f"em {resultado['tempo_total']:.2f}s")
+        print(f"{'Método':<20}{'WAPE':>10}{'MAPE':>10}{'Viés':>10}{'Melhor em':>12}{'Tempo (s)':>12}")
+        for metodo, r in resultado['metodos'].items():
+            print(f"{metodo:<20}{_percentual(r['wape_medio']):>10}{_percentual(r['mape_medio']):>10}"
+                  f"{_percentual(r['vies_medio']):>10}{r['itens_melhor']:>12}{r['tempo']:>12.3f}")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""Lança a baixa de insumos consumidos pelas vendas (explosão das receitas)
+
+Uso:
+    python -m app.scripts.consumo_vendas [--data AAAA-MM-DD | --inicio AAAA-MM-DD --fim AAAA-MM-DD]
+                                         [--reprocessar] [--limitar-ao-saldo]
+"""
+import argparse
+import sys
+from datetime import date, datetime, timedelta
+
+from app import create_app
+from app.utils.consumo_vendas import consumir_vendas_dia
+from app.utils.estoque_atomico import EstoqueInsuficiente
+from app.utils.matriz_receitas import MatrizReceitas
+
+
+def _data(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Consumo de insumos pelas vendas')
+    parser.add_argument('--data', type=_data, help='Dia a processar (padrão: ontem)')
+    parser.add_argument('--inicio', type=_data, help='Primeiro dia a processar (AAAA-MM-DD)')
+    parser.add_argument('--fim', type=_data, help='Último dia a processar (AAAA-MM-DD)')
+    parser.add_argument('--reprocessar', action='store_true', help='Estorna e lança de novo dias já processados')
+    parser.add_argument('--limitar-ao-saldo', action='store_true',
+                        help='Baixa no máximo o saldo disponível e reporta a falta')
+    args = parser.parse_args(argv)
+
+    inicio = args.inicio or args.data or date.today() - timedelta(days=1)
+    fim = args.fim or inicio
+
+    app = create_app('development')
+    with app.app_context():
+        matriz = MatrizReceitas.carregar()
+        dia = inicio
+        while dia <= fim:
+            try:
+                r = consumir_vendas_dia(dia, reprocessar=args.reprocessar,
+                                        limitar_ao_saldo=args.limitar_ao_saldo, matriz=matriz)
+            except EstoqueInsuficiente as e:
+                print(f"{dia}: {e}")
+                return 1
+            print(f"{dia}: {r['status']} - {r['pratos']} pratos, {r['produtos']} produtos baixados "
+                  f"({r['tempo_total']:.3f}s)")
+            for produto_id, falta in r['faltas'].items():
+                print(f"  Falta no produto {produto_id}: {falta}")
+            dia += timedelta(days=1)
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""Registra o custo histórico (custo_unitario_snapshot) nas vendas que ainda não o têm
+
+Usa o preço de cada insumo vigente na data da venda e reconstrói o agregado
+diário das datas afetadas.
+
+Uso:
+    python -m app.scripts.custo_vendas [--inicio AAAA-MM-DD] [--fim AAAA-MM-DD] [--sem-agregado]
+"""
+import argparse
+import sys
+from datetime import date
+
+from app import create_app
+from app.utils.custo_vendas import preencher_custo_vendas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Custo histórico das vendas')
+    parser.add_argument('--inicio', type=date.fromisoformat, help='Data inicial (padrão: sem limite)')
+    parser.add_argument('--fim', type=date.fromisoformat, help='Data final (padrão: sem limite)')
+    parser.add_argument('--sem-agregado', action='store_true', help='Não reconstrói o agregado diário')
+    args = parser.parse_args(argv)
+
+    app = create_app('development')
+    with app.app_context():
+        resultado = preencher_custo_vendas(args.inicio, args.fim, reconstruir_agregado=not args.sem_agregado)
+        print(f"{resultado['vendas']} vendas atualizadas ({resultado['pares']} pares data/prato) "
+              f"em {resultado['tempo_total']:.2f}s.")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,22 @@
+#!/usr/bin/env python
+"""Recalcula o custo persistido de todos os pratos (custo_direto_cache / custo_porcao_cache)
+
+Uso:
+    python -m app.scripts.custos_pratos
+"""
+from app import create_app
+from app.extensions import db
+from app.models.modelo_prato import Prato, recalcular_custos_pratos
+
+
+def recalcular_todos():
+    """Recalcula o custo de todos os pratos a partir das receitas e preços atuais"""
+    app = create_app('development')
+    with app.app_context():
+        recalcular_custos_pratos()
+        db.session.commit()
+        print(f"Custos recalculados para {Prato.query.count()} pratos.")
+
+
+if __name__ == '__main__':
+    recalcular_todos()
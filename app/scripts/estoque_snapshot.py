@@ -0,0 +1,67 @@
+#!/usr/bin/env python
+"""Gera snapshots de estoque ou verifica o estoque atual contra as movimentações
+
+Uso:
+    python -m app.scripts.estoque_snapshot --gerar [--data AAAA-MM-DD | --inicio AAAA-MM-DD --fim AAAA-MM-DD] [--mensal]
+    python -m app.scripts.estoque_snapshot --check
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+
+from app import create_app
+from app.utils.estoque_snapshot import gerar_snapshots, verificar_estoque
+
+
+def _data(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def _datas(args):
+    """Dias a fechar (um por mês na periodicidade mensal)"""
+    if not args.inicio:
+        return [args.data]
+    datas, dia = [], args.inicio
+    while dia <= (args.fim or args.inicio):
+        if not args.mensal or not datas or (dia.year, dia.month) != (datas[-1].year, datas[-1].month):
+            datas.append(dia)
+        dia += timedelta(days=1)
+    return datas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Snapshots e verificação do estoque')
+    acao = parser.add_mutually_exclusive_group(required=True)
+    acao.add_argument('--gerar', action='store_true', help='Grava a posição de fechamento dos produtos')
+    acao.add_argument('--check', action='store_true', help='Compara estoque_atual com as movimentações')
+    parser.add_argument('--data', type=_data, help='Dia a fechar (padrão: ontem)')
+    parser.add_argument('--inicio', type=_data, help='Primeiro dia a fechar (AAAA-MM-DD)')
+    parser.add_argument('--fim', type=_data, help='Último dia a fechar (AAAA-MM-DD)')
+    parser.add_argument('--mensal', action='store_true', help='Fecha o mês em vez do dia')
+    args = parser.parse_args(argv)
+
+    app = create_app('development')
+    with app.app_context():
+        if args.gerar:
+            periodicidade = 'mensal' if args.mensal else 'diario'
+            # Em ordem cronológica: cada fechamento parte do anterior
+            for data in _datas(args):
+                resultado = gerar_snapshots(data, periodicidade)
+                print(f"Posição em {resultado['posicao_em']:%Y-%m-%d %H:%M}: {resultado['produtos']} produtos, "
+                      f"valor total {resultado['valor_total']:.2f} ({resultado['tempo_total']:.2f}s)")
+            return 0
+
+        divergencias = verificar_estoque()
+        if not divergencias:
+            print("Estoque atual consistente com as movimentações.")
+            return 0
+
+        print(f"Foram encontradas {len(divergencias)} divergências:")
+        for d in divergencias:
+            print(f"  {d['produto_id']} {d['nome']}: estoque_atual {d['estoque_atual']} / "
+                  f"movimentações {d['estoque_movimentacoes']} (diferença {d['diferenca']})")
+        return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""Exporta vendas e desperdício em Parquet/Arrow, particionados por mês
+
+Só os meses novos ou alterados desde a última execução são escritos, então o
+comando pode rodar toda noite sobre o mesmo diretório.
+
+Uso:
+    python -m app.scripts.exportar_analitico --destino DIR [--conjunto vendas|desperdicio]
+        [--formato parquet|arrow] [--inicio AAAA-MM-DD] [--fim AAAA-MM-DD] [--substituir]
+"""
+import argparse
+import sys
+from datetime import datetime
+
+from app import create_app
+from app.utils.exportacao_analitica import CONJUNTOS, FORMATOS, exportar_particionado
+
+
+def _data(valor):
+    return datetime.strptime(valor, '%Y-%m-%d').date()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Exportação colunar do histórico de vendas e de desperdício')
+    parser.add_argument('--destino', required=True, help='Diretório raiz dos arquivos')
+    parser.add_argument('--conjunto', choices=list(CONJUNTOS), action='append',
+                        help='Conjunto a exportar (pode repetir; padrão: todos)')
+    parser.add_argument('--formato', choices=list(FORMATOS), default='parquet')
+    parser.add_argument('--inicio', type=_data, help='Data inicial (AAAA-MM-DD)')
+    parser.add_argument('--fim', type=_data, help='Data final (AAAA-MM-DD)')
+    parser.add_argument('--substituir', action='store_true',
+                        help='Reescreve todos os meses do recorte, mesmo os inalterados')
+    args = parser.parse_args(argv)
+
+    app = create_app('development')
+    with app.app_context():
+        for conjunto in args.conjunto or list(CONJUNTOS):
+            plano = exportar_particionado(conjunto, args.destino, args.formato,
+                                          args.inicio, args.fim, args.substituir)
+
+            escritos = [p for p in plano if p['acao'] == 'escrever']
+            removidos = [p for p in plano if p['acao'] == 'remover']
+            print(f"{conjunto}: {len(escritos)} meses escritos, "
+                  f"{len(plano) - len(escritos) - len(removidos)} mantidos, {len(removidos)} removidos.")
+            for p in escritos:
+                print(f"  {p['ano']}-{p['mes']:02d}: {p['linhas_escritas']} linhas")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+"""Importa em lote os XMLs de NF-e de uma pasta ou arquivo ZIP
+
+Uso:
+    python -m app.scripts.importar_nfe_lote "nf e/" [--lote 50] [--processos 4]
+"""
+import argparse
+import sys
+
+from app import create_app
+from app.utils.nfe_lote import TAMANHO_LOTE_PADRAO, importar_lote, ler_arquivos_xml
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Importação de NF-e em lote')
+    parser.add_argument('caminhos', nargs='+', help='Pastas, arquivos ZIP ou XMLs')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_PADRAO, help='Notas gravadas por transação')
+    parser.add_argument('--processos', type=int, default=None, help='Processos para leitura dos XMLs')
+    args = parser.parse_args(argv)
+
+    app = create_app('development')
+    with app.app_context():
+        arquivos = [a for caminho in args.caminhos for a in ler_arquivos_xml(caminho)]
+        print(f"Processando {len(arquivos)} arquivos XML...")
+
+        resultado = importar_lote(arquivos, tamanho_lote=args.lote, processos=args.processos)
+
+        for r in resultado['arquivos']:
+            if r['status'] != 'importada':
+                print(f"  [{r['status']}] {r['arquivo']}: {r.get('mensagem', '')}")
+
+        print(f"Importadas: {resultado['importadas']} | Já existentes: {resultado['duplicadas']} | "
+              f"Erros: {resultado['erros']} | Itens: {resultado['itens']}")
+        print(f"Tempo: {resultado['tempo_total']:.2f} s "
+              f"({resultado['notas_por_segundo']:.1f} notas/s, {resultado['itens_por_segundo']:.1f} itens/s)")
+
+        return 1 if resultado['erros'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,36 @@
+#!/usr/bin/env python
+"""Importa um CSV de histórico de vendas (exportação do PDV) em uma única transação
+
+Uso:
+    python -m app.scripts.importar_vendas_csv ARQUIVO.csv [--lote 5000] [--delimitador ';']
+"""
+import argparse
+import sys
+
+from app import create_app
+from app.utils.importacao_vendas import TAMANHO_LOTE_PADRAO, importar_historico_csv
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Importação em massa do histórico de vendas')
+    parser.add_argument('arquivo', help='Arquivo CSV')
+    parser.add_argument('--lote', type=int, default=TAMANHO_LOTE_PADRAO, help='Linhas inseridas por vez')
+    parser.add_argument('--delimitador', default=';', help='Separador de colunas')
+    args = parser.parse_args(argv)
+
+    app = create_app('development')
+    with app.app_context():
+        resultado = importar_historico_csv(args.arquivo, tamanho_lote=args.lote, delimitador=args.delimitador)
+
+        print(f"Lidas: {resultado['lidas']}  Importadas: {resultado['importadas']}  "
+              f"Rejeitadas: {resultado['rejeitadas']}")
+        print(f"Tempo: {resultado['tempo_total']:.2f}s ({resultado['linhas_por_segundo']:.0f} linhas/s)")
+        for motivo, quantidade in sorted(resultado['motivos'].items()):
+            print(f"  {motivo}: {quantidade}")
+        for rejeicao in resultado['rejeicoes']:
+            print(f"  linha {rejeicao['linha']}: {rejeicao['motivo']} {rejeicao['dados']}")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
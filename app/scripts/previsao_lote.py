@@ -0,0 +1,43 @@
+#!/usr/bin/env python
+"""Gera previsões de demanda para todos os pratos e itens de cardápio com histórico
+
+Pensado para rodar como tarefa noturna.
+
+Uso:
+    python -m app.scripts.previsao_lote [--dias 7] [--historico 90] [--metodo media_movel ...] [--sazonalidade]
+"""
+import argparse
+import sys
+from datetime import date, timedelta
+
+from app import create_app
+from app.utils.previsao_demanda import METODOS, gerar_previsoes_todos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Previsão de demanda de todos os itens')
+    parser.add_argument('--dias', type=int, default=7, help='Dias a prever a partir de hoje')
+    parser.add_argument('--historico', type=int, help='Dias de histórico (padrão: PREVISAO_DIAS_HISTORICO)')
+    parser.add_argument('--metodo', action='append', choices=METODOS, dest='metodos',
+                        help='Método a executar (pode repetir; padrão: todos)')
+    parser.add_argument('--sazonalidade', action='store_true', help='Aplica os fatores de sazonalidade cadastrados')
+    args = parser.parse_args(argv)
+
+    app = create_app('development')
+    with app.app_context():
+        hoje = date.today()
+        resultado = gerar_previsoes_todos(
+            hoje, hoje + timedelta(days=args.dias - 1),
+            metodos=args.metodos or METODOS,
+            usar_sazonalidade=args.sazonalidade,
+            dias_historico=args.historico or app.config['PREVISAO_DIAS_HISTORICO']
+        )
+        print(f"{resultado['previsoes']} previsões gravadas para {resultado['itens']} itens "
+              f"({resultado['ignorados']} ignorados por falta de histórico).")
+        print(f"Leitura: {resultado['tempo_leitura']:.3f}s  Cálculo: {resultado['tempo_calculo']:.3f}s  "
+              f"Total: {resultado['tempo_total']:.3f}s")
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
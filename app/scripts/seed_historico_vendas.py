@@ -4,6 +4,7 @@ from app.extensions import db
 from app.models.modelo_previsao import HistoricoVendas
 from app.models.modelo_cardapio import CardapioItem
 from app.models.modelo_prato import Prato
+from app.utils.agregados_vendas import acumular_vendas_diarias
 from datetime import datetime, timedelta
 import random
 
@@ -25,6 +26,7 @@ def seed_historico_vendas():
         
         # Criar registros para os últimos 90 dias
         registros_criados = 0
+        vendas_criadas = []
         for dias_atras in range(90, 0, -1):
             data = hoje - timedelta(days=dias_atras)
             
@@ -102,8 +104,12 @@ def seed_historico_vendas():
                 )
                 
                 db.session.add(venda)
+                vendas_criadas.append(venda)
                 registros_criados += 1
         
+        # Atualizar o agregado diário usado pelo dashboard
+        acumular_vendas_diarias(vendas_criadas)
+        
         # Commit das alterações
         db.session.commit()
         print(f"Foram criados {registros_criados} registros de histórico de vendas.")
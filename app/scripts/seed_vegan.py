@@ -4,6 +4,7 @@ from app.models.modelo_prato import Prato, PratoInsumo
 from app.models.modelo_fornecedor import Fornecedor
 from app.models.modelo_cardapio import Cardapio, CardapioSecao, CardapioItem
 from app.models.modelo_previsao import HistoricoVendas
+from app.utils.agregados_vendas import acumular_vendas_diarias
 # from faker import Faker
 import random
 import string
@@ -222,11 +223,13 @@ def seed_vegan_data():
             # Commit em lotes para não sobrecarregar
             if len(vendas_buffer) >= 100:
                 db.session.add_all(vendas_buffer)
+                acumular_vendas_diarias(vendas_buffer)
                 db.session.commit()
                 vendas_buffer = []
 
     if vendas_buffer:
         db.session.add_all(vendas_buffer)
+        acumular_vendas_diarias(vendas_buffer)
         db.session.commit()
         
     print("Vendas simuladas com sucesso!")
@@ -1,4 +1,5 @@
 from app.models import HistoricoVendas, db
+from app.utils.agregados_vendas import reconstruir_vendas_diarias
 from datetime import datetime, timedelta
 import random
 
@@ -40,6 +41,9 @@ def criar_historico_vendas(pratos, dias=30):
                 db.session.add(venda)
     
     db.session.commit()
+    
+    # O dashboard lê o agregado diário: recalcula o período semeado
+    reconstruir_vendas_diarias(hoje - timedelta(days=dias), hoje - timedelta(days=1))
 
 def criar_fatores_sazonais():
     """Cria fatores sazonais para o AleroVeg"""
@@ -0,0 +1,227 @@
+"""Manutenção do agregado diário de desperdício (tabela desperdicio_diario)
+
+Os indicadores de desperdício (página inicial e relatórios do módulo, metas e
+widget do dashboard) leem uma linha por dia/categoria/item em vez de percorrer
+os registros, de modo que o custo depende do número de dias, não de registros.
+O agregado é atualizado de forma incremental quando um desperdício é registrado
+e pode ser reconstruído a qualquer momento a partir dos registros.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Date, func, insert
+
+from app.extensions import db
+from app.models.modelo_desperdicio import DesperdicioDiario, RegistroDesperdicio
+from app.utils.cache_dashboard import registrar_alteracao
+from app.utils.soma_agregados import somar_em_agregado
+
+CENTAVOS = Decimal('0.01')
+
+# Dia do registro (data_registro é datetime)
+DIA_REGISTRO = func.date(RegistroDesperdicio.data_registro, type_=Date)
+
+
+def _decimal(valor) -> Decimal:
+    """Converte um valor numérico para Decimal com duas casas"""
+    return Decimal(str(valor or 0)).quantize(CENTAVOS)
+
+
+def _dia(valor) -> date:
+    """Normaliza o dia retornado pelo banco (date, datetime ou texto ISO)"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    return date.fromisoformat(str(valor)[:10])
+
+
+def filtrar_periodo(query, modelo, data_inicio: Optional[date] = None, data_fim: Optional[date] = None,
+                    categoria_id: Optional[int] = None):
+    """Filtra por período (dias inteiros) e categoria o agregado ou os registros brutos
+
+    Args:
+        query: Consulta a filtrar
+        modelo: DesperdicioDiario ou RegistroDesperdicio
+        data_inicio: Primeiro dia (opcional)
+        data_fim: Último dia, incluído (opcional)
+        categoria_id: Categoria (opcional)
+    """
+    if modelo is DesperdicioDiario:
+        if data_inicio:
+            query = query.filter(DesperdicioDiario.data >= data_inicio)
+        if data_fim:
+            query = query.filter(DesperdicioDiario.data <= data_fim)
+    else:
+        if data_inicio:
+            query = query.filter(
+                RegistroDesperdicio.data_registro >= datetime.combine(data_inicio, datetime.min.time())
+            )
+        if data_fim:
+            query = query.filter(
+                RegistroDesperdicio.data_registro < datetime.combine(data_fim + timedelta(days=1), datetime.min.time())
+            )
+    if categoria_id:
+        query = query.filter(modelo.categoria_id == categoria_id)
+    return query
+
+
+def acumular_desperdicio_diario(registros: Iterable[RegistroDesperdicio]) -> int:
+    """Soma registros de desperdício recém-criados ao agregado diário
+
+    Deve ser chamada na mesma transação em que os registros são adicionados,
+    antes do commit. Registros sem data recebem a data/hora atual.
+
+    Args:
+        registros: Registros ainda não contabilizados
+
+    Returns:
+        int: Quantidade de linhas do agregado afetadas
+    """
+    totais = defaultdict(lambda: [0.0, Decimal('0'), 0, None])
+    for registro in registros:
+        if registro.data_registro is None:
+            registro.data_registro = datetime.now()
+        chave = (_dia(registro.data_registro), registro.categoria_id, registro.produto_id, registro.prato_id)
+        total = totais[chave]
+        total[0] += float(registro.quantidade or 0)
+        total[1] += _decimal(registro.valor_estimado)
+        total[2] += 1
+        total[3] = registro.unidade or total[3]
+    return somar_totais_desperdicio(totais)
+
+
+def somar_totais_desperdicio(totais: Dict[Tuple, List]) -> int:
+    """Soma totais já agrupados por (data, categoria, produto, prato) ao agregado
+
+    A soma é feita pelo banco (upsert), então registros do mesmo dia/item feitos
+    ao mesmo tempo por outro worker não se perdem nem duplicam a linha.
+
+    Args:
+        totais: [quantidade, valor, registros, unidade] por (data, categoria_id, produto_id, prato_id)
+
+    Returns:
+        int: Quantidade de linhas do agregado afetadas
+    """
+    # Ordem fixa das chaves: transações concorrentes travam as linhas na mesma ordem
+    linhas = [
+        {
+            'data': chave[0],
+            'categoria_id': chave[1],
+            'produto_id': chave[2],
+            'prato_id': chave[3],
+            'quantidade': float(quantidade),
+            'valor': _decimal(valor),
+            'total_registros': int(registros),
+            'unidade': unidade
+        }
+        for chave, (quantidade, valor, registros, unidade)
+        in sorted(totais.items(), key=lambda item: (item[0][0], item[0][1], item[0][2] or 0, item[0][3] or 0))
+    ]
+    return somar_em_agregado(DesperdicioDiario, 'uq_desperdicio_diario_item', linhas,
+                             somar=('quantidade', 'valor', 'total_registros'), preservar=('unidade',))
+
+
+def _agrupar_registros(data_inicio: Optional[date] = None, data_fim: Optional[date] = None):
+    """Agrupa os registros brutos por (dia, categoria, produto, prato) em uma única consulta"""
+    query = db.session.query(
+        DIA_REGISTRO.label('data'),
+        RegistroDesperdicio.categoria_id,
+        RegistroDesperdicio.produto_id,
+        RegistroDesperdicio.prato_id,
+        func.sum(RegistroDesperdicio.quantidade).label('quantidade'),
+        func.sum(RegistroDesperdicio.valor_estimado).label('valor'),
+        func.count(RegistroDesperdicio.id).label('registros'),
+        func.max(RegistroDesperdicio.unidade).label('unidade')
+    )
+    query = filtrar_periodo(query, RegistroDesperdicio, data_inicio, data_fim)
+    return query.group_by(
+        DIA_REGISTRO, RegistroDesperdicio.categoria_id, RegistroDesperdicio.produto_id, RegistroDesperdicio.prato_id
+    ).all()
+
+
+def reconstruir_desperdicio_diario(data_inicio: Optional[date] = None,
+                                   data_fim: Optional[date] = None,
+                                   commit: bool = True) -> int:
+    """Reconstrói o agregado diário a partir dos registros de desperdício
+
+    Args:
+        data_inicio: Data inicial (opcional, sem limite se omitida)
+        data_fim: Data final (opcional, sem limite se omitida)
+        commit: Se True, confirma a transação ao final
+
+    Returns:
+        int: Quantidade de linhas geradas no agregado
+    """
+    filtrar_periodo(DesperdicioDiario.query, DesperdicioDiario, data_inicio, data_fim).delete(
+        synchronize_session=False
+    )
+
+    grupos = _agrupar_registros(data_inicio, data_fim)
+    if grupos:
+        db.session.execute(insert(DesperdicioDiario), [
+            {
+                'data': _dia(g.data),
+                'categoria_id': g.categoria_id,
+                'produto_id': g.produto_id,
+                'prato_id': g.prato_id,
+                'quantidade': float(g.quantidade or 0),
+                'valor': _decimal(g.valor),
+                'total_registros': g.registros,
+                'unidade': g.unidade
+            }
+            for g in grupos
+        ])
+    # Os indicadores em cache no dashboard passam a ler o agregado novo
+    registrar_alteracao(db.session)
+
+    if commit:
+        db.session.commit()
+
+    return len(grupos)
+
+
+def verificar_desperdicio_diario(data_inicio: Optional[date] = None,
+                                 data_fim: Optional[date] = None) -> List[Dict]:
+    """Compara o agregado diário com os registros brutos
+
+    Verifica quantidade, valor e número de registros de cada (data, categoria, item).
+
+    Args:
+        data_inicio: Data inicial (opcional)
+        data_fim: Data final (opcional)
+
+    Returns:
+        List[Dict]: Divergências encontradas (lista vazia se consistente)
+    """
+    esperado = {
+        (_dia(g.data), g.categoria_id, g.produto_id, g.prato_id):
+            (round(float(g.quantidade or 0), 6), _decimal(g.valor), g.registros)
+        for g in _agrupar_registros(data_inicio, data_fim)
+    }
+    atual = {
+        (linha.data, linha.categoria_id, linha.produto_id, linha.prato_id):
+            (round(float(linha.quantidade or 0), 6), _decimal(linha.valor), linha.total_registros)
+        for linha in filtrar_periodo(DesperdicioDiario.query, DesperdicioDiario, data_inicio, data_fim)
+    }
+
+    divergencias = []
+    vazio = (0.0, Decimal('0.00'), 0)
+    for chave in sorted(set(esperado) | set(atual), key=lambda c: (c[0], c[1], c[2] or 0, c[3] or 0)):
+        valor_esperado = esperado.get(chave, vazio)
+        valor_atual = atual.get(chave, vazio)
+        if valor_esperado != valor_atual:
+            divergencias.append({
+                'data': chave[0].isoformat(),
+                'categoria_id': chave[1],
+                'produto_id': chave[2],
+                'prato_id': chave[3],
+                'esperado': dict(zip(('quantidade', 'valor', 'registros'), (
+                    valor_esperado[0], float(valor_esperado[1]), valor_esperado[2]))),
+                'agregado': dict(zip(('quantidade', 'valor', 'registros'), (
+                    valor_atual[0], float(valor_atual[1]), valor_atual[2])))
+            })
+
+    return divergencias
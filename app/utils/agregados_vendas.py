@@ -0,0 +1,300 @@
+"""Manutenção do agregado diário de vendas (tabela vendas_diarias_agregadas)
+
+O dashboard lê uma linha por dia/prato em vez de percorrer todo o histórico de
+vendas. O agregado é atualizado de forma incremental quando as vendas são
+registradas e pode ser reconstruído a qualquer momento a partir do histórico.
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import case, func
+from sqlalchemy.orm import selectinload
+
+from app.extensions import db
+from app.models.modelo_cardapio import CardapioItem
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_previsao import HistoricoVendas, VendaDiariaAgregada
+from app.utils.soma_agregados import somar_em_agregado
+
+CENTAVOS = Decimal('0.01')
+
+
+def _decimal(valor) -> Decimal:
+    """Converte um valor numérico para Decimal com duas casas"""
+    return Decimal(str(valor or 0)).quantize(CENTAVOS)
+
+
+def _mapa_custos_pratos(prato_ids: Iterable[int]) -> Dict[int, float]:
+    """Retorna o custo total por porção de cada prato informado
+
+    Args:
+        prato_ids: Ids dos pratos
+
+    Returns:
+        Dict[int, float]: Custo por porção indexado pelo id do prato
+    """
+    ids = {p for p in prato_ids if p is not None}
+    if not ids:
+        return {}
+
+    # Usa o custo persistido; só percorre a receita de pratos ainda sem cache
+    custos = {}
+    sem_cache = set()
+    for prato_id, custo in db.session.query(Prato.id, Prato.custo_porcao_cache).filter(Prato.id.in_(ids)):
+        if custo is None:
+            sem_cache.add(prato_id)
+        else:
+            custos[prato_id] = float(custo)
+
+    if sem_cache:
+        pratos = Prato.query.options(
+            selectinload(Prato.insumos).joinedload(PratoInsumo.produto)
+        ).filter(Prato.id.in_(sem_cache)).all()
+        custos.update({p.id: float(p.custo_total_por_porcao or 0) for p in pratos})
+
+    return custos
+
+
+def _resolver_pratos(vendas: List[HistoricoVendas]) -> List[Optional[int]]:
+    """Resolve o prato de cada venda (itens de cardápio apontam para um prato)"""
+    item_ids = {v.cardapio_item_id for v in vendas if v.cardapio_item_id}
+    prato_por_item = {}
+    if item_ids:
+        prato_por_item = dict(
+            db.session.query(CardapioItem.id, CardapioItem.prato_id)
+            .filter(CardapioItem.id.in_(item_ids)).all()
+        )
+
+    return [
+        prato_por_item.get(v.cardapio_item_id) or v.prato_id
+        for v in vendas
+    ]
+
+
+def registrar_custo_vendas(vendas: List[HistoricoVendas],
+                           pratos: Optional[List[Optional[int]]] = None) -> List[Optional[int]]:
+    """Preenche custo_unitario_snapshot das vendas que ainda não o têm
+
+    Usa o custo por porção persistido do prato (custo vigente no momento).
+
+    Args:
+        vendas: Registros de HistoricoVendas
+        pratos: Prato de cada venda, se já resolvido
+
+    Returns:
+        List[Optional[int]]: Prato de cada venda
+    """
+    if pratos is None:
+        pratos = _resolver_pratos(vendas)
+    pendentes = [(v, p) for v, p in zip(vendas, pratos) if v.custo_unitario_snapshot is None]
+    if pendentes:
+        custos = _mapa_custos_pratos(p for _, p in pendentes)
+        for venda, prato_id in pendentes:
+            if prato_id in custos:
+                venda.custo_unitario_snapshot = Decimal(str(round(custos[prato_id], 4)))
+    return pratos
+
+
+def acumular_vendas_diarias(vendas: Iterable[HistoricoVendas]) -> int:
+    """Soma um lote de vendas recém-criadas ao agregado diário
+
+    Deve ser chamada na mesma transação em que as vendas são adicionadas, antes
+    do commit. O custo somado é o custo registrado na venda (custo_unitario_snapshot),
+    preenchido com o custo por porção vigente quando ausente.
+
+    Args:
+        vendas: Registros de HistoricoVendas ainda não contabilizados
+
+    Returns:
+        int: Quantidade de linhas do agregado afetadas
+    """
+    vendas = list(vendas)
+    if not vendas:
+        return 0
+
+    pratos = registrar_custo_vendas(vendas)
+
+    # Agrupa o lote em memória por (data, prato)
+    totais = defaultdict(lambda: [0, Decimal('0'), Decimal('0'), 0])
+    for venda, prato_id in zip(vendas, pratos):
+        quantidade = int(venda.quantidade or 0)
+        total = totais[(venda.data, prato_id)]
+        total[0] += quantidade
+        total[1] += _decimal(venda.valor_total)
+        total[2] += _decimal(float(venda.custo_unitario_snapshot or 0) * quantidade)
+        total[3] += 1
+
+    return somar_totais_diarios(totais)
+
+
+def somar_totais_diarios(totais: Dict[Tuple[date, Optional[int]], List]) -> int:
+    """Soma totais já agrupados por (data, prato) ao agregado diário
+
+    Usada diretamente por importações em massa, que agrupam as vendas sem criar
+    objetos HistoricoVendas. A soma é feita pelo banco (upsert), então vendas do
+    mesmo dia/prato registradas ao mesmo tempo por outro worker não se perdem.
+
+    Args:
+        totais: [quantidade, receita, custo, registros] por (data, prato_id)
+
+    Returns:
+        int: Quantidade de linhas do agregado afetadas
+    """
+    # Ordem fixa das chaves: transações concorrentes travam as linhas na mesma ordem
+    linhas = [
+        {
+            'data': data,
+            'prato_id': prato_id,
+            'quantidade': int(quantidade),
+            'receita': _decimal(receita),
+            'custo': _decimal(custo),
+            'total_registros': int(registros)
+        }
+        for (data, prato_id), (quantidade, receita, custo, registros)
+        in sorted(totais.items(), key=lambda item: (item[0][0], item[0][1] or 0))
+    ]
+    return somar_em_agregado(VendaDiariaAgregada, 'uq_venda_diaria_data_prato', linhas,
+                             somar=('quantidade', 'receita', 'custo', 'total_registros'))
+
+
+def _agrupar_historico(data_inicio: Optional[date] = None, data_fim: Optional[date] = None):
+    """Agrupa o histórico bruto por (data, prato) em uma única consulta"""
+    prato_id = func.coalesce(CardapioItem.prato_id, HistoricoVendas.prato_id)
+    query = db.session.query(
+        HistoricoVendas.data,
+        prato_id.label('prato_id'),
+        func.sum(HistoricoVendas.quantidade).label('quantidade'),
+        func.sum(HistoricoVendas.valor_total).label('receita'),
+        func.sum(HistoricoVendas.quantidade * HistoricoVendas.custo_unitario_snapshot).label('custo'),
+        func.sum(case(
+            (HistoricoVendas.custo_unitario_snapshot.is_(None), HistoricoVendas.quantidade), else_=0
+        )).label('quantidade_sem_custo'),
+        func.count(HistoricoVendas.id).label('registros')
+    ).outerjoin(
+        CardapioItem, HistoricoVendas.cardapio_item_id == CardapioItem.id
+    )
+
+    if data_inicio:
+        query = query.filter(HistoricoVendas.data >= data_inicio)
+    if data_fim:
+        query = query.filter(HistoricoVendas.data <= data_fim)
+
+    return query.group_by(HistoricoVendas.data, prato_id).all()
+
+
+def reconstruir_vendas_diarias(data_inicio: Optional[date] = None,
+                               data_fim: Optional[date] = None,
+                               commit: bool = True) -> int:
+    """Reconstrói o agregado diário a partir do histórico de vendas
+
+    Args:
+        data_inicio: Data inicial (opcional, sem limite se omitida)
+        data_fim: Data final (opcional, sem limite se omitida)
+        commit: Se True, confirma a transação ao final
+
+    Returns:
+        int: Quantidade de linhas geradas no agregado
+    """
+    query = VendaDiariaAgregada.query
+    if data_inicio:
+        query = query.filter(VendaDiariaAgregada.data >= data_inicio)
+    if data_fim:
+        query = query.filter(VendaDiariaAgregada.data <= data_fim)
+    query.delete(synchronize_session=False)
+
+    grupos = _agrupar_historico(data_inicio, data_fim)
+    # Vendas sem custo registrado usam o custo por porção atual
+    custos = _mapa_custos_pratos(g.prato_id for g in grupos if g.quantidade_sem_custo)
+
+    db.session.bulk_insert_mappings(VendaDiariaAgregada, [
+        {
+            'data': g.data,
+            'prato_id': g.prato_id,
+            'quantidade': int(g.quantidade or 0),
+            'receita': _decimal(g.receita),
+            'custo': _decimal(float(g.custo or 0) + custos.get(g.prato_id, 0) * int(g.quantidade_sem_custo or 0)),
+            'total_registros': g.registros
+        }
+        for g in grupos
+    ])
+
+    if commit:
+        db.session.commit()
+
+    return len(grupos)
+
+
+def verificar_vendas_diarias(data_inicio: Optional[date] = None,
+                             data_fim: Optional[date] = None) -> List[Dict]:
+    """Compara o agregado diário com o histórico bruto
+
+    Verifica quantidade, receita e número de registros de cada (data, prato).
+    O custo não é comparado, pois é um retrato do momento da venda.
+
+    Args:
+        data_inicio: Data inicial (opcional)
+        data_fim: Data final (opcional)
+
+    Returns:
+        List[Dict]: Divergências encontradas (lista vazia se consistente)
+    """
+    esperado = {
+        (g.data, g.prato_id): (int(g.quantidade or 0), _decimal(g.receita), g.registros)
+        for g in _agrupar_historico(data_inicio, data_fim)
+    }
+
+    query = VendaDiariaAgregada.query
+    if data_inicio:
+        query = query.filter(VendaDiariaAgregada.data >= data_inicio)
+    if data_fim:
+        query = query.filter(VendaDiariaAgregada.data <= data_fim)
+    atual = {
+        (linha.data, linha.prato_id): (linha.quantidade, _decimal(linha.receita), linha.total_registros)
+        for linha in query.all()
+    }
+
+    divergencias = []
+    for chave in sorted(set(esperado) | set(atual), key=lambda c: (c[0], c[1] or 0)):
+        valor_esperado = esperado.get(chave, (0, Decimal('0.00'), 0))
+        valor_atual = atual.get(chave, (0, Decimal('0.00'), 0))
+        if valor_esperado != valor_atual:
+            divergencias.append({
+                'data': chave[0].isoformat(),
+                'prato_id': chave[1],
+                'esperado': {
+                    'quantidade': valor_esperado[0],
+                    'receita': float(valor_esperado[1]),
+                    'registros': valor_esperado[2]
+                },
+                'agregado': {
+                    'quantidade': valor_atual[0],
+                    'receita': float(valor_atual[1]),
+                    'registros': valor_atual[2]
+                }
+            })
+
+    return divergencias
+
+
+def obter_totais_por_dia(data_inicio: date, data_fim: date) -> Dict[date, Tuple[float, float, int]]:
+    """Retorna receita, custo direto e quantidade vendida por dia do período
+
+    Returns:
+        Dict[date, Tuple[float, float, int]]: (receita, custo, quantidade) por data
+    """
+    linhas = db.session.query(
+        VendaDiariaAgregada.data,
+        func.sum(VendaDiariaAgregada.receita),
+        func.sum(VendaDiariaAgregada.custo),
+        func.sum(VendaDiariaAgregada.quantidade)
+    ).filter(
+        VendaDiariaAgregada.data >= data_inicio,
+        VendaDiariaAgregada.data <= data_fim
+    ).group_by(VendaDiariaAgregada.data).all()
+
+    return {
+        data: (float(receita or 0), float(custo or 0), int(quantidade or 0))
+        for data, receita, custo, quantidade in linhas
+    }
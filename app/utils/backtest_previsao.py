@@ -0,0 +1,230 @@
+"""Backtest com origem móvel dos métodos de previsão de demanda
+
+O histórico é "reproduzido": para cada origem, os métodos são ajustados apenas
+com os dados anteriores a ela e comparados com as vendas reais dos dias
+seguintes. As métricas por item (MAPE, WAPE e viés) ficam gravadas em
+ResultadoBacktest, e o método de menor WAPE é usado pela previsão automática.
+
+Os itens são divididos em blocos processados em paralelo (pool de processos);
+dentro de cada bloco os cálculos são vetorizados.
+"""
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models.modelo_previsao import ResultadoBacktest
+from app.utils.previsao_demanda import (
+    METODOS, MIN_DIAS_COM_VENDA, carregar_matriz_vendas, prever_holt_winters,
+    prever_media_movel, prever_regressao_linear
+)
+
+METODO_PADRAO = 'regressao_linear'  # Usado pela previsão automática quando não há backtest
+
+
+def _prever(valores: np.ndarray, metodo: str, horizonte: int) -> np.ndarray:
+    """Previsão de um método para todas as colunas de um trecho de treino"""
+    if metodo == 'media_movel':
+        return prever_media_movel(valores, horizonte)[0]
+    if metodo == 'regressao_linear':
+        return prever_regressao_linear(valores, horizonte)[0]
+    if metodo == 'sazonalidade':
+        return prever_holt_winters(valores, horizonte)[0]
+    raise ValueError(f'Método de previsão desconhecido: {metodo}')
+
+
+def backtest_matriz(valores: np.ndarray, metodos: Iterable[str] = METODOS,
+                    horizonte: int = 7, origens: int = 4) -> Tuple[Dict[str, Dict[str, np.ndarray]], Dict[str, float]]:
+    """Avalia os métodos em `origens` cortes sucessivos no fim do histórico
+
+    As origens ficam a `horizonte` dias umas das outras, de forma que os
+    períodos avaliados cobrem as últimas origens × horizonte datas.
+
+    Args:
+        valores: Matriz dias × itens (NaN antes da primeira venda)
+        metodos: Métodos a avaliar
+        horizonte: Dias previstos a partir de cada origem
+        origens: Quantidade de origens
+
+    Returns:
+        Tuple: Métricas por método ({'mape', 'wape', 'vies'} com um valor por item)
+            e tempo de execução (s) por método
+    """
+    T, n = valores.shape
+    cortes = [T - horizonte * (origens - k) for k in range(origens)]
+    cortes = [c for c in cortes if c > 0]
+
+    metricas, tempos = {}, {}
+    for metodo in metodos:
+        erro_absoluto = np.zeros(n)
+        erro = np.zeros(n)
+        vendido = np.zeros(n)
+        erro_percentual = np.zeros(n)
+        dias_com_venda = np.zeros(n)
+
+        inicio = time.perf_counter()
+        for corte in cortes:
+            real = valores[corte:corte + horizonte]
+            previsto = _prever(valores[:corte], metodo, horizonte)[:len(real)]
+            avaliado = ~np.isnan(real)
+            real = np.where(avaliado, real, 0.0)
+            diferenca = np.where(avaliado, previsto - real, 0.0)
+
+            erro_absoluto += np.abs(diferenca).sum(axis=0)
+            erro += diferenca.sum(axis=0)
+            vendido += real.sum(axis=0)
+            positivos = real > 0
+            erro_percentual += np.where(positivos, np.abs(diferenca) / np.where(positivos, real, 1.0), 0).sum(axis=0)
+            dias_com_venda += positivos.sum(axis=0)
+        tempos[metodo] = time.perf_counter() - inicio
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            metricas[metodo] = {
+                'mape': np.where(dias_com_venda > 0, erro_percentual / dias_com_venda, np.nan),
+                'wape': np.where(vendido > 0, erro_absoluto / vendido, np.nan),
+                'vies': np.where(vendido > 0, erro / vendido, np.nan),
+            }
+    return metricas, tempos
+
+
+def _backtest_bloco(argumentos):
+    """Executa o backtest de um bloco de itens (executado nos processos do pool)"""
+    valores, metodos, horizonte, origens = argumentos
+    return backtest_matriz(valores, metodos, horizonte, origens)
+
+
+def _marcar_melhores():
+    """Marca em cada item o resultado de menor WAPE entre todos os métodos gravados
+
+    Empates ficam com o resultado gravado primeiro (a ordem de `metodos`).
+    """
+    melhores = {}
+    for id_, cardapio_item_id, prato_id in db.session.query(
+        ResultadoBacktest.id, ResultadoBacktest.cardapio_item_id, ResultadoBacktest.prato_id
+    ).filter(ResultadoBacktest.wape.isnot(None)).order_by(ResultadoBacktest.wape, ResultadoBacktest.id):
+        melhores.setdefault((cardapio_item_id, prato_id), id_)
+
+    db.session.query(ResultadoBacktest).update({ResultadoBacktest.melhor: False}, synchronize_session=False)
+    if melhores:
+        db.session.query(ResultadoBacktest).filter(ResultadoBacktest.id.in_(melhores.values())).update(
+            {ResultadoBacktest.melhor: True}, synchronize_session=False
+        )
+
+
+def executar_backtest(dias_historico: int = 180, horizonte: int = 7, origens: int = 4,
+                      metodos: Iterable[str] = METODOS, processos: Optional[int] = None,
+                      hoje: Optional[date] = None, commit: bool = True) -> Dict:
+    """Executa o backtest de todos os itens com histórico e grava os resultados
+
+    Os resultados anteriores dos métodos avaliados são substituídos; os dos
+    demais métodos são mantidos, e o melhor método de cada item é escolhido
+    entre todos os resultados gravados.
+
+    Args:
+        dias_historico: Dias de histórico reproduzidos (até ontem)
+        horizonte: Dias previstos a partir de cada origem
+        origens: Quantidade de origens avaliadas
+        metodos: Métodos a comparar
+        processos: Número de processos (padrão: número de CPUs; 1 desativa o pool)
+        hoje: Data de referência (padrão: date.today())
+        commit: Se True, confirma a transação ao final
+
+    Returns:
+        Dict: Relatório com itens avaliados, tempo por método e resumo das métricas
+    """
+    metodos = list(metodos)
+    for metodo in metodos:
+        if metodo not in METODOS:
+            raise ValueError(f'Método de previsão desconhecido: {metodo}')
+
+    inicio = time.perf_counter()
+    hoje = hoje or date.today()
+    fim_historico = hoje - timedelta(days=1)
+    matriz = carregar_matriz_vendas(fim_historico - timedelta(days=dias_historico - 1), fim_historico)
+
+    suficientes = (np.nan_to_num(matriz.valores) > 0).sum(axis=0) >= MIN_DIAS_COM_VENDA
+    itens = [item for item, ok in zip(matriz.itens, suficientes) if ok]
+    valores = matriz.valores[:, suficientes]
+
+    # Divide os itens em blocos (um por processo)
+    processos = processos or os.cpu_count() or 1
+    blocos = [b for b in np.array_split(np.arange(len(itens)), min(processos, max(len(itens), 1))) if len(b)]
+    argumentos = [(valores[:, b], metodos, horizonte, origens) for b in blocos]
+    if processos == 1 or len(blocos) < 2:
+        resultados = [_backtest_bloco(a) for a in argumentos]
+    else:
+        with ProcessPoolExecutor(max_workers=processos) as executor:
+            resultados = list(executor.map(_backtest_bloco, argumentos))
+
+    metricas = {m: {k: np.full(len(itens), np.nan) for k in ('mape', 'wape', 'vies')} for m in metodos}
+    tempos = dict.fromkeys(metodos, 0.0)
+    for bloco, (metricas_bloco, tempos_bloco) in zip(blocos, resultados):
+        for metodo in metodos:
+            tempos[metodo] += tempos_bloco[metodo]
+            for chave, valores_bloco in metricas_bloco[metodo].items():
+                metricas[metodo][chave][bloco] = valores_bloco
+
+    # Melhor método por item: menor WAPE (itens sem vendas no período ficam sem melhor)
+    wapes = np.array([metricas[m]['wape'] for m in metodos]).reshape(len(metodos), len(itens))
+    com_wape = ~np.isnan(wapes).all(axis=0)
+    melhor = np.argmin(np.where(np.isnan(wapes), np.inf, wapes), axis=0)
+
+    registros = []
+    for coluna, (tipo_item, item_id) in enumerate(itens):
+        for posicao, metodo in enumerate(metodos):
+            registro = {
+                'cardapio_item_id': item_id if tipo_item == 'cardapio_item' else None,
+                'prato_id': item_id if tipo_item == 'prato' else None,
+                'metodo': metodo,
+                'horizonte': horizonte,
+                'origens': origens,
+                'melhor': False  # Marcado depois, entre todos os métodos gravados
+            }
+            for chave in ('mape', 'wape', 'vies'):
+                valor = metricas[metodo][chave][coluna]
+                registro[chave] = None if np.isnan(valor) else float(valor)
+            registros.append(registro)
+
+    db.session.query(ResultadoBacktest).filter(
+        ResultadoBacktest.metodo.in_(metodos)
+    ).delete(synchronize_session=False)
+    if registros:
+        db.session.execute(insert(ResultadoBacktest), registros)
+    _marcar_melhores()
+    if commit:
+        db.session.commit()
+
+    with np.errstate(invalid='ignore'):
+        resumo = {
+            metodo: {
+                'wape_medio': float(np.nanmean(metricas[metodo]['wape'])) if com_wape.any() else None,
+                'mape_medio': float(np.nanmean(metricas[metodo]['mape'])) if com_wape.any() else None,
+                'vies_medio': float(np.nanmean(metricas[metodo]['vies'])) if com_wape.any() else None,
+                'itens_melhor': int((com_wape & (melhor == posicao)).sum()),
+                'tempo': tempos[metodo]
+            }
+            for posicao, metodo in enumerate(metodos)
+        }
+
+    return {
+        'itens': len(itens),
+        'ignorados': int((~suficientes).sum()),
+        'resultados': len(registros),
+        'metodos': resumo,
+        'tempo_total': time.perf_counter() - inicio
+    }
+
+
+def melhor_metodo(tipo_item: str, item_id: int) -> Optional[str]:
+    """Método com menor WAPE no último backtest do item (None se nunca avaliado)"""
+    filtro = (ResultadoBacktest.cardapio_item_id == item_id) if tipo_item == 'cardapio_item' \
+        else (ResultadoBacktest.prato_id == item_id)
+    resultado = db.session.query(ResultadoBacktest.metodo).filter(
+        filtro, ResultadoBacktest.melhor.is_(True)
+    ).first()
+    return resultado[0] if resultado else None
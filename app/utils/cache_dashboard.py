@@ -0,0 +1,362 @@
+"""Cache dos resultados do dashboard de lucratividade
+
+Os cálculos do dashboard são guardados por (função, início, fim). Períodos
+fechados (que terminam antes do mês corrente) não mudam e ficam em cache até que
+uma alteração retroativa os atinja; períodos que alcançam o mês corrente são
+invalidados sempre que vendas, custos indiretos, desperdícios ou o custo dos
+pratos mudam.
+
+A invalidação usa duas gerações, gravadas no próprio backend:
+    historico: incrementada por alterações com data anterior ao mês corrente
+    aberto: incrementada por qualquer alteração
+As chaves de períodos fechados incluem a geração histórica e as de períodos
+abertos incluem as duas, de modo que um valor antigo nunca é relido.
+
+Backends:
+    CacheLRU: em memória, por processo (um único worker)
+    CacheSQLite: arquivo SQLite compartilhado entre os workers do gunicorn
+"""
+import functools
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime
+from typing import Iterable, Optional, Tuple
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+GERACAO_HISTORICO = 'historico'
+GERACAO_ABERTO = 'aberto'
+
+_AUSENTE = object()
+
+
+class CacheLRU:
+    """Cache em memória com descarte do item menos usado"""
+
+    def __init__(self, max_itens: int = 256):
+        self.max_itens = max_itens
+        self._itens = OrderedDict()
+        self._geracoes = {GERACAO_HISTORICO: 0, GERACAO_ABERTO: 0}
+        self._trava = threading.Lock()
+
+    def obter(self, chave: str):
+        with self._trava:
+            valor = self._itens.get(chave, _AUSENTE)
+            if valor is not _AUSENTE:
+                self._itens.move_to_end(chave)
+            return valor
+
+    def gravar(self, chave: str, valor, geracao: Tuple[int, Optional[int]]):
+        with self._trava:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.max_itens:
+                self._itens.popitem(last=False)
+
+    def geracoes(self) -> Tuple[int, int]:
+        return self._geracoes[GERACAO_HISTORICO], self._geracoes[GERACAO_ABERTO]
+
+    def incrementar(self, nomes: Iterable[str]):
+        with self._trava:
+            for nome in nomes:
+                self._geracoes[nome] += 1
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+class CacheSQLite:
+    """Cache em um arquivo SQLite, compartilhado entre processos
+
+    Cada processo/thread abre a sua própria conexão. Os valores são serializados
+    com pickle; entradas de gerações anteriores são removidas a cada invalidação.
+    """
+
+    def __init__(self, caminho: str, timeout: float = 5.0):
+        self.caminho = caminho
+        self.timeout = timeout
+        self._local = threading.local()
+        conexao = self._conexao()
+        with conexao:
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS cache_dashboard ('
+                'chave TEXT PRIMARY KEY, valor BLOB NOT NULL, '
+                'geracao_historico INTEGER NOT NULL, geracao_aberto INTEGER, criado REAL NOT NULL)'
+            )
+            conexao.execute(
+                'CREATE TABLE IF NOT EXISTS cache_dashboard_geracoes ('
+                'nome TEXT PRIMARY KEY, valor INTEGER NOT NULL)'
+            )
+            conexao.executemany(
+                'INSERT OR IGNORE INTO cache_dashboard_geracoes (nome, valor) VALUES (?, 0)',
+                [(GERACAO_HISTORICO,), (GERACAO_ABERTO,)]
+            )
+
+    def _conexao(self) -> sqlite3.Connection:
+        # Conexões não podem ser herdadas de um processo pai (fork dos workers)
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conexao = sqlite3.connect(self.caminho, timeout=self.timeout)
+            self._local.conexao.execute('PRAGMA journal_mode=WAL')
+            self._local.pid = os.getpid()
+        return self._local.conexao
+
+    def obter(self, chave: str):
+        linha = self._conexao().execute(
+            'SELECT valor FROM cache_dashboard WHERE chave = ?', (chave,)
+        ).fetchone()
+        return pickle.loads(linha[0]) if linha else _AUSENTE
+
+    def gravar(self, chave: str, valor, geracao: Tuple[int, Optional[int]]):
+        conexao = self._conexao()
+        with conexao:
+            conexao.execute(
+                'INSERT OR REPLACE INTO cache_dashboard '
+                '(chave, valor, geracao_historico, geracao_aberto, criado) VALUES (?, ?, ?, ?, ?)',
+                (chave, pickle.dumps(valor, protocol=pickle.HIGHEST_PROTOCOL), geracao[0], geracao[1], time.time())
+            )
+
+    def geracoes(self) -> Tuple[int, int]:
+        valores = dict(self._conexao().execute('SELECT nome, valor FROM cache_dashboard_geracoes'))
+        return valores.get(GERACAO_HISTORICO, 0), valores.get(GERACAO_ABERTO, 0)
+
+    def incrementar(self, nomes: Iterable[str]):
+        conexao = self._conexao()
+        with conexao:
+            conexao.executemany(
+                'UPDATE cache_dashboard_geracoes SET valor = valor + 1 WHERE nome = ?',
+                [(nome,) for nome in nomes]
+            )
+            conexao.execute(
+                'DELETE FROM cache_dashboard WHERE '
+                'geracao_historico < (SELECT valor FROM cache_dashboard_geracoes WHERE nome = ?) OR '
+                'geracao_aberto < (SELECT valor FROM cache_dashboard_geracoes WHERE nome = ?)',
+                (GERACAO_HISTORICO, GERACAO_ABERTO)
+            )
+
+    def limpar(self):
+        conexao = self._conexao()
+        with conexao:
+            conexao.execute('DELETE FROM cache_dashboard')
+
+    def __len__(self):
+        return self._conexao().execute('SELECT COUNT(*) FROM cache_dashboard').fetchone()[0]
+
+
+def _data(valor) -> Optional[date]:
+    """Normaliza datas recebidas como date, datetime ou texto ISO"""
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    if isinstance(valor, str):
+        try:
+            return date.fromisoformat(valor[:10])
+        except ValueError:
+            return None
+    return None
+
+
+def _inicio_mes_corrente() -> date:
+    hoje = date.today()
+    return date(hoje.year, hoje.month, 1)
+
+
+class CacheDashboard:
+    """Cache das funções do dashboard, com contadores de acertos e falhas
+
+    As funções decoradas com `em_cache` recebem o período nos dois primeiros
+    argumentos (data_inicio, data_fim); funções sem período são tratadas como
+    período aberto. Os valores retornados são compartilhados e não devem ser
+    alterados por quem os recebe.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend
+        self.acertos = 0
+        self.falhas = 0
+        # Os widgets do dashboard são calculados em várias threads
+        self._trava = threading.Lock()
+
+    def init_app(self, app):
+        """Configura o backend a partir de DASHBOARD_CACHE (None, 'lru' ou 'sqlite')"""
+        tipo = app.config.get('DASHBOARD_CACHE')
+        if tipo == 'lru':
+            self.backend = CacheLRU(app.config.get('DASHBOARD_CACHE_ITENS', 256))
+        elif tipo == 'sqlite':
+            caminho = app.config.get('DASHBOARD_CACHE_CAMINHO') or os.path.join(app.instance_path, 'cache_dashboard.sqlite')
+            os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+            self.backend = CacheSQLite(caminho)
+        elif tipo:
+            raise ValueError(f'Backend de cache do dashboard desconhecido: {tipo}')
+        else:
+            self.backend = None
+        app.extensions['cache_dashboard'] = self
+
+    @property
+    def ativo(self) -> bool:
+        return self.backend is not None
+
+    def em_cache(self, funcao):
+        """Decorador: guarda o resultado de `funcao` por argumentos e período"""
+        nome = f'{funcao.__module__}.{funcao.__qualname__}'
+
+        @functools.wraps(funcao)
+        def envoltorio(*args, **kwargs):
+            backend = self.backend
+            if backend is None:
+                return funcao(*args, **kwargs)
+
+            inicio, fim = (_data(a) for a in (list(args[:2]) + [None, None])[:2])
+            fechado = fim is not None and fim < _inicio_mes_corrente()
+            historico, aberto = backend.geracoes()
+            geracao = (historico, None if fechado else aberto)
+
+            argumentos = [_data(a) or a for a in args]
+            chave = f'{nome}|{argumentos!r}|{sorted(kwargs.items())!r}|h{historico}'
+            if not fechado:
+                # Períodos abertos também dependem do dia (ex.: tendência dos últimos meses)
+                chave += f'|a{aberto}|{date.today().isoformat()}'
+
+            valor = backend.obter(chave)
+            if valor is not _AUSENTE:
+                with self._trava:
+                    self.acertos += 1
+                return valor
+
+            with self._trava:
+                self.falhas += 1
+            valor = funcao(*args, **kwargs)
+            backend.gravar(chave, valor, geracao)
+            return valor
+
+        envoltorio.sem_cache = funcao
+        return envoltorio
+
+    def invalidar(self, datas: Optional[Iterable] = None):
+        """Invalida os períodos afetados por alterações nas datas informadas
+
+        Sem datas (alteração sem data conhecida), invalida todos os períodos.
+        """
+        if self.backend is None:
+            return
+        inicio_mes = _inicio_mes_corrente()
+        retroativa = datas is None or any(d is None or d < inicio_mes for d in map(_data, datas))
+        self.backend.incrementar([GERACAO_HISTORICO, GERACAO_ABERTO] if retroativa else [GERACAO_ABERTO])
+
+    def limpar(self):
+        if self.backend is not None:
+            self.backend.limpar()
+        with self._trava:
+            self.acertos = self.falhas = 0
+
+    def estatisticas(self) -> dict:
+        """Acertos e falhas deste processo e tamanho atual do cache"""
+        with self._trava:
+            acertos, falhas = self.acertos, self.falhas
+        consultas = acertos + falhas
+        return {
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'itens': len(self.backend) if self.backend is not None else 0,
+            'acertos': acertos,
+            'falhas': falhas,
+            'taxa_acerto': acertos / consultas if consultas else 0.0,
+        }
+
+
+cache_dashboard = CacheDashboard()
+
+
+# --- Invalidação automática -------------------------------------------------
+
+def _campos_data():
+    """Modelos que afetam o dashboard e o atributo de data de cada um"""
+    from app.models.modelo_custo import CustoIndireto
+    from app.models.modelo_desperdicio import RegistroDesperdicio
+    from app.models.modelo_previsao import HistoricoVendas
+    return {
+        HistoricoVendas: 'data',
+        CustoIndireto: 'data_referencia',
+        RegistroDesperdicio: 'data_registro',
+    }
+
+
+def _afeta_custo_pratos(obj) -> bool:
+    """Alterações que mudam o custo por porção dos pratos"""
+    from app.models.modelo_prato import Prato, PratoInsumo
+    from app.models.modelo_produto import Produto
+    if isinstance(obj, (Prato, PratoInsumo)):
+        return True
+    return isinstance(obj, Produto) and inspect(obj).attrs.preco_unitario.history.has_changes()
+
+
+def registrar_alteracao(session, datas: Optional[Iterable] = None):
+    """Anota na sessão uma alteração a invalidar quando a transação for confirmada
+
+    Args:
+        session: Sessão em que a alteração foi feita
+        datas: Datas afetadas (None = data desconhecida, invalida todos os períodos)
+    """
+    pendentes = session.info.setdefault('cache_dashboard_datas', set())
+    if datas is None:
+        pendentes.add(None)
+    else:
+        pendentes.update(_data(d) for d in datas)
+
+
+@event.listens_for(Session, 'before_flush')
+def _coletar_alteracoes(session, flush_context, instances):
+    if not cache_dashboard.ativo:
+        return
+    campos = _campos_data()
+    for objetos in (session.new, session.dirty, session.deleted):
+        for obj in objetos:
+            campo = campos.get(type(obj))
+            if campo:
+                historico = inspect(obj).attrs[campo].history
+                datas = list(historico.deleted or ()) + [getattr(obj, campo)]
+                registrar_alteracao(session, [d or date.today() for d in datas])
+            elif _afeta_custo_pratos(obj):
+                registrar_alteracao(session, [date.today()])
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _coletar_alteracoes_em_massa(estado_execucao):
+    """Inserções/atualizações em massa (session.execute(insert(...), [...]))"""
+    if not cache_dashboard.ativo or not (
+            estado_execucao.is_insert or estado_execucao.is_update or estado_execucao.is_delete):
+        return
+    mapeador = estado_execucao.bind_mapper
+    if mapeador is None:
+        return
+    from app.models.modelo_prato import Prato
+    campo = _campos_data().get(mapeador.class_)
+    if campo:
+        parametros = estado_execucao.parameters
+        if estado_execucao.is_insert and isinstance(parametros, list) and all(campo in p for p in parametros):
+            registrar_alteracao(estado_execucao.session, [p[campo] for p in parametros])
+        else:
+            registrar_alteracao(estado_execucao.session)
+    elif mapeador.class_ is Prato:
+        registrar_alteracao(estado_execucao.session, [date.today()])
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_invalidacao(session):
+    datas = session.info.pop('cache_dashboard_datas', None)
+    if datas and cache_dashboard.ativo:
+        cache_dashboard.invalidar(None if None in datas else datas)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alteracoes(session):
+    session.info.pop('cache_dashboard_datas', None)
+
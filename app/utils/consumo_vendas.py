@@ -0,0 +1,125 @@
+"""Baixa automática dos insumos consumidos pelas vendas do dia
+
+As vendas do dia são somadas por prato no banco (itens de cardápio apontam para
+o seu prato), explodidas nos insumos pela matriz de receitas e gravadas como uma
+única saída de estoque por produto, com referência "Consumo vendas AAAA-MM-DD",
+em uma única transação. Reprocessar um dia devolve ao estoque o consumo já
+lançado antes de lançar o novo.
+"""
+import time
+from datetime import date, datetime
+from typing import Dict, Optional
+
+from sqlalchemy import delete, func, insert
+
+from app.extensions import db
+from app.models.modelo_cardapio import CardapioItem
+from app.models.modelo_estoque import EstoqueMovimentacao
+from app.models.modelo_previsao import HistoricoVendas
+from app.utils.estoque_atomico import aplicar_movimentos, bloquear_produtos
+from app.utils.matriz_receitas import MatrizReceitas
+
+
+def referencia_consumo(data: date) -> str:
+    """Referência das saídas de consumo de um dia"""
+    return f'Consumo vendas {data.isoformat()}'
+
+
+def porcoes_vendidas(data: date) -> Dict[int, float]:
+    """Porções vendidas de cada prato no dia (uma consulta agrupada)"""
+    prato_id = func.coalesce(CardapioItem.prato_id, HistoricoVendas.prato_id)
+    return {
+        prato: float(quantidade)
+        for prato, quantidade in db.session.query(prato_id, func.sum(HistoricoVendas.quantidade)).outerjoin(
+            CardapioItem, HistoricoVendas.cardapio_item_id == CardapioItem.id
+        ).filter(
+            HistoricoVendas.data == data, prato_id.isnot(None)
+        ).group_by(prato_id)
+    }
+
+
+def consumir_vendas_dia(data: date, reprocessar: bool = False, limitar_ao_saldo: bool = False,
+                        matriz: Optional[MatrizReceitas] = None, commit: bool = True) -> Dict:
+    """Lança a saída de insumos consumidos pelas vendas de um dia
+
+    Args:
+        data: Dia das vendas
+        reprocessar: Se True, estorna o consumo já lançado para o dia e lança de novo;
+            caso contrário um dia já processado é ignorado
+        limitar_ao_saldo: Se True, baixa no máximo o estoque disponível e reporta a
+            falta; caso contrário a falta de saldo cancela o dia inteiro
+        matriz: Matriz de receitas já carregada (opcional, útil ao processar vários dias)
+        commit: Se True, confirma a transação ao final
+
+    Returns:
+        Dict: status ('processado', 'ja_processado' ou 'sem_vendas'), pratos,
+            produtos, consumo (por produto), faltas (por produto) e tempo_total
+
+    Raises:
+        EstoqueInsuficiente: Se algum produto não tem saldo e limitar_ao_saldo é False
+    """
+    inicio = time.perf_counter()
+    referencia = referencia_consumo(data)
+    relatorio = {'data': data, 'status': 'processado', 'pratos': 0, 'produtos': 0, 'consumo': {}, 'faltas': {}}
+
+    try:
+        anteriores = db.session.query(EstoqueMovimentacao.produto_id, EstoqueMovimentacao.quantidade).filter(
+            EstoqueMovimentacao.referencia == referencia, EstoqueMovimentacao.tipo == 'saída'
+        ).all()
+        if anteriores and not reprocessar:
+            relatorio['status'] = 'ja_processado'
+            relatorio['tempo_total'] = time.perf_counter() - inicio
+            return relatorio
+        if anteriores:
+            aplicar_movimentos(anteriores)
+            db.session.execute(delete(EstoqueMovimentacao).where(
+                EstoqueMovimentacao.referencia == referencia, EstoqueMovimentacao.tipo == 'saída'
+            ))
+
+        vendas = porcoes_vendidas(data)
+        relatorio['pratos'] = len(vendas)
+        matriz = matriz or MatrizReceitas.carregar(vendas)
+        consumo = {produto: round(q, 6) for produto, q in matriz.explodir(vendas).items() if round(q, 6) > 0}
+        if not consumo:
+            relatorio['status'] = 'sem_vendas' if not vendas else relatorio['status']
+            if commit:
+                db.session.commit()
+            relatorio['tempo_total'] = time.perf_counter() - inicio
+            return relatorio
+
+        # Estoque e preço gravados, com as linhas travadas até o commit
+        atuais = bloquear_produtos(consumo)
+        if limitar_ao_saldo:
+            for produto_id, quantidade in list(consumo.items()):
+                saldo = atuais.get(produto_id, {}).get('estoque', 0.0)
+                if quantidade > saldo:
+                    relatorio['faltas'][produto_id] = round(quantidade - saldo, 6)
+                    consumo[produto_id] = round(max(saldo, 0.0), 6)
+            consumo = {p: q for p, q in consumo.items() if q > 0}
+
+        aplicar_movimentos((produto_id, -quantidade) for produto_id, quantidade in consumo.items())
+        momento = datetime.combine(data, datetime.max.time().replace(microsecond=0))
+        if consumo:
+            db.session.execute(insert(EstoqueMovimentacao), [
+                {
+                    'produto_id': produto_id,
+                    'quantidade': quantidade,
+                    'tipo': 'saída',
+                    'data_movimentacao': momento,
+                    'referencia': referencia,
+                    'valor_unitario': atuais.get(produto_id, {}).get('preco'),
+                    'observacao': (f"Falta de {relatorio['faltas'][produto_id]} no estoque"
+                                   if produto_id in relatorio['faltas'] else None)
+                }
+                for produto_id, quantidade in consumo.items()
+            ])
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    relatorio['produtos'] = len(consumo)
+    relatorio['consumo'] = consumo
+    relatorio['tempo_total'] = time.perf_counter() - inicio
+    return relatorio
@@ -0,0 +1,177 @@
+"""Preenchimento em massa do custo registrado nas vendas (custo_unitario_snapshot)
+
+Vendas gravadas antes da existência do snapshot não têm custo registrado. Este
+módulo calcula, para cada (data, prato), o custo por porção com o preço de cada
+insumo vigente na data da venda: o preço médio do histórico de preços naquela
+data, o valor unitário da última entrada de estoque (vendas anteriores ao
+histórico) ou, sem nenhum dos dois, o preço atual do produto.
+
+Todo o cálculo é feito sobre os pares (data, prato) distintos, e não por venda,
+e gravado com UPDATEs em massa.
+"""
+import time
+from datetime import date
+from typing import Dict, Optional
+
+import pandas as pd
+from sqlalchemy import bindparam, func, select, update
+
+from app.extensions import db
+from app.models.modelo_cardapio import CardapioItem
+from app.models.modelo_estoque import EstoqueMovimentacao
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_previsao import HistoricoVendas
+from app.models.modelo_produto import Produto, ProdutoPrecoHistorico
+from app.utils.agregados_vendas import reconstruir_vendas_diarias
+from app.utils.cache_dashboard import registrar_alteracao
+
+
+def _pares_sem_custo(data_inicio: Optional[date], data_fim: Optional[date]) -> pd.DataFrame:
+    """(data, prato) distintos das vendas ainda sem custo registrado"""
+    prato_id = func.coalesce(CardapioItem.prato_id, HistoricoVendas.prato_id)
+    query = db.session.query(HistoricoVendas.data, prato_id).outerjoin(
+        CardapioItem, HistoricoVendas.cardapio_item_id == CardapioItem.id
+    ).filter(
+        HistoricoVendas.custo_unitario_snapshot.is_(None),
+        prato_id.isnot(None)
+    )
+    if data_inicio:
+        query = query.filter(HistoricoVendas.data >= data_inicio)
+    if data_fim:
+        query = query.filter(HistoricoVendas.data <= data_fim)
+    return pd.DataFrame(query.distinct().all(), columns=['data', 'prato_id'])
+
+
+def calcular_custos_historicos(pares: pd.DataFrame) -> pd.DataFrame:
+    """Custo por porção de cada (data, prato) com os preços vigentes em cada data
+
+    Args:
+        pares: DataFrame com as colunas data e prato_id
+
+    Returns:
+        pd.DataFrame: Colunas data, prato_id e custo
+    """
+    pratos = [int(p) for p in pares['prato_id'].unique()]
+    insumos = pd.DataFrame(
+        db.session.query(PratoInsumo.prato_id, PratoInsumo.produto_id, PratoInsumo.quantidade)
+        .filter(PratoInsumo.prato_id.in_(pratos)).all(),
+        columns=['prato_id', 'produto_id', 'quantidade']
+    )
+    info = pd.DataFrame(
+        db.session.query(Prato.id, Prato.porcoes_rendimento, Prato.custo_indireto)
+        .filter(Prato.id.in_(pratos)).all(),
+        columns=['prato_id', 'porcoes', 'custo_indireto']
+    )
+    produtos = [int(p) for p in insumos['produto_id'].unique()]
+    precos_atuais = {
+        produto_id: float(preco or 0)
+        for produto_id, preco in db.session.query(Produto.id, Produto.preco_unitario).filter(Produto.id.in_(produtos))
+    }
+    entradas = pd.DataFrame(
+        db.session.query(
+            EstoqueMovimentacao.produto_id, EstoqueMovimentacao.data_movimentacao, EstoqueMovimentacao.valor_unitario
+        ).filter(
+            EstoqueMovimentacao.produto_id.in_(produtos),
+            EstoqueMovimentacao.tipo == 'entrada',
+            EstoqueMovimentacao.valor_unitario.isnot(None)
+        ).all(),
+        columns=['produto_id', 'data', 'preco']
+    )
+
+    # Uma linha por (data, prato, insumo), com o preço da última entrada até a data
+    linhas = pares.merge(insumos, on='prato_id')
+    linhas['data'] = pd.to_datetime(linhas['data']).astype('datetime64[ns]')
+    linhas = linhas.sort_values('data')
+    if len(entradas):
+        # Entradas do dia valem para as vendas do mesmo dia
+        entradas['data'] = pd.to_datetime(entradas['data']).dt.normalize().astype('datetime64[ns]')
+        entradas['preco'] = entradas['preco'].astype(float)
+        linhas = pd.merge_asof(linhas, entradas.sort_values('data'), on='data', by='produto_id',
+                               direction='backward')
+    else:
+        linhas['preco'] = float('nan')
+    # O histórico de preços tem precedência; entradas e preço atual cobrem o que vem antes dele
+    datas = linhas['data'].dt.date
+    historico = ProdutoPrecoHistorico.precos_em(zip(linhas['produto_id'], datas))
+    linhas['preco'] = pd.Series(
+        [historico.get((int(p), d)) for p, d in zip(linhas['produto_id'], datas)],
+        index=linhas.index, dtype=float
+    ).fillna(linhas['preco'])
+    linhas['preco'] = linhas['preco'].fillna(linhas['produto_id'].map(precos_atuais)).fillna(0)
+    linhas['custo_direto'] = linhas['quantidade'] * linhas['preco']
+    diretos = linhas.groupby([linhas['data'].dt.date, 'prato_id'])['custo_direto'].sum()
+
+    resultado = pares.merge(info, on='prato_id', how='left')
+    resultado['custo_direto'] = [diretos.get((d, p), 0.0) for d, p in zip(resultado['data'], resultado['prato_id'])]
+    porcoes = resultado['porcoes'].fillna(0)
+    resultado['custo'] = (
+        (resultado['custo_direto'] / porcoes.where(porcoes > 0)).fillna(0)
+        + resultado['custo_indireto'].astype(float).fillna(0)
+    ).round(4)
+    return resultado[['data', 'prato_id', 'custo']]
+
+
+def preencher_custo_vendas(data_inicio: Optional[date] = None, data_fim: Optional[date] = None,
+                           reconstruir_agregado: bool = True, commit: bool = True) -> Dict:
+    """Registra o custo histórico nas vendas que ainda não o têm
+
+    Args:
+        data_inicio: Data inicial (opcional, sem limite se omitida)
+        data_fim: Data final (opcional, sem limite se omitida)
+        reconstruir_agregado: Se True, reconstrói o agregado diário das datas afetadas
+            para que o custo do dashboard use os valores registrados
+        commit: Se True, confirma a transação ao final
+
+    Returns:
+        Dict: Pares (data, prato) calculados, vendas atualizadas e tempo total
+    """
+    inicio = time.perf_counter()
+    pares = _pares_sem_custo(data_inicio, data_fim)
+    relatorio = {'pares': len(pares), 'vendas': 0}
+    if pares.empty:
+        relatorio['tempo_total'] = time.perf_counter() - inicio
+        return relatorio
+
+    custos = calcular_custos_historicos(pares)
+    parametros = [
+        {'b_data': d, 'b_prato': int(p), 'b_custo': float(c)}
+        for d, p, c in zip(custos['data'], custos['prato_id'], custos['custo'])
+    ]
+
+    tabela = HistoricoVendas.__table__
+    valores = {'custo_unitario_snapshot': bindparam('b_custo')}
+    por_prato = update(tabela).where(
+        tabela.c.data == bindparam('b_data'),
+        tabela.c.cardapio_item_id.is_(None),
+        tabela.c.prato_id == bindparam('b_prato'),
+        tabela.c.custo_unitario_snapshot.is_(None)
+    ).values(**valores)
+    por_item = update(tabela).where(
+        tabela.c.data == bindparam('b_data'),
+        tabela.c.cardapio_item_id.in_(
+            select(CardapioItem.id).where(CardapioItem.prato_id == bindparam('b_prato'))
+        ),
+        tabela.c.custo_unitario_snapshot.is_(None)
+    ).values(**valores)
+
+    try:
+        conexao = db.session.connection()
+        for stmt in (por_prato, por_item):
+            relatorio['vendas'] += max(conexao.execute(stmt, parametros).rowcount, 0)
+
+        # UPDATEs fora do ORM: expira as vendas carregadas e avisa o cache do dashboard
+        for objeto in list(db.session.identity_map.values()):
+            if isinstance(objeto, HistoricoVendas):
+                db.session.expire(objeto, ['custo_unitario_snapshot'])
+        registrar_alteracao(db.session, set(custos['data']))
+
+        if reconstruir_agregado:
+            reconstruir_vendas_diarias(min(custos['data']), max(custos['data']), commit=False)
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    relatorio['tempo_total'] = time.perf_counter() - inicio
+    return relatorio
@@ -0,0 +1,189 @@
+"""Atualização atômica do estoque (Produto.estoque_atual)
+
+Ler o estoque em Python, alterar e gravar perde atualizações quando dois
+workers movimentam o mesmo produto ao mesmo tempo, e a verificação de saldo
+pode ser contornada. Aqui cada ajuste é um único UPDATE condicional:
+
+    UPDATE produto SET estoque_atual = estoque_atual - :q
+    WHERE id = :id AND estoque_atual >= :q
+
+O banco serializa as escritas na linha (ou no arquivo, no SQLite), então o saldo
+verificado é sempre o que está gravado. Nos lotes, os produtos são atualizados
+em ordem de id, o que evita deadlocks entre transações concorrentes no
+PostgreSQL. Quem precisa ler o estoque para calcular outro valor (ex.: preço
+médio ponderado) usa bloquear_produtos, que faz SELECT ... FOR UPDATE onde o
+banco suporta. O SQLite ignora o FOR UPDATE e um SELECT comum não trava nada,
+então ali bloquear_produtos reserva o arquivo para escrita antes de ler.
+
+Nada aqui faz commit: as alterações entram na transação da sessão atual
+(alterações pendentes da sessão são gravadas antes, com flush).
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, Tuple
+
+from sqlalchemy import bindparam, false, func, select, update
+
+from app.extensions import db
+from app.models.modelo_produto import Produto
+
+# Os UPDATEs vão direto na tabela (Core): um por produto, sem o custo do ORM
+PRODUTOS = Produto.__table__
+
+# Estoque atual tratando NULL como zero
+ESTOQUE = func.coalesce(PRODUTOS.c.estoque_atual, 0)
+
+# Construídos uma vez: cada ajuste só troca os parâmetros
+_ENTRADA = update(PRODUTOS).where(PRODUTOS.c.id == bindparam('b_id')).values(
+    estoque_atual=ESTOQUE + bindparam('b_delta')
+)
+_SAIDA = _ENTRADA.where(ESTOQUE >= -bindparam('b_delta'))
+
+# UPDATE que não altera nenhuma linha: no SQLite, basta para tomar o bloqueio
+# de escrita (RESERVED) do arquivo, mantido até o fim da transação
+_RESERVAR = update(PRODUTOS).where(false()).values(id=PRODUTOS.c.id)
+
+
+class EstoqueInsuficiente(ValueError):
+    """Saída maior que o saldo do produto"""
+
+    def __init__(self, produto_id, solicitado, disponivel=None, nome=None):
+        self.produto_id = produto_id
+        self.solicitado = solicitado
+        self.disponivel = disponivel
+        descricao = nome or f'produto {produto_id}'
+        super().__init__(f'Estoque insuficiente para {descricao}. Atual: {disponivel}, Solicitado: {solicitado}')
+
+
+def _expirar(produto_ids: Iterable[int]):
+    """Descarta o estoque carregado dos produtos alterados fora do ORM"""
+    ids = set(produto_ids)
+    # A chave da identity map evita recarregar objetos já expirados só para ler o id
+    for chave, objeto in list(db.session.identity_map.items()):
+        if isinstance(objeto, Produto) and chave[1][0] in ids:
+            db.session.expire(objeto, ['estoque_atual'])
+
+
+def _ajustar(produto_id: int, delta: float):
+    """Aplica um delta com um único UPDATE; saídas só se houver saldo
+
+    Returns:
+        float ou None: Novo estoque, ou None se o produto não existe ou não tem saldo
+    """
+    conexao = db.session.connection()
+    stmt = _SAIDA if delta < 0 else _ENTRADA
+    parametros = {'b_id': produto_id, 'b_delta': delta}
+    if conexao.dialect.update_returning:
+        return conexao.execute(stmt.returning(PRODUTOS.c.estoque_atual), parametros).scalar()
+    if conexao.execute(stmt, parametros).rowcount == 0:
+        return None
+    return conexao.execute(select(PRODUTOS.c.estoque_atual).where(PRODUTOS.c.id == produto_id)).scalar()
+
+
+def _falha(produto_id: int, quantidade: float):
+    """Monta o erro de uma saída recusada (produto inexistente ou sem saldo)"""
+    linha = db.session.execute(
+        select(Produto.nome, Produto.estoque_atual).where(Produto.id == produto_id)
+    ).first()
+    if linha is None:
+        return ValueError(f'Produto com ID {produto_id} não encontrado')
+    return EstoqueInsuficiente(produto_id, quantidade, linha.estoque_atual, linha.nome)
+
+
+def repor_estoque(produto_id: int, quantidade: float) -> float:
+    """Soma uma entrada ao estoque do produto
+
+    Returns:
+        float: Novo estoque
+
+    Raises:
+        ValueError: Se o produto não existe
+    """
+    db.session.flush()
+    novo = _ajustar(produto_id, float(quantidade))
+    if novo is None:
+        raise ValueError(f'Produto com ID {produto_id} não encontrado')
+    _expirar([produto_id])
+    return float(novo)
+
+
+def baixar_estoque(produto_id: int, quantidade: float) -> float:
+    """Subtrai uma saída do estoque do produto, se houver saldo
+
+    Returns:
+        float: Novo estoque
+
+    Raises:
+        EstoqueInsuficiente: Se o saldo gravado é menor que a quantidade
+        ValueError: Se o produto não existe
+    """
+    db.session.flush()
+    novo = _ajustar(produto_id, -float(quantidade))
+    if novo is None:
+        raise _falha(produto_id, float(quantidade))
+    _expirar([produto_id])
+    return float(novo)
+
+
+def aplicar_movimentos(movimentos: Iterable[Tuple[int, float]]) -> Dict[int, float]:
+    """Aplica vários deltas (positivos para entradas, negativos para saídas) de uma vez
+
+    Os deltas de um mesmo produto são somados e os produtos atualizados em ordem
+    de id. Se algum não tiver saldo, os ajustes já feitos são desfeitos antes do
+    erro, e nenhum estoque muda.
+
+    Args:
+        movimentos: Pares (produto_id, delta)
+
+    Returns:
+        Dict[int, float]: Novo estoque de cada produto
+
+    Raises:
+        EstoqueInsuficiente: Se alguma saída excede o saldo gravado
+        ValueError: Se algum produto não existe
+    """
+    deltas = defaultdict(float)
+    for produto_id, delta in movimentos:
+        deltas[int(produto_id)] += float(delta)
+
+    db.session.flush()
+    novos = {}
+    try:
+        for produto_id in sorted(deltas):
+            novo = _ajustar(produto_id, deltas[produto_id])
+            if novo is None:
+                raise _falha(produto_id, -deltas[produto_id])
+            novos[produto_id] = float(novo)
+    except ValueError:
+        # As linhas já alteradas continuam travadas por esta transação
+        for produto_id in novos:
+            _ajustar(produto_id, -deltas[produto_id])
+        raise
+    finally:
+        _expirar(deltas)
+    return novos
+
+
+def bloquear_produtos(produto_ids: Iterable[int]) -> Dict[int, Dict]:
+    """Lê estoque e preço dos produtos travando as linhas até o fim da transação
+
+    Usa SELECT ... FOR UPDATE (em ordem de id) nos bancos que suportam. No
+    SQLite, onde o FOR UPDATE é ignorado, um UPDATE vazio toma antes o
+    bloqueio de escrita do arquivo: outras transações continuam lendo, mas
+    não gravam até o commit ou rollback desta.
+
+    Returns:
+        Dict[int, Dict]: estoque e preco atuais por id de produto
+    """
+    ids = sorted({int(p) for p in produto_ids})
+    if not ids:
+        return {}
+    if db.session.get_bind().dialect.name == 'sqlite':
+        db.session.execute(_RESERVAR)
+    linhas = db.session.execute(
+        select(Produto.id, Produto.estoque_atual, Produto.preco_unitario)
+        .where(Produto.id.in_(ids)).order_by(Produto.id).with_for_update()
+    )
+    return {
+        produto_id: {'estoque': float(estoque or 0), 'preco': float(preco or 0)}
+        for produto_id, estoque, preco in linhas
+    }
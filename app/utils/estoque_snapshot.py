@@ -0,0 +1,206 @@
+"""Snapshots de estoque e consultas de posição em uma data passada
+
+O estoque atual vive em Produto.estoque_atual, alterado no lugar a cada
+movimentação. Para responder "quanto havia (e quanto valia) no dia D", as
+posições de fechamento são gravadas periodicamente em estoque_snapshot e a
+consulta parte do snapshot mais próximo anterior a D, somando apenas as
+movimentações entre ele e D. O valor usa o preço médio vigente no instante
+(histórico de preços, ou o preço atual para produtos sem histórico).
+
+O verificador recalcula o estoque de cada produto a partir de todas as
+movimentações, sem usar snapshots, e reporta as divergências com estoque_atual.
+"""
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import and_, case, delete, func, insert, or_
+
+from app.extensions import db
+from app.models.modelo_estoque import EstoqueMovimentacao, EstoqueSnapshot
+from app.models.modelo_produto import Produto, ProdutoPrecoHistorico
+
+PERIODICIDADES = ('diario', 'mensal')
+
+# Quantidade com sinal: entradas somam, saídas subtraem
+QUANTIDADE_LIQUIDA = case(
+    (EstoqueMovimentacao.tipo == 'entrada', EstoqueMovimentacao.quantidade),
+    else_=-EstoqueMovimentacao.quantidade
+)
+
+
+def _instante(momento: Union[date, datetime]) -> datetime:
+    """Datas representam o fechamento do dia (início do dia seguinte)"""
+    if isinstance(momento, datetime):
+        return momento
+    return datetime.combine(momento + timedelta(days=1), datetime.min.time())
+
+
+def posicao_fechamento(data: date, periodicidade: str = 'diario') -> datetime:
+    """Instante de fechamento do dia ou do mês que contém a data"""
+    if periodicidade not in PERIODICIDADES:
+        raise ValueError(f'Periodicidade inválida: {periodicidade}')
+    if periodicidade == 'mensal':
+        data = (data.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return _instante(data)
+
+
+def estoque_em(momento: Union[date, datetime], produto_ids: Optional[Iterable[int]] = None) -> Dict[int, Dict]:
+    """Quantidade e valor do estoque de cada produto em um instante passado
+
+    Args:
+        momento: Data (posição no fechamento do dia) ou datetime (posição antes
+            deste instante)
+        produto_ids: Produtos consultados (opcional, todos se omitido)
+
+    Returns:
+        Dict[int, Dict]: quantidade, preco_unitario e valor por id de produto
+    """
+    limite = _instante(momento)
+    ids = None if produto_ids is None else {int(p) for p in produto_ids}
+    if ids is not None and not ids:
+        return {}
+
+    # Snapshot mais recente de cada produto até o instante
+    ultimo = db.session.query(
+        EstoqueSnapshot.produto_id, func.max(EstoqueSnapshot.posicao_em).label('posicao_em')
+    ).filter(EstoqueSnapshot.posicao_em <= limite)
+    if ids is not None:
+        ultimo = ultimo.filter(EstoqueSnapshot.produto_id.in_(ids))
+    ultimo = ultimo.group_by(EstoqueSnapshot.produto_id).subquery()
+
+    quantidades = {
+        produto_id: float(quantidade)
+        for produto_id, quantidade in db.session.query(EstoqueSnapshot.produto_id, EstoqueSnapshot.quantidade).join(
+            ultimo, and_(EstoqueSnapshot.produto_id == ultimo.c.produto_id,
+                         EstoqueSnapshot.posicao_em == ultimo.c.posicao_em)
+        )
+    }
+
+    # Apenas as movimentações entre o snapshot (ou o início, sem snapshot) e o instante
+    deltas = db.session.query(
+        EstoqueMovimentacao.produto_id, func.sum(QUANTIDADE_LIQUIDA)
+    ).outerjoin(
+        ultimo, ultimo.c.produto_id == EstoqueMovimentacao.produto_id
+    ).filter(
+        EstoqueMovimentacao.data_movimentacao < limite,
+        or_(ultimo.c.posicao_em.is_(None), EstoqueMovimentacao.data_movimentacao >= ultimo.c.posicao_em)
+    )
+    if ids is not None:
+        deltas = deltas.filter(EstoqueMovimentacao.produto_id.in_(ids))
+    for produto_id, delta in deltas.group_by(EstoqueMovimentacao.produto_id):
+        quantidades[produto_id] = quantidades.get(produto_id, 0.0) + float(delta or 0)
+
+    if ids is not None:
+        for produto_id in ids:
+            quantidades.setdefault(produto_id, 0.0)
+    if not quantidades:
+        return {}
+
+    precos = ProdutoPrecoHistorico.precos_em((p, limite) for p in quantidades)
+    faltando = [p for p in quantidades if (p, limite) not in precos]
+    precos_atuais = dict(
+        db.session.query(Produto.id, Produto.preco_unitario).filter(Produto.id.in_(faltando))
+    ) if faltando else {}
+
+    resultado = {}
+    for produto_id, quantidade in quantidades.items():
+        preco = precos.get((produto_id, limite), float(precos_atuais.get(produto_id) or 0))
+        resultado[produto_id] = {
+            'quantidade': round(quantidade, 6),
+            'preco_unitario': preco,
+            'valor': round(quantidade * preco, 2)
+        }
+    return resultado
+
+
+def valor_estoque_em(momento: Union[date, datetime]) -> float:
+    """Valor total do estoque em um instante passado"""
+    return round(sum(p['valor'] for p in estoque_em(momento).values()), 2)
+
+
+def gerar_snapshots(data: Optional[date] = None, periodicidade: str = 'diario', commit: bool = True) -> Dict:
+    """Grava a posição de fechamento de todos os produtos com movimentação
+
+    Um snapshot já existente no mesmo instante é substituído, o que permite
+    regerá-lo depois de lançamentos retroativos.
+
+    Args:
+        data: Dia (ou um dia do mês, na periodicidade mensal) a fechar; padrão: ontem
+        periodicidade: 'diario' ou 'mensal'
+        commit: Se True, confirma a transação ao final
+
+    Returns:
+        Dict: posicao_em, produtos gravados, valor total e tempo_total
+    """
+    inicio = time.perf_counter()
+    posicao = posicao_fechamento(data or date.today() - timedelta(days=1), periodicidade)
+    if posicao > datetime.now():
+        raise ValueError('Não é possível gerar snapshot de um período ainda não encerrado')
+
+    try:
+        db.session.execute(delete(EstoqueSnapshot).where(EstoqueSnapshot.posicao_em == posicao))
+        posicoes = estoque_em(posicao)
+        agora = datetime.now()
+        registros = [
+            {
+                'produto_id': produto_id,
+                'posicao_em': posicao,
+                'quantidade': p['quantidade'],
+                'preco_unitario': Decimal(str(round(p['preco_unitario'], 4))),
+                'valor': Decimal(str(p['valor'])),
+                'periodicidade': periodicidade,
+                'data_geracao': agora
+            }
+            for produto_id, p in posicoes.items()
+        ]
+        if registros:
+            db.session.execute(insert(EstoqueSnapshot), registros)
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return {
+        'posicao_em': posicao,
+        'produtos': len(registros),
+        'valor_total': round(sum(p['valor'] for p in posicoes.values()), 2),
+        'tempo_total': time.perf_counter() - inicio
+    }
+
+
+def verificar_estoque(produto_ids: Optional[Iterable[int]] = None, tolerancia: float = 1e-6) -> List[Dict]:
+    """Recalcula o estoque de cada produto a partir de todas as movimentações
+
+    Args:
+        produto_ids: Produtos verificados (opcional, todos se omitido)
+        tolerancia: Diferença máxima aceita (arredondamento de ponto flutuante)
+
+    Returns:
+        List[Dict]: produto_id, nome, estoque_atual, estoque_movimentacoes e
+            diferenca de cada produto divergente
+    """
+    ledger = db.session.query(
+        EstoqueMovimentacao.produto_id, func.sum(QUANTIDADE_LIQUIDA).label('quantidade')
+    ).group_by(EstoqueMovimentacao.produto_id).subquery()
+
+    query = db.session.query(
+        Produto.id, Produto.nome, Produto.estoque_atual, func.coalesce(ledger.c.quantidade, 0)
+    ).outerjoin(ledger, ledger.c.produto_id == Produto.id)
+    if produto_ids is not None:
+        query = query.filter(Produto.id.in_({int(p) for p in produto_ids}))
+
+    divergencias = []
+    for produto_id, nome, atual, calculado in query.order_by(Produto.id):
+        atual, calculado = float(atual or 0), float(calculado or 0)
+        if abs(atual - calculado) > tolerancia:
+            divergencias.append({
+                'produto_id': produto_id,
+                'nome': nome,
+                'estoque_atual': atual,
+                'estoque_movimentacoes': calculado,
+                'diferenca': round(atual - calculado, 6)
+            })
+    return divergencias
@@ -0,0 +1,116 @@
+"""Exportação de CSV em fluxo contínuo
+
+As linhas são lidas do banco em lotes (yield_per, com cursor do lado do
+servidor quando o driver suporta), convertidas em CSV por um gerador e
+enviadas em blocos numa resposta chunked. A memória usada não depende do
+tamanho da exportação e o download começa assim que o primeiro bloco fica
+pronto. Com ?gzip=1 o arquivo é compactado durante o envio (.csv.gz).
+"""
+import csv
+import io
+import zlib
+from datetime import date, datetime
+from typing import Iterable, Iterator, Optional, Sequence, Tuple
+
+from flask import Response, request, stream_with_context
+
+# Linhas lidas do banco por vez e linhas de CSV por bloco enviado
+LINHAS_POR_LOTE = 1000
+LINHAS_POR_BLOCO = 500
+
+
+def percorrer(query, lote: int = LINHAS_POR_LOTE):
+    """Itera sobre uma consulta em lotes, sem carregar todo o resultado
+
+    Relacionamentos usados na exportação devem ser carregados com
+    joinedload (muitos-para-um) para evitar uma consulta por linha.
+    """
+    return query.yield_per(lote)
+
+
+def gerar_csv(linhas: Iterable[Sequence], separador: str = ',',
+              linhas_por_bloco: int = LINHAS_POR_BLOCO) -> Iterator[str]:
+    """Converte linhas em blocos de texto CSV
+
+    Args:
+        linhas: Linhas a escrever, a primeira normalmente é o cabeçalho
+        separador: Separador de campos
+        linhas_por_bloco: Linhas acumuladas antes de liberar um bloco
+
+    Yields:
+        str: Trechos do CSV
+    """
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=separador, lineterminator='\n')
+    pendentes = 0
+    for linha in linhas:
+        escritor.writerow(linha)
+        pendentes += 1
+        if pendentes >= linhas_por_bloco:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pendentes = 0
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def compactar_gzip(blocos: Iterable[str], encoding: str = 'utf-8') -> Iterator[bytes]:
+    """Compacta blocos de texto em gzip à medida que são gerados"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: formato gzip
+    for bloco in blocos:
+        dados = compressor.compress(bloco.encode(encoding))
+        if dados:
+            yield dados
+    yield compressor.flush()
+
+
+def gzip_solicitado() -> bool:
+    """Indica se a requisição pediu o arquivo compactado (?gzip=1)"""
+    return request.args.get('gzip', '').lower() in ('1', 'true', 'sim')
+
+
+def periodo_solicitado() -> Tuple[Optional[date], Optional[date]]:
+    """Lê ?data_inicio e ?data_fim (AAAA-MM-DD, ambos opcionais) da requisição
+
+    Raises:
+        ValueError: Se alguma das datas não estiver no formato AAAA-MM-DD
+    """
+    datas = []
+    for nome in ('data_inicio', 'data_fim'):
+        valor = request.args.get(nome)
+        datas.append(datetime.strptime(valor, '%Y-%m-%d').date() if valor else None)
+    return datas[0], datas[1]
+
+
+def resposta_csv(linhas: Iterable[Sequence], nome_arquivo: str, separador: str = ',',
+                 compactar: Optional[bool] = None) -> Response:
+    """Resposta de download que envia o CSV em blocos
+
+    O gerador roda depois do retorno da view, dentro do contexto da requisição
+    (stream_with_context), então a sessão do banco continua disponível.
+
+    Args:
+        linhas: Linhas do CSV (pode ser um gerador sobre uma consulta)
+        nome_arquivo: Nome do arquivo sem extensão
+        separador: Separador de campos
+        compactar: Envia .csv.gz; se omitido, segue o parâmetro ?gzip da requisição
+
+    Returns:
+        Response: Resposta em fluxo com Content-Disposition de anexo
+    """
+    if compactar is None:
+        compactar = gzip_solicitado()
+
+    blocos = gerar_csv(linhas, separador)
+    if compactar:
+        corpo, mimetype, extensao = compactar_gzip(blocos), 'application/gzip', 'csv.gz'
+    else:
+        corpo, mimetype, extensao = blocos, 'text/csv', 'csv'
+
+    return Response(
+        stream_with_context(corpo),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={nome_arquivo}.{extensao}'}
+    )
+
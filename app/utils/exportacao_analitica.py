@@ -0,0 +1,435 @@
+"""Exportação colunar (Parquet ou Arrow IPC) do histórico de vendas e de desperdício
+
+Os arquivos são montados a partir de consultas em lotes (yield_per), um
+RecordBatch por lote, já com os campos derivados usados nas análises (dia da
+semana, período do dia, custo no momento da venda/perda). No modo particionado
+cada mês vira um arquivo em <destino>/<conjunto>/ano=AAAA/mes=MM/, no layout
+lido diretamente por pandas, pyarrow.dataset e DuckDB. Um manifesto guarda as
+linhas e o maior id de cada mês: uma execução noturna só reescreve os meses
+novos ou alterados (em geral apenas o mês corrente).
+"""
+import json
+import os
+import tempfile
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet as pq
+from flask import send_file
+from sqlalchemy import DateTime, extract, func
+
+from app.extensions import db
+from app.models.modelo_cardapio import CardapioItem
+from app.models.modelo_desperdicio import CategoriaDesperdicio, RegistroDesperdicio
+from app.models.modelo_prato import Prato
+from app.models.modelo_previsao import HistoricoVendas
+from app.models.modelo_produto import Produto
+from app.utils.agregados_desperdicio import filtrar_periodo
+
+# Extensão e mimetype de cada formato
+FORMATOS = {
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrow', 'application/vnd.apache.arrow.file'),
+}
+LINHAS_POR_LOTE = 10_000
+MANIFESTO = '_manifesto.json'
+
+COLUNAS_VENDAS = [
+    ('id', 'inteiro'),
+    ('data', 'data'),
+    ('ano', 'inteiro'),
+    ('mes', 'inteiro'),
+    ('dia_semana', 'inteiro'),
+    ('periodo_dia', 'texto'),
+    ('cardapio_item_id', 'inteiro'),
+    ('prato_id', 'inteiro'),
+    ('prato', 'texto'),
+    ('quantidade', 'inteiro'),
+    ('valor_unitario', 'decimal'),
+    ('valor_total', 'decimal'),
+    ('custo_unitario_snapshot', 'decimal'),
+    ('custo_total', 'decimal'),
+    ('margem_bruta', 'decimal'),
+    ('feriado', 'booleano'),
+    ('evento_especial', 'texto'),
+    ('clima', 'texto'),
+    ('temperatura', 'decimal'),
+]
+
+COLUNAS_DESPERDICIO = [
+    ('id', 'inteiro'),
+    ('data_registro', 'data_hora'),
+    ('data', 'data'),
+    ('ano', 'inteiro'),
+    ('mes', 'inteiro'),
+    ('dia_semana', 'inteiro'),
+    ('periodo_dia', 'texto'),
+    ('categoria_id', 'inteiro'),
+    ('categoria', 'texto'),
+    ('tipo_item', 'texto'),
+    ('produto_id', 'inteiro'),
+    ('prato_id', 'inteiro'),
+    ('item', 'texto'),
+    ('quantidade', 'decimal'),
+    ('unidade', 'texto'),
+    ('valor_estimado', 'decimal'),
+    ('custo_unitario', 'decimal'),
+    ('motivo', 'texto'),
+    ('responsavel', 'texto'),
+    ('local', 'texto'),
+]
+
+
+def _schema(colunas: List[Tuple[str, str]]):
+    """Schema Arrow a partir da lista de colunas do conjunto"""
+    tipos = {
+        'inteiro': pa.int64(),
+        'decimal': pa.float64(),
+        'texto': pa.string(),
+        'data': pa.date32(),
+        'data_hora': pa.timestamp('s'),
+        'booleano': pa.bool_(),
+    }
+    return pa.schema([(nome, tipos[tipo]) for nome, tipo in colunas])
+
+
+def _float(valor) -> Optional[float]:
+    return float(valor) if valor is not None else None
+
+
+def periodo_do_dia(momento: datetime) -> str:
+    """Período do dia (manhã, tarde ou noite) de um horário"""
+    if momento.hour < 12:
+        return 'manhã'
+    if momento.hour < 18:
+        return 'tarde'
+    return 'noite'
+
+
+# Vendas
+
+def _consulta_vendas(inicio: Optional[date], fim: Optional[date]):
+    """Vendas do período com o prato resolvido (direto ou pelo item do cardápio)"""
+    prato_id = func.coalesce(HistoricoVendas.prato_id, CardapioItem.prato_id)
+    query = db.session.query(
+        HistoricoVendas.id, HistoricoVendas.data, HistoricoVendas.cardapio_item_id, prato_id, Prato.nome,
+        HistoricoVendas.quantidade, HistoricoVendas.valor_unitario, HistoricoVendas.valor_total,
+        HistoricoVendas.custo_unitario_snapshot, HistoricoVendas.periodo_dia, HistoricoVendas.dia_semana,
+        HistoricoVendas.feriado, HistoricoVendas.evento_especial, HistoricoVendas.clima,
+        HistoricoVendas.temperatura
+    ).outerjoin(
+        CardapioItem, CardapioItem.id == HistoricoVendas.cardapio_item_id
+    ).outerjoin(
+        Prato, Prato.id == prato_id
+    )
+    if inicio:
+        query = query.filter(HistoricoVendas.data >= inicio)
+    if fim:
+        query = query.filter(HistoricoVendas.data <= fim)
+    return query.order_by(HistoricoVendas.data, HistoricoVendas.id)
+
+
+def _linha_venda(linha) -> tuple:
+    (id_, dia, cardapio_item_id, prato_id, prato, quantidade, valor_unitario, valor_total,
+     custo, periodo_dia, dia_semana, feriado, evento, clima, temperatura) = linha
+    custo = _float(custo)
+    custo_total = custo * quantidade if custo is not None else None
+    return (
+        id_, dia, dia.year, dia.month,
+        dia_semana if dia_semana is not None else dia.weekday(),
+        periodo_dia, cardapio_item_id, prato_id, prato, quantidade,
+        _float(valor_unitario), _float(valor_total), custo, custo_total,
+        float(valor_total) - custo_total if custo_total is not None else None,
+        bool(feriado) if feriado is not None else None, evento, clima, temperatura
+    )
+
+
+# Desperdício
+
+def _consulta_desperdicio(inicio: Optional[date], fim: Optional[date]):
+    """Registros de desperdício do período (dias inteiros) com os nomes de categoria e item"""
+    query = db.session.query(
+        RegistroDesperdicio.id, RegistroDesperdicio.data_registro, RegistroDesperdicio.categoria_id,
+        CategoriaDesperdicio.nome, RegistroDesperdicio.produto_id, RegistroDesperdicio.prato_id,
+        Produto.nome, Prato.nome, RegistroDesperdicio.quantidade, RegistroDesperdicio.unidade,
+        RegistroDesperdicio.valor_estimado, RegistroDesperdicio.motivo, RegistroDesperdicio.responsavel,
+        RegistroDesperdicio.local
+    ).outerjoin(
+        CategoriaDesperdicio, CategoriaDesperdicio.id == RegistroDesperdicio.categoria_id
+    ).outerjoin(
+        Produto, Produto.id == RegistroDesperdicio.produto_id
+    ).outerjoin(
+        Prato, Prato.id == RegistroDesperdicio.prato_id
+    )
+    query = filtrar_periodo(query, RegistroDesperdicio, inicio, fim)
+    return query.order_by(RegistroDesperdicio.data_registro, RegistroDesperdicio.id)
+
+
+def _linha_desperdicio(linha) -> tuple:
+    (id_, momento, categoria_id, categoria, produto_id, prato_id, produto, prato, quantidade, unidade,
+     valor, motivo, responsavel, local) = linha
+    valor = _float(valor)
+    dia = momento.date()
+    return (
+        id_, momento, dia, dia.year, dia.month, dia.weekday(), periodo_do_dia(momento),
+        categoria_id, categoria, 'produto' if produto_id else 'prato', produto_id, prato_id,
+        produto if produto_id else prato, quantidade, unidade, valor,
+        valor / quantidade if valor is not None and quantidade else None,
+        motivo, responsavel, local
+    )
+
+
+# Conjuntos exportáveis: colunas, consulta do período, conversão da linha e coluna de data
+CONJUNTOS = {
+    'vendas': {
+        'colunas': COLUNAS_VENDAS,
+        'consulta': _consulta_vendas,
+        'linha': _linha_venda,
+        'modelo': HistoricoVendas,
+        'data': HistoricoVendas.data,
+    },
+    'desperdicio': {
+        'colunas': COLUNAS_DESPERDICIO,
+        'consulta': _consulta_desperdicio,
+        'linha': _linha_desperdicio,
+        'modelo': RegistroDesperdicio,
+        'data': RegistroDesperdicio.data_registro,
+    },
+}
+
+
+def _conjunto(nome: str) -> Dict:
+    if nome not in CONJUNTOS:
+        raise ValueError(f'Conjunto desconhecido: {nome}. Use um de {", ".join(CONJUNTOS)}')
+    return CONJUNTOS[nome]
+
+
+def lotes_colunares(conjunto: str, inicio: Optional[date] = None, fim: Optional[date] = None,
+                    lote: int = LINHAS_POR_LOTE) -> Iterator[Dict[str, list]]:
+    """Percorre o período em lotes, cada um como colunas (nome -> lista de valores)
+
+    Args:
+        conjunto: 'vendas' ou 'desperdicio'
+        inicio: Primeiro dia (opcional)
+        fim: Último dia, incluído (opcional)
+        lote: Linhas lidas do banco e entregues por vez
+
+    Yields:
+        Dict[str, list]: Valores de cada coluna do lote
+    """
+    definicao = _conjunto(conjunto)
+    nomes = [nome for nome, _ in definicao['colunas']]
+    converter = definicao['linha']
+    linhas = []
+    for linha in definicao['consulta'](inicio, fim).yield_per(lote):
+        linhas.append(converter(linha))
+        if len(linhas) >= lote:
+            yield dict(zip(nomes, map(list, zip(*linhas))))
+            linhas = []
+    if linhas:
+        yield dict(zip(nomes, map(list, zip(*linhas))))
+
+
+def escrever_arquivo(conjunto: str, destino, formato: str, inicio: Optional[date] = None,
+                     fim: Optional[date] = None, lote: int = LINHAS_POR_LOTE) -> int:
+    """Escreve o período em um único arquivo Parquet ou Arrow IPC, lote a lote
+
+    Args:
+        conjunto: 'vendas' ou 'desperdicio'
+        destino: Caminho ou arquivo binário aberto para escrita
+        formato: 'parquet' ou 'arrow'
+        inicio: Primeiro dia (opcional)
+        fim: Último dia, incluído (opcional)
+        lote: Linhas por lote (e por RecordBatch)
+
+    Returns:
+        int: Quantidade de linhas escritas
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato desconhecido: {formato}. Use parquet ou arrow')
+
+    schema = _schema(_conjunto(conjunto)['colunas'])
+    if formato == 'parquet':
+        escritor = pq.ParquetWriter(destino, schema)
+    else:
+        escritor = pa.ipc.new_file(destino, schema)
+
+    total = 0
+    try:
+        for colunas in lotes_colunares(conjunto, inicio, fim, lote):
+            escritor.write_batch(pa.RecordBatch.from_pydict(colunas, schema=schema))
+            total += len(colunas['id'])
+    finally:
+        escritor.close()
+    return total
+
+
+# Exportação particionada por mês
+
+def _caminho_particao(base: str, ano: int, mes: int, formato: str) -> str:
+    return os.path.join(base, f'ano={ano}', f'mes={mes:02d}', f'parte.{FORMATOS[formato][0]}')
+
+
+def _remover_particao(base: str, ano: int, mes: int, exceto: Optional[str] = None):
+    for formato in FORMATOS:
+        caminho = _caminho_particao(base, ano, mes, formato)
+        if formato != exceto and os.path.exists(caminho):
+            os.remove(caminho)
+
+
+def _ler_manifesto(base: str) -> Dict[str, Dict]:
+    caminho = os.path.join(base, MANIFESTO)
+    if not os.path.exists(caminho):
+        return {}
+    with open(caminho, encoding='utf-8') as arquivo:
+        return json.load(arquivo)
+
+
+def _gravar_manifesto(base: str, manifesto: Dict[str, Dict]):
+    caminho = os.path.join(base, MANIFESTO)
+    with open(caminho + '.tmp', 'w', encoding='utf-8') as arquivo:
+        json.dump(manifesto, arquivo, indent=2, sort_keys=True)
+    os.replace(caminho + '.tmp', caminho)
+
+
+def resumo_meses(conjunto: str, inicio: Optional[date] = None,
+                 fim: Optional[date] = None) -> Dict[Tuple[int, int], Tuple[int, int]]:
+    """Linhas e maior id de cada mês com dados, em uma única consulta agrupada
+
+    Returns:
+        Dict[Tuple[int, int], Tuple[int, int]]: (linhas, max_id) por (ano, mês)
+    """
+    definicao = _conjunto(conjunto)
+    modelo, coluna = definicao['modelo'], definicao['data']
+    ano, mes = extract('year', coluna), extract('month', coluna)
+    query = db.session.query(ano, mes, func.count(modelo.id), func.max(modelo.id))
+
+    def limite(dia):
+        # data_registro é datetime; data das vendas é date
+        return datetime.combine(dia, datetime.min.time()) if isinstance(coluna.type, DateTime) else dia
+
+    if inicio:
+        query = query.filter(coluna >= limite(inicio))
+    if fim:
+        query = query.filter(coluna < limite(fim + timedelta(days=1)))
+    return {
+        (int(a), int(m)): (int(linhas), int(max_id))
+        for a, m, linhas, max_id in query.group_by(ano, mes)
+    }
+
+
+def planejar_particoes(conjunto: str, destino: str, formato: str = 'parquet',
+                       inicio: Optional[date] = None, fim: Optional[date] = None,
+                       substituir: bool = False) -> List[Dict]:
+    """Decide quais meses precisam ser escritos, mantidos ou removidos
+
+    Um mês é mantido quando o arquivo existe e o manifesto registra as mesmas
+    linhas, o mesmo maior id e o mesmo formato. Alterações que não mudam essas
+    contagens (edição de um registro antigo) exigem substituir=True.
+
+    Returns:
+        List[Dict]: ano, mes, linhas, max_id e acao ('escrever', 'manter' ou 'remover')
+    """
+    base = os.path.join(destino, conjunto)
+    manifesto = _ler_manifesto(base)
+    meses = resumo_meses(conjunto, inicio, fim)
+
+    plano = []
+    for (ano, mes), (linhas, max_id) in sorted(meses.items()):
+        registrado = manifesto.get(f'{ano}-{mes:02d}')
+        atual = (
+            not substituir
+            and registrado is not None
+            and registrado.get('formato') == formato
+            and (registrado.get('linhas'), registrado.get('max_id')) == (linhas, max_id)
+            and os.path.exists(_caminho_particao(base, ano, mes, formato))
+        )
+        plano.append({'ano': ano, 'mes': mes, 'linhas': linhas, 'max_id': max_id,
+                      'acao': 'manter' if atual else 'escrever'})
+
+    # Meses do manifesto que ficaram sem dados (registros apagados) dentro do recorte
+    for chave in sorted(manifesto):
+        ano, mes = map(int, chave.split('-'))
+        if (ano, mes) in meses:
+            continue
+        primeiro, ultimo = date(ano, mes, 1), date(ano, mes, monthrange(ano, mes)[1])
+        if (inicio and ultimo < inicio) or (fim and primeiro > fim):
+            continue
+        plano.append({'ano': ano, 'mes': mes, 'linhas': 0, 'max_id': None, 'acao': 'remover'})
+
+    return plano
+
+
+def exportar_particionado(conjunto: str, destino: str, formato: str = 'parquet',
+                          inicio: Optional[date] = None, fim: Optional[date] = None,
+                          substituir: bool = False, lote: int = LINHAS_POR_LOTE) -> List[Dict]:
+    """Exporta o conjunto em arquivos mensais, escrevendo só os meses novos ou alterados
+
+    Cada partição é escrita em um arquivo temporário e renomeada no final, de
+    modo que leitores nunca veem um mês pela metade.
+
+    Args:
+        conjunto: 'vendas' ou 'desperdicio'
+        destino: Diretório raiz (os arquivos ficam em <destino>/<conjunto>/)
+        formato: 'parquet' ou 'arrow'
+        inicio: Primeiro dia considerado (opcional)
+        fim: Último dia considerado (opcional)
+        substituir: Reescreve todos os meses do recorte
+        lote: Linhas por lote
+
+    Returns:
+        List[Dict]: O plano executado (ver planejar_particoes)
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f'Formato desconhecido: {formato}. Use parquet ou arrow')
+
+    base = os.path.join(destino, conjunto)
+    plano = planejar_particoes(conjunto, destino, formato, inicio, fim, substituir)
+    manifesto = _ler_manifesto(base)
+
+    for particao in plano:
+        ano, mes = particao['ano'], particao['mes']
+        chave = f'{ano}-{mes:02d}'
+
+        if particao['acao'] == 'remover':
+            _remover_particao(base, ano, mes)
+            manifesto.pop(chave, None)
+        elif particao['acao'] == 'escrever':
+            # Um mês exportado antes em outro formato não fica duplicado
+            _remover_particao(base, ano, mes, exceto=formato)
+            caminho = _caminho_particao(base, ano, mes, formato)
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+            linhas = escrever_arquivo(conjunto, caminho + '.tmp', formato,
+                                      date(ano, mes, 1), date(ano, mes, monthrange(ano, mes)[1]), lote)
+            os.replace(caminho + '.tmp', caminho)
+            manifesto[chave] = {
+                'formato': formato,
+                'linhas': particao['linhas'],
+                'max_id': particao['max_id'],
+                'gerado_em': datetime.now().isoformat(timespec='seconds')
+            }
+            particao['linhas_escritas'] = linhas
+
+        # Grava a cada mês: uma interrupção não perde o que já foi exportado
+        os.makedirs(base, exist_ok=True)
+        _gravar_manifesto(base, manifesto)
+
+    return plano
+
+
+def resposta_colunar(conjunto: str, formato: str, inicio: Optional[date], fim: Optional[date],
+                     nome_arquivo: str):
+    """Resposta de download com o período em um único arquivo Parquet ou Arrow
+
+    O arquivo é escrito lote a lote em um temporário em disco (Parquet precisa
+    do rodapé no fim antes de ser lido) e enviado a partir dele.
+    """
+    temporario = tempfile.TemporaryFile()
+    escrever_arquivo(conjunto, temporario, formato, inicio, fim)
+    temporario.seek(0)
+    extensao, mimetype = FORMATOS[formato]
+    return send_file(temporario, mimetype=mimetype, as_attachment=True,
+                     download_name=f'{nome_arquivo}.{extensao}')
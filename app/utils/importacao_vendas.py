@@ -0,0 +1,243 @@
+"""Importação em massa do histórico de vendas a partir de CSV
+
+O arquivo é lido em blocos (pandas, chunksize) e cada bloco é validado e
+transformado de forma vetorizada: os itens são conferidos contra os conjuntos de
+ids carregados uma única vez, dia da semana, semana do mês e mês são derivados
+em colunas e o custo por porção vigente de cada prato é registrado na venda.
+As linhas válidas são inseridas com executemany (COPY no PostgreSQL) e somadas
+ao agregado diário, tudo em uma única transação.
+
+Formato (separador ';', decimais com ',' ou '.'):
+    data;tipo_item;item_id;quantidade;valor_unitario[;periodo_dia;clima;temperatura;evento_especial]
+"""
+import csv
+import io
+import time
+from collections import defaultdict
+from decimal import Decimal
+from typing import Dict, IO, List, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models.modelo_cardapio import CardapioItem
+from app.models.modelo_prato import Prato
+from app.models.modelo_previsao import HistoricoVendas
+from app.utils.agregados_vendas import _mapa_custos_pratos, somar_totais_diarios
+from app.utils.cache_dashboard import registrar_alteracao
+
+TAMANHO_LOTE_PADRAO = 5000
+MAX_REJEICOES_DETALHADAS = 200  # Linhas rejeitadas listadas no relatório
+
+COLUNAS_OBRIGATORIAS = ['data', 'tipo_item', 'item_id', 'quantidade', 'valor_unitario']
+COLUNAS_OPCIONAIS = ['periodo_dia', 'clima', 'temperatura', 'evento_especial']
+COLUNAS_INSERCAO = [
+    'data', 'cardapio_item_id', 'prato_id', 'quantidade', 'valor_unitario', 'valor_total',
+    'custo_unitario_snapshot', 'periodo_dia', 'dia_semana', 'semana_mes', 'mes', 'feriado', 'evento_especial', 'clima', 'temperatura'
+]
+
+
+def _numero(serie: pd.Series) -> pd.Series:
+    """Converte texto com vírgula ou ponto decimal em número (NaN se inválido)"""
+    return pd.to_numeric(serie.str.strip().str.replace(',', '.', regex=False), errors='coerce')
+
+
+def _texto(serie: pd.Series) -> pd.Series:
+    """Normaliza colunas de texto opcionais (vazio vira None)"""
+    serie = serie.str.strip()
+    return serie.where(serie.notna() & (serie != ''), None)
+
+
+def _validar_bloco(bloco: pd.DataFrame, ids_pratos: List[int], ids_itens: List[int]):
+    """Valida e converte um bloco do CSV
+
+    Returns:
+        Tuple[pd.DataFrame, pd.Series]: Linhas válidas convertidas e o motivo de
+            rejeição de cada linha inválida (indexado pela linha)
+    """
+    data = pd.to_datetime(bloco['data'].str.strip(), format='%Y-%m-%d', errors='coerce')
+    tipo = bloco['tipo_item'].str.strip()
+    item_id = pd.to_numeric(bloco['item_id'], errors='coerce')
+    quantidade = pd.to_numeric(bloco['quantidade'], errors='coerce')
+    valor_unitario = _numero(bloco['valor_unitario'])
+
+    ids = item_id.fillna(-1).astype(np.int64)
+    existe = np.where(
+        tipo == 'prato', ids.isin(ids_pratos),
+        np.where(tipo == 'cardapio_item', ids.isin(ids_itens), False)
+    )
+
+    # Ordem de avaliação: o primeiro motivo encontrado é o reportado
+    motivos = pd.Series(None, index=bloco.index, dtype=object)
+    regras = [
+        (data.isna(), 'data inválida'),
+        (~tipo.isin(['prato', 'cardapio_item']), 'tipo_item inválido'),
+        (item_id.isna() | (item_id <= 0) | (item_id % 1 != 0), 'item_id inválido'),
+        (~existe, 'item não encontrado'),
+        (quantidade.isna() | (quantidade <= 0) | (quantidade % 1 != 0), 'quantidade inválida'),
+        (valor_unitario.isna() | (valor_unitario <= 0), 'valor_unitario inválido'),
+    ]
+    for condicao, motivo in reversed(regras):
+        motivos[np.asarray(condicao)] = motivo
+    validas = motivos.isna()
+
+    data = data[validas]
+    quantidade = quantidade[validas].astype(np.int64)
+    valor_unitario = valor_unitario[validas].round(2)
+    ids = ids[validas]
+    tipo = tipo[validas]
+
+    convertido = pd.DataFrame({
+        'data': data.dt.date,
+        'cardapio_item_id': ids.where(tipo == 'cardapio_item').astype('Int64'),
+        'prato_id': ids.where(tipo == 'prato').astype('Int64'),
+        'quantidade': quantidade,
+        'valor_unitario': valor_unitario,
+        'valor_total': (quantidade * valor_unitario).round(2),
+        'dia_semana': data.dt.weekday,
+        'semana_mes': (data.dt.day - 1) // 7 + 1,
+        'mes': data.dt.month,
+        'feriado': False,
+    })
+    for coluna in ('periodo_dia', 'clima', 'evento_especial'):
+        convertido[coluna] = _texto(bloco.loc[validas, coluna]) if coluna in bloco else None
+    convertido['temperatura'] = _numero(bloco.loc[validas, 'temperatura']) if 'temperatura' in bloco else np.nan
+
+    return convertido, motivos[~validas]
+
+
+def _registros(convertido: pd.DataFrame) -> List[Dict]:
+    """Converte o bloco em dicionários com tipos Python (None no lugar de NaN)"""
+    convertido = convertido[COLUNAS_INSERCAO].astype(object)
+    convertido = convertido.where(convertido.notna(), None)
+    return convertido.to_dict('records')
+
+
+def _inserir_copy(registros: List[Dict]):
+    """Insere via COPY ... FROM STDIN (PostgreSQL), na conexão da sessão atual"""
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    for r in registros:
+        escritor.writerow(['' if r[c] is None else r[c] for c in COLUNAS_INSERCAO])
+    buffer.seek(0)
+
+    # O COPY não passa pelo ORM: anota as datas para invalidar o cache do dashboard
+    registrar_alteracao(db.session, {r['data'] for r in registros})
+    conexao = db.session.connection().connection
+    with conexao.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {HistoricoVendas.__tablename__} ({', '.join(COLUNAS_INSERCAO)}) "
+            "FROM STDIN WITH (FORMAT csv)",
+            buffer
+        )
+
+
+def _inserir(registros: List[Dict]):
+    """Insere um bloco de vendas (COPY no PostgreSQL, executemany nos demais bancos)"""
+    if not registros:
+        return
+    if db.session.get_bind().dialect.name == 'postgresql':
+        _inserir_copy(registros)
+    else:
+        db.session.execute(insert(HistoricoVendas), registros)
+
+
+def _custear_bloco(convertido: pd.DataFrame, prato_por_item: Dict[int, int], custos: Dict[int, float]):
+    """Resolve o prato de cada venda e registra o custo por porção vigente"""
+    prato_id = convertido['prato_id'].fillna(convertido['cardapio_item_id'].map(prato_por_item))
+    convertido['prato'] = prato_id.fillna(-1).astype(np.int64)
+    convertido['custo_unitario_snapshot'] = convertido['prato'].map(custos).round(4)
+
+
+def _agrupar_bloco(convertido: pd.DataFrame) -> pd.DataFrame:
+    """Agrupa um bloco por (data, prato), com o custo registrado nas vendas"""
+    custo = convertido['quantidade'] * convertido['custo_unitario_snapshot'].fillna(0)
+    return convertido.assign(custo=custo, registros=1).groupby(['data', 'prato']).agg(
+        quantidade=('quantidade', 'sum'),
+        receita=('valor_total', 'sum'),
+        custo=('custo', 'sum'),
+        registros=('registros', 'sum')
+    )
+
+
+def _totais_agregado(grupos: pd.DataFrame) -> Dict:
+    """Converte os grupos (data, prato) no formato de somar_totais_diarios"""
+    grupos = grupos.groupby(level=['data', 'prato']).sum()
+    totais = {}
+    for (data, prato), quantidade, receita, custo, registros in zip(
+            grupos.index, grupos['quantidade'].tolist(), grupos['receita'].round(2).tolist(),
+            grupos['custo'].round(2).tolist(), grupos['registros'].tolist()):
+        prato = int(prato) if prato >= 0 else None
+        totais[(data, prato)] = [quantidade, Decimal(str(receita)), Decimal(str(custo)), registros]
+    return totais
+
+
+def importar_historico_csv(arquivo: Union[str, IO], tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                           delimitador: str = ';', commit: bool = True) -> Dict:
+    """Importa um CSV de histórico de vendas em uma única transação
+
+    Args:
+        arquivo: Caminho ou arquivo aberto (texto ou binário, UTF-8)
+        tamanho_lote: Linhas validadas e inseridas por vez
+        delimitador: Separador de colunas
+        commit: Se True, confirma a transação ao final
+
+    Returns:
+        Dict: lidas, importadas, rejeitadas, rejeicoes (linha, motivo e conteúdo das
+            primeiras MAX_REJEICOES_DETALHADAS), motivos (contagem), tempo_total e
+            linhas_por_segundo
+    """
+    inicio = time.perf_counter()
+
+    # Conjuntos de ids válidos e prato de cada item de cardápio (carregados uma vez)
+    ids_pratos = [i for (i,) in db.session.query(Prato.id)]
+    prato_por_item = dict(db.session.query(CardapioItem.id, CardapioItem.prato_id))
+    ids_itens = list(prato_por_item)
+    custos = _mapa_custos_pratos(ids_pratos)
+
+    grupos = []
+    relatorio = {'lidas': 0, 'importadas': 0, 'rejeitadas': 0, 'rejeicoes': [], 'motivos': defaultdict(int)}
+    try:
+        leitor = pd.read_csv(arquivo, sep=delimitador, dtype=str, chunksize=tamanho_lote,
+                             keep_default_na=False, skipinitialspace=True, encoding='utf-8')
+        for bloco in leitor:
+            bloco.columns = [c.strip().lower() for c in bloco.columns]
+            faltando = [c for c in COLUNAS_OBRIGATORIAS if c not in bloco]
+            if faltando:
+                raise ValueError(f"Colunas obrigatórias ausentes: {', '.join(faltando)}")
+
+            convertido, motivos = _validar_bloco(bloco, ids_pratos, ids_itens)
+            _custear_bloco(convertido, prato_por_item, custos)
+            _inserir(_registros(convertido))
+            grupos.append(_agrupar_bloco(convertido))
+
+            relatorio['lidas'] += len(bloco)
+            relatorio['importadas'] += len(convertido)
+            relatorio['rejeitadas'] += len(motivos)
+            for indice, motivo in motivos.items():
+                relatorio['motivos'][motivo] += 1
+                if len(relatorio['rejeicoes']) < MAX_REJEICOES_DETALHADAS:
+                    relatorio['rejeicoes'].append({
+                        'linha': int(indice) + 2,  # +1 do cabeçalho, +1 por começar em 1
+                        'motivo': motivo,
+                        'dados': {c: bloco.at[indice, c] for c in COLUNAS_OBRIGATORIAS}
+                    })
+
+        # O agregado diário é atualizado uma vez, com os totais de todos os blocos
+        if grupos:
+            somar_totais_diarios(_totais_agregado(pd.concat(grupos)))
+
+        if commit:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    relatorio['motivos'] = dict(relatorio['motivos'])
+    relatorio['tempo_total'] = time.perf_counter() - inicio
+    relatorio['linhas_por_segundo'] = (
+        relatorio['lidas'] / relatorio['tempo_total'] if relatorio['tempo_total'] > 0 else 0
+    )
+    return relatorio
@@ -0,0 +1,189 @@
+"""Receitas como matriz esparsa prato × produto
+
+Cada PratoInsumo vira uma entrada (prato, produto, quantidade por porção) em
+formato COO. Explodir as vendas (ou uma produção planejada) de vários pratos
+nos insumos é então uma multiplicação matriz-vetor esparsa, feita com numpy
+em uma única passada, sem percorrer as receitas em Python.
+
+matriz_em_cache() mantém a matriz carregada no processo; alterações em receitas
+ou no rendimento dos pratos feitas pela sessão a descartam no commit.
+"""
+import threading
+import time
+from typing import Dict, Iterable, Mapping, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.models.modelo_prato import Prato, PratoInsumo
+
+# Validade da matriz em cache: alterações feitas por outros workers aparecem
+# em no máximo este tempo (as do próprio processo invalidam na hora)
+VALIDADE_CACHE_SEGUNDOS = 60
+
+
+class MatrizReceitas:
+    """Quantidade de cada produto consumida por porção de cada prato (COO)"""
+
+    def __init__(self, prato_ids, produto_ids, coeficientes):
+        prato_ids = np.asarray(prato_ids, dtype=np.int64)
+        produto_ids = np.asarray(produto_ids, dtype=np.int64)
+        self.coeficientes = np.asarray(coeficientes, dtype=np.float64)
+
+        # Índices densos das linhas (pratos) e colunas (produtos)
+        self.pratos, self.linhas = np.unique(prato_ids, return_inverse=True)
+        self.produtos, self.colunas = np.unique(produto_ids, return_inverse=True)
+
+    @classmethod
+    def carregar(cls, prato_ids: Optional[Iterable[int]] = None) -> 'MatrizReceitas':
+        """Monta a matriz com uma consulta (todos os pratos, ou só os informados)
+
+        Pratos sem porções de rendimento não consomem insumos.
+        """
+        query = db.session.query(
+            PratoInsumo.prato_id, PratoInsumo.produto_id,
+            PratoInsumo.quantidade / Prato.porcoes_rendimento
+        ).join(Prato, Prato.id == PratoInsumo.prato_id).filter(Prato.porcoes_rendimento > 0)
+        if prato_ids is not None:
+            query = query.filter(PratoInsumo.prato_id.in_({int(p) for p in prato_ids}))
+
+        linhas = query.all()
+        if not linhas:
+            return cls([], [], [])
+        pratos, produtos, coeficientes = zip(*linhas)
+        return cls(pratos, produtos, [float(c) for c in coeficientes])
+
+    def __len__(self):
+        return len(self.coeficientes)
+
+    def vetor_pratos(self, quantidades: Mapping[int, float]) -> np.ndarray:
+        """Converte {prato_id: porções} no vetor denso das linhas da matriz
+
+        Pratos fora da matriz (sem receita) são ignorados.
+        """
+        vetor = np.zeros(len(self.pratos))
+        if not quantidades or not len(self.pratos):
+            return vetor
+        ids = np.fromiter(quantidades.keys(), dtype=np.int64, count=len(quantidades))
+        valores = np.fromiter(quantidades.values(), dtype=np.float64, count=len(quantidades))
+        posicoes = np.searchsorted(self.pratos, ids).clip(max=len(self.pratos) - 1)
+        encontrados = self.pratos[posicoes] == ids
+        np.add.at(vetor, posicoes[encontrados], valores[encontrados])
+        return vetor
+
+    def explodir_vetor(self, vetor_pratos: np.ndarray) -> np.ndarray:
+        """Multiplicação esparsa: consumo de cada produto (na ordem de self.produtos)"""
+        return np.bincount(
+            self.colunas, weights=self.coeficientes * vetor_pratos[self.linhas], minlength=len(self.produtos)
+        )
+
+    def explodir_matriz(self, porcoes: np.ndarray) -> np.ndarray:
+        """Explode várias colunas de uma vez (ex.: um dia por linha)
+
+        Args:
+            porcoes: Matriz períodos × pratos (colunas na ordem de self.pratos)
+
+        Returns:
+            np.ndarray: Matriz períodos × produtos (colunas na ordem de self.produtos)
+        """
+        resultado = np.zeros((porcoes.shape[0], len(self.produtos)))
+        np.add.at(resultado, (slice(None), self.colunas), porcoes[:, self.linhas] * self.coeficientes)
+        return resultado
+
+    def explodir(self, quantidades: Mapping[int, float]) -> Dict[int, float]:
+        """Consumo de insumos de um conjunto de porções vendidas ou produzidas
+
+        Args:
+            quantidades: Porções por id de prato
+
+        Returns:
+            Dict[int, float]: Quantidade consumida por id de produto (só os positivos)
+        """
+        consumo = self.explodir_vetor(self.vetor_pratos(quantidades))
+        usados = consumo > 0
+        return dict(zip(self.produtos[usados].tolist(), consumo[usados].tolist()))
+
+    def porcoes_possiveis(self, estoque: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Porções de cada prato que o estoque permite produzir, todas de uma vez
+
+        Para cada prato, o mínimo entre os insumos de estoque / necessidade por
+        porção; o insumo que dá o mínimo é o gargalo.
+
+        Args:
+            estoque: Estoque de cada produto, na ordem de self.produtos
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Porções inteiras por prato (na ordem de
+                self.pratos) e a entrada da matriz do insumo gargalo (produto em
+                self.colunas, necessidade por porção em self.coeficientes)
+        """
+        if not len(self.coeficientes):
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        razoes = np.clip(estoque[self.colunas], 0, None) / self.coeficientes
+
+        # Ordena por (prato, razão): a primeira entrada de cada prato é o gargalo
+        ordem = np.lexsort((razoes, self.linhas))
+        _, primeiras = np.unique(self.linhas[ordem], return_index=True)
+        gargalos = ordem[primeiras]
+        porcoes = np.floor(razoes[gargalos] + 1e-9).astype(np.int64)
+        return porcoes, gargalos
+
+
+_cache = {'matriz': None, 'carregada_em': 0.0}
+_cache_lock = threading.Lock()
+
+
+def matriz_em_cache() -> MatrizReceitas:
+    """Matriz de todos os pratos, carregada uma vez e reaproveitada entre requisições"""
+    with _cache_lock:
+        if _cache['matriz'] is None or time.monotonic() - _cache['carregada_em'] > VALIDADE_CACHE_SEGUNDOS:
+            _cache['matriz'] = MatrizReceitas.carregar()
+            _cache['carregada_em'] = time.monotonic()
+        return _cache['matriz']
+
+
+def invalidar_matriz():
+    """Descarta a matriz em cache (recarregada no próximo uso)"""
+    with _cache_lock:
+        _cache['matriz'] = None
+
+
+def _altera_receitas(obj) -> bool:
+    if isinstance(obj, PratoInsumo):
+        return True
+    return isinstance(obj, Prato) and (
+        obj.id is None or inspect(obj).attrs.porcoes_rendimento.history.has_changes()
+    )
+
+
+@event.listens_for(Session, 'before_flush')
+def _coletar_alteracoes_receitas(session, flush_context, instances):
+    for objetos in (session.new, session.dirty, session.deleted):
+        if any(_altera_receitas(obj) for obj in objetos):
+            session.info['receitas_alteradas'] = True
+            return
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _coletar_alteracoes_receitas_em_massa(estado_execucao):
+    """Inserções/atualizações em massa (session.execute(insert(PratoInsumo), [...]))"""
+    if not (estado_execucao.is_insert or estado_execucao.is_update or estado_execucao.is_delete):
+        return
+    mapeador = estado_execucao.bind_mapper
+    if mapeador is not None and mapeador.class_ in (Prato, PratoInsumo):
+        estado_execucao.session.info['receitas_alteradas'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_matriz_receitas(session):
+    if session.info.pop('receitas_alteradas', False):
+        invalidar_matriz()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alteracoes_receitas(session):
+    # A matriz pode ter sido carregada com as alterações desfeitas
+    if session.info.pop('receitas_alteradas', False):
+        invalidar_matriz()
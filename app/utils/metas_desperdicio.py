@@ -0,0 +1,241 @@
+"""Avaliação em lote das metas de redução de desperdício
+
+O valor atual de uma meta é a soma das quantidades desperdiçadas no seu escopo
+(categoria, produto e prato, quando definidos) entre a data de início e o menor
+entre hoje e a data de fim, com o último dia inteiro incluído. Em vez de uma
+consulta por meta (e por acesso a status, progresso e to_dict), avaliar_metas
+calcula todas as metas com uma única consulta agrupada por meta, sobre o
+agregado diário de desperdício.
+
+Os valores ficam em cache no processo. Um RegistroDesperdicio novo, alterado ou
+excluído descarta apenas as metas cujo escopo o inclui; alterar a própria meta
+descarta a dela, e a virada do dia descarta todas. Alterações feitas por outros
+workers aparecem em no máximo VALIDADE_CACHE_SEGUNDOS.
+"""
+import threading
+import time
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, event, func, or_
+from sqlalchemy.orm import Session
+
+from app.extensions import db
+from app.models.modelo_desperdicio import DesperdicioDiario, MetaDesperdicio, RegistroDesperdicio
+
+VALIDADE_CACHE_SEGUNDOS = 60
+
+_cache = {'dia': None, 'metas': {}}  # meta_id -> (escopo, valor, calculado_em)
+_cache_lock = threading.Lock()
+
+
+def _escopo(meta: MetaDesperdicio) -> Tuple:
+    """Filtros que determinam o valor atual de uma meta"""
+    return meta.data_inicio, meta.data_fim, meta.categoria_id, meta.produto_id, meta.prato_id
+
+
+def _no_escopo(escopo: Tuple, registro: Tuple) -> bool:
+    """Indica se um registro (dia, categoria, produto, prato) entra no valor da meta"""
+    inicio, fim, categoria_id, produto_id, prato_id = escopo
+    dia, categoria, produto, prato = registro
+    if dia is not None and not (inicio <= dia <= fim):
+        return False
+    return all(filtro is None or filtro == valor for filtro, valor in (
+        (categoria_id, categoria), (produto_id, produto), (prato_id, prato)
+    ))
+
+
+def _consultar(meta_ids: List[int], hoje: date) -> Dict[int, float]:
+    """Valor atual das metas informadas em uma consulta agrupada sobre o agregado diário"""
+    dias = and_(
+        DesperdicioDiario.data >= MetaDesperdicio.data_inicio,
+        DesperdicioDiario.data <= MetaDesperdicio.data_fim,
+        DesperdicioDiario.data <= hoje,
+        or_(MetaDesperdicio.categoria_id.is_(None), DesperdicioDiario.categoria_id == MetaDesperdicio.categoria_id),
+        or_(MetaDesperdicio.produto_id.is_(None), DesperdicioDiario.produto_id == MetaDesperdicio.produto_id),
+        or_(MetaDesperdicio.prato_id.is_(None), DesperdicioDiario.prato_id == MetaDesperdicio.prato_id)
+    )
+    query = db.session.query(
+        MetaDesperdicio.id, func.coalesce(func.sum(DesperdicioDiario.quantidade), 0)
+    ).outerjoin(DesperdicioDiario, dias).filter(
+        MetaDesperdicio.id.in_(meta_ids)
+    ).group_by(MetaDesperdicio.id)
+    return {meta_id: float(valor) for meta_id, valor in query}
+
+
+def _valor_direto(meta: MetaDesperdicio, hoje: date) -> float:
+    """Valor de uma meta ainda não gravada (sem id para a consulta agrupada)"""
+    query = db.session.query(func.coalesce(func.sum(DesperdicioDiario.quantidade), 0)).filter(
+        DesperdicioDiario.data >= meta.data_inicio,
+        DesperdicioDiario.data <= min(hoje, meta.data_fim)
+    )
+    for coluna, valor in ((DesperdicioDiario.categoria_id, meta.categoria_id),
+                          (DesperdicioDiario.produto_id, meta.produto_id),
+                          (DesperdicioDiario.prato_id, meta.prato_id)):
+        if valor is not None:
+            query = query.filter(coluna == valor)
+    return float(query.scalar() or 0)
+
+
+def _em_cache(meta: MetaDesperdicio, hoje: date) -> Optional[float]:
+    """Valor em cache da meta, se ainda válido para o escopo atual"""
+    with _cache_lock:
+        if _cache['dia'] != hoje:
+            return None
+        entrada = _cache['metas'].get(meta.id)
+    if entrada is None:
+        return None
+    escopo, valor, calculado_em = entrada
+    if escopo != _escopo(meta) or time.monotonic() - calculado_em > VALIDADE_CACHE_SEGUNDOS:
+        return None
+    return valor
+
+
+def _calcular(metas: List[MetaDesperdicio], hoje: date) -> Dict[int, float]:
+    """Valor atual das metas, consultando o banco só para as que faltam no cache"""
+    valores, faltando = {}, []
+    for meta in metas:
+        valor = _em_cache(meta, hoje)
+        if valor is None:
+            faltando.append(meta)
+        else:
+            valores[meta.id] = valor
+    if not faltando:
+        return valores
+
+    calculados = _consultar([m.id for m in faltando], hoje)
+    agora = time.monotonic()
+    with _cache_lock:
+        if _cache['dia'] != hoje:
+            _cache['dia'], _cache['metas'] = hoje, {}
+        for meta in faltando:
+            valores[meta.id] = calculados.get(meta.id, 0.0)
+            _cache['metas'][meta.id] = (_escopo(meta), valores[meta.id], agora)
+    return valores
+
+
+def valor_atual_meta(meta: MetaDesperdicio) -> float:
+    """Valor atual de uma meta (do cache, preenchido por avaliar_metas, ou consultado)"""
+    hoje = date.today()
+    if meta.id is None:
+        return _valor_direto(meta, hoje)
+    return _calcular([meta], hoje)[meta.id]
+
+
+def avaliar_metas(metas: Optional[Iterable[MetaDesperdicio]] = None) -> List[Dict]:
+    """Valor atual, progresso e status de várias metas com uma consulta agrupada
+
+    Depois da chamada, valor_atual, status, progresso e to_dict das metas
+    avaliadas leem o resultado em cache, sem novas consultas.
+
+    Args:
+        metas: Metas avaliadas (opcional, todas as ativas se omitido)
+
+    Returns:
+        List[Dict]: meta_id, descricao, valor_inicial, valor_meta, valor_atual,
+            progresso e status de cada meta, na ordem recebida
+    """
+    if metas is None:
+        metas = MetaDesperdicio.query.filter_by(ativo=True).order_by(MetaDesperdicio.data_fim).all()
+    metas = list(metas)
+
+    hoje = date.today()
+    gravadas = [m for m in metas if m.id is not None]
+    if gravadas:
+        _calcular(gravadas, hoje)
+
+    return [
+        {
+            'meta_id': meta.id,
+            'descricao': meta.descricao,
+            'valor_inicial': meta.valor_inicial,
+            'valor_meta': meta.valor_meta,
+            'valor_atual': meta.valor_atual,
+            'progresso': meta.progresso,
+            'status': meta.status
+        }
+        for meta in metas
+    ]
+
+
+def invalidar_metas(registros: Optional[Iterable[Tuple]] = None, meta_ids: Iterable[int] = ()):
+    """Descarta valores em cache
+
+    Args:
+        registros: Tuplas (dia, categoria_id, produto_id, prato_id) de registros
+            alterados; descarta as metas cujo escopo os inclui. None descarta tudo.
+        meta_ids: Metas descartadas independentemente dos registros
+    """
+    with _cache_lock:
+        if registros is None:
+            _cache['metas'].clear()
+            return
+        registros = list(registros)
+        for meta_id in list(_cache['metas']):
+            escopo = _cache['metas'][meta_id][0]
+            if meta_id in meta_ids or any(_no_escopo(escopo, r) for r in registros):
+                del _cache['metas'][meta_id]
+
+
+def _aplicar(pendentes: Dict):
+    if pendentes['tudo']:
+        invalidar_metas()
+    else:
+        invalidar_metas(pendentes['registros'], pendentes['metas'])
+
+
+def _escopo_registro(registro: RegistroDesperdicio) -> Tuple:
+    dia = registro.data_registro
+    if isinstance(dia, datetime):
+        dia = dia.date()
+    return dia, registro.categoria_id, registro.produto_id, registro.prato_id
+
+
+def _pendentes(session) -> Dict:
+    return session.info.setdefault('desperdicio_alterado', {'registros': set(), 'metas': set(), 'tudo': False})
+
+
+@event.listens_for(Session, 'before_flush')
+def _coletar_alteracoes_desperdicio(session, flush_context, instances):
+    pendentes = None
+    for objetos, alterados in ((session.new, False), (session.dirty, True), (session.deleted, False)):
+        for obj in objetos:
+            if isinstance(obj, RegistroDesperdicio):
+                pendentes = pendentes or _pendentes(session)
+                # Um registro alterado pode ter saído do escopo anterior
+                pendentes['tudo'] = pendentes['tudo'] or alterados
+                pendentes['registros'].add(_escopo_registro(obj))
+            elif isinstance(obj, MetaDesperdicio) and obj.id is not None:
+                pendentes = pendentes or _pendentes(session)
+                pendentes['metas'].add(obj.id)
+    if pendentes:
+        # A própria sessão passa a ver os novos valores antes do commit
+        _aplicar(pendentes)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _coletar_alteracoes_desperdicio_em_massa(estado_execucao):
+    """Inserções/atualizações em massa de registros ou metas e reconstruções do agregado descartam tudo"""
+    if not (estado_execucao.is_insert or estado_execucao.is_update or estado_execucao.is_delete):
+        return
+    mapeador = estado_execucao.bind_mapper
+    if mapeador is not None and (
+            mapeador.class_ in (RegistroDesperdicio, MetaDesperdicio)
+            or (mapeador.class_ is DesperdicioDiario and estado_execucao.is_delete)):
+        _pendentes(estado_execucao.session)['tudo'] = True
+        invalidar_metas()
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidar_metas_desperdicio(session):
+    pendentes = session.info.pop('desperdicio_alterado', None)
+    if pendentes:
+        _aplicar(pendentes)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_alteracoes_desperdicio(session):
+    # Valores calculados com as alterações desfeitas
+    pendentes = session.info.pop('desperdicio_alterado', None)
+    if pendentes:
+        _aplicar(pendentes)
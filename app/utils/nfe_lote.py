@@ -0,0 +1,382 @@
+"""Importação em lote de NF-e (pastas, ZIPs ou vários uploads)
+
+O processamento é feito em duas fases:
+    1. Os XMLs são lidos e validados em paralelo (pool de processos).
+    2. As notas válidas são gravadas em transações por lote: fornecedores e
+       produtos são resolvidos com uma única consulta IN cada, e notas, itens e
+       movimentações de estoque são inseridos em massa.
+"""
+import io
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, insert, update
+
+from app.extensions import db
+from app.models.modelo_estoque import EstoqueMovimentacao
+from app.models.modelo_fornecedor import Fornecedor
+from app.models.modelo_nfe import NFItem, NFNota, NFXmlBlob
+from app.models.modelo_prato import recalcular_custos_pratos
+from app.models.modelo_produto import Produto, ProdutoPrecoHistorico
+from app.utils.calculos import calcular_preco_medio_ponderado
+from app.utils.estoque_atomico import bloquear_produtos
+from app.utils.nfe_parser import NFeData, extrair_dados_nfe
+
+TAMANHO_LOTE_PADRAO = 50
+
+
+def _decodificar_xml(conteudo: bytes) -> str:
+    """Decodifica o conteúdo do arquivo (UTF-8, com fallback para Latin-1)"""
+    try:
+        return conteudo.decode('utf-8')
+    except UnicodeDecodeError:
+        return conteudo.decode('latin-1')
+
+
+def _processar_arquivo(arquivo: Tuple[str, bytes]) -> Dict:
+    """Lê e valida um XML (executado nos processos do pool)"""
+    nome, conteudo = arquivo
+    try:
+        xml_content = _decodificar_xml(conteudo)
+        return {'arquivo': nome, 'dados': extrair_dados_nfe(xml_content), 'xml': xml_content}
+    except Exception as e:
+        return {'arquivo': nome, 'erro': str(e)}
+
+
+def ler_arquivos_xml(caminho: str) -> Iterator[Tuple[str, bytes]]:
+    """Percorre um arquivo XML, um ZIP ou uma pasta (recursivamente)
+
+    Args:
+        caminho: Caminho do arquivo ou da pasta
+
+    Yields:
+        Tuple[str, bytes]: Nome e conteúdo de cada XML encontrado
+    """
+    if os.path.isdir(caminho):
+        for raiz, _, arquivos in os.walk(caminho):
+            for nome in sorted(arquivos):
+                completo = os.path.join(raiz, nome)
+                if nome.lower().endswith(('.xml', '.zip')):
+                    yield from ler_arquivos_xml(completo)
+    elif caminho.lower().endswith('.zip'):
+        with open(caminho, 'rb') as f:
+            yield from ler_zip(f.read(), os.path.basename(caminho))
+    else:
+        with open(caminho, 'rb') as f:
+            yield os.path.basename(caminho), f.read()
+
+
+def ler_zip(conteudo: bytes, nome_zip: str = '') -> Iterator[Tuple[str, bytes]]:
+    """Extrai os XMLs de um arquivo ZIP em memória"""
+    with zipfile.ZipFile(io.BytesIO(conteudo)) as zf:
+        for info in zf.infolist():
+            if not info.is_dir() and info.filename.lower().endswith('.xml'):
+                nome = f"{nome_zip}/{info.filename}" if nome_zip else info.filename
+                yield nome, zf.read(info)
+
+
+def processar_arquivos(arquivos: Iterable[Tuple[str, bytes]], processos: Optional[int] = None) -> List[Dict]:
+    """Lê e valida os XMLs, em paralelo quando há mais de um arquivo
+
+    Args:
+        arquivos: Pares (nome, conteúdo)
+        processos: Número de processos (padrão: número de CPUs; 1 desativa o pool)
+
+    Returns:
+        List[Dict]: Resultado da leitura de cada arquivo, na ordem de entrada
+    """
+    arquivos = list(arquivos)
+    if processos == 1 or len(arquivos) < 2:
+        return [_processar_arquivo(a) for a in arquivos]
+
+    chunksize = max(1, len(arquivos) // ((processos or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=processos) as executor:
+        return list(executor.map(_processar_arquivo, arquivos, chunksize=chunksize))
+
+
+def _resolver_fornecedores(notas: List[NFeData]) -> Dict[str, int]:
+    """Busca os fornecedores existentes com uma única consulta IN"""
+    cnpjs = {n.fornecedor.cnpj for n in notas}
+    if not cnpjs:
+        return {}
+    return dict(db.session.query(Fornecedor.cnpj, Fornecedor.id).filter(Fornecedor.cnpj.in_(cnpjs)))
+
+
+def _resolver_produtos(notas: List[NFeData]) -> Dict[str, Dict]:
+    """Busca os produtos existentes (por código) com uma única consulta IN"""
+    codigos = {item.codigo for n in notas for item in n.itens}
+    if not codigos:
+        return {}
+    return {
+        codigo: {'id': id_, 'estoque': float(estoque or 0), 'preco': float(preco or 0), 'alterado': False}
+        for id_, codigo, estoque, preco in db.session.query(
+            Produto.id, Produto.codigo, Produto.estoque_atual, Produto.preco_unitario
+        ).filter(Produto.codigo.in_(codigos))
+    }
+
+
+def _travar_produtos(notas: List[NFeData], produtos: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Relê (com SELECT ... FOR UPDATE onde suportado) estoque e preço dos produtos do lote"""
+    codigos = {item.codigo for n in notas for item in n.itens}
+    codigo_por_id = {produtos[c]['id']: c for c in codigos}
+    return {codigo_por_id[id_]: atual for id_, atual in bloquear_produtos(codigo_por_id).items()}
+
+
+def _gravar_lote(lote: List[Dict], fornecedores: Dict[str, int], produtos: Dict[str, Dict]):
+    """Grava um lote de notas já validadas em uma única transação"""
+    notas = [r['dados'] for r in lote]
+
+    # Fornecedores novos (uma inserção em massa)
+    novos_fornecedores = {}
+    for n in notas:
+        f = n.fornecedor
+        if f.cnpj not in fornecedores and f.cnpj not in novos_fornecedores:
+            novos_fornecedores[f.cnpj] = {
+                'cnpj': f.cnpj,
+                'razao_social': f.razao_social,
+                'inscricao_estadual': f.inscricao_estadual,
+                'endereco': f.endereco,
+                'cidade': f.cidade,
+                'estado': f.estado
+            }
+    if novos_fornecedores:
+        fornecedores.update({
+            cnpj: id_ for id_, cnpj in db.session.execute(
+                insert(Fornecedor).returning(Fornecedor.id, Fornecedor.cnpj),
+                list(novos_fornecedores.values())
+            )
+        })
+
+    # Produtos novos (uma inserção em massa)
+    novos_produtos = {}
+    for n in notas:
+        for item in n.itens:
+            if item.codigo not in produtos and item.codigo not in novos_produtos:
+                novos_produtos[item.codigo] = {
+                    'codigo': item.codigo,
+                    'nome': item.descricao,
+                    'unidade': item.unidade,
+                    'preco_unitario': item.valor_unitario,
+                    'fornecedor_id': fornecedores[n.fornecedor.cnpj]
+                }
+    if novos_produtos:
+        for id_, codigo in db.session.execute(
+            insert(Produto).returning(Produto.id, Produto.codigo),
+            list(novos_produtos.values())
+        ):
+            produtos[codigo] = {
+                'id': id_, 'estoque': 0.0, 'preco': float(novos_produtos[codigo]['preco_unitario']), 'alterado': False
+            }
+
+    # XML original, comprimido e fora da tabela de notas
+    blobs = [NFXmlBlob.montar(n.chave_acesso, r['xml']) for r, n in zip(lote, notas)]
+    blobs_existentes = {h for (h,) in db.session.query(NFXmlBlob.hash).filter(
+        NFXmlBlob.hash.in_([b['hash'] for b in blobs])
+    )}
+    novos_blobs = [b for b in blobs if b['hash'] not in blobs_existentes]
+    if novos_blobs:
+        db.session.execute(insert(NFXmlBlob), novos_blobs)
+
+    # Notas
+    ids_notas = db.session.scalars(
+        insert(NFNota).returning(NFNota.id, sort_by_parameter_order=True),
+        [
+            {
+                'chave_acesso': n.chave_acesso,
+                'numero': n.numero,
+                'serie': n.serie,
+                'data_emissao': n.data_emissao,
+                'valor_total': n.valor_total,
+                'valor_produtos': n.valor_produtos,
+                'valor_frete': n.valor_frete,
+                'valor_seguro': n.valor_seguro,
+                'valor_desconto': n.valor_desconto,
+                'valor_impostos': n.valor_impostos,
+                'fornecedor_id': fornecedores[n.fornecedor.cnpj],
+                'xml_hash': blob['hash']
+            }
+            for n, blob in zip(notas, blobs)
+        ]
+    ).all()
+
+    # Itens
+    itens = []
+    for nota_id, n in zip(ids_notas, notas):
+        for item in n.itens:
+            itens.append({
+                'nf_nota_id': nota_id,
+                'produto_id': produtos[item.codigo]['id'],
+                'num_item': item.num_item,
+                'quantidade': item.quantidade,
+                'valor_unitario': item.valor_unitario,
+                'valor_total': item.valor_total,
+                'unidade_medida': item.unidade,
+                'cfop': item.cfop,
+                'ncm': item.ncm,
+                'percentual_icms': item.icms_aliquota,
+                'valor_icms': item.icms_valor,
+                'percentual_ipi': item.ipi_aliquota,
+                'valor_ipi': item.ipi_valor
+            })
+    ids_itens = db.session.scalars(
+        insert(NFItem).returning(NFItem.id, sort_by_parameter_order=True), itens
+    ).all() if itens else []
+
+    # Estoque e preço gravados, com as linhas travadas: outro worker pode ter
+    # movimentado os produtos desde que foram carregados
+    for codigo, atual in _travar_produtos(notas, produtos).items():
+        produtos[codigo].update(atual)
+
+    # Movimentações de estoque e preço médio ponderado, na ordem das notas
+    agora = datetime.now()
+    movimentos = []
+    posicao = 0
+    for n in notas:
+        for item in n.itens:
+            produto = produtos[item.codigo]
+            produto['entrada'] = produto.get('entrada', 0.0) + item.quantidade
+            produto['preco'] = calcular_preco_medio_ponderado(
+                estoque_atual=produto['estoque'],
+                preco_atual=produto['preco'],
+                quantidade_nova=item.quantidade,
+                preco_novo=item.valor_unitario
+            )
+            produto['estoque'] += item.quantidade
+            produto['alterado'] = True
+            produto['ultima_compra'] = (item.valor_unitario, f'NF {n.numero}/{n.serie}')
+
+            movimentos.append({
+                'produto_id': produto['id'],
+                'quantidade': item.quantidade,
+                'tipo': 'entrada',
+                'data_movimentacao': agora,
+                'referencia': f'NF {n.numero}/{n.serie}',
+                'ref_id': ids_itens[posicao],
+                'valor_unitario': item.valor_unitario
+            })
+            posicao += 1
+    if movimentos:
+        db.session.execute(insert(EstoqueMovimentacao), movimentos)
+
+    # Atualização em massa dos produtos movimentados: o estoque recebe o delta
+    # (estoque_atual + entrada) e não o valor calculado aqui
+    alterados = [p for p in produtos.values() if p['alterado']]
+    if alterados:
+        tabela = Produto.__table__
+        db.session.connection().execute(
+            update(tabela).where(tabela.c.id == bindparam('b_id')).values(
+                estoque_atual=func.coalesce(tabela.c.estoque_atual, 0) + bindparam('b_entrada'),
+                preco_unitario=bindparam('b_preco')
+            ),
+            [{'b_id': p['id'], 'b_entrada': p['entrada'], 'b_preco': p['preco']} for p in alterados]
+        )
+        # A atualização em massa não passa pelo flush: recalcula o custo dos pratos
+        # e registra o histórico de preços aqui
+        recalcular_custos_pratos(produto_ids=[p['id'] for p in alterados])
+        db.session.execute(insert(ProdutoPrecoHistorico), [
+            {
+                'produto_id': p['id'],
+                'vigente_desde': agora,
+                'preco_medio': p['preco'],
+                'ultimo_preco_compra': p['ultima_compra'][0],
+                'origem': 'nfe',
+                'referencia': p['ultima_compra'][1]
+            }
+            for p in alterados
+        ])
+
+    db.session.commit()
+
+    for p in alterados:
+        p['alterado'] = False
+        p['entrada'] = 0.0
+
+    return ids_notas
+
+
+def importar_lote(arquivos: Iterable[Tuple[str, bytes]], tamanho_lote: int = TAMANHO_LOTE_PADRAO,
+                  processos: Optional[int] = None) -> Dict:
+    """Importa um conjunto de XMLs de NF-e
+
+    Args:
+        arquivos: Pares (nome, conteúdo) dos XMLs
+        tamanho_lote: Quantidade de notas gravadas por transação
+        processos: Número de processos para a leitura dos XMLs
+
+    Returns:
+        Dict: Relatório com o resultado de cada arquivo e a vazão obtida
+    """
+    inicio = time.perf_counter()
+    resultados = processar_arquivos(arquivos, processos)
+    tempo_leitura = time.perf_counter() - inicio
+
+    relatorio = []
+    validos = []
+    for r in resultados:
+        if 'erro' in r:
+            relatorio.append({'arquivo': r['arquivo'], 'status': 'erro', 'mensagem': r['erro']})
+        else:
+            r['relatorio'] = {
+                'arquivo': r['arquivo'],
+                'status': 'importada',
+                'chave_acesso': r['dados'].chave_acesso,
+                'itens': len(r['dados'].itens)
+            }
+            relatorio.append(r['relatorio'])
+            validos.append(r)
+
+    # Notas já importadas ou repetidas no próprio lote
+    chaves = {r['dados'].chave_acesso for r in validos}
+    existentes = set()
+    if chaves:
+        existentes = {c for (c,) in db.session.query(NFNota.chave_acesso).filter(NFNota.chave_acesso.in_(chaves))}
+    novos = []
+    for r in validos:
+        chave = r['dados'].chave_acesso
+        if chave in existentes:
+            r['relatorio'].update(status='duplicada', mensagem='Nota fiscal já importada')
+        else:
+            existentes.add(chave)
+            novos.append(r)
+
+    fornecedores = _resolver_fornecedores([r['dados'] for r in novos])
+    produtos = _resolver_produtos([r['dados'] for r in novos])
+
+    for i in range(0, len(novos), tamanho_lote):
+        lote = novos[i:i + tamanho_lote]
+        copia_fornecedores = dict(fornecedores)
+        copia_produtos = {k: dict(v) for k, v in produtos.items()}
+        try:
+            ids_notas = _gravar_lote(lote, fornecedores, produtos)
+            for r, nota_id in zip(lote, ids_notas):
+                r['relatorio']['nota_id'] = nota_id
+        except Exception as e:
+            db.session.rollback()
+            # Descarta o que foi criado pelo lote que falhou
+            fornecedores.clear()
+            fornecedores.update(copia_fornecedores)
+            produtos.clear()
+            produtos.update(copia_produtos)
+            for r in lote:
+                r['relatorio'].update(status='erro', mensagem=f'Falha ao gravar o lote: {str(e)}')
+
+    tempo_total = time.perf_counter() - inicio
+    importadas = [r for r in relatorio if r['status'] == 'importada']
+    total_itens = sum(r['itens'] for r in importadas)
+
+    return {
+        'arquivos': relatorio,
+        'total_arquivos': len(relatorio),
+        'importadas': len(importadas),
+        'duplicadas': sum(1 for r in relatorio if r['status'] == 'duplicada'),
+        'erros': sum(1 for r in relatorio if r['status'] == 'erro'),
+        'itens': total_itens,
+        'tempo_leitura': tempo_leitura,
+        'tempo_total': tempo_total,
+        'notas_por_segundo': len(importadas) / tempo_total if tempo_total > 0 else 0,
+        'itens_por_segundo': total_itens / tempo_total if tempo_total > 0 else 0
+    }
@@ -1,6 +1,7 @@
-import xmltodict
+import os
+import xml.etree.ElementTree as ET
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Union, IO
 from pydantic import BaseModel, Field, validator
 
 class NFeItemData(BaseModel):
@@ -23,10 +24,13 @@ class NFeFornecedorData(BaseModel):
     """Modelo Pydantic para o fornecedor da NF-e"""
     cnpj: str
     razao_social: str
+    nome_fantasia: Optional[str] = None
     inscricao_estadual: Optional[str] = None
     endereco: Optional[str] = None
     cidade: Optional[str] = None
     estado: Optional[str] = None
+    cep: Optional[str] = None
+    telefone: Optional[str] = None
     
     @validator('cnpj')
     def cnpj_deve_ser_valido(cls, v):
@@ -68,7 +72,224 @@ class NFeData(BaseModel):
         
         return v
 
-def extrair_dados_nfe(xml_content: str) -> NFeData:
+TAMANHO_BLOCO = 64 * 1024  # Bytes/caracteres entregues ao parser por vez
+
+# Tags qualificadas pelo namespace da NF-e, pré-compiladas para a leitura incremental
+NS_NFE = '{http://www.portalfiscal.inf.br/nfe}'
+_SECOES = ('infNFe', 'ide', 'emit', 'det', 'total', 'infProt', 'Signature')
+_LOCAL = {}
+for _nome in _SECOES + ('prod', 'imposto', 'ICMS', 'IPI', 'enderEmit', 'ICMSTot'):
+    _LOCAL[NS_NFE + _nome] = _nome
+    _LOCAL[_nome] = _nome
+_LOCAL['{http://www.w3.org/2000/09/xmldsig#}Signature'] = 'Signature'
+
+
+def _local(tag: str) -> str:
+    """Nome da tag sem namespace (consulta pré-compilada, com fallback)"""
+    nome = _LOCAL.get(tag)
+    if nome is None:
+        nome = tag.rpartition('}')[2]
+    return nome
+
+
+def _filhos(elem) -> Dict[str, Any]:
+    """Mapeia os filhos diretos de um elemento pelo nome local (uma única passada)"""
+    return {_local(filho.tag): filho for filho in elem}
+
+
+def _texto(filhos: Dict[str, Any], nome: str, padrao: Optional[str] = None) -> Optional[str]:
+    elem = filhos.get(nome)
+    if elem is None or elem.text is None:
+        return padrao
+    return elem.text.strip()
+
+
+def _numero(filhos: Dict[str, Any], nome: str, padrao: float = 0.0) -> float:
+    valor = _texto(filhos, nome)
+    return float(valor) if valor not in (None, '') else padrao
+
+
+def _primeiro_grupo(elem):
+    """Retorna o primeiro subgrupo com filhos (ex.: ICMS00 dentro de ICMS, IPITrib dentro de IPI)"""
+    if elem is None:
+        return None
+    for filho in elem:
+        if len(filho):
+            return _filhos(filho)
+    return None
+
+
+def _extrair_item(det) -> NFeItemData:
+    """Converte um elemento <det> em NFeItemData"""
+    partes = _filhos(det)
+    prod = _filhos(partes['prod'])
+    
+    icms_valor = icms_aliquota = ipi_valor = ipi_aliquota = None
+    imposto = partes.get('imposto')
+    if imposto is not None:
+        impostos = _filhos(imposto)
+        icms = _primeiro_grupo(impostos.get('ICMS'))
+        if icms is not None:
+            icms_valor = _numero(icms, 'vICMS')
+            icms_aliquota = _numero(icms, 'pICMS')
+        ipi = _primeiro_grupo(impostos.get('IPI'))
+        if ipi is not None:
+            ipi_valor = _numero(ipi, 'vIPI')
+            ipi_aliquota = _numero(ipi, 'pIPI')
+    
+    return NFeItemData(
+        num_item=int(det.get('nItem')),
+        codigo=_texto(prod, 'cProd'),
+        descricao=_texto(prod, 'xProd'),
+        unidade=_texto(prod, 'uCom'),
+        quantidade=_numero(prod, 'qCom'),
+        valor_unitario=_numero(prod, 'vUnCom'),
+        valor_total=_numero(prod, 'vProd'),
+        ncm=_texto(prod, 'NCM'),
+        cfop=_texto(prod, 'CFOP'),
+        icms_valor=icms_valor,
+        icms_aliquota=icms_aliquota,
+        ipi_valor=ipi_valor,
+        ipi_aliquota=ipi_aliquota
+    )
+
+
+def _extrair_fornecedor(emit) -> NFeFornecedorData:
+    """Converte o elemento <emit> em NFeFornecedorData"""
+    dados = _filhos(emit)
+    endereco = cidade = estado = cep = telefone = None
+    if 'enderEmit' in dados:
+        end = _filhos(dados['enderEmit'])
+        endereco = f"{_texto(end, 'xLgr', '')}, {_texto(end, 'nro', '')} - {_texto(end, 'xBairro', '')}"
+        cidade = _texto(end, 'xMun')
+        estado = _texto(end, 'UF')
+        cep = _texto(end, 'CEP')
+        telefone = _texto(end, 'fone')
+    
+    return NFeFornecedorData(
+        cnpj=_texto(dados, 'CNPJ') or _texto(dados, 'CPF', ''),
+        razao_social=_texto(dados, 'xNome'),
+        nome_fantasia=_texto(dados, 'xFant'),
+        inscricao_estadual=_texto(dados, 'IE'),
+        endereco=endereco,
+        cidade=cidade,
+        estado=estado,
+        cep=cep,
+        telefone=telefone
+    )
+
+
+def _sem_bom(texto: str) -> str:
+    """Remove a marca de ordem de bytes (BOM) deixada no início de textos decodificados com 'utf-8'"""
+    return texto[1:] if texto.startswith('\ufeff') else texto
+
+
+def _blocos_arquivo(arquivo: IO):
+    """Lê um arquivo aberto (binário ou texto) em blocos até o fim"""
+    bloco = arquivo.read(TAMANHO_BLOCO)
+    fim = type(bloco)()  # b'' em arquivos binários, '' em arquivos de texto
+    yield _sem_bom(bloco) if isinstance(bloco, str) else bloco
+    yield from iter(lambda: arquivo.read(TAMANHO_BLOCO), fim)
+
+
+def _blocos(fonte: Union[str, bytes, os.PathLike, IO]):
+    """Fatia a fonte em blocos para o parser incremental
+    
+    str e bytes são sempre o conteúdo do XML (nunca um caminho), fatiados sem
+    cópias intermediárias; caminhos são aceitos apenas como os.PathLike.
+    """
+    if isinstance(fonte, str):
+        fonte = _sem_bom(fonte)
+    if isinstance(fonte, (str, bytes)):
+        for i in range(0, len(fonte), TAMANHO_BLOCO):
+            yield fonte[i:i + TAMANHO_BLOCO]
+    elif isinstance(fonte, os.PathLike):
+        with open(fonte, 'rb') as arquivo:
+            yield from _blocos_arquivo(arquivo)
+    else:
+        yield from _blocos_arquivo(fonte)
+
+
+def _eventos(fonte: Union[str, bytes, os.PathLike, IO]):
+    """Gera os eventos de fim de tag alimentando o parser em blocos"""
+    parser = ET.XMLPullParser(events=('end',))
+    for bloco in _blocos(fonte):
+        parser.feed(bloco)
+        yield from parser.read_events()
+    parser.close()
+    yield from parser.read_events()
+
+
+def ler_nfe(fonte: Union[str, bytes, os.PathLike, IO]) -> NFeData:
+    """Lê uma NF-e de forma incremental (iterparse), percorrendo o documento uma única vez
+    
+    Cada <det> é convertido e esvaziado assim que termina, de modo que a árvore
+    XML não cresce com a quantidade de itens da nota.
+    
+    Args:
+        fonte: Conteúdo do XML (str/bytes), caminho (os.PathLike) ou objeto de arquivo
+        
+    Returns:
+        NFeData: Modelo Pydantic com os dados da NF-e
+    """
+    encontrou_inf_nfe = False
+    chave_id = chave_protocolo = None
+    ide = totais = fornecedor = None
+    itens = []
+    
+    for _, elem in _eventos(fonte):
+        nome = _LOCAL.get(elem.tag)
+        if nome is None:
+            continue
+        
+        if nome == 'det':
+            itens.append(_extrair_item(elem))
+        elif nome == 'ide':
+            ide = _filhos(elem)
+        elif nome == 'emit':
+            fornecedor = _extrair_fornecedor(elem)
+        elif nome == 'total':
+            totais = _filhos(_filhos(elem)['ICMSTot'])
+        elif nome == 'infProt':
+            chave_protocolo = _texto(_filhos(elem), 'chNFe')
+        elif nome == 'infNFe':
+            encontrou_inf_nfe = True
+            chave_id = elem.get('Id')
+        elif nome != 'Signature':
+            continue
+        
+        # Libera o conteúdo do elemento já processado
+        elem.clear()
+    
+    if not encontrou_inf_nfe or ide is None or fornecedor is None or totais is None:
+        raise ValueError("Estrutura da NF-e inválida: Tag 'infNFe' não encontrada ou incompleta.")
+    
+    chave_acesso = chave_protocolo
+    if not chave_acesso and chave_id and chave_id.startswith('NFe'):
+        chave_acesso = chave_id[3:]
+    if not chave_acesso:
+        raise ValueError('Chave de acesso não encontrada no XML')
+    
+    data_str = _texto(ide, 'dhEmi') or _texto(ide, 'dEmi')
+    data_emissao = datetime.strptime(data_str.split('T')[0], '%Y-%m-%d')
+    
+    return NFeData(
+        chave_acesso=chave_acesso,
+        numero=_texto(ide, 'nNF'),
+        serie=_texto(ide, 'serie'),
+        data_emissao=data_emissao,
+        valor_produtos=_numero(totais, 'vProd'),
+        valor_total=_numero(totais, 'vNF'),
+        valor_frete=_numero(totais, 'vFrete'),
+        valor_seguro=_numero(totais, 'vSeg'),
+        valor_desconto=_numero(totais, 'vDesc'),
+        valor_impostos=_numero(totais, 'vIPI') + _numero(totais, 'vICMS'),
+        fornecedor=fornecedor,
+        itens=itens
+    )
+
+
+def extrair_dados_nfe(xml_content: Union[str, bytes]) -> NFeData:
     """Extrai os dados principais de um XML de NF-e
     
     Args:
@@ -81,125 +302,6 @@ def extrair_dados_nfe(xml_content: str) -> NFeData:
         ValueError: Se o XML nu00e3o estiver no formato esperado ou faltar informau00e7u00f5es
     """
     try:
-        # Converter XML para dicionu00e1rio
-        xml_dict = xmltodict.parse(xml_content)
-        
-        # Extrair os dados principais da NF-e
-        nfe = xml_dict['nfeProc']['NFe']['infNFe']
-        
-        # Extrair chave de acesso
-        chave_acesso = xml_dict['nfeProc']['protNFe']['infProt']['chNFe']
-        
-        # Informau00e7u00f5es da Nota
-        ide = nfe['ide']
-        numero = ide['nNF']
-        serie = ide['serie']
-        data_emissao = datetime.strptime(ide['dhEmi'].split('T')[0], '%Y-%m-%d')
-        
-        # Informau00e7u00f5es do Fornecedor (Emitente)
-        emit = nfe['emit']
-        cnpj = emit['CNPJ']
-        razao_social = emit['xNome']
-        inscricao_estadual = emit.get('IE')
-        
-        # Endereu00e7o do Fornecedor
-        endereco = None
-        cidade = None
-        estado = None
-        if 'enderEmit' in emit:
-            end = emit['enderEmit']
-            endereco = f"{end.get('xLgr', '')}, {end.get('nro', '')} - {end.get('xBairro', '')}"
-            cidade = end.get('xMun')
-            estado = end.get('UF')
-        
-        # Valores Totais
-        total = nfe['total']['ICMSTot']
-        valor_produtos = float(total['vProd'])
-        valor_total = float(total['vNF'])
-        valor_frete = float(total.get('vFrete', 0))
-        valor_seguro = float(total.get('vSeg', 0))
-        valor_desconto = float(total.get('vDesc', 0))
-        valor_impostos = float(total.get('vIPI', 0)) + float(total.get('vICMS', 0))
-        
-        # Criar modelo do fornecedor
-        fornecedor_data = NFeFornecedorData(
-            cnpj=cnpj,
-            razao_social=razao_social,
-            inscricao_estadual=inscricao_estadual,
-            endereco=endereco,
-            cidade=cidade,
-            estado=estado
-        )
-        
-        # Itens da Nota
-        itens_list = []
-        det = nfe['det']
-        
-        # Se tiver apenas um item, colocu00e1-lo numa lista
-        if isinstance(det, dict):
-            det = [det]
-        
-        for item in det:
-            num_item = int(item['@nItem'])
-            prod = item['prod']
-            
-            # Extrair informau00e7u00f5es fiscais (ICMS, IPI)
-            icms_valor = None
-            icms_aliquota = None
-            ipi_valor = None
-            ipi_aliquota = None
-            
-            if 'imposto' in item:
-                if 'ICMS' in item['imposto']:
-                    for _, icms_data in item['imposto']['ICMS'].items():
-                        if isinstance(icms_data, dict):
-                            icms_valor = float(icms_data.get('vICMS', 0))
-                            icms_aliquota = float(icms_data.get('pICMS', 0))
-                            break
-                
-                if 'IPI' in item['imposto']:
-                    for _, ipi_data in item['imposto']['IPI'].items():
-                        if isinstance(ipi_data, dict):
-                            ipi_valor = float(ipi_data.get('vIPI', 0))
-                            ipi_aliquota = float(ipi_data.get('pIPI', 0))
-                            break
-            
-            # Criar modelo do item
-            item_data = NFeItemData(
-                num_item=num_item,
-                codigo=prod['cProd'],
-                descricao=prod['xProd'],
-                unidade=prod['uCom'],
-                quantidade=float(prod['qCom']),
-                valor_unitario=float(prod['vUnCom']),
-                valor_total=float(prod['vProd']),
-                ncm=prod.get('NCM'),
-                cfop=prod.get('CFOP'),
-                icms_valor=icms_valor,
-                icms_aliquota=icms_aliquota,
-                ipi_valor=ipi_valor,
-                ipi_aliquota=ipi_aliquota
-            )
-            
-            itens_list.append(item_data)
-        
-        # Criar modelo completo da NF-e
-        nfe_data = NFeData(
-            chave_acesso=chave_acesso,
-            numero=numero,
-            serie=serie,
-            data_emissao=data_emissao,
-            valor_produtos=valor_produtos,
-            valor_total=valor_total,
-            valor_frete=valor_frete,
-            valor_seguro=valor_seguro,
-            valor_desconto=valor_desconto,
-            valor_impostos=valor_impostos,
-            fornecedor=fornecedor_data,
-            itens=itens_list
-        )
-        
-        return nfe_data
-        
+        return ler_nfe(xml_content)
     except Exception as e:
         raise ValueError(f"Erro ao processar XML da NF-e: {str(e)}")
@@ -0,0 +1,214 @@
+"""Planejamento de compras (MRP) a partir das previsões de demanda
+
+A previsão vigente de cada item (a mais recente, preferindo o método marcado
+como melhor no backtest) é convertida em porções por prato e por dia e
+explodida nos insumos pela matriz de receitas, resultando em uma matriz
+dias × produtos. Essa matriz fica em cache por versão das previsões: planejar
+outro horizonte só soma as linhas do período, e a única consulta por chamada é
+a do estoque e dos fornecedores.
+
+A necessidade líquida de cada produto é a demanda do período mais o estoque
+mínimo, menos o estoque atual; as sugestões são agrupadas por fornecedor.
+"""
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, or_
+
+from app.extensions import db
+from app.models.modelo_cardapio import CardapioItem
+from app.models.modelo_fornecedor import Fornecedor
+from app.models.modelo_previsao import PrevisaoDemanda, ResultadoBacktest
+from app.models.modelo_produto import Produto
+from app.utils.matriz_receitas import MatrizReceitas, matriz_em_cache
+
+MAX_VERSOES_EM_CACHE = 4
+
+
+@dataclass
+class DemandaInsumos:
+    """Demanda diária prevista de cada insumo (dias × produtos)"""
+    versao: Tuple
+    matriz_receitas: MatrizReceitas
+    datas: np.ndarray  # datetime64[D], ordenadas
+    produtos: np.ndarray
+    valores: np.ndarray
+    previsoes: int
+
+    def somar(self, data_inicio: date, data_fim: date) -> np.ndarray:
+        """Demanda total de cada produto no período (na ordem de self.produtos)"""
+        inicio = np.searchsorted(self.datas, np.datetime64(data_inicio, 'D'), side='left')
+        fim = np.searchsorted(self.datas, np.datetime64(data_fim, 'D'), side='right')
+        return self.valores[inicio:fim].sum(axis=0)
+
+
+_cache: 'OrderedDict[Tuple, DemandaInsumos]' = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def versao_previsoes() -> Tuple:
+    """Identifica o conjunto atual de previsões e resultados de backtest"""
+    previsoes = db.session.query(func.count(PrevisaoDemanda.id), func.max(PrevisaoDemanda.id)).one()
+    backtest = db.session.query(func.max(ResultadoBacktest.id)).scalar()
+    return tuple(previsoes) + (backtest,)
+
+
+def _previsoes_vigentes() -> List[int]:
+    """Id da previsão vigente de cada item: a mais recente, preferindo o melhor método"""
+    previsoes = pd.DataFrame(
+        db.session.query(
+            PrevisaoDemanda.id, PrevisaoDemanda.cardapio_item_id, PrevisaoDemanda.prato_id, PrevisaoDemanda.metodo
+        ).all(),
+        columns=['id', 'cardapio_item_id', 'prato_id', 'metodo']
+    )
+    if previsoes.empty:
+        return []
+    melhores = pd.DataFrame(
+        db.session.query(ResultadoBacktest.cardapio_item_id, ResultadoBacktest.prato_id, ResultadoBacktest.metodo)
+        .filter(ResultadoBacktest.melhor.is_(True)).all(),
+        columns=['cardapio_item_id', 'prato_id', 'metodo']
+    )
+    chave = ['cardapio_item_id', 'prato_id']
+    for tabela in (previsoes, melhores):
+        tabela[chave] = tabela[chave].astype('Int64').fillna(-1)
+    melhores['preferida'] = True
+    previsoes = previsoes.merge(melhores, on=chave + ['metodo'], how='left')
+    previsoes['preferida'] = previsoes['preferida'].fillna(False).astype(bool)
+    previsoes = previsoes.sort_values(['preferida', 'id']).groupby(chave).tail(1)
+    return [int(i) for i in previsoes['id']]
+
+
+def _carregar_demanda(versao: Tuple, matriz: MatrizReceitas) -> DemandaInsumos:
+    """Monta a matriz dias × produtos a partir das previsões vigentes"""
+    ids = _previsoes_vigentes()
+    prato_por_item = dict(db.session.query(CardapioItem.id, CardapioItem.prato_id))
+
+    porcoes = {}  # (data, prato) -> porções
+    for cardapio_item_id, prato_id, valores in db.session.query(
+            PrevisaoDemanda.cardapio_item_id, PrevisaoDemanda.prato_id, PrevisaoDemanda.valores_previstos
+    ).filter(PrevisaoDemanda.id.in_(ids)) if ids else []:
+        prato = prato_id if prato_id is not None else prato_por_item.get(cardapio_item_id)
+        if prato is None or not valores:
+            continue
+        for dia, quantidade in json.loads(valores).items():
+            if quantidade:
+                porcoes[(dia, prato)] = porcoes.get((dia, prato), 0.0) + float(quantidade)
+
+    if not porcoes:
+        return DemandaInsumos(versao, matriz, np.array([], dtype='datetime64[D]'), matriz.produtos,
+                              np.zeros((0, len(matriz.produtos))), len(ids))
+
+    dias, pratos = zip(*porcoes)
+    datas, linhas = np.unique(np.array(dias, dtype='datetime64[D]'), return_inverse=True)
+    vendas = np.zeros((len(datas), len(matriz.pratos)))
+    posicoes = np.searchsorted(matriz.pratos, pratos).clip(max=max(len(matriz.pratos) - 1, 0))
+    com_receita = matriz.pratos[posicoes] == np.asarray(pratos) if len(matriz.pratos) else np.zeros(len(pratos), bool)
+    np.add.at(vendas, (linhas[com_receita], posicoes[com_receita]),
+              np.fromiter(porcoes.values(), dtype=np.float64)[com_receita])
+
+    return DemandaInsumos(versao, matriz, datas, matriz.produtos, matriz.explodir_matriz(vendas), len(ids))
+
+
+def demanda_insumos() -> DemandaInsumos:
+    """Demanda diária de insumos da versão atual das previsões (em cache)"""
+    versao = versao_previsoes()
+    matriz = matriz_em_cache()
+    with _cache_lock:
+        demanda = _cache.get(versao)
+        if demanda is not None and demanda.matriz_receitas is matriz:
+            _cache.move_to_end(versao)
+            return demanda
+
+    demanda = _carregar_demanda(versao, matriz)
+    with _cache_lock:
+        _cache[versao] = demanda
+        while len(_cache) > MAX_VERSOES_EM_CACHE:
+            _cache.popitem(last=False)
+    return demanda
+
+
+def limpar_cache():
+    """Descarta as demandas calculadas"""
+    with _cache_lock:
+        _cache.clear()
+
+
+def planejar_compras(data_inicio: date, data_fim: date, considerar_estoque_minimo: bool = True) -> Dict:
+    """Lista de compras sugerida para atender a demanda prevista no período
+
+    Args:
+        data_inicio: Primeiro dia do horizonte
+        data_fim: Último dia do horizonte
+        considerar_estoque_minimo: Se True, a compra também repõe o estoque mínimo
+
+    Returns:
+        Dict: data_inicio, data_fim, previsoes (vigentes usadas), fornecedores (cada
+            um com itens e valor_total, do maior valor para o menor) e valor_total
+    """
+    if data_fim < data_inicio:
+        raise ValueError('A data final deve ser posterior à data inicial')
+
+    demanda = demanda_insumos()
+    necessidade = demanda.somar(data_inicio, data_fim)
+    relatorio = {
+        'data_inicio': data_inicio.isoformat(),
+        'data_fim': data_fim.isoformat(),
+        'previsoes': demanda.previsoes,
+        'fornecedores': [],
+        'valor_total': 0.0
+    }
+    com_demanda = necessidade > 0
+    if not com_demanda.any() and not considerar_estoque_minimo:
+        return relatorio
+
+    query = db.session.query(
+        Produto.id, Produto.nome, Produto.unidade, Produto.estoque_atual, Produto.estoque_minimo,
+        Produto.preco_unitario, Produto.fornecedor_id, Fornecedor.razao_social
+    ).outerjoin(Fornecedor, Fornecedor.id == Produto.fornecedor_id)
+    if considerar_estoque_minimo:
+        query = query.filter(or_(
+            Produto.id.in_(demanda.produtos[com_demanda].tolist()),
+            Produto.estoque_atual < Produto.estoque_minimo
+        ))
+    else:
+        query = query.filter(Produto.id.in_(demanda.produtos[com_demanda].tolist()))
+
+    por_produto = dict(zip(demanda.produtos.tolist(), necessidade.tolist()))
+    fornecedores = {}
+    for produto_id, nome, unidade, estoque, minimo, preco, fornecedor_id, razao_social in query:
+        previsto = por_produto.get(produto_id, 0.0)
+        alvo = previsto + (float(minimo or 0) if considerar_estoque_minimo else 0.0)
+        sugerido = round(alvo - float(estoque or 0), 3)
+        if sugerido <= 0:
+            continue
+        grupo = fornecedores.setdefault(fornecedor_id, {
+            'fornecedor_id': fornecedor_id,
+            'fornecedor': razao_social or 'Sem fornecedor',
+            'itens': [],
+            'valor_total': 0.0
+        })
+        valor = round(sugerido * float(preco or 0), 2)
+        grupo['itens'].append({
+            'produto_id': produto_id,
+            'nome': nome,
+            'unidade': unidade,
+            'necessidade_prevista': round(previsto, 3),
+            'estoque_atual': float(estoque or 0),
+            'estoque_minimo': float(minimo or 0),
+            'quantidade_sugerida': sugerido,
+            'preco_unitario': float(preco or 0),
+            'valor_estimado': valor
+        })
+        grupo['valor_total'] = round(grupo['valor_total'] + valor, 2)
+
+    for grupo in fornecedores.values():
+        grupo['itens'].sort(key=lambda i: i['nome'])
+    relatorio['fornecedores'] = sorted(fornecedores.values(), key=lambda g: -g['valor_total'])
+    relatorio['valor_total'] = round(sum(g['valor_total'] for g in fornecedores.values()), 2)
+    return relatorio
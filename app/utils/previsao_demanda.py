@@ -0,0 +1,492 @@
+"""Previsão de demanda vetorizada para todos os itens de uma vez
+
+O histórico de vendas da janela é lido em uma única consulta e organizado em uma
+matriz data × item. As previsões são calculadas para todas as colunas ao mesmo
+tempo com NumPy. Os dias anteriores à primeira venda de cada item ficam como
+NaN, para que itens novos não sejam penalizados por zeros artificiais.
+"""
+import json
+import time
+import warnings
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, insert
+
+from app.extensions import db
+from app.models.modelo_previsao import HistoricoVendas, PrevisaoDemanda
+from app.utils.sazonalidade import IndiceSazonalidade, carregar_eventos
+
+METODOS = ('media_movel', 'regressao_linear', 'sazonalidade')
+MIN_DIAS_COM_VENDA = 5  # Mesmo mínimo de pontos exigido por gerar_previsao
+
+# Holt-Winters: ciclo semanal e grade de parâmetros testada para cada item
+PERIODO_SEMANAL = 7
+GRADE_HOLT_WINTERS = {
+    'alfa': (0.05, 0.1, 0.2, 0.3, 0.5, 0.8),
+    'beta': (0.0, 0.01, 0.05, 0.1),
+    'gama': (0.05, 0.1, 0.2, 0.4),
+}
+TAMANHO_BLOCO_HW = 500  # Itens processados juntos (limita a memória da grade)
+EPSILON = 1e-6
+
+
+@dataclass
+class MatrizVendas:
+    """Histórico de vendas organizado como matriz (dias × itens)"""
+    datas: List[date]
+    itens: List[Tuple[str, int]]  # (tipo_item, item_id), na ordem das colunas
+    valores: np.ndarray  # float64, NaN antes da primeira venda de cada item
+
+    @property
+    def dias_semana(self) -> np.ndarray:
+        """Dia da semana (0 = segunda) de cada linha da matriz"""
+        return _dias_semana(self.datas)
+
+
+def _dias_semana(datas: List[date]) -> np.ndarray:
+    if not datas:
+        return np.zeros(0, dtype=int)
+    return (datas[0].weekday() + np.arange(len(datas))) % 7
+
+
+def carregar_matriz_vendas(data_inicio: date, data_fim: date) -> MatrizVendas:
+    """Carrega o histórico do período em uma matriz data × item
+
+    Args:
+        data_inicio: Primeiro dia do histórico
+        data_fim: Último dia do histórico
+
+    Returns:
+        MatrizVendas: Quantidades vendidas por dia (linhas) e item (colunas)
+    """
+    linhas = db.session.query(
+        HistoricoVendas.data,
+        HistoricoVendas.cardapio_item_id,
+        HistoricoVendas.prato_id,
+        func.sum(HistoricoVendas.quantidade)
+    ).filter(
+        HistoricoVendas.data >= data_inicio,
+        HistoricoVendas.data <= data_fim
+    ).group_by(
+        HistoricoVendas.data, HistoricoVendas.cardapio_item_id, HistoricoVendas.prato_id
+    ).all()
+
+    n_dias = (data_fim - data_inicio).days + 1
+    datas = [data_inicio + timedelta(days=i) for i in range(n_dias)]
+
+    colunas = {}
+    indices_linha = np.empty(len(linhas), dtype=int)
+    indices_coluna = np.empty(len(linhas), dtype=int)
+    quantidades = np.empty(len(linhas), dtype=float)
+    for i, (data, cardapio_item_id, prato_id, quantidade) in enumerate(linhas):
+        chave = ('cardapio_item', cardapio_item_id) if cardapio_item_id else ('prato', prato_id)
+        indices_linha[i] = (data - data_inicio).days
+        indices_coluna[i] = colunas.setdefault(chave, len(colunas))
+        quantidades[i] = quantidade or 0
+
+    valores = np.zeros((n_dias, len(colunas)))
+    np.add.at(valores, (indices_linha, indices_coluna), quantidades)
+
+    # Antes da primeira venda o item ainda não existia: marcar como ausente
+    if colunas:
+        primeira_venda = np.argmax(valores > 0, axis=0)
+        valores[np.arange(n_dias)[:, None] < primeira_venda[None, :]] = np.nan
+
+    return MatrizVendas(datas=datas, itens=list(colunas), valores=valores)
+
+
+def _regressao(valores: np.ndarray):
+    """Ajusta y = m·x + b em cada coluna, ignorando NaN
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Inclinação e intercepto por coluna
+    """
+    x = np.arange(valores.shape[0], dtype=float)[:, None]
+    peso = ~np.isnan(valores)
+    y = np.where(peso, valores, 0.0)
+    xw = np.where(peso, x, 0.0)
+
+    n = peso.sum(axis=0)
+    sx = xw.sum(axis=0)
+    sy = y.sum(axis=0)
+    sxy = (xw * y).sum(axis=0)
+    sxx = (xw * xw).sum(axis=0)
+
+    denominador = n * sxx - sx ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        m = np.where(denominador != 0, (n * sxy - sx * sy) / denominador, 0.0)
+        b = np.where(n > 0, (sy - m * sx) / n, 0.0)
+    return m, b
+
+
+def _r2(valores: np.ndarray, ajustados: np.ndarray) -> np.ndarray:
+    """Coeficiente de determinação por coluna, limitado a [0, 1]"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media = np.nanmean(valores, axis=0)
+        ss_tot = np.nansum((valores - media) ** 2, axis=0)
+        ss_res = np.nansum((valores - ajustados) ** 2, axis=0)
+        r2 = np.where(ss_tot > 0, 1 - ss_res / ss_tot, 0.0)
+    return np.clip(r2, 0, 1)
+
+
+def prever_media_movel(valores: np.ndarray, dias_projecao: int, janela: int = 7):
+    """Projeta a última média móvel de cada item
+
+    A confiabilidade segue a regra de calcular_media_movel: 1 - coeficiente de
+    variação do histórico (0,5 quando a média é zero).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Previsão (dias_projecao × itens) e confiabilidade por item
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # colunas sem dados na janela
+        nivel = np.nan_to_num(np.nanmean(valores[-janela:], axis=0))
+        media = np.nanmean(valores, axis=0)
+        desvio = np.nanstd(valores, axis=0)
+        confiabilidade = np.where(media > 0, np.clip(1 - desvio / media, 0, 1), 0.5)
+
+    previsao = np.repeat(nivel[None, :], dias_projecao, axis=0)
+    return previsao, confiabilidade
+
+
+def prever_regressao_linear(valores: np.ndarray, dias_projecao: int):
+    """Regressão linear por item, projetada para os próximos dias
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Previsão (dias_projecao × itens) e R² por item
+    """
+    m, b = _regressao(valores)
+    x = np.arange(valores.shape[0], dtype=float)[:, None]
+    confiabilidade = _r2(valores, m * x + b)
+
+    x_futuro = np.arange(valores.shape[0], valores.shape[0] + dias_projecao, dtype=float)[:, None]
+    return np.maximum(m * x_futuro + b, 0), confiabilidade
+
+
+def indices_dia_semana(valores: np.ndarray, dias_semana: np.ndarray) -> np.ndarray:
+    """Índice sazonal semanal de cada item (média do dia da semana / média geral)
+
+    Returns:
+        np.ndarray: Matriz 7 × itens; 1,0 onde não há dados suficientes
+    """
+    peso = ~np.isnan(valores)
+    y = np.where(peso, valores, 0.0)
+    uma_quente = np.eye(7)[dias_semana]  # dias × 7
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        media_dia = (uma_quente.T @ y) / (uma_quente.T @ peso)
+        media_geral = y.sum(axis=0) / peso.sum(axis=0)
+        indices = media_dia / media_geral
+    return np.where(np.isfinite(indices) & (indices > 0), indices, 1.0)
+
+
+def prever_sazonal(valores: np.ndarray, dias_semana: np.ndarray, dias_semana_futuros: np.ndarray):
+    """Regressão sobre a série dessazonalizada pelo dia da semana
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Previsão (dias futuros × itens) e R² na escala original
+    """
+    indices = indices_dia_semana(valores, dias_semana)
+    m, b = _regressao(valores / indices[dias_semana])
+
+    x = np.arange(valores.shape[0], dtype=float)[:, None]
+    confiabilidade = _r2(valores, (m * x + b) * indices[dias_semana])
+
+    x_futuro = np.arange(valores.shape[0], valores.shape[0] + len(dias_semana_futuros), dtype=float)[:, None]
+    previsao = (m * x_futuro + b) * indices[dias_semana_futuros]
+    return np.maximum(previsao, 0), confiabilidade
+
+
+def _holt_winters_grade(valores: np.ndarray, inicio: np.ndarray, alfa: np.ndarray, beta: np.ndarray,
+                        gama: np.ndarray, periodo: int, multiplicativo: bool):
+    """Executa o Holt-Winters para todas as combinações da grade e todos os itens de uma vez
+
+    O laço percorre apenas o tempo; em cada passo os estados de todas as
+    combinações (G) e itens (n) são atualizados juntos.
+
+    Args:
+        valores: Matriz T × n (NaN antes da primeira venda)
+        inicio: Índice da primeira venda de cada item
+        alfa, beta, gama: Vetores (G,) com as combinações da grade
+
+    Returns:
+        Tuple: SSE dos erros de um passo (G × n), nível e tendência finais (G × n)
+            e componente sazonal final (periodo × G × n, indexado pela fase t % periodo)
+    """
+    T, n = valores.shape
+    colunas = np.arange(n)
+
+    # Inicialização com as duas primeiras temporadas de cada item
+    posicoes = np.minimum(inicio[None, :] + np.arange(2 * periodo)[:, None], T - 1)
+    janela = np.nan_to_num(valores[posicoes, colunas])
+    media1 = janela[:periodo].mean(axis=0)
+    media2 = janela[periodo:].mean(axis=0)
+    if multiplicativo:
+        sazonal0 = np.where(media1 > 0, janela[:periodo] / np.where(media1 > 0, media1, 1.0), 1.0)
+    else:
+        sazonal0 = janela[:periodo] - media1
+    fases = (inicio[None, :] + np.arange(periodo)[:, None]) % periodo
+    sazonal_item = np.empty((periodo, n))
+    sazonal_item[fases, colunas] = sazonal0
+
+    G = len(alfa)
+    nivel = np.repeat(media1[None, :], G, axis=0)
+    tendencia = np.repeat(((media2 - media1) / periodo)[None, :], G, axis=0)
+    sazonal = np.repeat(sazonal_item[:, None, :], G, axis=1)
+    a, b, g = alfa[:, None], beta[:, None], gama[:, None]
+    sse = np.zeros((G, n))
+
+    primeiro = inicio + periodo  # a primeira temporada só serve para inicializar
+    for t in range(int(primeiro.min()), T):
+        ativo = t >= primeiro
+        y = np.nan_to_num(valores[t])
+        fase = t % periodo
+        s = sazonal[fase]
+        base = nivel + tendencia
+        if multiplicativo:
+            previsto = base * s
+            novo_nivel = a * (y / np.maximum(s, EPSILON)) + (1 - a) * base
+            novo_sazonal = g * (y / np.maximum(novo_nivel, EPSILON)) + (1 - g) * s
+        else:
+            previsto = base + s
+            novo_nivel = a * (y - s) + (1 - a) * base
+            novo_sazonal = g * (y - novo_nivel) + (1 - g) * s
+        nova_tendencia = b * (novo_nivel - nivel) + (1 - b) * tendencia
+
+        sse += np.where(ativo, (y - previsto) ** 2, 0.0)
+        nivel = np.where(ativo, novo_nivel, nivel)
+        tendencia = np.where(ativo, nova_tendencia, tendencia)
+        sazonal[fase] = np.where(ativo, novo_sazonal, s)
+
+    return sse, nivel, tendencia, sazonal
+
+
+def ajustar_holt_winters(valores: np.ndarray, dias_projecao: int, periodo: int = PERIODO_SEMANAL,
+                         tipos: Sequence[str] = ('aditivo', 'multiplicativo'),
+                         grade: Optional[Dict[str, Sequence[float]]] = None) -> Dict:
+    """Suavização exponencial tripla (Holt-Winters) com escolha de parâmetros por grade
+
+    Para cada item, escolhe entre as combinações de α/β/γ (e os tipos de
+    sazonalidade pedidos) a de menor erro quadrático um passo à frente. A
+    confiabilidade é o R² desses erros, comparável ao da regressão linear. Itens
+    com menos de duas temporadas de histórico usam prever_sazonal.
+
+    Args:
+        valores: Matriz dias × itens (NaN antes da primeira venda)
+        dias_projecao: Dias a prever após o fim do histórico
+        periodo: Tamanho da temporada (7 = ciclo semanal)
+        tipos: 'aditivo' e/ou 'multiplicativo'
+        grade: Valores de 'alfa', 'beta' e 'gama' a testar (padrão: GRADE_HOLT_WINTERS)
+
+    Returns:
+        Dict: previsao (dias_projecao × itens), confiabilidade, alfa, beta, gama e tipo por item
+    """
+    grade = grade or GRADE_HOLT_WINTERS
+    alfa, beta, gama = (c.ravel() for c in np.meshgrid(grade['alfa'], grade['beta'], grade['gama'], indexing='ij'))
+    T, n = valores.shape
+
+    resultado = {
+        'previsao': np.zeros((dias_projecao, n)),
+        'confiabilidade': np.zeros(n),
+        'alfa': np.full(n, np.nan),
+        'beta': np.full(n, np.nan),
+        'gama': np.full(n, np.nan),
+        'tipo': np.array([None] * n, dtype=object),
+    }
+    if n == 0:
+        return resultado
+
+    validos = ~np.isnan(valores)
+    inicio = np.where(validos.any(axis=0), np.argmax(validos, axis=0), T)
+    ajustaveis = T - inicio >= 2 * periodo
+
+    # Histórico curto: regressão dessazonalizada pelo dia da semana
+    curtos = np.flatnonzero(~ajustaveis)
+    if len(curtos):
+        dias_semana = np.arange(T) % periodo
+        futuros = np.arange(T, T + dias_projecao) % periodo
+        previsao, confiabilidade = prever_sazonal(valores[:, curtos], dias_semana, futuros)
+        resultado['previsao'][:, curtos] = previsao
+        resultado['confiabilidade'][curtos] = confiabilidade
+
+    horizonte = np.arange(1, dias_projecao + 1)[:, None]
+    fases_futuras = (T - 1 + horizonte[:, 0]) % periodo
+    for bloco in np.array_split(np.flatnonzero(ajustaveis), max(1, int(ajustaveis.sum()) // TAMANHO_BLOCO_HW + 1)):
+        if not len(bloco):
+            continue
+        colunas = np.arange(len(bloco))
+        melhor_sse = np.full(len(bloco), np.inf)
+        for tipo in tipos:
+            multiplicativo = tipo == 'multiplicativo'
+            sse, nivel, tendencia, sazonal = _holt_winters_grade(
+                valores[:, bloco], inicio[bloco], alfa, beta, gama, periodo, multiplicativo)
+            melhor = np.argmin(sse, axis=0)
+            sse_melhor = sse[melhor, colunas]
+            trocar = sse_melhor < melhor_sse
+            if not trocar.any():
+                continue
+
+            base = nivel[melhor, colunas] + horizonte * tendencia[melhor, colunas]
+            saz = sazonal[:, melhor, colunas][fases_futuras]
+            previsao = base * saz if multiplicativo else base + saz
+
+            destino = bloco[trocar]
+            melhor_sse[trocar] = sse_melhor[trocar]
+            resultado['previsao'][:, destino] = previsao[:, trocar]
+            resultado['alfa'][destino] = alfa[melhor[trocar]]
+            resultado['beta'][destino] = beta[melhor[trocar]]
+            resultado['gama'][destino] = gama[melhor[trocar]]
+            resultado['tipo'][destino] = tipo
+
+        # R² dos erros um passo à frente no trecho pontuado
+        dados = valores[:, bloco]
+        pontuados = np.arange(T)[:, None] >= (inicio[bloco] + periodo)[None, :]
+        trecho = np.where(pontuados, dados, np.nan)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sst = np.nansum((trecho - np.nanmean(trecho, axis=0)) ** 2, axis=0)
+            r2 = np.where(sst > 0, 1 - melhor_sse / sst, 0.0)
+        resultado['confiabilidade'][bloco] = np.clip(r2, 0, 1)
+
+    resultado['previsao'] = np.maximum(resultado['previsao'], 0)
+    return resultado
+
+
+def prever_holt_winters(valores: np.ndarray, dias_projecao: int, **kwargs):
+    """Previsão Holt-Winters semanal de todos os itens
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Previsão (dias_projecao × itens) e confiabilidade por item
+    """
+    resultado = ajustar_holt_winters(valores, dias_projecao, **kwargs)
+    return resultado['previsao'], resultado['confiabilidade']
+
+
+def prever_matriz(matriz: MatrizVendas, metodo: str, dias_projecao: int, janela: int = 7):
+    """Executa um método de previsão sobre todas as colunas da matriz
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Previsão (dias_projecao × itens) e confiabilidade por item
+    """
+    if metodo == 'media_movel':
+        return prever_media_movel(matriz.valores, dias_projecao, janela)
+    if metodo == 'regressao_linear':
+        return prever_regressao_linear(matriz.valores, dias_projecao)
+    if metodo == 'sazonalidade':
+        return prever_holt_winters(matriz.valores, dias_projecao)
+    raise ValueError(f'Método de previsão desconhecido: {metodo}')
+
+
+def gerar_previsoes_todos(data_inicio: date, data_fim: date,
+                          metodos: Iterable[str] = METODOS,
+                          dias_historico: int = 90,
+                          usar_sazonalidade: bool = False,
+                          hoje: Optional[date] = None,
+                          commit: bool = True) -> Dict:
+    """Gera e grava previsões para todos os pratos e itens de cardápio com histórico
+
+    O histórico usado vai de `dias_historico` dias atrás até ontem. Itens com
+    menos de MIN_DIAS_COM_VENDA dias com venda são ignorados.
+
+    Args:
+        data_inicio: Primeiro dia previsto
+        data_fim: Último dia previsto
+        metodos: Métodos a executar (um registro de PrevisaoDemanda por item e método)
+        dias_historico: Tamanho da janela de histórico em dias
+        usar_sazonalidade: Se True, remove os fatores de sazonalidade cadastrados
+            antes do ajuste e os reaplica nas datas previstas
+        hoje: Data de referência (padrão: date.today())
+        commit: Se True, confirma a transação ao final
+
+    Returns:
+        Dict: Relatório com itens, previsões gravadas, itens ignorados e tempos
+    """
+    if data_fim < data_inicio:
+        raise ValueError('A data final deve ser posterior à data inicial')
+    metodos = list(metodos)
+    for metodo in metodos:
+        if metodo not in METODOS:
+            raise ValueError(f'Método de previsão desconhecido: {metodo}')
+
+    inicio = time.perf_counter()
+    hoje = hoje or date.today()
+    fim_historico = hoje - timedelta(days=1)
+    matriz = carregar_matriz_vendas(fim_historico - timedelta(days=dias_historico - 1), fim_historico)
+    tempo_leitura = time.perf_counter() - inicio
+
+    # Só itens com dados suficientes entram no cálculo
+    suficientes = (np.nan_to_num(matriz.valores) > 0).sum(axis=0) >= MIN_DIAS_COM_VENDA
+    ignorados = int((~suficientes).sum())
+    matriz = MatrizVendas(
+        datas=matriz.datas,
+        itens=[item for item, ok in zip(matriz.itens, suficientes) if ok],
+        valores=matriz.valores[:, suficientes]
+    )
+
+    # A projeção começa logo após o histórico; guardamos só os dias pedidos
+    dias_projecao = (data_fim - fim_historico).days
+    primeiro = max((data_inicio - fim_historico).days - 1, 0)
+    datas_futuras = [fim_historico + timedelta(days=i + 1) for i in range(dias_projecao)]
+    datas_previsao = [d.isoformat() for d in datas_futuras[primeiro:]]
+
+    indice = None
+    if usar_sazonalidade and matriz.itens:
+        indice = IndiceSazonalidade.compilar(matriz.itens)
+        eventos = carregar_eventos(matriz.datas[0], matriz.datas[-1])
+        matriz.valores = indice.dessazonalizar(matriz.valores, matriz.datas, eventos)
+
+    registros = []
+    if matriz.itens and dias_projecao > 0:
+        for metodo in metodos:
+            ajuste = None
+            if metodo == 'sazonalidade':
+                ajuste = ajustar_holt_winters(matriz.valores, dias_projecao)
+                previsao, confiabilidade = ajuste['previsao'], ajuste['confiabilidade']
+            else:
+                previsao, confiabilidade = prever_matriz(matriz, metodo, dias_projecao)
+            if indice is not None:
+                previsao = indice.aplicar(previsao, datas_futuras)
+            previsao = np.rint(np.maximum(previsao[primeiro:], 0)).astype(int)
+            parametros = {
+                'dias_historico': dias_historico,
+                'usar_sazonalidade': usar_sazonalidade,
+                'lote': True
+            }
+            for coluna, (tipo_item, item_id) in enumerate(matriz.itens):
+                if ajuste is not None and ajuste['tipo'][coluna]:
+                    parametros_item = json.dumps(dict(parametros, **{
+                        'tipo': ajuste['tipo'][coluna],
+                        'alfa': float(ajuste['alfa'][coluna]),
+                        'beta': float(ajuste['beta'][coluna]),
+                        'gama': float(ajuste['gama'][coluna])
+                    }))
+                else:
+                    parametros_item = json.dumps(parametros)
+                registros.append({
+                    'data_inicio': data_inicio,
+                    'data_fim': data_fim,
+                    'cardapio_item_id': item_id if tipo_item == 'cardapio_item' else None,
+                    'prato_id': item_id if tipo_item == 'prato' else None,
+                    'metodo': metodo,
+                    'parametros': parametros_item,
+                    'valores_previstos': json.dumps(dict(zip(datas_previsao, previsao[:, coluna].tolist()))),
+                    'confiabilidade': float(confiabilidade[coluna])
+                })
+    tempo_calculo = time.perf_counter() - inicio - tempo_leitura
+
+    if registros:
+        db.session.execute(insert(PrevisaoDemanda), registros)
+    if commit:
+        db.session.commit()
+
+    return {
+        'itens': len(matriz.itens),
+        'ignorados': ignorados,
+        'previsoes': len(registros),
+        'metodos': metodos,
+        'tempo_leitura': tempo_leitura,
+        'tempo_calculo': tempo_calculo,
+        'tempo_total': time.perf_counter() - inicio
+    }
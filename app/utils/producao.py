@@ -0,0 +1,90 @@
+"""Capacidade de produção dos pratos a partir do estoque atual
+
+Para cada prato ativo, quantas porções o estoque permite produzir (o mínimo,
+entre os insumos da receita, de estoque / necessidade por porção) e qual insumo
+limita a produção. O cálculo é vetorizado sobre a matriz de receitas em cache;
+por requisição só são lidos o estoque e os pratos ativos.
+"""
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.extensions import db
+from app.models.modelo_prato import Prato
+from app.models.modelo_produto import Produto
+from app.utils.matriz_receitas import MatrizReceitas, matriz_em_cache
+
+
+def vetor_estoque(matriz: MatrizReceitas) -> np.ndarray:
+    """Estoque atual de cada produto da matriz, na ordem de matriz.produtos"""
+    estoque = np.zeros(len(matriz.produtos))
+    if not len(matriz.produtos):
+        return estoque
+    ids, quantidades = [], []
+    for produto_id, quantidade in db.session.query(Produto.id, Produto.estoque_atual).filter(
+            Produto.id.in_(matriz.produtos.tolist())):
+        ids.append(produto_id)
+        quantidades.append(quantidade or 0)
+    if ids:
+        estoque[np.searchsorted(matriz.produtos, ids)] = quantidades
+    return estoque
+
+
+def calcular_porcoes_produziveis(somente_ativos: bool = True,
+                                 matriz: Optional[MatrizReceitas] = None) -> List[Dict]:
+    """Porções produzíveis e insumo gargalo de todos os pratos
+
+    Args:
+        somente_ativos: Se True, considera apenas os pratos ativos
+        matriz: Matriz de receitas (padrão: a matriz em cache do processo)
+
+    Returns:
+        List[Dict]: prato_id, nome, porcoes e gargalo (produto_id, nome, unidade,
+            estoque e necessidade por porção) de cada prato, das menores porções
+            para as maiores; pratos sem receita têm porcoes e gargalo None
+    """
+    matriz = matriz if matriz is not None else matriz_em_cache()
+    estoque = vetor_estoque(matriz)
+    porcoes, entradas = matriz.porcoes_possiveis(estoque)
+    colunas = matriz.colunas[entradas]
+
+    query = db.session.query(Prato.id, Prato.nome)
+    if somente_ativos:
+        query = query.filter(Prato.ativo.is_(True))
+    pratos = query.all()
+
+    produtos_gargalo = set(matriz.produtos[colunas].tolist())
+    info_produtos = {
+        produto_id: (nome, unidade)
+        for produto_id, nome, unidade in db.session.query(Produto.id, Produto.nome, Produto.unidade).filter(
+            Produto.id.in_(produtos_gargalo))
+    } if produtos_gargalo else {}
+
+    # Posição de cada prato nas linhas da matriz (-1 para pratos sem receita)
+    ids = np.array([p.id for p in pratos], dtype=np.int64)
+    posicoes = np.searchsorted(matriz.pratos, ids).clip(max=max(len(matriz.pratos) - 1, 0))
+    com_receita = (matriz.pratos[posicoes] == ids) if len(matriz.pratos) else np.zeros(len(ids), dtype=bool)
+
+    resultado = []
+    for (prato_id, nome), posicao, tem_receita in zip(pratos, posicoes.tolist(), com_receita.tolist()):
+        if not tem_receita:
+            resultado.append({'prato_id': prato_id, 'nome': nome, 'porcoes': None, 'gargalo': None})
+            continue
+        coluna = int(colunas[posicao])
+        produto_id = int(matriz.produtos[coluna])
+        produto_nome, unidade = info_produtos.get(produto_id, (None, None))
+        resultado.append({
+            'prato_id': prato_id,
+            'nome': nome,
+            'porcoes': int(porcoes[posicao]),
+            'gargalo': {
+                'produto_id': produto_id,
+                'nome': produto_nome,
+                'unidade': unidade,
+                'estoque': float(estoque[coluna]),
+                'necessario_por_porcao': round(float(matriz.coeficientes[entradas[posicao]]), 6)
+            }
+        })
+
+    resultado.sort(key=lambda r: (r['porcoes'] is None, r['porcoes'] or 0, r['nome']))
+    return resultado
@@ -0,0 +1,169 @@
+"""Estatísticas agregadas do relatório de desperdício
+
+Os recortes do relatório saem do agregado diário (desperdicio_diario), com duas
+consultas agrupadas: uma por dia × categoria (totais, categorias, evolução
+diária e dias da semana) e outra por item, limitada aos maiores. O custo
+depende do número de dias do período, não do número de registros.
+"""
+from datetime import date, timedelta
+from typing import Dict, Optional
+
+from sqlalchemy import case, func
+
+from app.extensions import db
+from app.models.modelo_desperdicio import CategoriaDesperdicio, DesperdicioDiario
+from app.models.modelo_prato import Prato
+from app.models.modelo_produto import Produto
+from app.utils.agregados_desperdicio import filtrar_periodo
+
+DIAS_SEMANA = ['Seg', 'Ter', 'Qua', 'Qui', 'Sex', 'Sáb', 'Dom']
+MAX_ITENS = 10
+
+VALOR = func.coalesce(func.sum(DesperdicioDiario.valor), 0)
+QUANTIDADE = func.coalesce(func.sum(DesperdicioDiario.quantidade), 0)
+REGISTROS = func.coalesce(func.sum(DesperdicioDiario.total_registros), 0)
+
+
+def totais_por_categoria(data_inicio: Optional[date], data_fim: Optional[date]) -> Dict[int, Dict]:
+    """Registros, quantidade e valor de cada categoria no período
+
+    Returns:
+        Dict[int, Dict]: nome, cor, registros, quantidade e valor por id de categoria
+    """
+    linhas = filtrar_periodo(db.session.query(
+        CategoriaDesperdicio.id, CategoriaDesperdicio.nome, CategoriaDesperdicio.cor, REGISTROS, QUANTIDADE, VALOR
+    ).join(
+        CategoriaDesperdicio, CategoriaDesperdicio.id == DesperdicioDiario.categoria_id
+    ), DesperdicioDiario, data_inicio, data_fim).group_by(
+        CategoriaDesperdicio.id, CategoriaDesperdicio.nome, CategoriaDesperdicio.cor
+    )
+    return {
+        categoria_id: {
+            'nome': nome,
+            'cor': cor or '#CCCCCC',
+            'registros': int(registros),
+            'quantidade': float(quantidade),
+            'valor': float(valor)
+        }
+        for categoria_id, nome, cor, registros, quantidade, valor in linhas
+    }
+
+
+def totais_por_tipo(data_inicio: Optional[date], data_fim: Optional[date]) -> Dict[str, Dict]:
+    """Registros e valor de produtos e de pratos no período"""
+    tipo = case((DesperdicioDiario.produto_id.isnot(None), 'Produtos'), else_='Pratos')
+    totais = {'Produtos': {'quantidade': 0, 'valor': 0.0}, 'Pratos': {'quantidade': 0, 'valor': 0.0}}
+    for nome, registros, valor in filtrar_periodo(
+            db.session.query(tipo, REGISTROS, VALOR), DesperdicioDiario, data_inicio, data_fim
+    ).group_by(tipo):
+        totais[nome] = {'quantidade': int(registros), 'valor': float(valor)}
+    return totais
+
+
+def resumo_desperdicio(data_inicio: date, data_fim: date, categoria_id: Optional[int] = None) -> Dict:
+    """Totais e recortes do desperdício no período, com duas consultas agrupadas
+
+    Args:
+        data_inicio: Primeiro dia do período
+        data_fim: Último dia do período (incluído)
+        categoria_id: Filtra uma categoria (opcional)
+
+    Returns:
+        Dict: total_registros, total_valor, total_quantidade, estatisticas_categorias,
+            dados_categorias, dados_evolucao, dados_dias_semana e top_itens
+    """
+    # 1. Dia × categoria: dá os totais, as categorias, a evolução e os dias da semana
+    por_dia_categoria = filtrar_periodo(db.session.query(
+        DesperdicioDiario.data, DesperdicioDiario.categoria_id, REGISTROS, VALOR, QUANTIDADE
+    ), DesperdicioDiario, data_inicio, data_fim, categoria_id).group_by(
+        DesperdicioDiario.data, DesperdicioDiario.categoria_id
+    ).all()
+
+    total_registros, total_valor, total_quantidade = 0, 0.0, 0.0
+    por_categoria, por_dia = {}, {}
+    for dia, categoria, qtd, valor, quantidade in por_dia_categoria:
+        total_registros += int(qtd)
+        total_valor += float(valor)
+        total_quantidade += float(quantidade)
+        acumulado = por_categoria.setdefault(categoria, [0, 0.0])
+        acumulado[0] += int(qtd)
+        acumulado[1] += float(valor)
+        por_dia[dia] = por_dia.get(dia, 0.0) + float(valor)
+
+    def percentual(valor):
+        return (valor / total_valor * 100) if total_valor > 0 else 0
+
+    nomes = {
+        id_: (nome, cor) for id_, nome, cor in db.session.query(
+            CategoriaDesperdicio.id, CategoriaDesperdicio.nome, CategoriaDesperdicio.cor
+        ).filter(CategoriaDesperdicio.id.in_(list(por_categoria)))
+    } if por_categoria else {}
+    estatisticas_categorias = sorted((
+        {
+            'nome': nomes.get(categoria, ('Sem categoria', None))[0],
+            'cor': nomes.get(categoria, (None, None))[1] or '#CCCCCC',
+            'qtd': qtd,
+            'quantidade': qtd,
+            'valor': valor,
+            'percentual': percentual(valor),
+            'tendencia': 0
+        }
+        for categoria, (qtd, valor) in por_categoria.items()
+    ), key=lambda c: c['valor'], reverse=True)
+
+    # 2. Evolução diária (dias sem registro zerados) e dias da semana
+    dias = [data_inicio + timedelta(days=i) for i in range((data_fim - data_inicio).days + 1)]
+    dias_valores = [0.0] * 7
+    for dia, valor in por_dia.items():
+        dias_valores[dia.weekday()] += valor
+
+    # 3. Itens: o produto, ou o prato quando o registro não tem produto; nomes só dos maiores
+    prato_sem_produto = case((DesperdicioDiario.produto_id.is_(None), DesperdicioDiario.prato_id))
+    itens = filtrar_periodo(db.session.query(
+        DesperdicioDiario.produto_id, prato_sem_produto, func.max(DesperdicioDiario.unidade), VALOR, QUANTIDADE
+    ), DesperdicioDiario, data_inicio, data_fim, categoria_id).group_by(
+        DesperdicioDiario.produto_id, prato_sem_produto
+    ).order_by(VALOR.desc()).limit(MAX_ITENS).all()
+
+    produtos = {p for p, *_ in itens if p is not None}
+    pratos = {p for _, p, *_ in itens if p is not None}
+    nomes_produtos = dict(
+        db.session.query(Produto.id, Produto.nome).filter(Produto.id.in_(produtos))
+    ) if produtos else {}
+    nomes_pratos = dict(
+        db.session.query(Prato.id, Prato.nome).filter(Prato.id.in_(pratos))
+    ) if pratos else {}
+
+    top_itens = []
+    for produto_id, prato_id, unidade, valor, quantidade in itens:
+        nome = nomes_produtos.get(produto_id) if produto_id is not None else nomes_pratos.get(prato_id)
+        nome = nome or 'Desconhecido'
+        top_itens.append({
+            'nome': nome,
+            'prato': {'nome': nome},  # O template lê item.prato.nome
+            'unidade': unidade,
+            'valor': float(valor),
+            'quantidade': float(quantidade),
+            'percentual': percentual(float(valor))
+        })
+
+    return {
+        'total_registros': total_registros,
+        'total_valor': total_valor,
+        'total_quantidade': total_quantidade,
+        'estatisticas_categorias': estatisticas_categorias,
+        'dados_categorias': {
+            'labels': [c['nome'] for c in estatisticas_categorias],
+            'valores': [c['valor'] for c in estatisticas_categorias],
+            'cores': [c['cor'] for c in estatisticas_categorias]
+        },
+        'dados_evolucao': {
+            'datas': [dia.strftime('%d/%m') for dia in dias],
+            'valores': [por_dia.get(dia, 0.0) for dia in dias]
+        },
+        'dados_dias_semana': {
+            'labels': DIAS_SEMANA,
+            'valores': dias_valores
+        },
+        'top_itens': top_itens
+    }
@@ -0,0 +1,262 @@
+"""Índice de sazonalidade pré-compilado para a previsão de demanda
+
+Os registros de FatorSazonalidade são lidos uma única vez e resolvidos, para cada
+item, em vetores de multiplicadores por mês, por dia da semana e por evento. Depois
+disso, normalizar ou reaplicar a sazonalidade de qualquer quantidade de datas é
+apenas uma multiplicação de matrizes.
+
+Resolução dos fatores (o nível mais específico que tiver o fator vence):
+    item de cardápio -> prato -> categoria (seção do cardápio) -> geral
+
+Fatores com periodo_dia só afetam a parcela das vendas do item naquele período:
+o multiplicador diário é 1 + participação * (fator - 1).
+"""
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func
+
+from app.extensions import db
+from app.models.modelo_cardapio import CardapioItem
+from app.models.modelo_previsao import FatorSazonalidade, HistoricoVendas
+
+# Ordem de precedência dos níveis (do mais genérico para o mais específico)
+NIVEIS = ('geral', 'categoria', 'prato', 'cardapio_item')
+
+
+class IndiceSazonalidade:
+    """Multiplicadores sazonais por item, prontos para aplicação vetorizada
+
+    Attributes:
+        itens: (tipo_item, item_id) de cada coluna
+        por_mes: Matriz 13 × itens (linha 0 sem uso; 1-12 são os meses)
+        por_dia_semana: Matriz 7 × itens (0 = segunda-feira)
+        por_evento: Vetor de multiplicadores por nome de evento
+        constante: Multiplicador aplicado em todas as datas (fatores só de período do dia)
+    """
+
+    def __init__(self, itens: Sequence[Tuple[str, int]]):
+        self.itens = list(itens)
+        n = len(self.itens)
+        self.por_mes = np.ones((13, n))
+        self.por_dia_semana = np.ones((7, n))
+        self.por_evento: Dict[str, np.ndarray] = {}
+        self.constante = np.ones(n)
+
+    def __repr__(self):
+        return f'<IndiceSazonalidade {len(self.itens)} itens, {len(self.por_evento)} eventos>'
+
+    @classmethod
+    def compilar(cls, itens: Sequence[Tuple[str, int]],
+                 participacao_periodo: Optional[Dict[str, np.ndarray]] = None) -> 'IndiceSazonalidade':
+        """Resolve todos os fatores de sazonalidade para os itens informados
+
+        Args:
+            itens: (tipo_item, item_id) de cada coluna, como em MatrizVendas.itens
+            participacao_periodo: Fração das vendas de cada item por período do dia
+                (calculada a partir do histórico quando omitida)
+
+        Returns:
+            IndiceSazonalidade: Índice pronto para uso
+        """
+        indice = cls(itens)
+        n = len(indice.itens)
+        if n == 0:
+            return indice
+
+        fatores = FatorSazonalidade.query.all()
+        if not fatores:
+            return indice
+
+        # Colunas de cada nível: prato e categoria de cada item
+        prato_por_coluna, categoria_por_coluna = _pratos_e_categorias(indice.itens)
+        colunas = {
+            'cardapio_item': _indices_por_chave(
+                [item_id if tipo == 'cardapio_item' else None for tipo, item_id in indice.itens]),
+            'prato': _indices_por_chave(prato_por_coluna),
+            'categoria': _indices_por_chave(categoria_por_coluna),
+        }
+
+        if participacao_periodo is None and any(f.periodo_dia for f in fatores):
+            participacao_periodo = calcular_participacao_periodo(indice.itens)
+
+        # Agrupa os fatores por dimensão (mês, dia, evento) e nível
+        agrupados = defaultdict(lambda: defaultdict(list))
+        for fator in fatores:
+            if fator.cardapio_item_id:
+                nivel = ('cardapio_item', fator.cardapio_item_id)
+            elif fator.prato_id:
+                nivel = ('prato', fator.prato_id)
+            elif fator.categoria_id:
+                nivel = ('categoria', fator.categoria_id)
+            else:
+                nivel = ('geral', None)
+
+            dimensoes = []
+            if fator.mes:
+                dimensoes.append(('mes', fator.mes))
+            if fator.dia_semana is not None:
+                dimensoes.append(('dia_semana', fator.dia_semana))
+            if fator.evento:
+                dimensoes.append(('evento', fator.evento))
+            if not dimensoes and fator.periodo_dia:
+                dimensoes.append(('constante', None))
+
+            for dimensao in dimensoes:
+                agrupados[dimensao][nivel].append(fator)
+
+        for dimensao, por_nivel in agrupados.items():
+            vetor = np.ones(n)
+            # Do mais genérico ao mais específico: cada nível sobrescreve o anterior
+            for nome_nivel in NIVEIS:
+                for (tipo, chave), lista in por_nivel.items():
+                    if tipo != nome_nivel:
+                        continue
+                    alvo = slice(None) if tipo == 'geral' else colunas[tipo].get(chave)
+                    if alvo is None:
+                        continue
+                    vetor[alvo] = _combinar(lista, participacao_periodo, n)[alvo]
+
+            tipo_dimensao, valor = dimensao
+            if tipo_dimensao == 'mes':
+                indice.por_mes[valor] = vetor
+            elif tipo_dimensao == 'dia_semana':
+                indice.por_dia_semana[valor] = vetor
+            elif tipo_dimensao == 'evento':
+                indice.por_evento[valor] = vetor
+            else:
+                indice.constante = vetor
+
+        return indice
+
+    def multiplicadores(self, datas: Sequence[date],
+                        eventos: Optional[Dict[date, str]] = None) -> np.ndarray:
+        """Multiplicador sazonal de cada data (linhas) e item (colunas)
+
+        Args:
+            datas: Datas a avaliar
+            eventos: Evento especial de cada data, se houver
+
+        Returns:
+            np.ndarray: Matriz len(datas) × itens
+        """
+        meses = np.fromiter((d.month for d in datas), dtype=int, count=len(datas))
+        dias = np.fromiter((d.weekday() for d in datas), dtype=int, count=len(datas))
+        resultado = self.por_mes[meses] * self.por_dia_semana[dias] * self.constante
+
+        if eventos and self.por_evento:
+            for linha, data in enumerate(datas):
+                vetor = self.por_evento.get(eventos.get(data))
+                if vetor is not None:
+                    resultado[linha] *= vetor
+        return resultado
+
+    def dessazonalizar(self, valores: np.ndarray, datas: Sequence[date],
+                       eventos: Optional[Dict[date, str]] = None) -> np.ndarray:
+        """Remove o efeito sazonal de uma matriz datas × itens"""
+        multiplicadores = self.multiplicadores(datas, eventos)
+        return valores / np.where(multiplicadores > 0, multiplicadores, 1.0)
+
+    def aplicar(self, valores: np.ndarray, datas: Sequence[date],
+                eventos: Optional[Dict[date, str]] = None) -> np.ndarray:
+        """Reaplica o efeito sazonal a uma matriz datas × itens"""
+        return valores * self.multiplicadores(datas, eventos)
+
+
+def _combinar(fatores: List[FatorSazonalidade], participacao_periodo, n: int) -> np.ndarray:
+    """Multiplica os fatores de um mesmo nível, ponderando os restritos a um período do dia"""
+    vetor = np.ones(n)
+    for fator in fatores:
+        if fator.periodo_dia:
+            participacao = (participacao_periodo or {}).get(fator.periodo_dia)
+            if participacao is None:
+                continue
+            vetor *= 1 + participacao * (fator.fator - 1)
+        else:
+            vetor *= fator.fator
+    return vetor
+
+
+def _indices_por_chave(chaves: Iterable) -> Dict[int, np.ndarray]:
+    """Agrupa as colunas por chave (ignorando None)"""
+    grupos = defaultdict(list)
+    for coluna, chave in enumerate(chaves):
+        if chave is not None:
+            grupos[chave].append(coluna)
+    return {chave: np.array(colunas) for chave, colunas in grupos.items()}
+
+
+def _pratos_e_categorias(itens: Sequence[Tuple[str, int]]):
+    """Resolve o prato e a categoria (seção do cardápio) de cada coluna em uma consulta
+
+    A categoria de um prato é a primeira seção de cardápio em que ele aparece.
+    """
+    item_ids = {item_id for tipo, item_id in itens if tipo == 'cardapio_item'}
+    prato_ids = {item_id for tipo, item_id in itens if tipo == 'prato'}
+
+    linhas = db.session.query(
+        CardapioItem.id, CardapioItem.prato_id, CardapioItem.secao_id
+    ).filter(
+        CardapioItem.id.in_(item_ids) | CardapioItem.prato_id.in_(prato_ids)
+    ).order_by(CardapioItem.secao_id).all()
+
+    item_info = {}
+    secao_por_prato = {}
+    for item_id, prato_id, secao_id in linhas:
+        item_info[item_id] = (prato_id, secao_id)
+        secao_por_prato.setdefault(prato_id, secao_id)
+
+    pratos, categorias = [], []
+    for tipo, item_id in itens:
+        if tipo == 'cardapio_item':
+            prato_id, secao_id = item_info.get(item_id, (None, None))
+        else:
+            prato_id, secao_id = item_id, secao_por_prato.get(item_id)
+        pratos.append(prato_id)
+        categorias.append(secao_id)
+    return pratos, categorias
+
+
+def calcular_participacao_periodo(itens: Sequence[Tuple[str, int]]) -> Dict[str, np.ndarray]:
+    """Fração das vendas de cada item em cada período do dia (manhã, tarde, noite)
+
+    Returns:
+        Dict[str, np.ndarray]: Vetor de participações (0-1) por período
+    """
+    colunas = {item: i for i, item in enumerate(itens)}
+    linhas = db.session.query(
+        HistoricoVendas.cardapio_item_id,
+        HistoricoVendas.prato_id,
+        HistoricoVendas.periodo_dia,
+        func.sum(HistoricoVendas.quantidade)
+    ).filter(
+        HistoricoVendas.periodo_dia.isnot(None)
+    ).group_by(
+        HistoricoVendas.cardapio_item_id, HistoricoVendas.prato_id, HistoricoVendas.periodo_dia
+    ).all()
+
+    totais = defaultdict(lambda: np.zeros(len(itens)))
+    for cardapio_item_id, prato_id, periodo, quantidade in linhas:
+        chave = ('cardapio_item', cardapio_item_id) if cardapio_item_id else ('prato', prato_id)
+        coluna = colunas.get(chave)
+        if coluna is not None:
+            totais[periodo][coluna] += quantidade or 0
+
+    soma = sum(totais.values(), np.zeros(len(itens)))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return {periodo: np.where(soma > 0, valores / soma, 0.0) for periodo, valores in totais.items()}
+
+
+def carregar_eventos(data_inicio: date, data_fim: date) -> Dict[date, str]:
+    """Eventos especiais registrados no histórico de vendas do período"""
+    return dict(
+        db.session.query(HistoricoVendas.data, func.max(HistoricoVendas.evento_especial))
+        .filter(
+            HistoricoVendas.data >= data_inicio,
+            HistoricoVendas.data <= data_fim,
+            HistoricoVendas.evento_especial.isnot(None),
+            HistoricoVendas.evento_especial != ''
+        ).group_by(HistoricoVendas.data).all()
+    )
@@ -0,0 +1,63 @@
+"""Soma atômica de totais nas tabelas de agregados diários
+
+Cada linha do lote vira um INSERT ... ON CONFLICT DO UPDATE que soma os valores
+ao que está gravado (SET quantidade = quantidade + excluded.quantidade). O banco
+resolve a disputa pela chave única, então dois workers que registram vendas ou
+desperdícios do mesmo dia não perdem incrementos nem falham com IntegrityError
+ao criar a mesma linha. SQLite (3.24+) e PostgreSQL suportam a sintaxe.
+
+A chave única dos agregados é um índice sobre COALESCE(coluna, 0) das colunas
+opcionais: NULL nunca colide com NULL, e sem isso linhas sem prato (ou sem
+produto) seriam duplicadas em vez de somadas. O alvo do ON CONFLICT é lido do
+próprio índice do modelo, para que os dois nunca divirjam.
+"""
+from typing import Dict, Iterable, List
+
+from sqlalchemy import func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from app.extensions import db
+
+_INSERTS = {
+    'postgresql': postgresql.insert,
+    'sqlite': sqlite.insert,
+}
+
+
+def somar_em_agregado(modelo, indice: str, linhas: List[Dict], somar: Iterable[str],
+                      preservar: Iterable[str] = ()) -> int:
+    """Insere as linhas ou soma seus valores às linhas já gravadas com a mesma chave
+
+    Args:
+        modelo: Modelo do agregado
+        indice: Nome do índice único usado como alvo do ON CONFLICT
+        linhas: Valores de cada linha (chave e totais)
+        somar: Colunas somadas ao valor gravado
+        preservar: Colunas substituídas só quando o novo valor não é nulo
+
+    Returns:
+        int: Quantidade de linhas do agregado afetadas
+    """
+    if not linhas:
+        return 0
+
+    tabela = modelo.__table__
+    alvo = next(i for i in tabela.indexes if i.name == indice)
+    dialeto = db.session.get_bind().dialect.name
+    if dialeto not in _INSERTS:
+        raise NotImplementedError(f'Agregados não suportam o banco {dialeto}')
+
+    stmt = _INSERTS[dialeto](tabela)
+    valores = {coluna: tabela.c[coluna] + stmt.excluded[coluna] for coluna in somar}
+    valores.update({
+        coluna: func.coalesce(stmt.excluded[coluna], tabela.c[coluna]) for coluna in preservar
+    })
+    stmt = stmt.on_conflict_do_update(index_elements=list(alvo.expressions), set_=valores)
+
+    db.session.execute(stmt, linhas)
+    # O upsert não sincroniza objetos do agregado já carregados na sessão
+    for objeto in list(db.session.identity_map.values()):
+        if isinstance(objeto, modelo):
+            db.session.expire(objeto)
+
+    return len(linhas)
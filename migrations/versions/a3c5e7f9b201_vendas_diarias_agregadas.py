@@ -0,0 +1,43 @@
+"""add vendas_diarias_agregadas rollup table
+
+Revision ID: a3c5e7f9b201
+Revises: 6e1b821db935
+Create Date: 2026-10-16 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c5e7f9b201'
+down_revision = '6e1b821db935'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('vendas_diarias_agregadas',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('data', sa.Date(), nullable=False),
+        sa.Column('prato_id', sa.Integer(), nullable=True),
+        sa.Column('quantidade', sa.Integer(), nullable=False),
+        sa.Column('receita', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('custo', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('total_registros', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['prato_id'], ['pratos.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('data', 'prato_id', name='uq_venda_diaria_data_prato')
+    )
+    with op.batch_alter_table('vendas_diarias_agregadas', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_vendas_diarias_agregadas_data'), ['data'], unique=False)
+
+    # O agregado é populado a partir do histórico com:
+    #   python -m app.scripts.agregados_vendas --rebuild
+
+
+def downgrade():
+    with op.batch_alter_table('vendas_diarias_agregadas', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_vendas_diarias_agregadas_data'))
+
+    op.drop_table('vendas_diarias_agregadas')
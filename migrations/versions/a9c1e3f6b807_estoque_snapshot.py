@@ -0,0 +1,42 @@
+"""add estoque_snapshot table for point-in-time stock positions
+
+Revision ID: a9c1e3f6b807
+Revises: f8b0d2e5a706
+Create Date: 2026-10-16 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a9c1e3f6b807'
+down_revision = 'f8b0d2e5a706'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('estoque_snapshot',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('produto_id', sa.Integer(), nullable=False),
+        sa.Column('posicao_em', sa.DateTime(), nullable=False),
+        sa.Column('quantidade', sa.Float(), nullable=False),
+        sa.Column('preco_unitario', sa.Numeric(precision=10, scale=4), nullable=False),
+        sa.Column('valor', sa.Numeric(precision=14, scale=2), nullable=False),
+        sa.Column('periodicidade', sa.String(length=10), nullable=False),
+        sa.Column('data_geracao', sa.DateTime(), nullable=False),
+        sa.CheckConstraint("periodicidade in ('diario', 'mensal')", name='check_periodicidade_snapshot'),
+        sa.ForeignKeyConstraint(['produto_id'], ['produto.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('produto_id', 'posicao_em', name='uq_estoque_snapshot_produto_posicao')
+    )
+    with op.batch_alter_table('estoque_snapshot', schema=None) as batch_op:
+        batch_op.create_index('ix_estoque_snapshot_posicao', ['posicao_em'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('estoque_snapshot', schema=None) as batch_op:
+        batch_op.drop_index('ix_estoque_snapshot_posicao')
+
+    op.drop_table('estoque_snapshot')
@@ -0,0 +1,47 @@
+"""add desperdicio_diario rollup table
+
+Revision ID: b0d2f4a7c908
+Revises: a9c1e3f6b807
+Create Date: 2026-10-17 09:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b0d2f4a7c908'
+down_revision = 'a9c1e3f6b807'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('desperdicio_diario',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('data', sa.Date(), nullable=False),
+        sa.Column('categoria_id', sa.Integer(), nullable=False),
+        sa.Column('produto_id', sa.Integer(), nullable=True),
+        sa.Column('prato_id', sa.Integer(), nullable=True),
+        sa.Column('quantidade', sa.Float(), nullable=False),
+        sa.Column('valor', sa.Numeric(precision=12, scale=2), nullable=False),
+        sa.Column('total_registros', sa.Integer(), nullable=False),
+        sa.Column('unidade', sa.String(length=10), nullable=True),
+        sa.ForeignKeyConstraint(['categoria_id'], ['categoria_desperdicio.id'], ),
+        sa.ForeignKeyConstraint(['produto_id'], ['produto.id'], ),
+        sa.ForeignKeyConstraint(['prato_id'], ['pratos.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('data', 'categoria_id', 'produto_id', 'prato_id', name='uq_desperdicio_diario_item')
+    )
+    with op.batch_alter_table('desperdicio_diario', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_desperdicio_diario_data'), ['data'], unique=False)
+
+    # O agregado é populado a partir dos registros com:
+    #   python -m app.scripts.agregados_desperdicio --rebuild
+
+
+def downgrade():
+    with op.batch_alter_table('desperdicio_diario', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_desperdicio_diario_data'))
+
+    op.drop_table('desperdicio_diario')
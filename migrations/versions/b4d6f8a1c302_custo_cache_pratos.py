@@ -0,0 +1,46 @@
+"""add persisted cost cache to pratos
+
+Revision ID: b4d6f8a1c302
+Revises: a3c5e7f9b201
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4d6f8a1c302'
+down_revision = 'a3c5e7f9b201'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pratos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('custo_direto_cache', sa.Numeric(precision=12, scale=4), nullable=True))
+        batch_op.add_column(sa.Column('custo_porcao_cache', sa.Numeric(precision=12, scale=4), nullable=True))
+        batch_op.create_index(batch_op.f('ix_pratos_custo_direto_cache'), ['custo_direto_cache'], unique=False)
+        batch_op.create_index(batch_op.f('ix_pratos_custo_porcao_cache'), ['custo_porcao_cache'], unique=False)
+
+    # Preencher o cache com as receitas e preços atuais
+    op.execute("""
+        UPDATE pratos SET custo_direto_cache = (
+            SELECT COALESCE(SUM(pi.quantidade * p.preco_unitario), 0)
+            FROM prato_insumo pi JOIN produto p ON p.id = pi.produto_id
+            WHERE pi.prato_id = pratos.id
+        )
+    """)
+    op.execute("""
+        UPDATE pratos SET custo_porcao_cache =
+            CASE WHEN porcoes_rendimento > 0 THEN custo_direto_cache / porcoes_rendimento ELSE 0 END
+            + COALESCE(custo_indireto, 0)
+    """)
+
+
+def downgrade():
+    with op.batch_alter_table('pratos', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pratos_custo_porcao_cache'))
+        batch_op.drop_index(batch_op.f('ix_pratos_custo_direto_cache'))
+        batch_op.drop_column('custo_porcao_cache')
+        batch_op.drop_column('custo_direto_cache')
@@ -0,0 +1,53 @@
+"""unique index on vendas_diarias_agregadas (data, coalesce(prato_id, 0))
+
+Revision ID: c1e3a5b7d909
+Revises: b0d2f4a7c908
+Create Date: 2026-10-17 15:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c1e3a5b7d909'
+down_revision = 'b0d2f4a7c908'
+branch_labels = None
+depends_on = None
+
+AGREGADO = sa.table('vendas_diarias_agregadas',
+    sa.column('id', sa.Integer()),
+    sa.column('data', sa.Date()),
+    sa.column('prato_id', sa.Integer()),
+    sa.column('quantidade', sa.Integer()),
+    sa.column('receita', sa.Numeric(12, 2)),
+    sa.column('custo', sa.Numeric(12, 2)),
+    sa.column('total_registros', sa.Integer())
+)
+
+
+def upgrade():
+    # A restrição antiga não impedia linhas repetidas de vendas sem prato
+    # (NULL não colide): junta cada grupo na linha de menor id antes do índice
+    conexao = op.get_bind()
+    t = AGREGADO.c
+    repetidas = conexao.execute(
+        sa.select(t.data, sa.func.min(t.id), sa.func.sum(t.quantidade), sa.func.sum(t.receita),
+                  sa.func.sum(t.custo), sa.func.sum(t.total_registros))
+        .where(t.prato_id.is_(None)).group_by(t.data).having(sa.func.count(t.id) > 1)
+    ).all()
+    for data, id_, quantidade, receita, custo, registros in repetidas:
+        conexao.execute(AGREGADO.update().where(t.id == id_).values(
+            quantidade=quantidade, receita=receita, custo=custo, total_registros=registros))
+        conexao.execute(AGREGADO.delete().where(t.data == data, t.prato_id.is_(None), t.id != id_))
+
+    with op.batch_alter_table('vendas_diarias_agregadas', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_venda_diaria_data_prato', type_='unique')
+    op.create_index('uq_venda_diaria_data_prato', 'vendas_diarias_agregadas',
+                    ['data', sa.text('coalesce(prato_id, 0)')], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_venda_diaria_data_prato', table_name='vendas_diarias_agregadas')
+    with op.batch_alter_table('vendas_diarias_agregadas', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_venda_diaria_data_prato', ['data', 'prato_id'])
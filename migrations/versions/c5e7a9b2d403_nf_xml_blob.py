@@ -0,0 +1,88 @@
+"""move NFe XML into compressed blob store
+
+Revision ID: c5e7a9b2d403
+Revises: b4d6f8a1c302
+Create Date: 2026-10-16 12:00:00.000000
+
+"""
+import gzip
+import hashlib
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5e7a9b2d403'
+down_revision = 'b4d6f8a1c302'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('nf_xml_blob',
+    sa.Column('hash', sa.String(length=64), nullable=False),
+    sa.Column('algoritmo', sa.String(length=10), nullable=False),
+    sa.Column('tamanho_original', sa.Integer(), nullable=False),
+    sa.Column('tamanho_comprimido', sa.Integer(), nullable=False),
+    sa.Column('conteudo', sa.LargeBinary(), nullable=False),
+    sa.Column('data_criacao', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('hash')
+    )
+    with op.batch_alter_table('nf_nota', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('xml_hash', sa.String(length=64), nullable=True))
+        batch_op.create_index(batch_op.f('ix_nf_nota_xml_hash'), ['xml_hash'], unique=False)
+        batch_op.create_foreign_key('fk_nf_nota_xml_hash', 'nf_xml_blob', ['xml_hash'], ['hash'])
+
+    # Migrar os XMLs existentes (gzip, para não depender do zstandard na migração)
+    conn = op.get_bind()
+    blobs = sa.table('nf_xml_blob',
+        sa.column('hash', sa.String), sa.column('algoritmo', sa.String),
+        sa.column('tamanho_original', sa.Integer), sa.column('tamanho_comprimido', sa.Integer),
+        sa.column('conteudo', sa.LargeBinary), sa.column('data_criacao', sa.DateTime))
+    notas = conn.execute(sa.text(
+        "SELECT id, chave_acesso, xml_data FROM nf_nota WHERE xml_data IS NOT NULL"
+    )).fetchall()
+    gravados = set()
+    for nota_id, chave_acesso, xml_data in notas:
+        hash_chave = hashlib.sha256(chave_acesso.encode('utf-8')).hexdigest()
+        if hash_chave not in gravados:
+            dados = xml_data.encode('utf-8')
+            comprimido = gzip.compress(dados, compresslevel=9)
+            conn.execute(blobs.insert().values(
+                hash=hash_chave, algoritmo='gzip', tamanho_original=len(dados),
+                tamanho_comprimido=len(comprimido), conteudo=comprimido,
+                data_criacao=sa.func.now()))
+            gravados.add(hash_chave)
+        conn.execute(sa.text("UPDATE nf_nota SET xml_hash = :h WHERE id = :id"),
+                     {'h': hash_chave, 'id': nota_id})
+
+    with op.batch_alter_table('nf_nota', schema=None) as batch_op:
+        batch_op.drop_column('xml_data')
+
+
+def downgrade():
+    with op.batch_alter_table('nf_nota', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('xml_data', sa.Text(), nullable=True))
+
+    # Restaurar o XML descomprimido na própria nota
+    conn = op.get_bind()
+    linhas = conn.execute(sa.text(
+        "SELECT n.id, b.algoritmo, b.conteudo FROM nf_nota n "
+        "JOIN nf_xml_blob b ON b.hash = n.xml_hash"
+    )).fetchall()
+    for nota_id, algoritmo, conteudo in linhas:
+        if algoritmo == 'zstd':
+            import zstandard
+            dados = zstandard.ZstdDecompressor().decompress(conteudo)
+        else:
+            dados = gzip.decompress(conteudo)
+        conn.execute(sa.text("UPDATE nf_nota SET xml_data = :x WHERE id = :id"),
+                     {'x': dados.decode('utf-8'), 'id': nota_id})
+
+    with op.batch_alter_table('nf_nota', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_nf_nota_xml_hash', type_='foreignkey')
+        batch_op.drop_index(batch_op.f('ix_nf_nota_xml_hash'))
+        batch_op.drop_column('xml_hash')
+
+    op.drop_table('nf_xml_blob')
@@ -0,0 +1,60 @@
+"""unique index on desperdicio_diario with coalesced item columns
+
+Revision ID: d2f4b6c8e010
+Revises: c1e3a5b7d909
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2f4b6c8e010'
+down_revision = 'c1e3a5b7d909'
+branch_labels = None
+depends_on = None
+
+AGREGADO = sa.table('desperdicio_diario',
+    sa.column('id', sa.Integer()),
+    sa.column('data', sa.Date()),
+    sa.column('categoria_id', sa.Integer()),
+    sa.column('produto_id', sa.Integer()),
+    sa.column('prato_id', sa.Integer()),
+    sa.column('quantidade', sa.Float()),
+    sa.column('valor', sa.Numeric(12, 2)),
+    sa.column('total_registros', sa.Integer())
+)
+
+
+def upgrade():
+    # A restrição antiga não impedia linhas repetidas quando produto_id ou
+    # prato_id é NULL (NULL não colide): junta cada grupo na linha de menor id
+    conexao = op.get_bind()
+    t = AGREGADO.c
+    produto = sa.func.coalesce(t.produto_id, 0)
+    prato = sa.func.coalesce(t.prato_id, 0)
+    repetidas = conexao.execute(
+        sa.select(t.data, t.categoria_id, produto, prato, sa.func.min(t.id), sa.func.sum(t.quantidade),
+                  sa.func.sum(t.valor), sa.func.sum(t.total_registros))
+        .group_by(t.data, t.categoria_id, produto, prato).having(sa.func.count(t.id) > 1)
+    ).all()
+    for data, categoria_id, produto_id, prato_id, id_, quantidade, valor, registros in repetidas:
+        conexao.execute(AGREGADO.update().where(t.id == id_).values(
+            quantidade=quantidade, valor=valor, total_registros=registros))
+        conexao.execute(AGREGADO.delete().where(
+            t.data == data, t.categoria_id == categoria_id, produto == produto_id, prato == prato_id, t.id != id_
+        ))
+
+    with op.batch_alter_table('desperdicio_diario', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_desperdicio_diario_item', type_='unique')
+    op.create_index('uq_desperdicio_diario_item', 'desperdicio_diario',
+                    ['data', 'categoria_id', sa.text('coalesce(produto_id, 0)'), sa.text('coalesce(prato_id, 0)')],
+                    unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_desperdicio_diario_item', table_name='desperdicio_diario')
+    with op.batch_alter_table('desperdicio_diario', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_desperdicio_diario_item',
+                                          ['data', 'categoria_id', 'produto_id', 'prato_id'])
@@ -0,0 +1,48 @@
+"""add resultado_backtest table for forecast method selection
+
+Revision ID: d6f8b0c3e504
+Revises: c5e7a9b2d403
+Create Date: 2026-10-16 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd6f8b0c3e504'
+down_revision = 'c5e7a9b2d403'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resultado_backtest',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('data_execucao', sa.DateTime(), nullable=False),
+        sa.Column('cardapio_item_id', sa.Integer(), nullable=True),
+        sa.Column('prato_id', sa.Integer(), nullable=True),
+        sa.Column('metodo', sa.String(length=50), nullable=False),
+        sa.Column('horizonte', sa.Integer(), nullable=False),
+        sa.Column('origens', sa.Integer(), nullable=False),
+        sa.Column('mape', sa.Float(), nullable=True),
+        sa.Column('wape', sa.Float(), nullable=True),
+        sa.Column('vies', sa.Float(), nullable=True),
+        sa.Column('melhor', sa.Boolean(), nullable=False),
+        sa.ForeignKeyConstraint(['cardapio_item_id'], ['cardapio_item.id'], ),
+        sa.ForeignKeyConstraint(['prato_id'], ['pratos.id'], ),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('resultado_backtest', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_resultado_backtest_cardapio_item_id'), ['cardapio_item_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_resultado_backtest_prato_id'), ['prato_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_resultado_backtest_melhor'), ['melhor'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('resultado_backtest', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_resultado_backtest_melhor'))
+        batch_op.drop_index(batch_op.f('ix_resultado_backtest_prato_id'))
+        batch_op.drop_index(batch_op.f('ix_resultado_backtest_cardapio_item_id'))
+
+    op.drop_table('resultado_backtest')
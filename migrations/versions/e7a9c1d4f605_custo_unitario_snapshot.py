@@ -0,0 +1,26 @@
+"""add custo_unitario_snapshot to historico_vendas
+
+Revision ID: e7a9c1d4f605
+Revises: d6f8b0c3e504
+Create Date: 2026-10-16 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7a9c1d4f605'
+down_revision = 'd6f8b0c3e504'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('historico_vendas', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('custo_unitario_snapshot', sa.Numeric(precision=12, scale=4), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('historico_vendas', schema=None) as batch_op:
+        batch_op.drop_column('custo_unitario_snapshot')
@@ -0,0 +1,46 @@
+"""add produto_preco_historico table for point-in-time prices
+
+Revision ID: f8b0d2e5a706
+Revises: e7a9c1d4f605
+Create Date: 2026-10-16 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f8b0d2e5a706'
+down_revision = 'e7a9c1d4f605'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('produto_preco_historico',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('produto_id', sa.Integer(), nullable=False),
+        sa.Column('vigente_desde', sa.DateTime(), nullable=False),
+        sa.Column('preco_medio', sa.Numeric(precision=10, scale=4), nullable=False),
+        sa.Column('ultimo_preco_compra', sa.Numeric(precision=10, scale=4), nullable=True),
+        sa.Column('origem', sa.String(length=20), nullable=False),
+        sa.Column('referencia', sa.String(length=100), nullable=True),
+        sa.CheckConstraint('preco_medio >= 0', name='check_preco_historico_positivo'),
+        sa.ForeignKeyConstraint(['produto_id'], ['produto.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('produto_preco_historico', schema=None) as batch_op:
+        batch_op.create_index('ix_produto_preco_historico_produto_data', ['produto_id', 'vigente_desde'], unique=False)
+
+    # Ponto de partida: o preço atual de cada produto já cadastrado
+    op.execute(
+        "INSERT INTO produto_preco_historico (produto_id, vigente_desde, preco_medio, origem) "
+        "SELECT id, COALESCE(data_cadastro, CURRENT_TIMESTAMP), COALESCE(preco_unitario, 0), 'cadastro' FROM produto"
+    )
+
+
+def downgrade():
+    with op.batch_alter_table('produto_preco_historico', schema=None) as batch_op:
+        batch_op.drop_index('ix_produto_preco_historico_produto_data')
+
+    op.drop_table('produto_preco_historico')
@@ -0,0 +1,218 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Micro-benchmark do parser de NF-e
+
+Compara o parser incremental (app.utils.nfe_parser.ler_nfe) com cópias congeladas
+das três implementações anteriores:
+    - ElementTree com buscas './/' (antigo nfe_importer.importar_nfe_xml)
+    - xmltodict (antigo nfe_parser.extrair_dados_nfe)
+    - xmltodict com namespaces + busca recursiva (antigo nfe/views.py::processar_xml_nfe)
+
+Uso (a partir da raiz do projeto):
+    python scripts/benchmark_nfe_parser.py [--itens 5000] [--repeticoes 5]
+"""
+import argparse
+import glob
+import os
+import re
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+from datetime import datetime
+
+import xmltodict
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app.utils.nfe_parser import ler_nfe  # noqa: E402
+
+NS = {'nfe': 'http://www.portalfiscal.inf.br/nfe'}
+PASTA_NFE = os.path.join(os.path.dirname(__file__), '..', 'nf e')
+
+
+# ---------------------------------------------------------------------------
+# Implementações anteriores (cópias congeladas, apenas a parte de leitura)
+# ---------------------------------------------------------------------------
+
+def legado_elementtree(xml_content):
+    """Antigo nfe_importer: ElementTree com buscas './/' repetidas"""
+    root = ET.fromstring(xml_content)
+    infNFe = root.find('.//nfe:NFe', NS).find('.//nfe:infNFe', NS)
+    ide = infNFe.find('.//nfe:ide', NS)
+    emit = infNFe.find('.//nfe:emit', NS)
+    total = infNFe.find('.//nfe:total/nfe:ICMSTot', NS)
+    dados = {
+        'chave_acesso': infNFe.get('Id').replace('NFe', ''),
+        'cnpj': emit.find('.//nfe:CNPJ', NS).text,
+        'razao_social': emit.find('.//nfe:xNome', NS).text,
+        'numero': ide.find('.//nfe:nNF', NS).text,
+        'serie': ide.find('.//nfe:serie', NS).text,
+        'data_emissao': datetime.strptime(ide.find('.//nfe:dhEmi', NS).text, '%Y-%m-%dT%H:%M:%S%z'),
+        'valor_total': float(total.find('.//nfe:vNF', NS).text),
+        'itens': []
+    }
+    for det in infNFe.findall('.//nfe:det', NS):
+        prod = det.find('.//nfe:prod', NS)
+        imposto = det.find('.//nfe:imposto', NS)
+        item = {
+            'num_item': int(det.get('nItem')),
+            'codigo': prod.find('.//nfe:cProd', NS).text,
+            'descricao': prod.find('.//nfe:xProd', NS).text,
+            'quantidade': float(prod.find('.//nfe:qCom', NS).text),
+            'valor_unitario': float(prod.find('.//nfe:vUnCom', NS).text),
+            'valor_total': float(prod.find('.//nfe:vProd', NS).text),
+            'unidade': prod.find('.//nfe:uCom', NS).text,
+            'cfop': prod.find('.//nfe:CFOP', NS).text,
+            'ncm': prod.find('.//nfe:NCM', NS).text,
+        }
+        icms = imposto.find('.//nfe:ICMS/nfe:ICMS00', NS)
+        if icms is not None:
+            item['icms_aliquota'] = float(icms.find('.//nfe:pICMS', NS).text or 0)
+            item['icms_valor'] = float(icms.find('.//nfe:vICMS', NS).text or 0)
+        dados['itens'].append(item)
+    return dados
+
+
+def _itens_xmltodict(det):
+    if isinstance(det, dict):
+        det = [det]
+    itens = []
+    for item in det:
+        prod = item['prod']
+        icms_valor = icms_aliquota = None
+        if 'imposto' in item and 'ICMS' in item['imposto']:
+            for _, icms_data in item['imposto']['ICMS'].items():
+                if isinstance(icms_data, dict):
+                    icms_valor = float(icms_data.get('vICMS', 0))
+                    icms_aliquota = float(icms_data.get('pICMS', 0))
+                    break
+        itens.append({
+            'num_item': int(item['@nItem']),
+            'codigo': prod['cProd'],
+            'descricao': prod['xProd'],
+            'unidade': prod['uCom'],
+            'quantidade': float(prod['qCom']),
+            'valor_unitario': float(prod['vUnCom']),
+            'valor_total': float(prod['vProd']),
+            'ncm': prod.get('NCM'),
+            'cfop': prod.get('CFOP'),
+            'icms_valor': icms_valor,
+            'icms_aliquota': icms_aliquota,
+        })
+    return itens
+
+
+def legado_xmltodict(xml_content):
+    """Antigo nfe_parser.extrair_dados_nfe: xmltodict sem namespaces"""
+    xml_dict = xmltodict.parse(xml_content)
+    nfe = xml_dict['nfeProc']['NFe']['infNFe']
+    ide = nfe['ide']
+    total = nfe['total']['ICMSTot']
+    return {
+        'chave_acesso': xml_dict['nfeProc']['protNFe']['infProt']['chNFe'],
+        'numero': ide['nNF'],
+        'serie': ide['serie'],
+        'data_emissao': datetime.strptime(ide['dhEmi'].split('T')[0], '%Y-%m-%d'),
+        'cnpj': nfe['emit']['CNPJ'],
+        'valor_total': float(total['vNF']),
+        'itens': _itens_xmltodict(nfe['det'])
+    }
+
+
+def legado_views(xml_content):
+    """Antigo nfe/views.py::processar_xml_nfe: xmltodict com namespaces + busca recursiva"""
+    xml_dict = xmltodict.parse(xml_content, process_namespaces=True,
+                               namespaces={'http://www.portalfiscal.inf.br/nfe': None})
+
+    def buscar_chave(dados, chave):
+        if isinstance(dados, dict):
+            for k, v in dados.items():
+                if k == chave:
+                    return v
+                if isinstance(v, (dict, list)):
+                    res = buscar_chave(v, chave)
+                    if res:
+                        return res
+        elif isinstance(dados, list):
+            for item in dados:
+                res = buscar_chave(item, chave)
+                if res:
+                    return res
+        return None
+
+    inf_nfe = buscar_chave(xml_dict, 'infNFe')
+    ide = inf_nfe['ide']
+    total = inf_nfe['total']['ICMSTot']
+    return {
+        'chave_acesso': xml_dict['nfeProc']['protNFe']['infProt'].get('chNFe'),
+        'numero': ide['nNF'],
+        'serie': ide['serie'],
+        'cnpj': inf_nfe['emit'].get('CNPJ'),
+        'valor_total': float(total['vNF']),
+        'itens': _itens_xmltodict(inf_nfe['det'])
+    }
+
+
+# ---------------------------------------------------------------------------
+# Geração de dados e medição
+# ---------------------------------------------------------------------------
+
+def gerar_nota_sintetica(xml_base, quantidade_itens):
+    """Replica os <det> da nota de exemplo até atingir a quantidade de itens desejada"""
+    dets = re.findall(r'<det nItem="\d+">.*?</det>', xml_base, flags=re.S)
+    novos = []
+    for i in range(quantidade_itens):
+        det = dets[i % len(dets)]
+        novos.append(re.sub(r'nItem="\d+"', f'nItem="{i + 1}"', det, count=1))
+    inicio = xml_base.index(dets[0])
+    fim = xml_base.index(dets[-1]) + len(dets[-1])
+    return xml_base[:inicio] + ''.join(novos) + xml_base[fim:]
+
+
+def medir(funcao, xml_content, repeticoes):
+    """Retorna o melhor tempo (s) e o pico de memória (KiB) de uma implementação"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(xml_content)
+        tempos.append(time.perf_counter() - inicio)
+
+    tracemalloc.start()
+    funcao(xml_content)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(tempos), pico / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark dos parsers de NF-e')
+    parser.add_argument('--itens', type=int, default=5000, help='Itens da nota sintética')
+    parser.add_argument('--repeticoes', type=int, default=5, help='Repetições por medição')
+    args = parser.parse_args()
+
+    caminho = glob.glob(os.path.join(PASTA_NFE, '*.xml'))[0]
+    with open(caminho, encoding='utf-8') as f:
+        xml_amostra = f.read()
+
+    cenarios = [
+        ('amostra (%d itens)' % len(ler_nfe(xml_amostra).itens), xml_amostra),
+        ('sintética (%d itens)' % args.itens, gerar_nota_sintetica(xml_amostra, args.itens)),
+    ]
+    implementacoes = [
+        ('iterparse (atual)', ler_nfe),
+        ('ElementTree .//', legado_elementtree),
+        ('xmltodict', legado_xmltodict),
+        ('xmltodict + busca', legado_views),
+    ]
+
+    for nome_cenario, xml_content in cenarios:
+        print(f"\nNota {nome_cenario} - {len(xml_content) / 1024:.0f} KiB")
+        print(f"{'Implementação':<22}{'Tempo (ms)':>12}{'Pico mem. (KiB)':>18}")
+        for nome, funcao in implementacoes:
+            tempo, pico = medir(funcao, xml_content, args.repeticoes)
+            print(f"{nome:<22}{tempo * 1000:>12.2f}{pico:>18.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Micro-benchmark da normalização sazonal
+
+Compara o índice vetorizado (app.utils.sazonalidade.IndiceSazonalidade) com uma
+cópia congelada do laço antigo de gerar_previsao (item × data × fator), em um
+banco SQLite em memória.
+
+Uso (a partir da raiz do projeto):
+    python scripts/benchmark_sazonalidade.py [--itens 100] [--dias 365] [--repeticoes 3]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models.modelo_prato import Prato  # noqa: E402
+from app.models.modelo_previsao import FatorSazonalidade  # noqa: E402
+from app.utils.sazonalidade import IndiceSazonalidade  # noqa: E402
+
+
+def legado_laco(valores, datas, fatores):
+    """Antigo gerar_previsao: um item por vez, data × fator"""
+    valores = list(valores)
+    for i, data in enumerate(datas):
+        for fator in fatores:
+            aplica_fator = False
+            if fator.mes and fator.mes == data.month:
+                aplica_fator = True
+            if fator.dia_semana is not None and fator.dia_semana == data.weekday():
+                aplica_fator = True
+            if aplica_fator:
+                valores[i] = valores[i] / fator.fator
+    return valores
+
+
+def medir(funcao, repeticoes):
+    """Menor tempo entre as repetições (segundos)"""
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append(time.perf_counter() - inicio)
+    return min(tempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark da normalização sazonal')
+    parser.add_argument('--itens', type=int, default=100, help='Pratos na matriz de vendas')
+    parser.add_argument('--dias', type=int, default=365, help='Dias na matriz de vendas')
+    parser.add_argument('--repeticoes', type=int, default=3, help='Repetições por medição')
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        pratos = [Prato(nome=f"Prato {i}", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+                  for i in range(args.itens)]
+        fatores = [FatorSazonalidade(mes=m, fator=1 + m / 20) for m in range(1, 13)]
+        fatores += [FatorSazonalidade(dia_semana=d, fator=0.8 + d / 10) for d in range(7)]
+        db.session.add_all(pratos + fatores)
+        db.session.commit()
+
+        datas = [date(2024, 1, 1) + timedelta(days=i) for i in range(args.dias)]
+        valores = np.random.default_rng(1).integers(1, 50, size=(args.dias, args.itens)).astype(float)
+        itens = [('prato', p.id) for p in pratos]
+
+        tempo_laco = medir(lambda: [legado_laco(valores[:, c], datas, fatores) for c in range(args.itens)],
+                           args.repeticoes)
+        tempo_indice = medir(lambda: IndiceSazonalidade.compilar(itens).dessazonalizar(valores, datas),
+                             args.repeticoes)
+
+    item_dias = args.dias * args.itens
+    print(f"{args.itens} itens × {args.dias} dias")
+    print(f"{'Implementação':<22}{'Tempo (ms)':>12}{'item-dias/s':>16}")
+    for nome, tempo in (('índice (atual)', tempo_indice), ('laço', tempo_laco)):
+        print(f"{nome:<22}{tempo * 1000:>12.2f}{item_dias / tempo:>16,.0f}")
+
+
+if __name__ == '__main__':
+    main()
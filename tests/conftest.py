@@ -2,6 +2,7 @@ import os
 import sys
 import pytest
 from flask import Flask
+from sqlalchemy import create_engine, event
 
 # Adicionar o diretório raiz do projeto ao PYTHONPATH
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
@@ -56,6 +57,7 @@ def session(app):
         session = db.scoped_session(
             db.sessionmaker(autocommit=False, autoflush=False, bind=connection)
         )
+        sessao_original = db.session
         db.session = session
         
         yield session
@@ -64,3 +66,40 @@ def session(app):
         session.close()
         transaction.rollback()
         connection.close()
+        db.session = sessao_original
+
+@pytest.fixture(scope='function')
+def consultas(app):
+    """
+    Fixture que registra o SQL de cada consulta enviada ao banco durante o teste
+    (use consultas.clear() antes do trecho medido)
+    """
+    registradas = []
+
+    def registrar(conn, cursor, statement, *args):
+        registradas.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', registrar)
+    yield registradas
+    event.remove(db.engine, 'before_cursor_execute', registrar)
+
+@pytest.fixture(scope='function')
+def banco_arquivo(app, tmp_path):
+    """
+    Fixture que troca o banco em memória por um SQLite em arquivo (modo WAL),
+    com uma sessão (e conexão) por thread, como em workers separados
+    """
+    engine = create_engine(f"sqlite:///{tmp_path / 'concorrencia.sqlite'}", connect_args={'timeout': 30})
+
+    @event.listens_for(engine, 'connect')
+    def _wal(conexao, registro):
+        conexao.execute('PRAGMA journal_mode=WAL')
+
+    db.metadata.create_all(engine)
+    sessao_original = db.session
+    db.session = db.scoped_session(db.sessionmaker(bind=engine))
+
+    yield engine
+
+    db.session = sessao_original
+    engine.dispose()
@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import insert
+
+from app.extensions import db
+from app.models.modelo_desperdicio import CategoriaDesperdicio, DesperdicioDiario, RegistroDesperdicio
+from app.models.modelo_prato import Prato
+from app.models.modelo_produto import Produto
+from app.routes.dashboard.views import obter_indicadores_desperdicio
+from app.utils.agregados_desperdicio import (
+    acumular_desperdicio_diario, reconstruir_desperdicio_diario, somar_totais_desperdicio,
+    verificar_desperdicio_diario
+)
+
+
+def _cadastros(session):
+    sobras = CategoriaDesperdicio(nome="Sobras Agregado")
+    vencido = CategoriaDesperdicio(nome="Vencido Agregado")
+    queijo = Produto(nome="Queijo Agregado", unidade="kg", preco_unitario=40.0)
+    lasanha = Prato(nome="Lasanha Agregado", rendimento=8, unidade_rendimento="porção", porcoes_rendimento=8)
+    session.add_all([sobras, vencido, queijo, lasanha])
+    session.commit()
+    return sobras, vencido, queijo, lasanha
+
+
+def test_registrar_desperdicio_atualiza_agregado(app, session):
+    """Registros pela tela somam no agregado do dia, por categoria e item"""
+    sobras, _, queijo, _ = _cadastros(session)
+    cliente = app.test_client()
+    for quantidade, valor in ((0.5, 20.0), (0.25, 10.0)):
+        resposta = cliente.post('/desperdicio/registrar', data={
+            'categoria_id': sobras.id, 'tipo_item': 'produto', 'produto_id': queijo.id,
+            'quantidade': quantidade, 'unidade': 'kg', 'valor_estimado': valor, 'data_registro': '2025-02-14'
+        })
+        assert resposta.status_code == 302
+
+    linhas = DesperdicioDiario.query.filter_by(data=date(2025, 2, 14)).all()
+    assert len(linhas) == 1
+    assert linhas[0].categoria_id == sobras.id and linhas[0].produto_id == queijo.id
+    assert linhas[0].quantidade == 0.75
+    assert float(linhas[0].valor) == 30.0
+    assert linhas[0].total_registros == 2
+    assert verificar_desperdicio_diario(date(2025, 2, 14), date(2025, 2, 14)) == []
+
+    indicadores = obter_indicadores_desperdicio(date(2025, 2, 1), date(2025, 2, 28))
+    assert indicadores['total_registros'] == 2
+    assert indicadores['valor_total'] == 30.0
+    assert indicadores['categorias'] == {'Sobras Agregado': 2}
+
+
+def test_acumular_lote_com_itens_e_dias_distintos(session):
+    sobras, vencido, queijo, lasanha = _cadastros(session)
+    registros = [
+        RegistroDesperdicio(data_registro=datetime(2025, 2, 14, 10), categoria_id=sobras.id, prato_id=lasanha.id,
+                            quantidade=2, unidade='porção', valor_estimado=30),
+        RegistroDesperdicio(data_registro=datetime(2025, 2, 14, 22), categoria_id=sobras.id, prato_id=lasanha.id,
+                            quantidade=1, unidade='porção', valor_estimado=15),
+        RegistroDesperdicio(data_registro=datetime(2025, 2, 14, 22), categoria_id=vencido.id, produto_id=queijo.id,
+                            quantidade=1, unidade='kg', valor_estimado=40),
+        RegistroDesperdicio(data_registro=datetime(2025, 2, 15, 8), categoria_id=sobras.id, prato_id=lasanha.id,
+                            quantidade=1, unidade='porção', valor_estimado=15),
+    ]
+    session.add_all(registros)
+    assert acumular_desperdicio_diario(registros) == 3
+    session.commit()
+
+    # Um segundo lote soma nas linhas existentes
+    extra = RegistroDesperdicio(data_registro=datetime(2025, 2, 15, 9), categoria_id=sobras.id,
+                                prato_id=lasanha.id, quantidade=3, unidade='porção', valor_estimado=45)
+    session.add(extra)
+    acumular_desperdicio_diario([extra])
+    session.commit()
+
+    dia_15 = DesperdicioDiario.query.filter_by(data=date(2025, 2, 15)).one()
+    assert (dia_15.quantidade, float(dia_15.valor), dia_15.total_registros) == (4.0, 60.0, 2)
+    assert DesperdicioDiario.query.filter_by(data=date(2025, 2, 14)).count() == 2
+    assert verificar_desperdicio_diario() == []
+
+
+def test_reconstruir_corrige_divergencias(session):
+    sobras, _, queijo, _ = _cadastros(session)
+    # Importação direta, sem passar pelo agregado
+    session.execute(insert(RegistroDesperdicio), [
+        {'data_registro': datetime(2025, 3, dia, 12), 'categoria_id': sobras.id, 'produto_id': queijo.id,
+         'quantidade': 1.0, 'unidade': 'kg', 'valor_estimado': 40}
+        for dia in (1, 1, 2)
+    ])
+    session.commit()
+
+    divergencias = verificar_desperdicio_diario(date(2025, 3, 1), date(2025, 3, 31))
+    assert [d['data'] for d in divergencias] == ['2025-03-01', '2025-03-02']
+    assert divergencias[0]['esperado']['registros'] == 2
+    assert divergencias[0]['agregado']['registros'] == 0
+
+    assert reconstruir_desperdicio_diario(date(2025, 3, 1), date(2025, 3, 31)) == 2
+    assert verificar_desperdicio_diario(date(2025, 3, 1), date(2025, 3, 31)) == []
+    assert float(DesperdicioDiario.query.filter_by(data=date(2025, 3, 1)).one().valor) == 80.0
+
+
+def test_somas_concorrentes_nao_duplicam_linhas(app, banco_arquivo):
+    """Workers registrando o mesmo produto e o mesmo prato no mesmo dia ao mesmo tempo"""
+    dia = date(2025, 3, 1)
+    with app.app_context():
+        sobras, _, queijo, lasanha = _cadastros(db.session)
+        chaves = [(dia, sobras.id, queijo.id, None), (dia, sobras.id, None, lasanha.id)]
+        db.session.remove()
+
+    def registrar(_):
+        with app.app_context():
+            try:
+                somar_totais_desperdicio({chave: [0.5, Decimal('2.00'), 1, 'kg'] for chave in chaves})
+                db.session.commit()
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(registrar, range(40)))
+
+    with app.app_context():
+        linhas = DesperdicioDiario.query.filter_by(data=dia).all()
+        assert len(linhas) == 2
+        assert {(linha.quantidade, float(linha.valor), linha.total_registros) for linha in linhas} == {(20.0, 80.0, 40)}
+        db.session.remove()
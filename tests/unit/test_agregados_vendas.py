@@ -0,0 +1,120 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from decimal import Decimal
+
+from app.extensions import db
+
+from app.models.modelo_produto import Produto
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_cardapio import Cardapio, CardapioSecao, CardapioItem
+from app.models.modelo_previsao import HistoricoVendas, VendaDiariaAgregada
+from app.utils.agregados_vendas import (
+    acumular_vendas_diarias, reconstruir_vendas_diarias, somar_totais_diarios, verificar_vendas_diarias
+)
+from app.routes.dashboard.views import calcular_metricas_principais
+
+
+def _criar_prato(session):
+    ing = Produto(nome="Ing Agregado", unidade="kg", preco_unitario=10.00)
+    prato = Prato(nome="Prato Agregado", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+    session.add_all([ing, prato])
+    session.commit()
+
+    session.add(PratoInsumo(prato_id=prato.id, produto_id=ing.id, quantidade=0.5))
+    session.commit()
+    return prato
+
+
+def test_registrar_venda_atualiza_agregado(session):
+    """Vendas registradas somam no agregado do dia, inclusive via item de cardápio"""
+    prato = _criar_prato(session)
+    cardapio = Cardapio(nome="Cardápio Agregado")
+    session.add(cardapio)
+    session.commit()
+    secao = CardapioSecao(nome="Principais", cardapio_id=cardapio.id)
+    session.add(secao)
+    session.commit()
+    item = CardapioItem(secao_id=secao.id, prato_id=prato.id, preco_venda=30.00)
+    session.add(item)
+    session.commit()
+
+    dia = date(2024, 3, 10)
+    HistoricoVendas.registrar_venda(dia, prato.id, 'prato', 2, 30.00)
+    HistoricoVendas.registrar_venda(dia, item.id, 'cardapio_item', 1, 30.00)
+
+    linhas = VendaDiariaAgregada.query.filter_by(data=dia).all()
+    assert len(linhas) == 1
+    assert linhas[0].prato_id == prato.id
+    assert linhas[0].quantidade == 3
+    assert float(linhas[0].receita) == 90.00
+    assert float(linhas[0].custo) == 15.00  # 3 porções x 5.00
+    assert verificar_vendas_diarias(dia, dia) == []
+
+    receita, custo, lucro, _ = calcular_metricas_principais(dia, dia)
+    assert receita == 90.00
+    assert custo == 15.00
+    assert lucro == 75.00
+
+
+def test_reconstruir_e_verificar_agregado(session):
+    """Vendas inseridas sem manutenção são detectadas e corrigidas pela reconstrução"""
+    prato = _criar_prato(session)
+    dia = date(2024, 4, 2)
+
+    vendas = [
+        HistoricoVendas(data=dia, prato_id=prato.id, quantidade=q, valor_unitario=20.00, valor_total=q * 20.00)
+        for q in (1, 4)
+    ]
+    session.add_all(vendas)
+    session.commit()
+
+    divergencias = verificar_vendas_diarias(dia, dia)
+    assert len(divergencias) == 1
+    assert divergencias[0]['esperado']['quantidade'] == 5
+
+    assert reconstruir_vendas_diarias(dia, dia) == 1
+    assert verificar_vendas_diarias(dia, dia) == []
+
+    linha = VendaDiariaAgregada.query.filter_by(data=dia).one()
+    assert float(linha.receita) == 100.00
+    assert float(linha.custo) == 25.00
+
+    # Novas vendas acumuladas em lote continuam consistentes
+    nova = HistoricoVendas(data=dia, prato_id=prato.id, quantidade=2, valor_unitario=20.00, valor_total=40.00)
+    session.add(nova)
+    acumular_vendas_diarias([nova])
+    session.commit()
+    assert verificar_vendas_diarias(dia, dia) == []
+
+
+def test_somas_concorrentes_nao_perdem_incrementos(app, banco_arquivo):
+    """Workers somando no mesmo dia/prato (e no mesmo dia sem prato) ao mesmo tempo"""
+    dia = date(2024, 5, 1)
+    with app.app_context():
+        prato = Prato(nome="Prato Concorrência", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+        db.session.add(prato)
+        db.session.commit()
+        prato_id = prato.id
+        db.session.remove()
+
+    def vender(_):
+        with app.app_context():
+            try:
+                somar_totais_diarios({
+                    (dia, prato_id): [1, Decimal('10.00'), Decimal('4.00'), 1],
+                    (dia, None): [2, Decimal('5.00'), Decimal('0'), 1],
+                })
+                db.session.commit()
+            finally:
+                db.session.remove()
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(vender, range(40)))
+
+    with app.app_context():
+        linhas = {linha.prato_id: linha for linha in VendaDiariaAgregada.query.filter_by(data=dia)}
+        assert set(linhas) == {prato_id, None}
+        assert (linhas[prato_id].quantidade, float(linhas[prato_id].receita)) == (40, 400.00)
+        assert float(linhas[prato_id].custo) == 160.00
+        assert (linhas[None].quantidade, linhas[None].total_registros) == (80, 40)
+        db.session.remove()
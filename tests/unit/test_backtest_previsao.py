@@ -0,0 +1,58 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.models.modelo_prato import Prato
+from app.models.modelo_previsao import HistoricoVendas, ResultadoBacktest
+from app.utils.backtest_previsao import backtest_matriz, executar_backtest, melhor_metodo
+
+
+def test_metricas_backtest():
+    """WAPE, MAPE e viés calculados sobre as origens avaliadas"""
+    valores = np.full((42, 2), 10.0)
+    valores[:, 1] = np.arange(42)  # crescimento linear
+    metricas, tempos = backtest_matriz(valores, ['media_movel', 'regressao_linear'], horizonte=7, origens=2)
+
+    assert np.allclose(metricas['media_movel']['wape'][0], 0)
+    assert np.allclose(metricas['regressao_linear']['wape'][1], 0)
+    # Média móvel fica atrás da tendência: viés negativo
+    assert metricas['media_movel']['vies'][1] < 0
+    assert metricas['media_movel']['mape'][1] > 0
+    assert set(tempos) == {'media_movel', 'regressao_linear'}
+
+
+def test_executar_backtest_escolhe_metodo_por_item(session):
+    """Item com ciclo semanal prefere Holt-Winters; resultado igual com e sem pool"""
+    semanal = Prato(nome="Prato Semanal", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+    estavel = Prato(nome="Prato Estável", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+    session.add_all([semanal, estavel])
+    session.commit()
+
+    hoje = date(2024, 6, 3)
+    ciclo = [5, 5, 6, 8, 20, 30, 25]
+    for dias_atras in range(1, 85):
+        dia = hoje - timedelta(days=dias_atras)
+        session.add(HistoricoVendas(data=dia, prato_id=semanal.id, quantidade=ciclo[dia.weekday()]))
+        session.add(HistoricoVendas(data=dia, prato_id=estavel.id, quantidade=12))
+    session.commit()
+
+    resultado = executar_backtest(dias_historico=84, hoje=hoje, processos=1)
+
+    assert resultado['itens'] == 2
+    assert resultado['resultados'] == 6
+    assert melhor_metodo('prato', semanal.id) == 'sazonalidade'
+    assert ResultadoBacktest.query.filter_by(prato_id=semanal.id, metodo='sazonalidade').one().wape < 0.05
+    assert ResultadoBacktest.query.filter_by(melhor=True).count() == 2
+    assert melhor_metodo('cardapio_item', 999) is None
+
+    metricas = {(r.prato_id, r.metodo): r.wape for r in ResultadoBacktest.query}
+    executar_backtest(dias_historico=84, hoje=hoje, processos=2)
+    assert ResultadoBacktest.query.count() == 6  # substitui a execução anterior
+    for r in ResultadoBacktest.query:
+        assert np.isclose(r.wape, metricas[(r.prato_id, r.metodo)])
+
+    # Reavaliar só um método mantém os demais e o melhor de cada item
+    executar_backtest(dias_historico=84, hoje=hoje, metodos=['media_movel'], processos=1)
+    assert ResultadoBacktest.query.count() == 6
+    assert melhor_metodo('prato', semanal.id) == 'sazonalidade'
+    assert ResultadoBacktest.query.filter_by(melhor=True).count() == 2
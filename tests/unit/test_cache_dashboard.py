@@ -0,0 +1,108 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import pytest
+
+from app.models.modelo_produto import Produto
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_previsao import HistoricoVendas
+from app.routes.dashboard.views import calcular_metricas_principais
+from app.utils.cache_dashboard import CacheDashboard, CacheLRU, CacheSQLite, cache_dashboard
+
+
+@pytest.fixture
+def cache_lru():
+    cache_dashboard.backend = CacheLRU(max_itens=8)
+    cache_dashboard.limpar()
+    yield cache_dashboard
+    cache_dashboard.backend = None
+    cache_dashboard.limpar()
+
+
+def _prato(session):
+    ing = Produto(nome="Ing Cache", unidade="kg", preco_unitario=10.00)
+    prato = Prato(nome="Prato Cache", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+    session.add_all([ing, prato])
+    session.commit()
+    session.add(PratoInsumo(prato_id=prato.id, produto_id=ing.id, quantidade=0.5))
+    session.commit()
+    return prato
+
+
+def test_periodo_fechado_fica_em_cache_e_aberto_e_invalidado(session, cache_lru):
+    """Vendas do mês corrente invalidam só períodos abertos; vendas retroativas invalidam tudo"""
+    prato = _prato(session)
+    hoje = date.today()
+    inicio_mes = date(hoje.year, hoje.month, 1)
+    mes_passado = (inicio_mes - timedelta(days=1)).replace(day=1)
+    fim_mes_passado = inicio_mes - timedelta(days=1)
+
+    HistoricoVendas.registrar_venda(mes_passado, prato.id, 'prato', 1, 20.00)
+    assert calcular_metricas_principais(mes_passado, fim_mes_passado)[0] == 20.00
+    assert calcular_metricas_principais(inicio_mes, hoje)[0] == 0
+    assert (cache_lru.acertos, cache_lru.falhas) == (0, 2)
+
+    # Venda no mês corrente: o período fechado continua em cache
+    HistoricoVendas.registrar_venda(hoje, prato.id, 'prato', 2, 20.00)
+    assert calcular_metricas_principais(mes_passado, fim_mes_passado)[0] == 20.00
+    assert calcular_metricas_principais(inicio_mes, hoje)[0] == 40.00
+    assert (cache_lru.acertos, cache_lru.falhas) == (1, 3)
+
+    # Venda retroativa: o período fechado é recalculado
+    HistoricoVendas.registrar_venda(mes_passado, prato.id, 'prato', 1, 20.00)
+    assert calcular_metricas_principais(mes_passado, fim_mes_passado)[0] == 40.00
+    assert cache_lru.falhas == 4
+
+    # Datas em texto (período personalizado) usam a mesma chave
+    calcular_metricas_principais(mes_passado.isoformat(), fim_mes_passado.isoformat())
+    assert cache_lru.estatisticas()['acertos'] == 2
+
+
+def test_cache_sqlite_compartilhado(tmp_path):
+    """Dois processos (instâncias) enxergam os mesmos valores e invalidações"""
+    caminho = str(tmp_path / 'cache.sqlite')
+    worker_a = CacheDashboard(CacheSQLite(caminho))
+    worker_b = CacheDashboard(CacheSQLite(caminho))
+    chamadas = []
+
+    def calcular(inicio, fim):
+        chamadas.append((inicio, fim))
+        return {'receita': len(chamadas)}
+
+    funcao_a = worker_a.em_cache(calcular)
+    funcao_b = worker_b.em_cache(calcular)
+    fechado = (date(2020, 1, 1), date(2020, 1, 31))
+    aberto = (date.today().replace(day=1), date.today())
+
+    assert funcao_a(*fechado) == {'receita': 1}
+    assert funcao_b(*fechado) == {'receita': 1}
+    funcao_a(*aberto)
+    assert len(chamadas) == 2
+    assert worker_b.estatisticas()['acertos'] == 1
+
+    # Invalidação do período corrente em um worker vale para o outro
+    worker_a.invalidar([date.today()])
+    funcao_b(*aberto)
+    funcao_b(*fechado)
+    assert len(chamadas) == 3
+    assert len(worker_b.backend) == 2  # A entrada da geração anterior foi removida
+
+    worker_b.invalidar()
+    assert funcao_a(*fechado) == {'receita': 4}
+
+
+def test_contadores_com_varias_threads():
+    """Widgets calculados em paralelo não perdem acertos nem falhas nas estatísticas"""
+    cache = CacheDashboard(CacheLRU())
+
+    @cache.em_cache
+    def somar(inicio, fim, valor):
+        return valor + 1
+
+    dia = date(2020, 1, 1)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: somar(dia, dia, i % 10), range(4000)))
+
+    estatisticas = cache.estatisticas()
+    assert estatisticas['acertos'] + estatisticas['falhas'] == 4000
+    assert estatisticas['itens'] == 10
@@ -0,0 +1,118 @@
+import random
+import time
+from datetime import date
+
+import pytest
+from sqlalchemy import insert
+
+from app.models.modelo_cardapio import Cardapio, CardapioSecao, CardapioItem
+from app.models.modelo_estoque import EstoqueMovimentacao
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_previsao import HistoricoVendas
+from app.models.modelo_produto import Produto
+from app.utils.consumo_vendas import consumir_vendas_dia, referencia_consumo
+from app.utils.estoque_atomico import EstoqueInsuficiente
+from app.utils.matriz_receitas import MatrizReceitas
+
+DIA = date(2024, 6, 3)
+
+
+def _receita(session, estoque=100):
+    arroz = Produto(nome="Arroz Consumo", unidade="kg", preco_unitario=6.00, estoque_atual=estoque)
+    feijao = Produto(nome="Feijão Consumo", unidade="kg", preco_unitario=8.00, estoque_atual=estoque)
+    prato = Prato(nome="PF Consumo", rendimento=4, unidade_rendimento="porção", porcoes_rendimento=4)
+    session.add_all([arroz, feijao, prato])
+    session.flush()
+    session.add_all([
+        PratoInsumo(prato_id=prato.id, produto_id=arroz.id, quantidade=1.0),
+        PratoInsumo(prato_id=prato.id, produto_id=feijao.id, quantidade=0.6),
+    ])
+    cardapio = Cardapio(nome="Cardápio Consumo")
+    session.add(cardapio)
+    session.flush()
+    secao = CardapioSecao(nome="Pratos", cardapio_id=cardapio.id)
+    session.add(secao)
+    session.flush()
+    item = CardapioItem(secao_id=secao.id, prato_id=prato.id, preco_venda=25.00)
+    session.add(item)
+    session.commit()
+    return arroz, feijao, prato, item
+
+
+def test_consumo_do_dia_gera_uma_saida_por_produto(session):
+    arroz, feijao, prato, item = _receita(session)
+    session.add_all([
+        HistoricoVendas(data=DIA, prato_id=prato.id, quantidade=3, valor_unitario=25, valor_total=75),
+        HistoricoVendas(data=DIA, cardapio_item_id=item.id, quantidade=5, valor_unitario=25, valor_total=125),
+        HistoricoVendas(data=date(2024, 6, 4), prato_id=prato.id, quantidade=40, valor_unitario=25, valor_total=1000),
+    ])
+    session.commit()
+
+    relatorio = consumir_vendas_dia(DIA)
+    assert relatorio['status'] == 'processado'
+    assert relatorio['consumo'] == {arroz.id: 2.0, feijao.id: 1.2}  # 8 porções de receitas de 4
+
+    saidas = EstoqueMovimentacao.query.filter_by(referencia=referencia_consumo(DIA)).all()
+    assert sorted((s.produto_id, s.quantidade) for s in saidas) == [(arroz.id, 2.0), (feijao.id, 1.2)]
+    assert (arroz.estoque_atual, feijao.estoque_atual) == (98.0, 98.8)
+
+    # Processar de novo não duplica; reprocessar estorna e lança outra vez
+    assert consumir_vendas_dia(DIA)['status'] == 'ja_processado'
+    session.add(HistoricoVendas(data=DIA, prato_id=prato.id, quantidade=4, valor_unitario=25, valor_total=100))
+    session.commit()
+    consumir_vendas_dia(DIA, reprocessar=True)
+    assert arroz.estoque_atual == 97.0
+    assert EstoqueMovimentacao.query.filter_by(referencia=referencia_consumo(DIA)).count() == 2
+
+
+def test_consumo_sem_saldo_cancela_o_dia(session):
+    _, _, prato, _ = _receita(session, estoque=1)
+    session.add(HistoricoVendas(data=DIA, prato_id=prato.id, quantidade=8, valor_unitario=25, valor_total=200))
+    session.commit()
+
+    with pytest.raises(EstoqueInsuficiente):
+        consumir_vendas_dia(DIA)
+
+
+def test_consumo_limitado_ao_saldo_reporta_falta(session):
+    arroz, feijao, prato, _ = _receita(session, estoque=1)
+    session.add(HistoricoVendas(data=DIA, prato_id=prato.id, quantidade=8, valor_unitario=25, valor_total=200))
+    session.commit()
+
+    relatorio = consumir_vendas_dia(DIA, limitar_ao_saldo=True)
+    assert relatorio['faltas'] == {arroz.id: 1.0, feijao.id: 0.2}
+    assert (arroz.estoque_atual, feijao.estoque_atual) == (0, 0)
+
+
+def test_matriz_receitas_explode_como_o_calculo_direto():
+    matriz = MatrizReceitas([10, 10, 20, 30], [1, 2, 2, 3], [0.5, 0.25, 1.0, 2.0])
+    assert matriz.explodir({10: 4, 20: 1, 99: 7}) == {1: 2.0, 2: 2.0}
+
+
+def test_dia_movimentado_em_menos_de_um_segundo(session):
+    """Dezenas de milhares de linhas de venda em um dia, 200 pratos e 300 insumos"""
+    random.seed(42)
+    produtos = [Produto(nome=f"Insumo Volume {i}", unidade="kg", preco_unitario=5.0, estoque_atual=1e9)
+                for i in range(300)]
+    pratos = [Prato(nome=f"Prato Volume {i}", rendimento=10, unidade_rendimento="porção", porcoes_rendimento=10)
+              for i in range(200)]
+    session.add_all(produtos + pratos)
+    session.flush()
+    session.execute(insert(PratoInsumo), [
+        {'prato_id': prato.id, 'produto_id': produto.id, 'quantidade': random.uniform(0.1, 2.0)}
+        for prato in pratos for produto in random.sample(produtos, 8)
+    ])
+    session.execute(insert(HistoricoVendas), [
+        {'data': DIA, 'prato_id': random.choice(pratos).id, 'quantidade': random.randint(1, 3),
+         'valor_unitario': 30, 'valor_total': 30}
+        for _ in range(30000)
+    ])
+    session.commit()
+
+    inicio = time.perf_counter()
+    relatorio = consumir_vendas_dia(DIA)
+    duracao = time.perf_counter() - inicio
+
+    assert relatorio['pratos'] == 200
+    assert EstoqueMovimentacao.query.filter_by(referencia=referencia_consumo(DIA)).count() == relatorio['produtos']
+    assert duracao < 1.0
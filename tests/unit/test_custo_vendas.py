@@ -0,0 +1,89 @@
+from datetime import date, datetime
+
+from app.models.modelo_estoque import EstoqueMovimentacao
+from app.models.modelo_produto import Produto
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_cardapio import Cardapio, CardapioSecao, CardapioItem
+from app.models.modelo_previsao import HistoricoVendas, VendaDiariaAgregada
+from app.routes.dashboard.views import calcular_lucratividade_categorias, obter_top_pratos
+from app.utils.custo_vendas import preencher_custo_vendas
+
+
+def _prato(session):
+    ing = Produto(nome="Ing Snapshot", unidade="kg", preco_unitario=10.00)
+    prato = Prato(nome="Prato Snapshot", categoria="Principal", rendimento=1,
+                  unidade_rendimento="porção", porcoes_rendimento=2)
+    session.add_all([ing, prato])
+    session.commit()
+    session.add(PratoInsumo(prato_id=prato.id, produto_id=ing.id, quantidade=1))
+    session.commit()
+    return ing, prato
+
+
+def test_venda_registra_custo_vigente(session):
+    """A venda guarda o custo do momento; mudar o preço depois não altera o passado"""
+    ing, prato = _prato(session)
+    dia = date(2024, 7, 1)
+    HistoricoVendas.registrar_venda(dia, prato.id, 'prato', 2, 20.00)
+
+    # Vendas criadas diretamente também recebem o custo ao serem gravadas
+    session.add(HistoricoVendas(data=dia, prato_id=prato.id, quantidade=1, valor_unitario=20.00, valor_total=20.00))
+    session.commit()
+    assert [float(v.custo_unitario_snapshot) for v in HistoricoVendas.query.filter_by(data=dia)] == [5.0, 5.0]
+
+    ing.preco_unitario = 30.00
+    session.commit()
+    assert float(Prato.query.get(prato.id).custo_porcao_cache) == 15.00
+
+    top = obter_top_pratos(dia, dia)
+    assert top[0]['custo_total'] == 15.00  # 3 porções a 5.00
+    assert calcular_lucratividade_categorias(dia, dia)['Categoria: Principal']['custo'] == 15.00
+
+
+def test_preencher_custo_com_preco_da_data(session):
+    """O preenchimento usa o preço da última entrada até a data de cada venda"""
+    ing, prato = _prato(session)
+    cardapio = Cardapio(nome="Cardápio Snapshot")
+    session.add(cardapio)
+    session.commit()
+    secao = CardapioSecao(nome="Seção Snapshot", cardapio_id=cardapio.id)
+    session.add(secao)
+    session.commit()
+    item = CardapioItem(secao_id=secao.id, prato_id=prato.id, preco_venda=20.00)
+    session.add_all([
+        item,
+        EstoqueMovimentacao(produto_id=ing.id, quantidade=5, tipo='entrada',
+                            data_movimentacao=datetime(2024, 1, 10, 9, 0), valor_unitario=4.00),
+        EstoqueMovimentacao(produto_id=ing.id, quantidade=5, tipo='entrada',
+                            data_movimentacao=datetime(2024, 3, 1, 9, 0), valor_unitario=8.00),
+    ])
+    session.commit()
+
+    # Vendas antigas, sem custo registrado
+    vendas = [
+        (date(2024, 1, 5), {'prato_id': prato.id}),  # antes de qualquer entrada: preço atual
+        (date(2024, 1, 10), {'prato_id': prato.id}),
+        (date(2024, 2, 20), {'cardapio_item_id': item.id}),
+        (date(2024, 3, 1), {'prato_id': prato.id}),
+    ]
+    for dia, item_venda in vendas:
+        session.execute(HistoricoVendas.__table__.insert().values(
+            data=dia, quantidade=2, valor_unitario=20.00, valor_total=40.00, **item_venda))
+    session.commit()
+
+    resultado = preencher_custo_vendas()
+    assert resultado['vendas'] == 4
+    custos = {v.data: float(v.custo_unitario_snapshot) for v in HistoricoVendas.query.all()}
+    assert custos == {
+        date(2024, 1, 5): 5.00,
+        date(2024, 1, 10): 2.00,
+        date(2024, 2, 20): 2.00,
+        date(2024, 3, 1): 4.00,
+    }
+
+    # O agregado diário passa a usar o custo histórico
+    agregado = VendaDiariaAgregada.query.filter_by(data=date(2024, 3, 1)).one()
+    assert float(agregado.custo) == 8.00
+
+    # Nada a fazer numa segunda execução
+    assert preencher_custo_vendas()['vendas'] == 0
@@ -0,0 +1,60 @@
+from app.models.modelo_produto import Produto
+from app.models.modelo_prato import Prato, PratoInsumo
+
+
+def _prato(session, nome, porcoes=1):
+    prato = Prato(nome=nome, rendimento=1, unidade_rendimento="porção", porcoes_rendimento=porcoes)
+    session.add(prato)
+    session.commit()
+    return prato
+
+
+def test_cache_acompanha_insumos(session):
+    """Adicionar, editar e remover insumos atualiza o custo persistido do prato"""
+    ing = Produto(nome="Ing Cache", unidade="kg", preco_unitario=10.00)
+    session.add(ing)
+    prato = _prato(session, "Prato Cache", porcoes=2)
+
+    insumo = PratoInsumo(prato_id=prato.id, produto_id=ing.id, quantidade=1.0)
+    session.add(insumo)
+    session.commit()
+    assert float(prato.custo_direto_cache) == 10.00
+    assert float(prato.custo_porcao_cache) == 5.00
+
+    insumo.quantidade = 3.0
+    session.commit()
+    assert prato.custo_direto_total == 30.00
+
+    prato.custo_indireto = 1.00
+    session.commit()
+    assert float(prato.custo_porcao_cache) == 16.00
+
+    session.delete(insumo)
+    session.commit()
+    assert float(prato.custo_direto_cache) == 0
+    assert prato.custo_total_por_porcao == 1.00
+
+
+def test_preco_do_produto_recalcula_apenas_pratos_afetados(session):
+    """Mudança de preço recalcula só os pratos que usam o produto"""
+    ing_a = Produto(nome="Ing A", unidade="kg", preco_unitario=10.00)
+    ing_b = Produto(nome="Ing B", unidade="kg", preco_unitario=4.00)
+    session.add_all([ing_a, ing_b])
+    prato_a = _prato(session, "Prato A")
+    prato_b = _prato(session, "Prato B")
+    session.add_all([
+        PratoInsumo(prato_id=prato_a.id, produto_id=ing_a.id, quantidade=1.0),
+        PratoInsumo(prato_id=prato_b.id, produto_id=ing_b.id, quantidade=1.0),
+    ])
+    session.commit()
+
+    ing_a.preco_unitario = 2.00
+    session.commit()
+
+    assert prato_a.custo_total_por_porcao == 2.00
+    assert prato_b.custo_total_por_porcao == 4.00
+
+    # A ordenação por custo passa a ser feita no banco
+    ordem = [p.nome for p in Prato.query.filter(Prato.id.in_([prato_a.id, prato_b.id]))
+             .order_by(Prato.custo_porcao_cache.desc())]
+    assert ordem == ["Prato B", "Prato A"]
@@ -0,0 +1,55 @@
+from datetime import date
+
+from app.models.modelo_produto import Produto
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_previsao import HistoricoVendas
+from app.routes.dashboard.views import WIDGETS, calcular_widgets
+
+
+def _vendas(session):
+    ing = Produto(nome="Ing Widget", unidade="kg", preco_unitario=10.00)
+    prato = Prato(nome="Prato Widget", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+    session.add_all([ing, prato])
+    session.commit()
+    session.add(PratoInsumo(prato_id=prato.id, produto_id=ing.id, quantidade=0.5))
+    session.commit()
+    HistoricoVendas.registrar_venda(date(2024, 6, 3), prato.id, 'prato', 4, 25.00)
+    return prato
+
+
+def test_widgets_em_endpoints_independentes(app, session):
+    """A página abre sem calcular os widgets, que são servidos em JSON"""
+    _vendas(session)
+    client = app.test_client()
+    periodo = 'periodo=personalizado&data_inicio=2024-06-01&data_fim=2024-06-30'
+
+    resposta = client.get(f'/index?{periodo}')
+    assert resposta.status_code == 200
+    assert b'id="receita_total"' in resposta.data
+
+    metricas = client.get(f'/widgets/metricas?{periodo}').get_json()
+    assert metricas['receita_total'] == 100.00
+    assert metricas['custo_total'] == 20.00
+
+    top = client.get(f'/widgets/top_pratos?{periodo}').get_json()
+    assert top[0]['nome'] == 'Prato Widget'
+
+    assert client.get('/widgets/inexistente').status_code == 404
+
+    todos = client.get(f'/widgets?{periodo}&nome=metricas&nome=desperdicio').get_json()
+    assert set(todos) == {'metricas', 'desperdicio'}
+    assert todos['metricas'] == metricas
+
+
+def test_calcular_widgets_em_paralelo(app, session):
+    """O pool de threads devolve os mesmos resultados do cálculo sequencial"""
+    _vendas(session)
+    inicio, fim = date(2024, 6, 1), date(2024, 6, 30)
+    sequencial = calcular_widgets(WIDGETS, inicio, fim, max_workers=1)
+    paralelo = calcular_widgets(WIDGETS, inicio, fim, max_workers=4)
+
+    assert set(paralelo) == set(WIDGETS)
+    assert paralelo['metricas']['receita_total'] == 100.00
+    assert paralelo['metricas']['custo_total'] == 20.00
+    assert paralelo['top_pratos'][0]['nome'] == 'Prato Widget'
+    assert paralelo == sequencial
\ No newline at end of file
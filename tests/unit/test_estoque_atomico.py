@@ -0,0 +1,131 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import create_engine, event, update
+from sqlalchemy.exc import OperationalError
+
+from app.extensions import db
+from app.models.modelo_estoque import EstoqueMovimentacao
+from app.models.modelo_produto import Produto
+from app.utils.estoque_atomico import (EstoqueInsuficiente, aplicar_movimentos, baixar_estoque,
+                                       bloquear_produtos)
+
+
+def _produto(session, nome, estoque):
+    produto = Produto(nome=nome, unidade="kg", preco_unitario=10.00, estoque_atual=estoque)
+    session.add(produto)
+    session.commit()
+    return produto
+
+
+def test_baixa_sem_saldo_nao_altera_estoque(session):
+    produto = _produto(session, "Ing Atômico", 3)
+
+    assert baixar_estoque(produto.id, 2) == 1.0
+    assert produto.estoque_atual == 1.0  # O objeto carregado é expirado e relido
+    with pytest.raises(EstoqueInsuficiente) as erro:
+        EstoqueMovimentacao.registrar_saida(produto.id, 2)
+    assert erro.value.disponivel == 1.0
+    assert produto.estoque_atual == 1.0
+    assert EstoqueMovimentacao.query.filter_by(produto_id=produto.id).count() == 0
+
+
+def test_lote_desfaz_ajustes_quando_um_produto_nao_tem_saldo(session):
+    """Uma saída recusada no lote não deixa os demais produtos alterados"""
+    a = _produto(session, "Ing Lote A", 5)
+    b = _produto(session, "Ing Lote B", 1)
+
+    assert aplicar_movimentos([(a.id, -2), (b.id, 3), (a.id, -1)]) == {a.id: 2.0, b.id: 4.0}
+    with pytest.raises(EstoqueInsuficiente) as erro:
+        aplicar_movimentos([(a.id, -1), (b.id, -10)])
+    assert erro.value.produto_id == b.id
+    assert (a.estoque_atual, b.estoque_atual) == (2.0, 4.0)
+
+
+def _engine_sqlite_wal(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'estoque.sqlite'}", connect_args={'timeout': 30})
+
+    @event.listens_for(engine, 'connect')
+    def _wal(conexao, registro):
+        conexao.execute('PRAGMA journal_mode=WAL')
+
+    return engine
+
+
+def test_bloquear_produtos_trava_escritas_no_sqlite(app, tmp_path):
+    """No SQLite outra conexão não grava enquanto os produtos estão bloqueados"""
+    engine = _engine_sqlite_wal(tmp_path)
+    outra = create_engine(engine.url, connect_args={'timeout': 0.1})
+    db.metadata.create_all(engine)
+
+    sessao_original = db.session
+    db.session = db.scoped_session(db.sessionmaker(bind=engine))
+    try:
+        with app.app_context():
+            produto = Produto(nome="Ing Bloqueio", unidade="kg", preco_unitario=5.00, estoque_atual=10)
+            db.session.add(produto)
+            db.session.commit()
+
+            assert bloquear_produtos([produto.id]) == {produto.id: {'estoque': 10.0, 'preco': 5.0}}
+            with outra.connect() as conexao:
+                with pytest.raises(OperationalError, match='locked'):
+                    conexao.execute(update(Produto.__table__).values(estoque_atual=0))
+            db.session.commit()
+
+            with outra.begin() as conexao:
+                conexao.execute(update(Produto.__table__).values(estoque_atual=0))
+            db.session.remove()
+    finally:
+        db.session = sessao_original
+        outra.dispose()
+        engine.dispose()
+
+
+@pytest.mark.parametrize('banco', ['sqlite', 'postgresql'])
+def test_saidas_concorrentes_nao_perdem_atualizacoes(app, tmp_path, banco):
+    """Muitas baixas em paralelo: nenhuma se perde e o saldo nunca fica negativo"""
+    if banco == 'postgresql':
+        url = os.environ.get('TEST_POSTGRES_URL')
+        if not url:
+            pytest.skip('TEST_POSTGRES_URL não definida')
+        engine = create_engine(url, pool_size=20)
+    else:
+        engine = _engine_sqlite_wal(tmp_path)
+    db.metadata.create_all(engine)
+
+    # Uma sessão (e conexão) por thread, como em workers separados
+    sessao_original = db.session
+    db.session = db.scoped_session(db.sessionmaker(bind=engine))
+    try:
+        with app.app_context():
+            produto = Produto(nome="Ing Concorrência", unidade="kg", preco_unitario=5.00, estoque_atual=25)
+            db.session.add(produto)
+            db.session.commit()
+            produto_id = produto.id
+            db.session.remove()
+
+        def retirar(_):
+            with app.app_context():
+                try:
+                    EstoqueMovimentacao.registrar_saida(produto_id, 1, referencia='Teste concorrência')
+                    return True
+                except EstoqueInsuficiente:
+                    db.session.rollback()
+                    return False
+                finally:
+                    db.session.remove()
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            resultados = list(executor.map(retirar, range(40)))
+
+        with app.app_context():
+            assert resultados.count(True) == 25
+            assert db.session.get(Produto, produto_id).estoque_atual == 0
+            assert EstoqueMovimentacao.query.filter_by(produto_id=produto_id).count() == 25
+            db.session.remove()
+    finally:
+        db.session = sessao_original
+        if banco == 'postgresql':
+            db.metadata.drop_all(engine)
+        engine.dispose()
@@ -0,0 +1,82 @@
+from datetime import date, datetime
+
+from app.models.modelo_estoque import EstoqueMovimentacao, EstoqueSnapshot
+from app.models.modelo_produto import Produto, ProdutoPrecoHistorico
+from app.utils.estoque_snapshot import estoque_em, gerar_snapshots, verificar_estoque
+
+
+def _movimentar(session, produto, movimentos):
+    for dia, tipo, quantidade in movimentos:
+        session.add(EstoqueMovimentacao(produto_id=produto.id, tipo=tipo, quantidade=quantidade,
+                                        data_movimentacao=datetime.combine(dia, datetime.min.time().replace(hour=10))))
+        produto.estoque_atual += quantidade if tipo == 'entrada' else -quantidade
+    session.commit()
+
+
+def _produto(session, nome='Ing Snapshot Estoque'):
+    produto = Produto(nome=nome, unidade="kg", preco_unitario=10.00, estoque_atual=0)
+    session.add(produto)
+    session.flush()
+    session.add(ProdutoPrecoHistorico(produto_id=produto.id, vigente_desde=datetime(2024, 1, 1), preco_medio=8.00))
+    session.add(ProdutoPrecoHistorico(produto_id=produto.id, vigente_desde=datetime(2024, 2, 1), preco_medio=12.00))
+    session.commit()
+    return produto
+
+
+def test_estoque_em_data_passada(session):
+    """Quantidade e valor na data, com e sem snapshots, batem com o histórico completo"""
+    produto = _produto(session)
+    _movimentar(session, produto, [
+        (date(2024, 1, 5), 'entrada', 10),
+        (date(2024, 1, 20), 'saída', 4),
+        (date(2024, 2, 3), 'entrada', 5),
+        (date(2024, 2, 10), 'saída', 1),
+    ])
+
+    sem_snapshot = estoque_em(date(2024, 1, 31), [produto.id])[produto.id]
+    assert sem_snapshot == {'quantidade': 6.0, 'preco_unitario': 8.0, 'valor': 48.0}
+
+    resultado = gerar_snapshots(date(2024, 1, 15), 'mensal')
+    assert resultado['posicao_em'] == datetime(2024, 2, 1)
+    assert resultado['produtos'] == 1
+    assert estoque_em(date(2024, 1, 31), [produto.id]) == {produto.id: sem_snapshot}
+    assert estoque_em(date(2024, 2, 5))[produto.id] == {'quantidade': 11.0, 'preco_unitario': 12.0, 'valor': 132.0}
+    assert estoque_em(date(2023, 12, 31), [produto.id])[produto.id]['quantidade'] == 0
+
+    # A consulta parte do snapshot mais próximo: só as movimentações depois dele são somadas
+    snapshot = EstoqueSnapshot.query.filter_by(produto_id=produto.id).one()
+    snapshot.quantidade = 100
+    session.commit()
+    assert estoque_em(date(2024, 2, 5), [produto.id])[produto.id]['quantidade'] == 105.0
+
+    # Regerar o mesmo fechamento substitui o snapshot
+    gerar_snapshots(date(2024, 1, 31), 'mensal')
+    assert EstoqueSnapshot.query.filter_by(produto_id=produto.id).count() == 1
+    assert estoque_em(date(2024, 2, 5), [produto.id])[produto.id]['quantidade'] == 11.0
+
+
+def test_verificar_estoque_reporta_divergencias(session):
+    """Produtos cujo estoque_atual não corresponde às movimentações são reportados"""
+    correto = _produto(session, 'Ing Correto')
+    divergente = _produto(session, 'Ing Divergente')
+    _movimentar(session, correto, [(date(2024, 1, 5), 'entrada', 3)])
+    _movimentar(session, divergente, [(date(2024, 1, 5), 'entrada', 3), (date(2024, 1, 6), 'saída', 1)])
+    divergente.estoque_atual = 5
+    session.commit()
+
+    divergencias = verificar_estoque([correto.id, divergente.id])
+    assert divergencias == [{
+        'produto_id': divergente.id, 'nome': 'Ing Divergente', 'estoque_atual': 5.0,
+        'estoque_movimentacoes': 2.0, 'diferenca': 3.0
+    }]
+
+
+def test_api_posicao(app, session):
+    produto = _produto(session)
+    _movimentar(session, produto, [(date(2024, 1, 5), 'entrada', 2)])
+    client = app.test_client()
+
+    resposta = client.get(f'/estoque/api/posicao?data=2024-01-10&produto_id={produto.id}')
+    assert resposta.status_code == 200
+    assert resposta.get_json()['valor_total'] == 16.0
+    assert client.get('/estoque/api/posicao?data=ontem').status_code == 400
@@ -0,0 +1,117 @@
+import csv
+import gzip
+import io
+from datetime import date, datetime, timedelta
+
+from app.models.modelo_cardapio import Cardapio, CardapioItem, CardapioSecao
+from app.models.modelo_desperdicio import CategoriaDesperdicio, RegistroDesperdicio
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_previsao import HistoricoVendas
+from app.models.modelo_produto import Produto
+from app.utils.exportacao import gerar_csv
+
+
+def _ler(texto, separador=','):
+    return list(csv.reader(io.StringIO(texto), delimiter=separador))
+
+
+def test_gerar_csv_libera_blocos():
+    linhas = [['id', 'nome']] + [[i, f'Item; "{i}"'] for i in range(1200)]
+    blocos = list(gerar_csv(iter(linhas), separador=';', linhas_por_bloco=500))
+    assert len(blocos) == 3
+    assert _ler(''.join(blocos), ';') == [[str(c) for c in linha] for linha in linhas]
+
+
+def test_exportar_registros_de_desperdicio(app, session):
+    sobras = CategoriaDesperdicio(nome="Sobras Exportação")
+    arroz = Produto(nome="Arroz Exportação", unidade="kg", preco_unitario=5.0)
+    session.add_all([sobras, arroz])
+    session.flush()
+    session.add_all([
+        RegistroDesperdicio(data_registro=datetime(2025, 4, 2, 8), categoria_id=sobras.id, produto_id=arroz.id,
+                            quantidade=1.5, unidade='kg', valor_estimado=7.5, motivo='Passou do ponto'),
+        RegistroDesperdicio(data_registro=datetime(2025, 4, 1, 20), categoria_id=sobras.id, produto_id=arroz.id,
+                            quantidade=0.5, unidade='kg', valor_estimado=2.5),
+        RegistroDesperdicio(data_registro=datetime(2025, 4, 3, 9), categoria_id=sobras.id, produto_id=arroz.id,
+                            quantidade=9.0, unidade='kg', valor_estimado=45),
+    ])
+    session.commit()
+
+    cliente = app.test_client()
+    url = '/desperdicio/exportar/registros?data_inicio=2025-04-01&data_fim=2025-04-02'
+    resposta = cliente.get(url)
+    assert resposta.status_code == 200
+    assert resposta.is_streamed
+    assert resposta.mimetype == 'text/csv'
+    linhas = _ler(resposta.get_data(as_text=True), ';')
+    assert linhas[0][:3] == ['ID', 'Data', 'Categoria']
+    assert [linha[1] for linha in linhas[1:]] == ['01/04/2025 20:00', '02/04/2025 08:00']
+    assert linhas[2][3:8] == ['Produto', 'Arroz Exportação', '1.5', 'kg', '7.5']
+
+    compactada = cliente.get(url + '&gzip=1')
+    assert compactada.mimetype == 'application/gzip'
+    assert '.csv.gz' in compactada.headers['Content-Disposition']
+    assert gzip.decompress(compactada.get_data()).decode('utf-8') == resposta.get_data(as_text=True)
+
+
+def test_exportar_historico_sem_consulta_por_linha(app, session, consultas):
+    pratos = [Prato(nome=f"Prato Exportação {i}", rendimento=1, unidade_rendimento="porção",
+                    porcoes_rendimento=1) for i in range(25)]
+    session.add_all(pratos)
+    session.flush()
+    inicio = date(2025, 1, 1)
+    session.add_all([
+        HistoricoVendas(data=inicio + timedelta(days=i), prato_id=prato.id, quantidade=i + 1,
+                        valor_unitario=10.00, valor_total=(i + 1) * 10.00)
+        for i, prato in enumerate(pratos)
+    ])
+    session.commit()
+    primeiro = pratos[0].id
+    session.expunge_all()
+
+    consultas.clear()
+    resposta = app.test_client().get('/previsao/historico/exportar?tipo_item=prato')
+    linhas = _ler(resposta.get_data(as_text=True), ';')
+
+    assert len(linhas) == 26
+    assert linhas[1][1:5] == ['2025-01-01', 'prato', str(primeiro), 'Prato Exportação 0']
+    assert linhas[-1][4:6] == ['Prato Exportação 24', '25']
+    assert len([c for c in consultas if c.lstrip().upper().startswith('SELECT')]) == 1
+
+
+def test_exportar_cardapio_e_ficha_tecnica(app, session):
+    arroz = Produto(nome="Arroz Ficha", unidade="kg", preco_unitario=5.0)
+    prato = Prato(nome="Risoto Ficha", rendimento=4, unidade_rendimento="porção", porcoes_rendimento=4,
+                  preco_venda=40.00)
+    cardapio = Cardapio(nome="Cardápio Exportação", data_inicio=date(2025, 1, 1))
+    session.add_all([arroz, prato, cardapio])
+    session.flush()
+    secao = CardapioSecao(nome="Principais", cardapio_id=cardapio.id)
+    session.add_all([secao, PratoInsumo(prato_id=prato.id, produto_id=arroz.id, quantidade=0.4)])
+    session.flush()
+    session.add(CardapioItem(secao_id=secao.id, prato_id=prato.id, preco_venda=45.00))
+    session.commit()
+
+    cliente = app.test_client()
+    linhas = _ler(cliente.get(f'/cardapios/exportar/{cardapio.id}').get_data(as_text=True))
+    assert linhas[:2] == [['DADOS DO CARDÁPIO'], ['Nome', 'Cardápio Exportação']]
+    inicio_itens = linhas.index(['ITENS DO CARDÁPIO'])
+    assert linhas[inicio_itens + 2][:5] == ['Principais', '1', 'Risoto Ficha', '1', '45.0']
+
+    linhas = _ler(cliente.get(f'/pratos/exportar_ficha/{prato.id}').get_data(as_text=True))
+    assert linhas[0] == ['FICHA TÉCNICA DE PREPARO']
+    inicio_insumos = linhas.index(['INSUMOS'])
+    assert linhas[inicio_insumos + 2][1:4] == ['Arroz Ficha', '0.4', 'kg']
+
+    assert cliente.get('/cardapios/exportar/999999').status_code == 404
+
+
+def test_exportar_relatorio_de_estoque(app, session):
+    session.add(Produto(nome="Feijão Estoque", unidade="kg", preco_unitario=8.0,
+                        estoque_atual=2, estoque_minimo=5))
+    session.commit()
+
+    linhas = _ler(app.test_client().get('/estoque/exportar_relatorio').get_data(as_text=True))
+    assert linhas[0][:3] == ['ID', 'Código', 'Nome']
+    feijao = next(linha for linha in linhas if linha[2] == 'Feijão Estoque')
+    assert feijao[8:] == ['16.0', 'N/A', 'Em Falta']
@@ -0,0 +1,111 @@
+import io
+from datetime import date, datetime
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+from app.models.modelo_cardapio import Cardapio, CardapioItem, CardapioSecao
+from app.models.modelo_desperdicio import CategoriaDesperdicio, RegistroDesperdicio
+from app.models.modelo_prato import Prato
+from app.models.modelo_previsao import HistoricoVendas
+from app.models.modelo_produto import Produto
+from app.utils.exportacao_analitica import exportar_particionado, lotes_colunares
+
+
+def _vendas(session):
+    prato = Prato(nome="Moqueca Analítica", rendimento=4, unidade_rendimento="porção", porcoes_rendimento=4)
+    cardapio = Cardapio(nome="Cardápio Analítico")
+    session.add_all([prato, cardapio])
+    session.flush()
+    secao = CardapioSecao(nome="Principais", cardapio_id=cardapio.id)
+    session.add(secao)
+    session.flush()
+    item = CardapioItem(secao_id=secao.id, prato_id=prato.id, preco_venda=50.00)
+    session.add(item)
+    session.flush()
+    vendas = [
+        HistoricoVendas(data=date(2025, 1, 6), prato_id=prato.id, quantidade=2, valor_unitario=50.00,
+                        valor_total=100.00, custo_unitario_snapshot=20.00, periodo_dia='noite'),
+        # Venda pelo cardápio, sem dia da semana gravado
+        HistoricoVendas(data=date(2025, 1, 8), cardapio_item_id=item.id, quantidade=1, valor_unitario=50.00,
+                        valor_total=50.00, custo_unitario_snapshot=20.00),
+        HistoricoVendas(data=date(2025, 2, 3), prato_id=prato.id, quantidade=3, valor_unitario=50.00,
+                        valor_total=150.00, custo_unitario_snapshot=22.00),
+    ]
+    session.add_all(vendas)
+    session.commit()
+    return prato, vendas
+
+
+def test_lotes_com_campos_derivados(session):
+    prato, _ = _vendas(session)
+    sobras = CategoriaDesperdicio(nome="Sobras Analítica")
+    arroz = Produto(nome="Arroz Analítico", unidade="kg", preco_unitario=5.0)
+    session.add_all([sobras, arroz])
+    session.flush()
+    session.add(RegistroDesperdicio(data_registro=datetime(2025, 1, 7, 15, 30), categoria_id=sobras.id,
+                                    produto_id=arroz.id, quantidade=2.0, unidade='kg', valor_estimado=10))
+    session.commit()
+
+    lotes = list(lotes_colunares('vendas', date(2025, 1, 1), date(2025, 1, 31), lote=1))
+    assert len(lotes) == 2
+    assert lotes[1]['prato_id'] == [prato.id]  # Resolvido pelo item do cardápio
+    assert lotes[1]['prato'] == ['Moqueca Analítica']
+    assert lotes[1]['dia_semana'] == [2]
+    assert lotes[0]['custo_total'] == [40.0]
+    assert lotes[0]['margem_bruta'] == [60.0]
+    assert lotes[0]['periodo_dia'] == ['noite']
+
+    lote, = lotes_colunares('desperdicio', date(2025, 1, 7), date(2025, 1, 7))
+    assert lote['data'] == [date(2025, 1, 7)]
+    assert lote['periodo_dia'] == ['tarde']
+    assert lote['item'] == ['Arroz Analítico']
+    assert lote['custo_unitario'] == [5.0]
+
+    with pytest.raises(ValueError):
+        list(lotes_colunares('estoque'))
+
+
+def test_exportacao_mensal_incremental(session, tmp_path):
+    prato, vendas = _vendas(session)
+
+    plano = exportar_particionado('vendas', str(tmp_path), lote=2)
+    assert [(p['mes'], p['acao']) for p in plano] == [(1, 'escrever'), (2, 'escrever')]
+    janeiro = tmp_path / 'vendas' / 'ano=2025' / 'mes=01' / 'parte.parquet'
+    tabela = pq.read_table(janeiro)
+    assert tabela.num_rows == 2
+    assert tabela.column('custo_unitario_snapshot').to_pylist() == [20.0, 20.0]
+
+    # Sem mudanças nada é reescrito; uma venda nova só reescreve o seu mês
+    assert {p['acao'] for p in exportar_particionado('vendas', str(tmp_path))} == {'manter'}
+    session.add(HistoricoVendas(data=date(2025, 2, 10), prato_id=prato.id, quantidade=1,
+                                valor_unitario=50.00, valor_total=50.00))
+    session.commit()
+    plano = exportar_particionado('vendas', str(tmp_path))
+    assert [(p['mes'], p['acao']) for p in plano] == [(1, 'manter'), (2, 'escrever')]
+    assert pq.read_table(tmp_path / 'vendas' / 'ano=2025' / 'mes=02' / 'parte.parquet').num_rows == 2
+
+    # Mês que ficou sem vendas sai da exportação
+    for venda in vendas[:2]:
+        session.delete(venda)
+    session.commit()
+    plano = exportar_particionado('vendas', str(tmp_path))
+    assert (1, 'remover') in [(p['mes'], p['acao']) for p in plano]
+    assert not janeiro.exists()
+
+
+def test_endpoints_colunares(app, session):
+    _vendas(session)
+    cliente = app.test_client()
+
+    resposta = cliente.get('/previsao/historico/exportar/parquet?data_inicio=2025-02-01')
+    assert resposta.status_code == 200
+    assert pq.read_table(io.BytesIO(resposta.get_data())).column('data').to_pylist() == [date(2025, 2, 3)]
+
+    resposta = cliente.get('/desperdicio/exportar/registros/arrow')
+    assert resposta.status_code == 200
+    assert pa.ipc.open_file(io.BytesIO(resposta.get_data())).read_all().num_rows == 0
+
+    assert cliente.get('/previsao/historico/exportar/xlsx').status_code == 404
+    assert cliente.get('/previsao/historico/exportar/parquet?data_inicio=01/02/2025').status_code == 400
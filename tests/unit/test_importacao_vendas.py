@@ -0,0 +1,79 @@
+import io
+from datetime import date
+
+import pytest
+
+from app.models.modelo_cardapio import Cardapio, CardapioSecao, CardapioItem
+from app.models.modelo_prato import Prato
+from app.models.modelo_previsao import HistoricoVendas, VendaDiariaAgregada
+from app.utils.agregados_vendas import verificar_vendas_diarias
+from app.utils.importacao_vendas import importar_historico_csv
+
+
+def _csv(linhas):
+    cabecalho = 'data;tipo_item;item_id;quantidade;valor_unitario;periodo_dia;clima;temperatura;evento_especial'
+    return io.BytesIO('\n'.join([cabecalho] + linhas).encode('utf-8'))
+
+
+def test_importar_csv_valida_deriva_e_agrega(session):
+    """Linhas válidas entram em massa; as inválidas são reportadas com o motivo"""
+    prato = Prato(nome="Prato CSV", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+    cardapio = Cardapio(nome="Cardápio CSV")
+    session.add_all([prato, cardapio])
+    session.commit()
+    secao = CardapioSecao(nome="Principais", cardapio_id=cardapio.id)
+    session.add(secao)
+    session.commit()
+    item = CardapioItem(secao_id=secao.id, prato_id=prato.id, preco_venda=30.00)
+    session.add(item)
+    session.commit()
+
+    # Venda já existente no agregado do mesmo dia
+    HistoricoVendas.registrar_venda(date(2024, 3, 9), prato.id, 'prato', 1, 30.00)
+
+    arquivo = _csv([
+        f'2024-03-09;prato;{prato.id};2;30,00;noite;chuvoso;21,5;Aniversário',
+        f'2024-03-09;cardapio_item;{item.id};3;29.90;tarde;;;',
+        f'2024-03-15;prato;{prato.id};1;30;;;;',
+        '2024-13-01;prato;1;1;30;;;;',
+        f'2024-03-10;prato;{prato.id + 100};1;30;;;;',
+        f'2024-03-10;bebida;{prato.id};1;30;;;;',
+        f'2024-03-10;prato;{prato.id};0;30;;;;',
+        f'2024-03-10;prato;{prato.id};1;abc;;;;',
+        f'2024-03-10;prato;{prato.id}.5;1;30;;;;',
+    ])
+
+    resultado = importar_historico_csv(arquivo, tamanho_lote=3)
+
+    assert resultado['lidas'] == 9
+    assert resultado['importadas'] == 3
+    assert resultado['rejeitadas'] == 6
+    assert [(r['linha'], r['motivo']) for r in resultado['rejeicoes']] == [
+        (5, 'data inválida'),
+        (6, 'item não encontrado'),
+        (7, 'tipo_item inválido'),
+        (8, 'quantidade inválida'),
+        (9, 'valor_unitario inválido'),
+        (10, 'item_id inválido'),  # Não é truncado para o id inteiro
+    ]
+
+    venda = HistoricoVendas.query.filter_by(evento_especial='Aniversário').one()
+    assert venda.dia_semana == 5  # sábado
+    assert venda.semana_mes == 2
+    assert venda.mes == 3
+    assert venda.temperatura == 21.5
+    assert float(venda.valor_total) == 60.00
+    assert HistoricoVendas.query.filter_by(cardapio_item_id=item.id).one().clima is None
+
+    agregado = VendaDiariaAgregada.query.filter_by(data=date(2024, 3, 9)).one()
+    assert agregado.quantidade == 6
+    assert float(agregado.receita) == 30.00 + 60.00 + 89.70
+    assert agregado.total_registros == 3
+    assert verificar_vendas_diarias() == []
+
+
+def test_importar_csv_sem_colunas_obrigatorias(session):
+    """Arquivo sem as colunas obrigatórias não grava nada"""
+    arquivo = io.BytesIO(b'data;quantidade\n2024-01-01;3')
+    with pytest.raises(ValueError, match='tipo_item'):
+        importar_historico_csv(arquivo)
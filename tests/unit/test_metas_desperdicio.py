@@ -0,0 +1,120 @@
+from datetime import date, datetime, timedelta
+
+import pytest
+
+from app.models.modelo_desperdicio import CategoriaDesperdicio, MetaDesperdicio, RegistroDesperdicio
+from app.models.modelo_produto import Produto
+from app.utils.agregados_desperdicio import acumular_desperdicio_diario
+from app.utils.metas_desperdicio import avaliar_metas, invalidar_metas
+
+
+@pytest.fixture(autouse=True)
+def cache_limpo():
+    # Cada teste roda em uma transação desfeita ao final: o cache não pode sobreviver a ela
+    invalidar_metas()
+    yield
+    invalidar_metas()
+
+
+def _cenario(session):
+    hoje = date.today()
+    sobras = CategoriaDesperdicio(nome="Sobras Metas")
+    vencido = CategoriaDesperdicio(nome="Vencido Metas")
+    alface = Produto(nome="Alface Metas", unidade="un", preco_unitario=2.0)
+    tomate = Produto(nome="Tomate Metas", unidade="kg", preco_unitario=6.0)
+    session.add_all([sobras, vencido, alface, tomate])
+    session.flush()
+
+    def registro(dias_atras, categoria, produto, quantidade):
+        momento = datetime.combine(hoje - timedelta(days=dias_atras), datetime.min.time()) + timedelta(hours=15)
+        return RegistroDesperdicio(data_registro=momento, categoria_id=categoria.id, produto_id=produto.id,
+                                   quantidade=quantidade, unidade=produto.unidade)
+
+    registros = [
+        registro(0, sobras, alface, 1.0),     # Hoje, depois da meia-noite: entra
+        registro(3, sobras, tomate, 2.0),
+        registro(5, vencido, alface, 4.0),
+        registro(40, sobras, alface, 50.0),   # Antes do início das metas
+    ]
+    session.add_all(registros)
+    acumular_desperdicio_diario(registros)
+    metas = {
+        'geral': MetaDesperdicio(descricao="Geral", data_inicio=hoje - timedelta(days=10),
+                                 data_fim=hoje + timedelta(days=20), valor_inicial=20, valor_meta=10,
+                                 meta_reducao_percentual=100),
+        'sobras': MetaDesperdicio(descricao="Sobras", data_inicio=hoje - timedelta(days=10),
+                                  data_fim=hoje + timedelta(days=20), categoria_id=sobras.id,
+                                  valor_inicial=10, valor_meta=5, meta_reducao_percentual=50),
+        'alface': MetaDesperdicio(descricao="Alface", data_inicio=hoje - timedelta(days=10),
+                                  data_fim=hoje - timedelta(days=4), produto_id=alface.id,
+                                  valor_inicial=8, valor_meta=5, meta_reducao_percentual=37.5),
+        'inativa': MetaDesperdicio(descricao="Inativa", data_inicio=hoje - timedelta(days=10),
+                                   data_fim=hoje + timedelta(days=20), valor_inicial=1, valor_meta=1,
+                                   meta_reducao_percentual=0, ativo=False),
+    }
+    session.add_all(metas.values())
+    session.commit()
+    return sobras, alface, metas
+
+
+def test_avalia_todas_as_metas_ativas_em_uma_consulta(session, consultas):
+    _, _, metas = _cenario(session)
+    session.expire_all()
+    ativas = MetaDesperdicio.query.filter_by(ativo=True).all()
+
+    consultas.clear()
+    tabela = {linha['descricao']: linha for linha in avaliar_metas(ativas)}
+    for meta in ativas:
+        meta.to_dict(), meta.status, meta.progresso
+    assert len(consultas) == 1
+
+    assert tabela['Geral']['valor_atual'] == 7.0
+    assert tabela['Geral']['progresso'] == pytest.approx(65.0)
+    assert tabela['Geral']['status'] == 'Em Andamento'
+    assert tabela['Sobras']['valor_atual'] == 3.0
+    assert tabela['Alface']['valor_atual'] == 4.0      # Só até data_fim, inclusive
+    assert tabela['Alface']['status'] == 'Concluída'
+    assert 'Inativa' not in {linha['descricao'] for linha in avaliar_metas()}
+
+
+def test_novo_registro_descarta_so_as_metas_afetadas(session, consultas):
+    sobras, alface, metas = _cenario(session)
+    avaliar_metas()
+
+    novo = RegistroDesperdicio(categoria_id=sobras.id, produto_id=alface.id, quantidade=2.5,
+                               unidade='un', data_registro=datetime.now())
+    session.add(novo)
+    acumular_desperdicio_diario([novo])
+    session.commit()
+
+    consultas.clear()
+    tabela = {linha['descricao']: linha for linha in avaliar_metas()}
+    assert tabela['Geral']['valor_atual'] == 9.5
+    assert tabela['Sobras']['valor_atual'] == 5.5
+    assert tabela['Alface']['valor_atual'] == 4.0  # Fora da janela: continua em cache
+    recalculo = [c for c in consultas if 'desperdicio_diario' in c]
+    assert len(recalculo) == 1
+
+
+def test_alterar_a_meta_recalcula_o_valor(session):
+    sobras, _, metas = _cenario(session)
+    assert metas['alface'].valor_atual == 4.0
+
+    metas['alface'].data_fim = date.today()
+    session.flush()  # A sessão de teste não usa autoflush
+    assert metas['alface'].valor_atual == 5.0
+    metas['alface'].categoria_id = sobras.id
+    session.commit()
+    assert metas['alface'].valor_atual == 1.0
+
+
+def test_meta_nao_gravada_e_api(app, session):
+    sobras, _, _ = _cenario(session)
+    nova = MetaDesperdicio(descricao="Nova", data_inicio=date.today() - timedelta(days=10),
+                           data_fim=date.today(), categoria_id=sobras.id, valor_inicial=3,
+                           valor_meta=1, meta_reducao_percentual=66)
+    assert nova.valor_atual == 3.0
+
+    resposta = app.test_client().get('/desperdicio/api/metas')
+    assert resposta.status_code == 200
+    assert {m['descricao'] for m in resposta.get_json()} == {'Geral', 'Sobras', 'Alface'}
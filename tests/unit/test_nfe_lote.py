@@ -0,0 +1,53 @@
+import glob
+import io
+import os
+import zipfile
+
+from app.models.modelo_estoque import EstoqueMovimentacao
+from app.models.modelo_fornecedor import Fornecedor
+from app.models.modelo_nfe import NFNota, NFItem
+from app.models.modelo_produto import Produto
+from app.utils.nfe_lote import importar_lote, ler_zip
+
+PASTA_NFE = os.path.join(os.path.dirname(__file__), '..', '..', 'nf e')
+
+
+def _amostra():
+    caminho = glob.glob(os.path.join(PASTA_NFE, '*.xml'))[0]
+    with open(caminho, 'rb') as f:
+        return os.path.basename(caminho), f.read()
+
+
+def test_importar_lote_zip_com_duplicata_e_erro(session):
+    """Importa via ZIP, ignora a nota repetida e reporta o arquivo inválido"""
+    nome, conteudo = _amostra()
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zf:
+        zf.writestr(nome, conteudo)
+        zf.writestr('copia/' + nome, conteudo)
+        zf.writestr('invalido.xml', b'<nfeProc></nfeProc>')
+    arquivos = list(ler_zip(buffer.getvalue(), 'notas.zip'))
+    assert len(arquivos) == 3
+
+    resultado = importar_lote(arquivos, processos=1)
+
+    assert resultado['importadas'] == 1
+    assert resultado['duplicadas'] == 1
+    assert resultado['erros'] == 1
+    assert resultado['itens'] == 4
+
+    nota = NFNota.query.one()
+    assert len(nota.itens) == 4
+    assert Fornecedor.query.filter_by(cnpj='07374789000190').count() == 1
+    assert EstoqueMovimentacao.query.count() == 4
+
+    item = NFItem.query.filter_by(nf_nota_id=nota.id, num_item=1).one()
+    assert item.produto.codigo == '001174'
+    assert item.produto.estoque_atual == 3.0
+    assert float(item.produto.preco_unitario) == 25.14
+
+    # Reimportar não duplica nada
+    resultado = importar_lote([(nome, conteudo)], processos=1)
+    assert resultado['duplicadas'] == 1
+    assert NFNota.query.count() == 1
+    assert Produto.query.filter_by(codigo='001174').one().estoque_atual == 3.0
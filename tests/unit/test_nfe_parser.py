@@ -0,0 +1,92 @@
+import glob
+import io
+import os
+import re
+
+import pytest
+
+from app.utils import nfe_parser
+from app.utils.nfe_parser import extrair_dados_nfe, ler_nfe
+
+PASTA_NFE = os.path.join(os.path.dirname(__file__), '..', '..', 'nf e')
+
+
+@pytest.fixture(scope='module')
+def xml_amostra():
+    with open(glob.glob(os.path.join(PASTA_NFE, '*.xml'))[0], encoding='utf-8') as f:
+        return f.read()
+
+
+def test_ler_nfe_amostra(xml_amostra):
+    """O parser incremental extrai cabeçalho, emitente, totais e itens"""
+    nfe = extrair_dados_nfe(xml_amostra)
+
+    assert nfe.chave_acesso == '35250407374789000190550010000848211154644503'
+    assert nfe.numero == '84821'
+    assert nfe.fornecedor.cnpj == '07374789000190'
+    assert nfe.fornecedor.cidade == 'CAMPINAS'
+    assert nfe.valor_total == 139.82
+    assert [i.codigo for i in nfe.itens] == ['001174', '011200', '011066', '000993']
+    assert nfe.itens[1].icms_valor == 2.14
+    assert nfe.itens[1].icms_aliquota == 18.0
+
+    # Bytes e str produzem o mesmo resultado
+    assert ler_nfe(xml_amostra.encode('utf-8')) == nfe
+
+
+def test_ler_nfe_sem_protocolo_usa_id(xml_amostra):
+    """Sem o envelope nfeProc, a chave vem do atributo Id de infNFe"""
+    inicio = xml_amostra.index('<NFe ')
+    fim = xml_amostra.index('</NFe>') + len('</NFe>')
+    nfe = ler_nfe(xml_amostra[inicio:fim])
+    assert nfe.chave_acesso == '35250407374789000190550010000848211154644503'
+
+
+def test_ler_nfe_muitos_itens(xml_amostra):
+    """Notas com milhares de itens são lidas por completo e na ordem"""
+    dets = re.findall(r'<det nItem="\d+">.*?</det>', xml_amostra, flags=re.S)
+    novos = ''.join(
+        re.sub(r'nItem="\d+"', f'nItem="{i + 1}"', dets[i % len(dets)], count=1)
+        for i in range(5000)
+    )
+    inicio = xml_amostra.index(dets[0])
+    fim = xml_amostra.index(dets[-1]) + len(dets[-1])
+
+    nfe = ler_nfe(xml_amostra[:inicio] + novos + xml_amostra[fim:])
+    assert len(nfe.itens) == 5000
+    assert nfe.itens[-1].num_item == 5000
+
+
+def test_ler_nfe_xml_invalido():
+    with pytest.raises(ValueError):
+        extrair_dados_nfe('<nfeProc></nfeProc>')
+
+
+def test_ler_nfe_com_bom(xml_amostra):
+    """Arquivos salvos com BOM são lidos como str ou bytes (como chegam do upload e do lote)"""
+    esperado = ler_nfe(xml_amostra)
+    com_bom = xml_amostra.encode('utf-8-sig')
+    assert ler_nfe(com_bom.decode('utf-8')) == esperado
+    assert ler_nfe(com_bom) == esperado
+
+
+def test_ler_nfe_de_arquivos_abertos(xml_amostra):
+    """Arquivos de texto e binários são lidos até o fim"""
+    esperado = ler_nfe(xml_amostra)
+    assert ler_nfe(io.StringIO('\ufeff' + xml_amostra)) == esperado
+    assert ler_nfe(io.BytesIO(xml_amostra.encode('utf-8'))) == esperado
+
+
+def test_ler_nfe_de_caminho_fecha_o_arquivo(xml_amostra, tmp_path, monkeypatch):
+    caminho = tmp_path / 'nota.xml'
+    caminho.write_text(xml_amostra, encoding='utf-8')
+    abertos = []
+
+    def abrir(*args, **kwargs):
+        arquivo = open(*args, **kwargs)
+        abertos.append(arquivo)
+        return arquivo
+
+    monkeypatch.setattr(nfe_parser, 'open', abrir, raising=False)
+    assert ler_nfe(caminho).numero == '84821'
+    assert len(abertos) == 1 and abertos[0].closed
@@ -38,7 +38,9 @@ def test_atualizar_estoque_preco_medio_ponderado():
 
         # Mock da sessão do banco de dados para evitar erros de commit/add
         with patch('app.models.modelo_nfe.db.session') as mock_session:
-            with patch('app.models.modelo_estoque.EstoqueMovimentacao') as MockMovimento:
+            with patch('app.models.modelo_estoque.EstoqueMovimentacao') as MockMovimento, \
+                    patch('app.utils.estoque_atomico.bloquear_produtos', return_value={}), \
+                    patch('app.utils.estoque_atomico.aplicar_movimentos') as mock_aplicar:
                  # Executa a função chamando DIRETAMENTE a classe, passando o mock como self
                 NFNota.atualizar_estoque(nota)
 
@@ -46,8 +48,8 @@ def test_atualizar_estoque_preco_medio_ponderado():
                 # 1. Preço médio deve ser 15.0
                 assert produto.preco_unitario == 15.0
                 
-                # 2. Estoque deve ser atualizado para 20.0
-                assert produto.estoque_atual == 20.0
+                # 2. Estoque deve ser atualizado em +10 (UPDATE atômico no banco)
+                assert list(mock_aplicar.call_args[0][0]) == [(1, 10.0)]
                 
                 # 3. Movimentação deve ter sido criada
                 MockMovimento.assert_called()
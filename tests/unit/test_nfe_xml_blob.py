@@ -0,0 +1,54 @@
+import glob
+import os
+from datetime import datetime
+
+from app.models.modelo_fornecedor import Fornecedor
+from app.models.modelo_nfe import NFNota, NFXmlBlob
+from app.utils.nfe_lote import importar_lote
+
+PASTA_NFE = os.path.join(os.path.dirname(__file__), '..', '..', 'nf e')
+
+
+def _nota(fornecedor, chave):
+    return NFNota(chave_acesso=chave, numero='1', serie='1', data_emissao=datetime(2026, 1, 1),
+                  valor_total=10, valor_produtos=10, fornecedor_id=fornecedor.id)
+
+
+def test_xml_comprimido_e_deduplicado(session):
+    """O XML volta íntegro e notas com a mesma chave compartilham o blob"""
+    fornecedor = Fornecedor(cnpj='11111111000111', razao_social='Fornecedor XML')
+    session.add(fornecedor)
+    session.flush()
+
+    xml = '<nfeProc>' + '<det><prod>Produto repetido</prod></det>' * 200 + '</nfeProc>'
+    chave = '3' * 44
+    nota = _nota(fornecedor, chave)
+    nota.xml_data = xml
+    session.add(nota)
+    session.commit()
+
+    blob = NFXmlBlob.query.one()
+    assert blob.hash == NFXmlBlob.calcular_hash(chave)
+    assert blob.tamanho_original == len(xml)
+    assert blob.tamanho_comprimido < blob.tamanho_original / 5
+    assert NFNota.query.get(nota.id).xml_data == xml
+
+    # Gravar novamente o XML da mesma chave reaproveita o blob existente
+    assert NFXmlBlob.salvar(chave, xml) is blob
+    assert NFXmlBlob.query.count() == 1
+
+
+def test_listagem_nao_carrega_xml(session, consultas):
+    """Listar notas não lê o conteúdo do XML do banco"""
+    caminho = glob.glob(os.path.join(PASTA_NFE, '*.xml'))[0]
+    with open(caminho, 'rb') as f:
+        importar_lote([(os.path.basename(caminho), f.read())], processos=1)
+    session.expire_all()
+
+    consultas.clear()
+    notas = NFNota.query.order_by(NFNota.data_emissao.desc()).paginate(page=1, per_page=20)
+    assert [n.xml_hash for n in notas.items] == [NFXmlBlob.calcular_hash(notas.items[0].chave_acesso)]
+
+    assert consultas
+    assert not any('conteudo' in sql or 'nf_xml_blob' in sql for sql in consultas)
+    assert '<nfeProc' in notas.items[0].xml_data
@@ -0,0 +1,121 @@
+from datetime import date
+
+import pytest
+
+from app.models.modelo_cardapio import Cardapio, CardapioSecao, CardapioItem
+from app.models.modelo_fornecedor import Fornecedor
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_previsao import PrevisaoDemanda, ResultadoBacktest
+from app.models.modelo_produto import Produto
+from app.utils import planejamento_compras
+from app.utils.matriz_receitas import invalidar_matriz
+from app.utils.planejamento_compras import planejar_compras
+
+
+@pytest.fixture(autouse=True)
+def caches_limpos():
+    # Os dados de cada teste são desfeitos ao final: nada calculado pode sobreviver
+    invalidar_matriz()
+    planejamento_compras.limpar_cache()
+    yield
+    invalidar_matriz()
+    planejamento_compras.limpar_cache()
+
+
+def _previsao(item, metodo, valores):
+    previsao = PrevisaoDemanda(data_inicio=date(2024, 7, 1), data_fim=date(2024, 7, 7), metodo=metodo,
+                               cardapio_item_id=item.id if isinstance(item, CardapioItem) else None,
+                               prato_id=item.id if isinstance(item, Prato) else None)
+    previsao.set_valores_previstos({f'2024-07-0{dia}': q for dia, q in valores.items()})
+    return previsao
+
+
+def _cenario(session):
+    hortifruti = Fornecedor(cnpj='11111111000111', razao_social='Hortifruti MRP')
+    graos = Fornecedor(cnpj='22222222000122', razao_social='Grãos MRP')
+    session.add_all([hortifruti, graos])
+    session.flush()
+    tomate = Produto(nome="Tomate MRP", unidade="kg", preco_unitario=5.00, estoque_atual=2,
+                     estoque_minimo=1, fornecedor_id=hortifruti.id)
+    arroz = Produto(nome="Arroz MRP", unidade="kg", preco_unitario=6.00, estoque_atual=50,
+                    estoque_minimo=5, fornecedor_id=graos.id)
+    sal = Produto(nome="Sal MRP", unidade="kg", preco_unitario=2.00, estoque_atual=0, estoque_minimo=3)
+    molho = Prato(nome="Molho MRP", rendimento=10, unidade_rendimento="porção", porcoes_rendimento=10)
+    risoto = Prato(nome="Risoto MRP", rendimento=4, unidade_rendimento="porção", porcoes_rendimento=4)
+    session.add_all([tomate, arroz, sal, molho, risoto])
+    session.flush()
+    session.add_all([
+        PratoInsumo(prato_id=molho.id, produto_id=tomate.id, quantidade=5),   # 0.5 kg/porção
+        PratoInsumo(prato_id=risoto.id, produto_id=arroz.id, quantidade=1),   # 0.25 kg/porção
+        PratoInsumo(prato_id=risoto.id, produto_id=tomate.id, quantidade=2),  # 0.5 kg/porção
+    ])
+    cardapio = Cardapio(nome="Cardápio MRP")
+    session.add(cardapio)
+    session.flush()
+    secao = CardapioSecao(nome="Principais", cardapio_id=cardapio.id)
+    session.add(secao)
+    session.flush()
+    item_risoto = CardapioItem(secao_id=secao.id, prato_id=risoto.id, preco_venda=40.00)
+    session.add(item_risoto)
+    session.flush()
+
+    session.add_all([
+        _previsao(molho, 'media_movel', {1: 100, 2: 100}),  # Substituída pela mais recente
+        _previsao(molho, 'media_movel', {1: 4, 2: 4, 3: 4, 5: 2}),
+        _previsao(item_risoto, 'regressao_linear', {1: 2, 2: 2, 3: 2}),
+        _previsao(item_risoto, 'media_movel', {1: 8, 2: 8, 3: 8}),  # Mais recente, mas não é o melhor método
+        ResultadoBacktest(cardapio_item_id=item_risoto.id, metodo='regressao_linear', horizonte=7, origens=4,
+                          melhor=True),
+    ])
+    session.commit()
+    return tomate, arroz, sal, hortifruti, graos
+
+
+def test_compras_sugeridas_por_fornecedor(session):
+    tomate, arroz, sal, hortifruti, graos = _cenario(session)
+
+    plano = planejar_compras(date(2024, 7, 1), date(2024, 7, 3))
+    assert plano['previsoes'] == 2
+    grupos = {g['fornecedor']: g for g in plano['fornecedores']}
+    assert set(grupos) == {'Hortifruti MRP', 'Sem fornecedor'}  # Arroz tem estoque de sobra
+
+    item = grupos['Hortifruti MRP']['itens'][0]
+    # Molho: 12 porções x 0.5 + risoto: 6 porções x 0.5 = 9 kg; +1 mínimo -2 em estoque
+    assert item['necessidade_prevista'] == 9.0
+    assert item['quantidade_sugerida'] == 8.0
+    assert item['valor_estimado'] == 40.0
+    assert grupos['Sem fornecedor']['itens'][0]['quantidade_sugerida'] == 3.0  # Só repõe o mínimo
+    assert plano['valor_total'] == 46.0
+
+    sem_minimo = planejar_compras(date(2024, 7, 1), date(2024, 7, 3), considerar_estoque_minimo=False)
+    assert [g['fornecedor'] for g in sem_minimo['fornecedores']] == ['Hortifruti MRP']
+    assert sem_minimo['fornecedores'][0]['itens'][0]['quantidade_sugerida'] == 7.0
+
+
+def test_outro_horizonte_reaproveita_a_demanda_em_cache(session, consultas):
+    tomate, *_ = _cenario(session)
+    planejar_compras(date(2024, 7, 1), date(2024, 7, 3))
+
+    consultas.clear()
+    plano = planejar_compras(date(2024, 7, 2), date(2024, 7, 31))
+
+    # Versão das previsões (2 consultas) e estoque/fornecedores (1)
+    assert len(consultas) == 3
+    tomate_item = next(i for g in plano['fornecedores'] for i in g['itens'] if i['produto_id'] == tomate.id)
+    assert tomate_item['necessidade_prevista'] == 7.0  # Molho: 10 porções, risoto: 4
+
+    # Uma nova previsão muda a versão e a demanda é recalculada
+    session.add(_previsao(Prato.query.filter_by(nome="Molho MRP").one(), 'media_movel', {5: 30}))
+    session.commit()
+    plano = planejar_compras(date(2024, 7, 2), date(2024, 7, 31))
+    tomate_item = next(i for g in plano['fornecedores'] for i in g['itens'] if i['produto_id'] == tomate.id)
+    assert tomate_item['necessidade_prevista'] == 17.0
+
+
+def test_api_compras(app, session):
+    _cenario(session)
+    client = app.test_client()
+    resposta = client.get('/previsao/api/compras?inicio=2024-07-01&fim=2024-07-03')
+    assert resposta.status_code == 200
+    assert resposta.get_json()['valor_total'] == 46.0
+    assert client.get('/previsao/api/compras?inicio=2024-07-03&fim=2024-07-01').status_code == 400
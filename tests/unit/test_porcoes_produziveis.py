@@ -0,0 +1,94 @@
+import random
+
+import pytest
+from sqlalchemy import insert
+
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_produto import Produto
+from app.utils.matriz_receitas import invalidar_matriz
+from app.utils.producao import calcular_porcoes_produziveis
+
+
+@pytest.fixture(autouse=True)
+def matriz_limpa():
+    # Cada teste roda em uma transação desfeita ao final: a matriz não pode sobreviver a ela
+    invalidar_matriz()
+    yield
+    invalidar_matriz()
+
+
+def _pratos(session):
+    farinha = Produto(nome="Farinha Porções", unidade="kg", preco_unitario=4.00, estoque_atual=10)
+    ovo = Produto(nome="Ovo Porções", unidade="un", preco_unitario=1.00, estoque_atual=12)
+    massa = Prato(nome="Massa Porções", rendimento=4, unidade_rendimento="porção", porcoes_rendimento=4)
+    bolo = Prato(nome="Bolo Porções", rendimento=8, unidade_rendimento="porção", porcoes_rendimento=8)
+    inativo = Prato(nome="Inativo Porções", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1,
+                    ativo=False)
+    sem_receita = Prato(nome="Sem Receita Porções", rendimento=1, unidade_rendimento="porção",
+                        porcoes_rendimento=1)
+    session.add_all([farinha, ovo, massa, bolo, inativo, sem_receita])
+    session.flush()
+    session.add_all([
+        PratoInsumo(prato_id=massa.id, produto_id=farinha.id, quantidade=1.0),  # 0.25 kg/porção -> 40
+        PratoInsumo(prato_id=massa.id, produto_id=ovo.id, quantidade=4),        # 1 ovo/porção -> 12
+        PratoInsumo(prato_id=bolo.id, produto_id=farinha.id, quantidade=2.0),   # 0.25 kg/porção -> 40
+        PratoInsumo(prato_id=inativo.id, produto_id=ovo.id, quantidade=1),
+    ])
+    session.commit()
+    return farinha, ovo, massa, bolo, sem_receita
+
+
+def test_porcoes_e_gargalo_de_todos_os_pratos(session):
+    farinha, ovo, massa, bolo, sem_receita = _pratos(session)
+
+    resultado = {r['prato_id']: r for r in calcular_porcoes_produziveis()}
+    assert set(resultado) == {massa.id, bolo.id, sem_receita.id}
+    assert resultado[massa.id]['porcoes'] == 12
+    assert resultado[massa.id]['gargalo']['produto_id'] == ovo.id
+    assert resultado[massa.id]['gargalo']['necessario_por_porcao'] == 1.0
+    assert resultado[bolo.id]['porcoes'] == 40
+    assert resultado[bolo.id]['gargalo']['nome'] == 'Farinha Porções'
+    assert resultado[sem_receita.id]['porcoes'] is None
+
+    # Mudar a receita descarta a matriz em cache no commit
+    session.add(PratoInsumo(prato_id=bolo.id, produto_id=ovo.id, quantidade=16))
+    session.commit()
+    bolo_atual = next(r for r in calcular_porcoes_produziveis() if r['prato_id'] == bolo.id)
+    assert bolo_atual['porcoes'] == 6
+    assert bolo_atual['gargalo']['produto_id'] == ovo.id
+
+
+def test_api_porcoes_produziveis(app, session):
+    _, _, massa, _, _ = _pratos(session)
+    resposta = app.test_client().get('/pratos/api/porcoes_produziveis')
+    assert resposta.status_code == 200
+    dados = resposta.get_json()
+    assert dados[0]['prato_id'] == massa.id  # Menos porções primeiro
+    assert dados[-1]['porcoes'] is None
+
+
+def test_centenas_de_pratos_com_consultas_fixas(session, consultas):
+    random.seed(7)
+    produtos = [Produto(nome=f"Insumo Capacidade {i}", unidade="kg", preco_unitario=1.0,
+                        estoque_atual=random.uniform(0, 50)) for i in range(400)]
+    pratos = [Prato(nome=f"Prato Capacidade {i}", rendimento=10, unidade_rendimento="porção",
+                    porcoes_rendimento=10) for i in range(500)]
+    session.add_all(produtos + pratos)
+    session.flush()
+    session.execute(insert(PratoInsumo), [
+        {'prato_id': prato.id, 'produto_id': produto.id, 'quantidade': random.uniform(0.1, 3.0)}
+        for prato in pratos for produto in random.sample(produtos, 10)
+    ])
+    session.commit()
+
+    consultas.clear()
+    calcular_porcoes_produziveis()  # Carrega a matriz
+    carga = len(consultas)
+
+    consultas.clear()
+    resultado = calcular_porcoes_produziveis()
+
+    assert len(resultado) == 500
+    # O número de consultas não cresce com a quantidade de pratos ou insumos
+    assert carga == 4  # Mais a montagem da matriz, uma única vez
+    assert len(consultas) == 3  # Estoque, pratos e nomes dos gargalos; a matriz vem do cache
@@ -0,0 +1,108 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.models.modelo_prato import Prato
+from app.models.modelo_previsao import HistoricoVendas, PrevisaoDemanda
+from app.routes.previsao.views import calcular_holt_winters, calcular_media_movel, calcular_regressao_linear
+from app.utils.previsao_demanda import (
+    ajustar_holt_winters, carregar_matriz_vendas, gerar_previsoes_todos, prever_media_movel,
+    prever_regressao_linear, prever_sazonal
+)
+
+
+def test_metodos_vetorizados_equivalem_aos_por_item():
+    """Cada coluna da matriz dá o mesmo resultado das funções de um item só"""
+    rng = np.random.default_rng(42)
+    valores = rng.integers(5, 40, size=(30, 4)).astype(float)
+
+    previsao, confiabilidade = prever_media_movel(valores, 3, janela=7)
+    previsao_rl, confiabilidade_rl = prever_regressao_linear(valores, 3)
+    for coluna in range(valores.shape[1]):
+        dados = valores[:, coluna].tolist()
+        esperado, conf = calcular_media_movel(dados, janela=7)
+        assert np.allclose(previsao[:, coluna], esperado[30:33])
+        assert np.isclose(confiabilidade[coluna], conf)
+
+        esperado, conf = calcular_regressao_linear(dados, dias_projecao=3)
+        assert np.allclose(previsao_rl[:, coluna], esperado[30:])
+        assert np.isclose(confiabilidade_rl[coluna], conf)
+
+
+def test_sazonal_reproduz_ciclo_semanal():
+    """Uma série com pico no fim de semana é prevista com o mesmo padrão"""
+    ciclo = np.array([10, 10, 10, 10, 20, 30, 30], dtype=float)
+    valores = np.tile(ciclo, 8)[:, None]
+    dias_semana = np.arange(56) % 7
+
+    previsao, confiabilidade = prever_sazonal(valores, dias_semana, np.arange(7))
+
+    assert np.allclose(previsao[:, 0], ciclo)
+    assert confiabilidade[0] > 0.99
+
+
+def test_holt_winters_ciclo_semanal_e_tendencia():
+    """Holt-Winters recupera ciclo e tendência; histórico curto usa o modelo simples"""
+    ciclo = np.array([10, 10, 12, 14, 25, 30, 28], dtype=float)
+    semanas = 30
+    aditivo = np.tile(ciclo, semanas) + 0.1 * np.arange(7 * semanas)
+    multiplicativo = np.tile(ciclo / ciclo.mean(), semanas) * np.linspace(20, 80, 7 * semanas)
+    curto = np.full(7 * semanas, np.nan)
+    curto[-10:] = 5
+    valores = np.column_stack([aditivo, multiplicativo, curto])
+
+    resultado = ajustar_holt_winters(valores, 7)
+
+    esperado = np.tile(ciclo, 1) + 0.1 * np.arange(7 * semanas, 7 * semanas + 7)
+    assert np.allclose(resultado['previsao'][:, 0], esperado, rtol=0.02)
+    assert resultado['tipo'][1] == 'multiplicativo'
+    assert resultado['confiabilidade'][0] > 0.95
+    assert resultado['confiabilidade'][1] > 0.95
+    assert resultado['tipo'][2] is None
+    assert np.allclose(resultado['previsao'][:, 2], 5)
+
+    dados = aditivo.tolist()
+    previsao, confiabilidade = calcular_holt_winters(dados, dias_projecao=7)
+    assert len(previsao) == len(dados) + 7
+    assert np.allclose(previsao[-7:], resultado['previsao'][:, 0])
+
+
+def test_gerar_previsoes_todos(session):
+    """Uma consulta alimenta todos os itens e as previsões são gravadas em massa"""
+    pratos = [Prato(nome=f"Prato Previsão {i}", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+              for i in range(3)]
+    session.add_all(pratos)
+    session.commit()
+
+    hoje = date(2024, 5, 20)
+    for dias_atras in range(1, 29):
+        dia = hoje - timedelta(days=dias_atras)
+        session.add(HistoricoVendas(data=dia, prato_id=pratos[0].id, quantidade=10, valor_unitario=20, valor_total=200))
+        session.add(HistoricoVendas(data=dia, prato_id=pratos[1].id, quantidade=dias_atras, valor_unitario=20,
+                                    valor_total=20 * dias_atras))
+    # Poucos dias de venda: item fica de fora
+    session.add(HistoricoVendas(data=hoje - timedelta(days=1), prato_id=pratos[2].id, quantidade=3,
+                                valor_unitario=20, valor_total=60))
+    session.commit()
+
+    matriz = carregar_matriz_vendas(hoje - timedelta(days=30), hoje - timedelta(days=1))
+    assert matriz.valores.shape == (30, 3)
+    assert np.isnan(matriz.valores[0]).all()  # antes da primeira venda
+
+    resultado = gerar_previsoes_todos(hoje, hoje + timedelta(days=2), dias_historico=30, hoje=hoje)
+
+    assert resultado['itens'] == 2
+    assert resultado['ignorados'] == 1
+    assert resultado['previsoes'] == 6
+    assert PrevisaoDemanda.query.count() == 6
+
+    constante = PrevisaoDemanda.query.filter_by(prato_id=pratos[0].id, metodo='media_movel').one()
+    assert constante.get_valores_previstos() == {'2024-05-20': 10, '2024-05-21': 10, '2024-05-22': 10}
+
+    # Vendas caindo um por dia: a regressão projeta 0 (sem valores negativos)
+    tendencia = PrevisaoDemanda.query.filter_by(prato_id=pratos[1].id, metodo='regressao_linear').one()
+    assert tendencia.get_valores_previstos()['2024-05-20'] == 0
+    assert tendencia.confiabilidade > 0.99
+
+    sazonal = PrevisaoDemanda.query.filter_by(prato_id=pratos[0].id, metodo='sazonalidade').one()
+    assert set(sazonal.get_valores_previstos().values()) == {10}
@@ -0,0 +1,86 @@
+from datetime import date, datetime
+
+from app.models.modelo_estoque import EstoqueMovimentacao
+from app.models.modelo_produto import Produto, ProdutoPrecoHistorico
+from app.utils.nfe_lote import importar_lote
+from tests.unit.test_nfe_lote import _amostra
+
+
+def _historico(produto_id):
+    return ProdutoPrecoHistorico.query.filter_by(produto_id=produto_id).order_by(
+        ProdutoPrecoHistorico.id).all()
+
+
+def test_mudancas_de_preco_geram_historico(session):
+    """Cadastro, edição manual e entrada de estoque registram uma linha cada"""
+    produto = Produto(nome="Ing Histórico", unidade="kg", preco_unitario=10.00)
+    session.add(produto)
+    session.commit()
+
+    produto.preco_unitario = 12.00
+    session.commit()
+    produto.estoque_minimo = 5  # Sem mudança de preço: nada a registrar
+    session.commit()
+    EstoqueMovimentacao.registrar_entrada(produto.id, 2, valor_unitario=14.00, referencia='Compra avulsa')
+
+    historico = _historico(produto.id)
+    assert [h.origem for h in historico] == ['cadastro', 'manual', 'entrada']
+    assert [float(h.preco_medio) for h in historico] == [10.00, 12.00, 14.00]
+    assert float(historico[-1].ultimo_preco_compra) == 14.00
+    assert historico[-1].referencia == 'Compra avulsa'
+
+
+def test_preco_em_data(session):
+    """O preço em D é o do último registro vigente até o fim daquele dia"""
+    produto = Produto(nome="Ing Data", unidade="kg", preco_unitario=10.00)
+    session.add(produto)
+    session.flush()
+    session.add_all([
+        ProdutoPrecoHistorico(produto_id=produto.id, vigente_desde=datetime(2024, 1, 1), preco_medio=10.00),
+        ProdutoPrecoHistorico(produto_id=produto.id, vigente_desde=datetime(2024, 3, 10, 15, 0), preco_medio=11.00,
+                              ultimo_preco_compra=12.00, origem='nfe'),
+    ])
+    session.commit()
+
+    assert ProdutoPrecoHistorico.preco_em(produto.id, date(2023, 12, 31)) is None
+    assert float(ProdutoPrecoHistorico.preco_em(produto.id, date(2024, 3, 9))) == 10.00
+    assert float(ProdutoPrecoHistorico.preco_em(produto.id, date(2024, 3, 10))) == 11.00
+    assert float(ProdutoPrecoHistorico.preco_em(produto.id, datetime(2024, 3, 10, 12, 0))) == 10.00
+    assert float(ProdutoPrecoHistorico.preco_em(produto.id, date(2024, 5, 1), 'ultimo_preco_compra')) == 12.00
+
+
+def test_precos_em_lote_com_uma_consulta(session, consultas):
+    """Muitos (produto, data) são resolvidos com uma consulta, com o mesmo resultado de preco_em"""
+    produtos = [Produto(nome=f"Ing Lote {i}", unidade="kg", preco_unitario=1.00) for i in range(5)]
+    session.add_all(produtos)
+    session.flush()
+    for i, produto in enumerate(produtos):
+        for mes in (1, 4, 7):
+            session.add(ProdutoPrecoHistorico(produto_id=produto.id, vigente_desde=datetime(2024, mes, 1),
+                                              preco_medio=i * 10 + mes))
+    session.commit()
+
+    datas = [date(2023, 12, 1), date(2024, 2, 15), date(2024, 4, 1), date(2024, 12, 31)]
+    pares = [(p.id, d) for p in produtos for d in datas]
+
+    consultas.clear()
+    precos = ProdutoPrecoHistorico.precos_em(pares)
+    assert len(consultas) == 1
+    assert (produtos[0].id, date(2023, 12, 1)) not in precos
+    assert precos[(produtos[2].id, date(2024, 2, 15))] == 21.0
+    assert precos[(produtos[2].id, date(2024, 4, 1))] == 24.0
+    assert precos[(produtos[4].id, date(2024, 12, 31))] == 47.0
+    for (produto_id, data), preco in precos.items():
+        assert float(ProdutoPrecoHistorico.preco_em(produto_id, data)) == preco
+
+
+def test_importacao_lote_registra_preco_de_compra(session):
+    """A importação em massa de NF-e registra o preço médio e o preço da compra"""
+    importar_lote([_amostra()], processos=1)
+
+    produto = Produto.query.filter_by(codigo='001174').one()
+    historico = _historico(produto.id)
+    assert historico[-1].origem == 'nfe'
+    assert float(historico[-1].preco_medio) == 25.14
+    assert float(historico[-1].ultimo_preco_compra) == 25.14
+    assert historico[-1].referencia.startswith('NF ')
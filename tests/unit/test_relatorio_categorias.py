@@ -0,0 +1,77 @@
+from datetime import date
+
+from app.models.modelo_produto import Produto
+from app.models.modelo_prato import Prato, PratoInsumo
+from app.models.modelo_cardapio import Cardapio, CardapioSecao, CardapioItem
+from app.models.modelo_previsao import HistoricoVendas
+from app.routes.dashboard.views import calcular_lucratividade_categorias
+
+DIA = date(2024, 5, 10)
+
+
+def _catalogo(session, secoes, pratos_por_secao):
+    """Cria seções com pratos (custo 5.00 por porção) e uma venda de cada um"""
+    ing = Produto(nome=f"Ing Categorias {secoes}", unidade="kg", preco_unitario=10.00)
+    cardapio = Cardapio(nome=f"Cardápio Categorias {secoes}")
+    session.add_all([ing, cardapio])
+    session.flush()
+
+    vendas = []
+    for s in range(secoes):
+        secao = CardapioSecao(nome=f"Seção {secoes}-{s}", cardapio_id=cardapio.id)
+        session.add(secao)
+        session.flush()
+        for p in range(pratos_por_secao):
+            prato = Prato(nome=f"Prato {secoes}-{s}-{p}", categoria=f"Cat {secoes}-{s}",
+                          rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+            session.add(prato)
+            session.flush()
+            session.add(PratoInsumo(prato_id=prato.id, produto_id=ing.id, quantidade=0.5))
+            item = CardapioItem(secao_id=secao.id, prato_id=prato.id, preco_venda=20.00)
+            session.add(item)
+            session.flush()
+            vendas += [
+                HistoricoVendas(data=DIA, cardapio_item_id=item.id, quantidade=2,
+                                valor_unitario=20.00, valor_total=40.00),
+                HistoricoVendas(data=DIA, prato_id=prato.id, quantidade=1,
+                                valor_unitario=20.00, valor_total=20.00),
+            ]
+    session.add_all(vendas)
+    session.commit()
+
+
+def test_relatorio_categorias_valores(session):
+    """Seções somam as vendas dos itens e categorias as vendas diretas dos pratos"""
+    _catalogo(session, 2, 3)
+    dados = calcular_lucratividade_categorias(DIA, DIA)
+
+    secao = dados['Seção: Seção 2-0']
+    assert secao['tipo'] == 'Seção'
+    assert secao['quantidade'] == 6
+    assert secao['receita'] == 120.00
+    assert secao['custo'] == 30.00  # 6 porções x 5.00
+    assert secao['lucro'] == 90.00
+    assert secao['margem'] == 75.0
+
+    categoria = dados['Categoria: Cat 2-1']
+    assert categoria['tipo'] == 'Categoria'
+    assert categoria['quantidade'] == 3
+    assert categoria['receita'] == 60.00
+    assert categoria['custo'] == 15.00
+    assert len(dados) == 4
+
+
+def test_relatorio_categorias_consultas_constantes(session, consultas):
+    """O número de consultas não cresce com o tamanho do cardápio"""
+    _catalogo(session, 2, 2)
+    consultas.clear()
+    assert len(calcular_lucratividade_categorias(DIA, DIA)) == 4
+    consultas_pequeno = len(consultas)
+
+    _catalogo(session, 10, 8)
+    consultas.clear()
+    assert len(calcular_lucratividade_categorias(DIA, DIA)) == 24
+    consultas_grande = len(consultas)
+
+    assert consultas_grande == consultas_pequeno
+    assert consultas_grande <= 3
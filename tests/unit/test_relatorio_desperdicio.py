@@ -0,0 +1,110 @@
+import random
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+from app.models.modelo_desperdicio import CategoriaDesperdicio, DesperdicioDiario, RegistroDesperdicio
+from app.models.modelo_prato import Prato
+from app.models.modelo_produto import Produto
+from app.utils.agregados_desperdicio import acumular_desperdicio_diario, reconstruir_desperdicio_diario
+from app.utils.relatorio_desperdicio import resumo_desperdicio
+
+
+def _cadastros(session):
+    sobras = CategoriaDesperdicio(nome="Sobras Relatório", cor="#FF0000")
+    vencido = CategoriaDesperdicio(nome="Vencido Relatório")
+    arroz = Produto(nome="Arroz Relatório", unidade="kg", preco_unitario=5.0)
+    feijoada = Prato(nome="Feijoada Relatório", rendimento=10, unidade_rendimento="porção", porcoes_rendimento=10)
+    session.add_all([sobras, vencido, arroz, feijoada])
+    session.flush()
+    return sobras, vencido, arroz, feijoada
+
+
+def test_recortes_do_periodo(session):
+    sobras, vencido, arroz, feijoada = _cadastros(session)
+    segunda = date(2025, 3, 3)
+    registros = [
+        RegistroDesperdicio(data_registro=datetime(2025, 3, 3, 9), categoria_id=sobras.id, produto_id=arroz.id,
+                            quantidade=2.0, unidade='kg', valor_estimado=10),
+        RegistroDesperdicio(data_registro=datetime(2025, 3, 3, 20), categoria_id=vencido.id, prato_id=feijoada.id,
+                            quantidade=3.0, unidade='porção', valor_estimado=30),
+        # Último dia do período, depois da meia-noite: entra
+        RegistroDesperdicio(data_registro=datetime(2025, 3, 9, 22), categoria_id=sobras.id, prato_id=feijoada.id,
+                            quantidade=1.0, unidade='porção', valor_estimado=5),
+        RegistroDesperdicio(data_registro=datetime(2025, 3, 10, 1), categoria_id=sobras.id, produto_id=arroz.id,
+                            quantidade=9.0, unidade='kg', valor_estimado=90),
+    ]
+    session.add_all(registros)
+    acumular_desperdicio_diario(registros)
+    session.commit()
+
+    resumo = resumo_desperdicio(segunda, segunda + timedelta(days=6))
+    assert resumo['total_registros'] == 3
+    assert resumo['total_valor'] == 45.0
+    assert resumo['total_quantidade'] == 6.0
+
+    categorias = resumo['estatisticas_categorias']
+    assert [c['nome'] for c in categorias] == ['Vencido Relatório', 'Sobras Relatório']
+    assert categorias[1]['quantidade'] == 2 and categorias[1]['cor'] == '#FF0000'
+    assert categorias[0]['cor'] == '#CCCCCC'
+
+    assert resumo['dados_evolucao']['datas'][0] == '03/03'
+    assert resumo['dados_evolucao']['valores'] == [40.0, 0, 0, 0, 0, 0, 5.0]
+    assert resumo['dados_dias_semana']['valores'] == [40.0, 0, 0, 0, 0, 0, 5.0]
+
+    itens = {i['nome']: i for i in resumo['top_itens']}
+    assert itens['Feijoada Relatório']['valor'] == 35.0
+    assert itens['Feijoada Relatório']['quantidade'] == 4.0
+    assert itens['Arroz Relatório']['unidade'] == 'kg'
+    assert resumo['top_itens'][0]['prato']['nome'] == 'Feijoada Relatório'
+
+    so_sobras = resumo_desperdicio(segunda, segunda + timedelta(days=6), categoria_id=sobras.id)
+    assert so_sobras['total_valor'] == 15.0
+
+
+def test_pagina_de_relatorios_pagina_os_registros(app, session):
+    sobras, _, arroz, _ = _cadastros(session)
+    session.execute(insert(RegistroDesperdicio), [
+        {'data_registro': datetime(2025, 5, 1, 12) + timedelta(hours=i), 'categoria_id': sobras.id,
+         'produto_id': arroz.id, 'quantidade': 1.0, 'unidade': 'kg', 'valor_estimado': 2}
+        for i in range(45)
+    ])
+    reconstruir_desperdicio_diario()
+
+    resposta = app.test_client().get('/desperdicio/relatorios?periodo=mensal&ano=2025&mes=5&pagina=3')
+    assert resposta.status_code == 200
+    html = resposta.get_data(as_text=True)
+    assert 'Registros do Período (45)' in html
+    assert html.count('Arroz Relatório</td>') == 5 + 1  # Página 3 e o top de itens
+
+
+def test_relatorio_anual_com_100k_registros_le_o_agregado(session, consultas):
+    random.seed(3)
+    categorias = [CategoriaDesperdicio(nome=f"Categoria Carga {i}") for i in range(4)]
+    produtos = [Produto(nome=f"Produto Carga {i}", unidade="kg", preco_unitario=1.0) for i in range(20)]
+    session.add_all(categorias + produtos)
+    session.flush()
+    inicio = datetime(2024, 1, 1)
+    session.execute(insert(RegistroDesperdicio), [
+        {
+            'data_registro': inicio + timedelta(minutes=random.randrange(366 * 24 * 60)),
+            'categoria_id': random.choice(categorias).id,
+            'produto_id': random.choice(produtos).id,
+            'quantidade': 1.0,
+            'unidade': 'kg',
+            'valor_estimado': 2
+        }
+        for _ in range(100_000)
+    ])
+    reconstruir_desperdicio_diario()
+    assert DesperdicioDiario.query.count() < 366 * 4 * 20  # Dias × categorias × itens
+
+    consultas.clear()
+    resumo = resumo_desperdicio(date(2024, 1, 1), date(2024, 12, 31))
+
+    assert resumo['total_registros'] == 100_000
+    assert resumo['total_valor'] == 200_000.0
+    assert len(resumo['dados_evolucao']['valores']) == 366
+    assert len(resumo['top_itens']) == 10
+    # Agrupado no banco: dia × categoria, itens e os nomes de categorias e produtos
+    assert len(consultas) == 4
@@ -0,0 +1,89 @@
+from datetime import date, timedelta
+
+import numpy as np
+
+from app.models.modelo_cardapio import Cardapio, CardapioSecao, CardapioItem
+from app.models.modelo_prato import Prato
+from app.models.modelo_previsao import FatorSazonalidade, HistoricoVendas
+from app.utils.sazonalidade import IndiceSazonalidade
+
+
+def _normalizar_laco(valores, datas, fatores):
+    """Cópia do laço antigo de gerar_previsao (um item, data × fator)"""
+    valores = list(valores)
+    for i, data in enumerate(datas):
+        for fator in fatores:
+            aplica_fator = False
+            if fator.mes and fator.mes == data.month:
+                aplica_fator = True
+            if fator.dia_semana is not None and fator.dia_semana == data.weekday():
+                aplica_fator = True
+            if aplica_fator:
+                valores[i] = valores[i] / fator.fator
+    return valores
+
+
+def _pratos(session, quantidade):
+    pratos = [Prato(nome=f"Prato Sazonal {i}", rendimento=1, unidade_rendimento="porção", porcoes_rendimento=1)
+              for i in range(quantidade)]
+    session.add_all(pratos)
+    session.commit()
+    return pratos
+
+
+def test_indice_equivale_ao_laco(session):
+    """O índice vetorizado reproduz o laço antigo para muitos itens × dias
+
+    A comparação de desempenho fica em scripts/benchmark_sazonalidade.py.
+    """
+    pratos = _pratos(session, 100)
+    fatores = [FatorSazonalidade(mes=m, fator=1 + m / 20) for m in range(1, 13)]
+    fatores += [FatorSazonalidade(dia_semana=d, fator=0.8 + d / 10) for d in range(7)]
+    session.add_all(fatores)
+    session.commit()
+
+    datas = [date(2024, 1, 1) + timedelta(days=i) for i in range(365)]
+    valores = np.random.default_rng(1).integers(1, 50, size=(365, len(pratos))).astype(float)
+
+    esperado = np.column_stack([_normalizar_laco(valores[:, c], datas, fatores) for c in range(len(pratos))])
+    indice = IndiceSazonalidade.compilar([('prato', p.id) for p in pratos])
+    obtido = indice.dessazonalizar(valores, datas)
+
+    assert np.allclose(obtido, esperado)
+    assert np.allclose(indice.aplicar(obtido, datas), valores)
+
+
+def test_precedencia_item_categoria_geral_e_eventos(session):
+    """O nível mais específico vence; eventos e períodos do dia são considerados"""
+    pratos = _pratos(session, 3)
+    cardapio = Cardapio(nome="Cardápio Sazonal")
+    session.add(cardapio)
+    session.commit()
+    secao = CardapioSecao(nome="Sobremesas", cardapio_id=cardapio.id)
+    session.add(secao)
+    session.commit()
+    item = CardapioItem(secao_id=secao.id, prato_id=pratos[1].id, preco_venda=20.00)
+    session.add(item)
+    session.commit()
+
+    session.add_all([
+        FatorSazonalidade(mes=12, fator=1.5),                                # geral
+        FatorSazonalidade(mes=12, categoria_id=secao.id, fator=2.0),        # categoria do item
+        FatorSazonalidade(mes=12, cardapio_item_id=item.id, fator=3.0),     # o próprio item
+        FatorSazonalidade(evento='Natal', prato_id=pratos[0].id, fator=4.0),
+        FatorSazonalidade(periodo_dia='noite', prato_id=pratos[2].id, fator=2.0),
+    ])
+    # Metade das vendas do prato 2 acontece à noite
+    session.add_all([
+        HistoricoVendas(data=date(2024, 1, 1), prato_id=pratos[2].id, quantidade=5, periodo_dia='noite'),
+        HistoricoVendas(data=date(2024, 1, 1), prato_id=pratos[2].id, quantidade=5, periodo_dia='tarde'),
+    ])
+    session.commit()
+
+    itens = [('prato', pratos[0].id), ('prato', pratos[1].id), ('cardapio_item', item.id), ('prato', pratos[2].id)]
+    indice = IndiceSazonalidade.compilar(itens)
+
+    natal = date(2024, 12, 25)
+    multiplicadores = indice.multiplicadores([natal, date(2024, 6, 3)], eventos={natal: 'Natal'})
+    assert np.allclose(multiplicadores[0], [1.5 * 4.0, 2.0, 3.0, 1.5 * 1.5])
+    assert np.allclose(multiplicadores[1], [1.0, 1.0, 1.0, 1.5])